@@ -33,9 +33,33 @@ function countWeeklyFromDateDateColumn_final() {
     outputSheet.clearContents();
   }
 
-  outputSheet.appendRow(["週（開始日）", "件数"]);
+  // 1回の書き込みでまとめて出力
   const sortedWeeks = Object.keys(weekMap).sort();
-  sortedWeeks.forEach(week => {
-    outputSheet.appendRow([week, weekMap[week]]);
-  });
+  const rows = [["週（開始日）", "件数"], ...sortedWeeks.map(week => [week, weekMap[week]])];
+  outputSheet.getRange(1, 1, rows.length, 2).setValues(rows);
+}
+
+// Lambda が課題の追加・更新ごとに差分で集計して公開する週別件数（rollups/by_week.csv）
+const WEEKLY_ROLLUP_URL = "https://your-company-exports.s3.amazonaws.com/project-exports/rollups/by_week.csv";
+
+/**
+ * 公開済みの週別集計を取得してシートに書き込む（シート全体の日付列は走査しない）
+ */
+function loadWeeklyRollupFromS3() {
+  const response = UrlFetchApp.fetch(WEEKLY_ROLLUP_URL, { muteHttpExceptions: true });
+  if (response.getResponseCode() !== 200) {
+    throw new Error(`週別集計を取得できません: HTTP ${response.getResponseCode()}`);
+  }
+  const rows = Utilities.parseCsv(response.getContentText("UTF-8"));
+
+  const ss = SpreadsheetApp.getActiveSpreadsheet();
+  const outputSheetName = "週別集計";
+  let outputSheet = ss.getSheetByName(outputSheetName);
+  if (!outputSheet) {
+    outputSheet = ss.insertSheet(outputSheetName);
+  } else {
+    outputSheet.clearContents();
+  }
+
+  outputSheet.getRange(1, 1, rows.length, rows[0].length).setValues(rows);
 }
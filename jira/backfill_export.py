@@ -0,0 +1,89 @@
+"""
+期間指定のバックフィル（mode=backfill）: 1日ごとのシャードに分割して日次ファイルを並列に作成
+"""
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+from jira_exporter import LambdaJiraS3Exporter
+
+logger = logging.getLogger(__name__)
+
+
+def parse_backfill_range(event: Dict) -> List[date]:
+    """event の start_date / end_date（YYYY-MM-DD、両端を含む）から対象日の一覧を作成"""
+    try:
+        start = datetime.strptime(event['start_date'], '%Y-%m-%d').date()
+        end = datetime.strptime(event.get('end_date', event['start_date']), '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        raise ValueError("バックフィルには start_date / end_date（YYYY-MM-DD）を指定してください")
+    if end < start:
+        raise ValueError(f"end_date が start_date より前です: {start} 〜 {end}")
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def run_backfill_export(exporter: LambdaJiraS3Exporter, event: Dict) -> Dict:
+    """
+    期間指定のバックフィル: 1日ごとのシャードに分割して並列に日次ファイルを作成
+    
+    各シャードは通常の日次エクスポートと同じ SUPPORT_created_YYYYMMDD.csv を出力する。
+    JIRAへのリクエストはエクスポーターの RequestGovernor を共有するため、
+    並列数に関係なく全体のレート・同時実行数の上限を守る。
+    公開済みの日はスキップするので、途中で失敗しても再実行すれば残りの日だけを処理する
+    （force=true で上書き）。最新ファイル（latest.csv）は更新しない。
+    """
+    now = datetime.now()
+    days = parse_backfill_range(event)
+    force = bool(event.get('force', False))
+    concurrency = max(1, int(event.get('concurrency') or os.environ.get('BACKFILL_CONCURRENCY', 4)))
+    
+    logger.info(f"バックフィル開始: {days[0]} 〜 {days[-1]} ({len(days)}日, 並列数 {concurrency})")
+    
+    def export_day(target: date) -> Dict:
+        filename = f"SUPPORT_created_{target.strftime('%Y%m%d')}.csv"
+        if not force and exporter.daily_exists(filename):
+            logger.info(f"公開済みのためスキップ: {filename}")
+            return {'date': target.isoformat(), 'filename': filename, 'status': 'skipped'}
+        
+        next_day = target + timedelta(days=1)
+        jql = (f'project = "SUPPORT" AND created >= "{target.strftime("%Y/%m/%d")}" '
+               f'AND created < "{next_day.strftime("%Y/%m/%d")}" ORDER BY created ASC')
+        result = exporter.stream_daily_export(jql, filename, target.year, target.month, target.day,
+                                              now.strftime('%Y-%m-%d'), update_latest=False)
+        if not result['daily_url']:
+            raise Exception(f"日次ファイルのアップロードに失敗しました: {filename}")
+        
+        return {
+            'date': target.isoformat(),
+            'filename': filename,
+            'status': 'exported',
+            'issue_count': result['issue_count'],
+            'daily_csv_url': result['daily_url']
+        }
+    
+    results = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(export_day, target): target for target in days}
+        for future, target in futures.items():
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.error(f"バックフィルエラー ({target}): {str(e)}")
+                results.append({'date': target.isoformat(), 'status': 'failed', 'error': str(e)})
+    
+    exported = [r for r in results if r['status'] == 'exported']
+    failed = [r['date'] for r in results if r['status'] == 'failed']
+    
+    return {
+        'message': f"バックフィル完了: {len(exported)}日分を出力、"
+                   f"{sum(1 for r in results if r['status'] == 'skipped')}日分は公開済み、{len(failed)}日分は失敗",
+        'mode': 'backfill',
+        'start_date': days[0].isoformat(),
+        'end_date': days[-1].isoformat(),
+        'issue_count': sum(r['issue_count'] for r in exported),
+        'failed_dates': failed,
+        'days': results,
+        'timestamp': now.isoformat()
+    }
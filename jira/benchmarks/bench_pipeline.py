@@ -0,0 +1,248 @@
+"""
+エクスポーター全体のオフラインベンチマーク
+
+ローカルの検索APIスタブ（jira_stub.JiraStub・合成課題）とローカルS3（LOCAL_S3_DIR）に向けた
+LambdaJiraS3Exporter で、課題数ごとに次の段階を計測する。
+
+- search: search_issues（全件をページ取得して IssueRecord にする）
+- csv:    issues_to_csv_string（標準CSVの文字列を作る）
+- upload: upload_latest_to_s3（latest.csv と圧縮版の書き込み）
+- stream: stream_daily_export（取得しながら日次・最新・差分CSVをストリーミング出力）
+
+search → csv → upload と stream は別々の子プロセスで実行し、ピークRSS（ru_maxrss）は
+子プロセスの開始から各段階の終了までの最大値を記録する（スタブは親プロセスで動かす）。
+結果は baselines.json の同じ条件・課題数の値と比較し、rows/sec が許容幅を超えて下がるか
+ピークRSSが許容幅を超えて増えた段階があれば終了コード 1 を返す。
+
+使い方:
+    python benchmarks/bench_pipeline.py                          # 1k / 10k / 100k
+    python benchmarks/bench_pipeline.py --sizes 1000 --latency 0.05 --throttle 0.02
+    python benchmarks/bench_pipeline.py --save-baseline          # 今回の結果をベースラインとして保存
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+import urllib.request
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+BASELINE_FILE = os.path.join(BENCH_DIR, 'baselines.json')
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+BUCKET = 'bench'
+JQL = 'project = "SUPPORT" ORDER BY created ASC'
+
+# 子プロセスで順に実行する段階
+STAGE_GROUPS = [['search', 'csv', 'upload'], ['stream']]
+
+# 比較する指標（True: 大きいほど良い）
+COMPARED_METRICS = {'rows_per_sec': True, 'peak_rss_mb': False}
+
+# これより短い段階は rows/sec のばらつきが大きいため比較しない
+MIN_COMPARED_SECONDS = 0.1
+
+
+def peak_rss_mb() -> float:
+    # Linux の ru_maxrss は KB 単位
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def tree_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def stub_stats(jira_url: str) -> Dict:
+    with urllib.request.urlopen(f'{jira_url}/_stats') as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+# ----------------------------------------------------------------------
+# 子プロセス（計測対象）
+# ----------------------------------------------------------------------
+
+def run_stages(stages: List[str]) -> Dict[str, Dict]:
+    """環境変数で設定したスタブ・ローカルS3に対して段階を順に実行"""
+    import logging
+    logging.disable(logging.WARNING)
+    from jira_exporter import LambdaJiraS3Exporter
+
+    exporter = LambdaJiraS3Exporter()
+    jira_url = exporter.jira_url
+    prefix = exporter.s3_prefix
+    bucket_dir = os.path.join(os.environ['LOCAL_S3_DIR'], BUCKET)
+
+    results = {}
+    issues = csv_content = None
+    for stage in stages:
+        # 段階ごとに別のプレフィックスに書き込み、その配下のサイズをアップロード量とする
+        exporter.s3_prefix = f'{prefix}{stage}/'
+        before = stub_stats(jira_url)
+        started = time.perf_counter()
+
+        if stage == 'search':
+            issues = exporter.search_issues(JQL, None)
+            rows = len(issues)
+        elif stage == 'csv':
+            csv_content = exporter.issues_to_csv_string(issues)
+            rows = len(issues)
+        elif stage == 'upload':
+            if not exporter.upload_latest_to_s3(csv_content, len(issues)):
+                raise RuntimeError('latest.csv のアップロードに失敗しました')
+            rows = len(issues)
+        elif stage == 'stream':
+            result = exporter.stream_daily_export(JQL, 'SUPPORT_created_bench.csv', 2024, 1, 1, '2024-01-02')
+            if not result['daily_url']:
+                raise RuntimeError('日次CSVのアップロードに失敗しました')
+            rows = result['issue_count']
+        else:
+            raise ValueError(f'未知の段階です: {stage}')
+
+        elapsed = time.perf_counter() - started
+        after = stub_stats(jira_url)
+        pages = after['pages'] - before['pages']
+        results[stage] = {
+            'seconds': round(elapsed, 3),
+            'rows': rows,
+            'rows_per_sec': round(rows / elapsed, 1),
+            'pages': pages,
+            'pages_per_sec': round(pages / elapsed, 1),
+            'throttled': after['throttled'] - before['throttled'],
+            'bytes_received': after['bytes_sent'] - before['bytes_sent'],
+            'bytes_uploaded': tree_size(os.path.join(bucket_dir, exporter.s3_prefix)),
+            'peak_rss_mb': round(peak_rss_mb(), 1)
+        }
+    exporter.http.close()
+    return results
+
+
+# ----------------------------------------------------------------------
+# 親プロセス（スタブの起動・子プロセスの実行・ベースライン比較）
+# ----------------------------------------------------------------------
+
+def scenario_name(args) -> str:
+    """ベースラインの条件名（条件が同じ結果どうしだけを比較する）"""
+    return (f'page={args.page_size},latency={args.latency:g},throttle={args.throttle:g},'
+            f'retry_after={args.retry_after:g},max_rps={args.max_rps:g},concurrency={args.concurrency}')
+
+
+def run_size(size: int, args) -> Dict[str, Dict]:
+    from csv_columns import DAILY_LAYOUT, STANDARD_LAYOUT, RowProjector
+    from jira_stub import JiraStub
+
+    stub = JiraStub(size, latency=args.latency, max_page_size=args.page_size,
+                    throttle_rate=args.throttle, retry_after=args.retry_after)
+    # エクスポーターが要求するページを先に作り、スタブの生成時間を計測に含めない
+    stub.prepare(RowProjector([STANDARD_LAYOUT, DAILY_LAYOUT]).fields + ['updated'])
+    jira_url = stub.start()
+    local_dir = tempfile.mkdtemp(prefix='bench_s3_')
+    env = dict(os.environ,
+               JIRA_URL=jira_url, JIRA_USERNAME='bench', JIRA_API_TOKEN='bench',
+               LOCAL_S3_DIR=local_dir, S3_BUCKET=BUCKET, S3_PREFIX='bench/',
+               JIRA_MAX_RPS=str(args.max_rps), JIRA_SEARCH_CONCURRENCY=str(args.concurrency))
+    env.pop('AWS_LAMBDA_FUNCTION_NAME', None)
+
+    results = {}
+    try:
+        for stages in STAGE_GROUPS:
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-stages', ','.join(stages)],
+                                    env=env, check=True, stdout=subprocess.PIPE).stdout
+            results.update(json.loads(output.decode('utf-8').strip().splitlines()[-1]))
+    finally:
+        stub.stop()
+        shutil.rmtree(local_dir, ignore_errors=True)
+    return results
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """ベースラインから許容幅を超えて悪化した指標"""
+    regressions = []
+    for stage, metrics in results.items():
+        base = baseline.get(stage) or {}
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            if not base.get(metric):
+                continue
+            if metric == 'rows_per_sec' and base.get('seconds', 0) < MIN_COMPARED_SECONDS:
+                continue
+            ratio = metrics[metric] / base[metric]
+            if (ratio < 1 - tolerance) if higher_is_better else (ratio > 1 + tolerance):
+                regressions.append(f'{stage}.{metric}: {base[metric]:,} → {metrics[metric]:,} ({ratio - 1:+.0%})')
+    return regressions
+
+
+def print_results(size: int, results: Dict, baseline: Dict):
+    print(f'課題数 {size:,}')
+    print(f'  {"段階":<8}{"秒":>8}{"pages/s":>10}{"rows/s":>12}{"upload MB":>11}{"recv MB":>9}'
+          f'{"429":>5}{"RSS MB":>9}{"基準 rows/s":>14}')
+    for stage, m in results.items():
+        base = (baseline.get(stage) or {}).get('rows_per_sec')
+        print(f'  {stage:<8}{m["seconds"]:>8.2f}{m["pages_per_sec"]:>10,.1f}{m["rows_per_sec"]:>12,.0f}'
+              f'{m["bytes_uploaded"] / 1024 / 1024:>11.1f}{m["bytes_received"] / 1024 / 1024:>9.1f}'
+              f'{m["throttled"]:>5}{m["peak_rss_mb"]:>9.1f}{(f"{base:,.0f}" if base else "-"):>14}')
+
+
+def load_baselines() -> Dict:
+    if not os.path.exists(BASELINE_FILE):
+        return {}
+    with open(BASELINE_FILE, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='エクスポーター全体のオフラインベンチマーク')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES), help='課題数（カンマ区切り）')
+    parser.add_argument('--page-size', type=int, default=100, help='スタブが返す1ページの最大件数')
+    parser.add_argument('--latency', type=float, default=0.0, help='検索リクエストごとの遅延（秒）')
+    parser.add_argument('--throttle', type=float, default=0.0, help='429 を返すリクエストの割合')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='429 の Retry-After（秒）')
+    parser.add_argument('--max-rps', type=float, default=0, help='JIRA_MAX_RPS（0 で無制限）')
+    parser.add_argument('--concurrency', type=int, default=4, help='JIRA_SEARCH_CONCURRENCY')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='ベースラインからの許容幅')
+    parser.add_argument('--save-baseline', action='store_true', help='結果を baselines.json に保存')
+    parser.add_argument('--run-stages', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stages:
+        print(json.dumps(run_stages(args.run_stages.split(','))))
+        return 0
+
+    scenario = scenario_name(args)
+    baselines = load_baselines()
+    print(f'条件: {scenario}')
+
+    regressions = []
+    for size in [int(size) for size in args.sizes.split(',') if size]:
+        results = run_size(size, args)
+        baseline = baselines.get(scenario, {}).get(str(size), {})
+        print_results(size, results, baseline)
+        regressions += [f'{size:,}件 {item}' for item in compare(results, baseline, args.tolerance)]
+        if args.save_baseline:
+            baselines.setdefault(scenario, {})[str(size)] = results
+
+    if args.save_baseline:
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'ベースラインを保存しました: {BASELINE_FILE}')
+    elif regressions:
+        print('ベースラインから悪化しています:')
+        for item in regressions:
+            print(f'  {item}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+行射影のマイクロベンチマーク
+
+旧実装（標準CSVと日次CSVでそれぞれ format_field_value を呼ぶ）と、
+RowProjector（課題ごとに1回だけ射影して両レイアウトを作る）の rows/sec を比較する。
+
+使い方:
+    python benchmarks/bench_row_projection.py [課題数]
+"""
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from csv_columns import DAILY_LAYOUT, STANDARD_LAYOUT, RowProjector  # noqa: E402
+
+
+def make_issues(count: int):
+    """サポートプロジェクトの課題に近い形のダミーデータを作成"""
+    priorities = ['Highest', 'High', 'Medium', 'Low']
+    users = [{'displayName': f'ユーザー{i}', 'accountId': f'acc-{i}'} for i in range(20)]
+    issues = []
+    for i in range(count):
+        issues.append({
+            'id': str(10000 + i),
+            'key': f'SUPPORT-{i}',
+            'fields': {
+                'issuetype': {'name': 'サポート', 'id': '10001'},
+                'summary': f'問い合わせ {i}',
+                'reporter': users[i % 20],
+                'assignee': users[(i * 7) % 20] if i % 5 else None,
+                'priority': {'name': priorities[i % 4], 'id': str(i % 4)},
+                'created': '2024-06-01T10:11:12.000+09:00',
+                'customfield_10141': [{'value': f'機能{i % 12}', 'id': str(i % 12)}],
+                'customfield_10140': {'value': f'分類{i % 6}', 'id': str(i % 6)},
+                'customfield_10129': users[(i * 3) % 20],
+                'customfield_10163': f'tok-{i % 500:05d}',
+            }
+        })
+    return issues
+
+
+def legacy_format_field_value(field_value, field_type='string'):
+    """旧実装の format_field_value（field_type の文字列比較で分岐）"""
+    if field_value is None:
+        return ''
+    if field_type == 'user':
+        return field_value.get('displayName', '') if isinstance(field_value, dict) else str(field_value)
+    elif field_type == 'status':
+        return field_value.get('name', '') if isinstance(field_value, dict) else str(field_value)
+    elif field_type == 'priority':
+        return field_value.get('name', '') if isinstance(field_value, dict) else str(field_value)
+    elif field_type == 'issuetype':
+        return field_value.get('name', '') if isinstance(field_value, dict) else str(field_value)
+    elif field_type == 'resolution':
+        return field_value.get('name', '') if isinstance(field_value, dict) else str(field_value)
+    elif field_type == 'datetime':
+        if field_value:
+            try:
+                dt = datetime.fromisoformat(field_value.replace('Z', '+00:00'))
+                return dt.strftime('%Y-%m-%d %H:%M:%S')
+            except Exception:
+                return str(field_value)
+        return ''
+    else:
+        if isinstance(field_value, dict):
+            if 'value' in field_value:
+                return str(field_value['value'])
+            elif 'name' in field_value:
+                return str(field_value['name'])
+            elif 'displayName' in field_value:
+                return str(field_value['displayName'])
+            else:
+                return str(field_value)
+        elif isinstance(field_value, list):
+            return ', '.join([str(item.get('value', item.get('name', item))) if isinstance(item, dict) else str(item)
+                              for item in field_value])
+        else:
+            return str(field_value)
+
+
+def legacy_row(issue):
+    f = legacy_format_field_value
+    fields = issue.get('fields', {})
+    return [
+        f(fields.get('issuetype'), 'issuetype'),
+        issue.get('key', ''),
+        issue.get('id', ''),
+        fields.get('summary', ''),
+        f(fields.get('customfield_10141')),
+        f(fields.get('customfield_10140')),
+        f(fields.get('reporter'), 'user'),
+        f(fields.get('customfield_10129'), 'user'),
+        f(fields.get('assignee'), 'user'),
+        f(fields.get('priority'), 'priority'),
+        f(fields.get('created'), 'datetime'),
+        f(fields.get('customfield_10163')),
+    ]
+
+
+def run_legacy(issues, prefix):
+    for issue in issues:
+        daily = prefix + legacy_row(issue)
+        standard = legacy_row(issue)
+    return daily, standard
+
+
+def run_projector(issues, prefix):
+    projector = RowProjector([STANDARD_LAYOUT, DAILY_LAYOUT])
+    for issue in issues:
+        base = projector.project(issue)
+        daily = projector.render(DAILY_LAYOUT, base, prefix)
+        standard = projector.render(STANDARD_LAYOUT, base)
+    return daily, standard
+
+
+def measure(func, issues, prefix, repeat=3) -> float:
+    """最良値の rows/sec（1課題 = 日次1行 + 標準1行）"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(issues, prefix)
+        best = min(best, time.perf_counter() - started)
+    return len(issues) / best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    issues = make_issues(count)
+    prefix = ['2024年6月1日', 2024, 6, 1, '2024-06-02']
+
+    assert run_legacy(issues[:100], prefix) == run_projector(issues[:100], prefix), '出力が一致しません'
+
+    before = measure(run_legacy, issues, prefix)
+    after = measure(run_projector, issues, prefix)
+
+    print(f"課題数: {count}")
+    print(f"旧実装 (format_field_value x2): {before:,.0f} rows/sec")
+    print(f"RowProjector (1回射影):         {after:,.0f} rows/sec")
+    print(f"高速化: {after / before:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
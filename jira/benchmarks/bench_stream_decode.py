@@ -0,0 +1,123 @@
+"""
+検索レスポンスのデコードのメモリベンチマーク
+
+旧実装（ページの本文をまとめて json.loads し、生の課題 dict をすべて保持する）と、
+decode_search_page（受信しながら1課題ずつデコードして prune_issue で縮める / IssueRecord にする）の
+ピークメモリ・保持メモリ（tracemalloc）と処理時間を比較する。
+保持した課題から日次CSV・標準CSVを作る時間（エンコード）も比較する。
+
+課題は self・avatarUrls などを含む JIRA Cloud のレスポンスに近い形で生成し（synthetic.py）、
+64KB のチャンクとして1ページずつ流す（フィクスチャ全体はメモリに置かない）。
+
+使い方:
+    python benchmarks/bench_stream_decode.py [課題数=50000] [ページサイズ=100]
+"""
+import os
+import sys
+import csv
+import json
+import time
+import tracemalloc
+from io import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from csv_columns import DAILY_LAYOUT, STANDARD_LAYOUT, RowProjector  # noqa: E402
+from json_stream import decode_search_page  # noqa: E402
+from synthetic import IssueFactory  # noqa: E402
+
+CHUNK_SIZE = 64 * 1024
+
+# 検索APIに要求するフィールド（エクスポーターと同じ）
+FACTORY = IssueFactory()
+FIELDS = RowProjector([STANDARD_LAYOUT, DAILY_LAYOUT]).fields + ['updated']
+
+
+def make_issue(i: int):
+    """JIRA Cloud の検索レスポンスに近い形の課題"""
+    return FACTORY.issue(i, FIELDS)
+
+
+def iter_page_chunks(start: int, count: int, total: int):
+    """1ページ分のレスポンス本文を CHUNK_SIZE ごとに生成（課題は1件ずつ作る）"""
+    buffer = bytearray(f'{{"expand":"schema,names","startAt":{start},"maxResults":{count},'
+                       f'"total":{total},"issues":['.encode('utf-8'))
+    for i in range(start, start + count):
+        if i > start:
+            buffer += b','
+        buffer += json.dumps(make_issue(i), ensure_ascii=False).encode('utf-8')
+        if len(buffer) >= CHUNK_SIZE:
+            yield bytes(buffer[:CHUNK_SIZE])
+            del buffer[:CHUNK_SIZE]
+    buffer += b']}'
+    yield bytes(buffer)
+
+
+def legacy_decode(chunks):
+    """旧実装: 本文をまとめて読み、文字列にデコードしてから json.loads"""
+    body = b''.join(chunks)
+    return json.loads(body.decode('utf-8'))
+
+
+def run(decode, total: int, page_size: int):
+    all_issues = []
+    for start in range(0, total, page_size):
+        page = decode(iter_page_chunks(start, min(page_size, total - start), total))
+        all_issues.extend(page['issues'])
+    return all_issues
+
+
+def measure(label: str, decode, total: int, page_size: int):
+    started = time.perf_counter()
+    issues = run(decode, total, page_size)
+    elapsed = time.perf_counter() - started
+    del issues
+
+    tracemalloc.start()
+    issues = run(decode, total, page_size)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<24} peak {peak / 1024 / 1024:8.1f} MB  retained {retained / 1024 / 1024:8.1f} MB  "
+          f"({retained / len(issues):7.0f} B/issue)  {total / elapsed:9,.0f} issues/sec")
+    return issues
+
+
+def encode(projector: RowProjector, issues, project) -> float:
+    """日次CSV・標準CSVの両方に書き出す時間"""
+    prefix = ['2024年6月1日', 2024, 6, 1, '2024-06-02']
+    output = StringIO()
+    writer = csv.writer(output)
+    started = time.perf_counter()
+    for issue in issues:
+        base = project(issue)
+        writer.writerow(projector.render(DAILY_LAYOUT, base, prefix))
+        writer.writerow(projector.render(STANDARD_LAYOUT, base))
+    return time.perf_counter() - started
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    print(f"課題数: {total:,} / ページサイズ: {page_size}")
+    projector = RowProjector([STANDARD_LAYOUT, DAILY_LAYOUT])
+
+    legacy = measure('json.loads + 生の課題', legacy_decode, total, page_size)
+    legacy_keys = [issue['key'] for issue in legacy]
+    legacy_encode = encode(projector, legacy, projector.project)
+    del legacy
+    pruned = measure('decode_search_page', decode_search_page, total, page_size)
+    assert [issue['key'] for issue in pruned] == legacy_keys
+    pruned_encode = encode(projector, pruned, projector.project)
+    del pruned
+    records = measure('IssueRecord', lambda chunks: decode_search_page(chunks, projector.record), total, page_size)
+    assert [issue.key for issue in records] == legacy_keys
+    record_encode = encode(projector, records, lambda issue: issue.row)
+
+    print()
+    for label, elapsed in [('生の課題（射影 + 出力）', legacy_encode), ('縮めた課題（射影 + 出力）', pruned_encode),
+                           ('IssueRecord（出力のみ）', record_encode)]:
+        print(f"エンコード {label:<24} {total / elapsed:10,.0f} issues/sec")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""
+ベンチマーク用のローカル JIRA 検索APIスタブ
+
+/rest/api/2/search で合成課題（synthetic.IssueFactory）を返す HTTP サーバー。
+
+- startAt / maxResults によるページング（maxResults は max_page_size で頭打ち）と
+  課題IDのキーセット（JQL の "id > N"）に対応。それ以外の条件は無視して全件を対象にする
+- fields で指定されたフィールドだけを返し、Accept-Encoding: gzip なら圧縮して返す
+- リクエストごとの遅延（latency）と、一定割合の 429（Retry-After 付き）を注入できる
+- /rest/api/2/field でフィールド定義（custom_fields.json）を返す
+- POST /rest/api/3/changelog/bulkfetch で課題IDごとのステータス変更履歴を返す
+  （1ページの変更履歴数は changelog_page_size で頭打ちにし、nextPageToken でページング）
+- /_stats でリクエスト数・ページ数・429 の数・送信バイト数を返す
+
+スタブ自身の生成・圧縮が計測のボトルネックにならないよう、gzip 済みのページは
+キャッシュし、prepare() で計測前に作っておける。
+
+    stub = JiraStub(10000, latency=0.05, throttle_rate=0.02)
+    url = stub.start()
+    ...
+    stub.stop()
+"""
+import re
+import json
+import gzip
+import time
+import random
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+from synthetic import FIRST_ID, IssueFactory
+
+_KEYSET = re.compile(r'\bid\s*>\s*(\d+)', re.IGNORECASE)
+
+# 送信の単位（クライアントが受信しながらデコードできるよう分けて書く）
+WRITE_CHUNK_SIZE = 64 * 1024
+
+
+class JiraStub:
+    """合成課題を返す検索APIスタブ（別スレッドで起動）"""
+
+    def __init__(self, total: int, factory: IssueFactory = None, latency: float = 0.0, max_page_size: int = 100,
+                 throttle_rate: float = 0.0, retry_after: float = 1.0, seed: int = 0,
+                 changelog_page_size: int = 10000):
+        self.total = total
+        self.factory = factory or IssueFactory()
+        self.latency = latency
+        self.max_page_size = max_page_size
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.changelog_page_size = changelog_page_size
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'pages': 0, 'issues': 0, 'throttled': 0, 'bytes_sent': 0, 'field_requests': 0,
+                      'changelog_requests': 0}
+        self.pages: Dict[tuple, Tuple[bytes, int]] = {}
+        self.server = None
+        self.thread = None
+
+    def start(self) -> str:
+        """空きポートで起動してベースURLを返す"""
+        handler = type('Handler', (_SearchHandler,), {'stub': self})
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def count(self, name: str, value: int = 1):
+        with self.lock:
+            self.stats[name] += value
+
+    def fields(self) -> List[Dict]:
+        """フィールド定義の一覧（合成課題の生成に使っている定義）"""
+        return list(self.factory.registry.fields.values())
+
+    def throttle(self) -> bool:
+        """このリクエストに 429 を返すか"""
+        if self.throttle_rate <= 0:
+            return False
+        with self.lock:
+            return self.random.random() < self.throttle_rate
+
+    def prepare(self, fields: List[str], page_size: int = None):
+        """startAt でページングした場合の gzip 済みページを作っておく"""
+        page_size = min(page_size or self.max_page_size, self.max_page_size)
+        for start_at in range(0, self.total, page_size):
+            self.search_body({'fields': ','.join(fields), 'startAt': start_at, 'maxResults': page_size}, True)
+
+    def search_body(self, params: Dict[str, str], compress: bool) -> Tuple[bytes, int]:
+        """検索APIのレスポンス本文と課題数"""
+        fields = [field for field in params.get('fields', '').split(',') if field]
+        start_at = int(params.get('startAt', 0))
+        max_results = min(int(params.get('maxResults', 50)), self.max_page_size)
+
+        # "id > N" 以降の課題（ID順）
+        match = _KEYSET.search(params.get('jql', ''))
+        first = min(self.total, max(0, int(match.group(1)) - FIRST_ID + 1)) if match else 0
+
+        key = (first, start_at, max_results, tuple(fields))
+        cached = self.pages.get(key) if compress else None
+        if cached:
+            return cached
+
+        start = first + start_at
+        end = min(self.total, start + max_results)
+        body = encode_json({
+            'expand': 'schema,names',
+            'startAt': start_at,
+            'maxResults': max_results,
+            'total': self.total - first,
+            'issues': [self.factory.issue(i, fields) for i in range(start, end)]
+        }, compress)
+        if compress:
+            self.pages[key] = (body, end - start)
+        return body, end - start
+
+
+    def changelog_body(self, request: Dict) -> Dict:
+        """一括取得APIのレスポンス（nextPageToken は全課題の変更履歴を並べたときの開始位置）"""
+        max_results = min(int(request.get('maxResults', 1000)), self.changelog_page_size)
+        offset = int(request.get('nextPageToken') or 0)
+        histories = []
+        for issue_id in request.get('issueIdsOrKeys', []):
+            i = int(issue_id) - FIRST_ID
+            if 0 <= i < self.total:
+                histories.extend((issue_id, history) for history in self.factory.status_histories(i))
+
+        changelogs = []
+        for issue_id, history in histories[offset:offset + max_results]:
+            if not changelogs or changelogs[-1]['issueId'] != issue_id:
+                changelogs.append({'issueId': issue_id, 'changeHistories': []})
+            changelogs[-1]['changeHistories'].append(history)
+        body = {'issueChangeLogs': changelogs}
+        if offset + max_results < len(histories):
+            body['nextPageToken'] = str(offset + max_results)
+        return body
+
+
+def encode_json(payload: Dict, compress: bool) -> bytes:
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    return gzip.compress(body, compresslevel=1) if compress else body
+
+
+class _SearchHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # ヘッダーと本文を分けて書くため、Nagle と遅延ACKで1リクエストごとに待たされないようにする
+    disable_nagle_algorithm = True
+    stub: JiraStub = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parts = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(parts.query))
+        stub = self.stub
+
+        if parts.path == '/_stats':
+            with stub.lock:
+                stats = dict(stub.stats)
+            self.send_json(200, stats, count=False)
+            return
+        stub.count('requests')
+
+        if parts.path == '/rest/api/2/myself':
+            self.send_json(200, {'displayName': 'ベンチマーク'})
+            return
+        if parts.path == '/rest/api/2/field':
+            stub.count('field_requests')
+            self.send_json(200, stub.fields())
+            return
+        if parts.path != '/rest/api/2/search':
+            self.send_json(404, {'errorMessages': ['Not Found']})
+            return
+
+        if stub.latency > 0:
+            time.sleep(stub.latency)
+        if stub.throttle():
+            stub.count('throttled')
+            self.send_json(429, {'errorMessages': ['Rate limit exceeded']},
+                           {'Retry-After': f'{stub.retry_after:g}'})
+            return
+
+        body, issue_count = stub.search_body(params, self.accepts_gzip)
+        stub.count('pages')
+        stub.count('issues', issue_count)
+        self.send_body(200, body)
+
+    def do_POST(self):
+        stub = self.stub
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        stub.count('requests')
+        if urllib.parse.urlsplit(self.path).path != '/rest/api/3/changelog/bulkfetch':
+            self.send_json(404, {'errorMessages': ['Not Found']})
+            return
+
+        if stub.latency > 0:
+            time.sleep(stub.latency)
+        if stub.throttle():
+            stub.count('throttled')
+            self.send_json(429, {'errorMessages': ['Rate limit exceeded']},
+                           {'Retry-After': f'{stub.retry_after:g}'})
+            return
+
+        stub.count('changelog_requests')
+        self.send_json(200, stub.changelog_body(request))
+
+    @property
+    def accepts_gzip(self) -> bool:
+        return 'gzip' in (self.headers.get('Accept-Encoding') or '')
+
+    def send_json(self, status: int, payload: Dict, headers: Dict[str, str] = None, count: bool = True):
+        self.send_body(status, encode_json(payload, self.accepts_gzip), headers, count)
+
+    def send_body(self, status: int, body: bytes, headers: Dict[str, str] = None, count: bool = True):
+        if self.accepts_gzip:
+            headers = dict(headers or {}, **{'Content-Encoding': 'gzip'})
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        for offset in range(0, len(body), WRITE_CHUNK_SIZE):
+            self.wfile.write(body[offset:offset + WRITE_CHUNK_SIZE])
+        if count:
+            self.stub.count('bytes_sent', len(body))
@@ -0,0 +1,175 @@
+"""
+ベンチマーク用の合成 SUPPORT 課題
+
+custom_fields.json のフィールド定義（schema.type / schema.items）に合わせて、
+JIRA Cloud の検索レスポンスと同じ形の値（self・avatarUrls などを含む）を生成する。
+値は課題の通し番号だけから決まるため、任意のページを状態なしで何度でも作れる。
+課題IDは 10000 から連番、作成日時は課題IDの順に増える。
+ステータスの変更履歴（status_histories）も現在のステータス・解決日時と矛盾しないよう生成する。
+"""
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from field_registry import FieldRegistry, get_registry  # noqa: E402
+
+BASE_URL = 'https://your-company.atlassian.net'
+
+FIRST_ID = 10000
+
+# 1件目の作成日時と、課題ごとの作成日時の間隔
+BASE_CREATED = datetime(2024, 1, 1, 9, 0, tzinfo=timezone(timedelta(hours=9)))
+CREATED_STEP = timedelta(minutes=7)
+
+USER_COUNT = 40
+OPTION_COUNT = 12
+
+
+def format_jira_datetime(value: datetime) -> str:
+    """JIRA の日時形式（例: 2024-06-01T10:11:12.000+0900）"""
+    return value.strftime('%Y-%m-%dT%H:%M:%S.000%z')
+
+
+def make_user(i: int) -> Dict:
+    account_id = f'5b10a2844c20165700ede{i:03d}'
+    return {
+        'self': f'{BASE_URL}/rest/api/2/user?accountId={account_id}',
+        'accountId': account_id,
+        'emailAddress': f'user{i}@example.com',
+        'avatarUrls': {size: f'https://avatar-management.example.com/{account_id}/{size}.png'
+                       for size in ('48x48', '24x24', '16x16', '32x32')},
+        'displayName': f'ユーザー{i}',
+        'active': True,
+        'timeZone': 'Asia/Tokyo',
+        'accountType': 'atlassian'
+    }
+
+
+USERS = [make_user(i) for i in range(USER_COUNT)]
+PRIORITIES = [{'self': f'{BASE_URL}/rest/api/2/priority/{i}', 'iconUrl': f'{BASE_URL}/images/icons/priorities/{i}.svg',
+               'name': name, 'id': str(i)} for i, name in enumerate(['Highest', 'High', 'Medium', 'Low'])]
+STATUSES = [{'self': f'{BASE_URL}/rest/api/2/status/{i}', 'description': '', 'iconUrl': f'{BASE_URL}/images/{i}.png',
+             'name': name, 'id': str(i), 'statusCategory': {'self': f'{BASE_URL}/rest/api/2/statuscategory/{i + 2}',
+                                                            'id': i + 2, 'key': key, 'colorName': color,
+                                                            'name': category}}
+            for i, (name, key, color, category) in enumerate([('Open', 'new', 'blue-gray', 'To Do'),
+                                                              ('In Progress', 'indeterminate', 'yellow', 'In Progress'),
+                                                              ('Closed', 'done', 'green', 'Done')])]
+RESOLUTION = {'self': f'{BASE_URL}/rest/api/2/resolution/10000', 'id': '10000', 'description': '', 'name': '完了'}
+ISSUE_TYPE = {'self': f'{BASE_URL}/rest/api/2/issuetype/10001', 'id': '10001', 'description': '',
+              'iconUrl': f'{BASE_URL}/images/icons/issuetypes/task.svg', 'name': 'サポート', 'subtask': False,
+              'avatarId': 10318, 'hierarchyLevel': 0}
+PROJECT = {'self': f'{BASE_URL}/rest/api/2/project/10002', 'id': '10002', 'key': 'SUPPORT', 'name': 'サポート',
+           'projectTypeKey': 'service_desk', 'simplified': False}
+NAMED_OBJECTS = {'issuetype': [ISSUE_TYPE], 'priority': PRIORITIES, 'project': [PROJECT]}
+
+
+class IssueFactory:
+    """
+    フィールド定義に合わせて合成課題を作る
+
+    フィールドIDごとに値の生成関数を schema から一度だけ作り、issue(i, fields) で
+    要求されたフィールドだけを持つ課題を返す（検索APIの fields 指定と同じ）。
+    """
+
+    def __init__(self, registry: FieldRegistry = None):
+        self.registry = registry or get_registry()
+        self.makers: Dict[str, Callable[[int], object]] = {}
+
+    def issue(self, i: int, fields: List[str]) -> Dict:
+        issue_id = FIRST_ID + i
+        return {
+            'expand': 'operations,versionedRepresentations,editmeta,changelog,renderedFields',
+            'id': str(issue_id),
+            'self': f'{BASE_URL}/rest/api/2/issue/{issue_id}',
+            'key': f'SUPPORT-{i + 1}',
+            'fields': {field_id: self.maker(field_id)(i) for field_id in fields}
+        }
+
+    def status_histories(self, i: int) -> List[Dict]:
+        """
+        課題のステータス変更履歴（一括取得APIの changeHistories の形、created はエポックミリ秒）
+
+        Open の課題は履歴なし、In Progress は Open → In Progress、Closed はさらに
+        解決日時に In Progress → Closed へ遷移する。
+        """
+        status = i % 3
+        if status == 0:
+            return []
+        span = timedelta(hours=i % 72 + 1)
+        steps = [(created_at(i) + span * (i % 4 + 1) / 5, STATUSES[0], STATUSES[1])]
+        if status == 2:
+            steps.append((created_at(i) + span, STATUSES[1], STATUSES[2]))
+        return [{
+            'id': str((FIRST_ID + i) * 10 + n),
+            'author': USERS[(i + n) % USER_COUNT],
+            'created': int(changed.timestamp() * 1000),
+            'items': [{'field': 'status', 'fieldtype': 'jira', 'fieldId': 'status',
+                       'from': before['id'], 'fromString': before['name'],
+                       'to': after['id'], 'toString': after['name']}]
+        } for n, (changed, before, after) in enumerate(steps)]
+
+    def maker(self, field_id: str) -> Callable[[int], object]:
+        maker = self.makers.get(field_id)
+        if maker is None:
+            maker = self.makers[field_id] = self._build_maker(field_id)
+        return maker
+
+    def _build_maker(self, field_id: str) -> Callable[[int], object]:
+        # フィールドごとに値の並びをずらす
+        salt = sum(field_id.encode('utf-8')) % 97 + 1
+
+        # 値の関係（作成 < 更新 < 解決、未解決は解決日なし）を保つ標準フィールド
+        if field_id == 'created':
+            return lambda i: format_jira_datetime(created_at(i))
+        if field_id == 'updated':
+            return lambda i: format_jira_datetime(created_at(i) + timedelta(hours=i % 72 + 1))
+        if field_id == 'resolution':
+            return lambda i: RESOLUTION if i % 3 == 2 else None
+        if field_id == 'resolutiondate':
+            return lambda i: format_jira_datetime(created_at(i) + timedelta(hours=i % 72 + 1)) if i % 3 == 2 else None
+        if field_id == 'status':
+            return lambda i: STATUSES[i % 3]
+        if field_id == 'summary':
+            return lambda i: f'問い合わせ {i}: ログイン後に画面が表示されない'
+        if field_id == 'assignee':
+            return lambda i: USERS[(i * 7) % USER_COUNT] if i % 5 else None
+
+        schema = self.registry.schema(field_id)
+        field_type = schema.get('type')
+        if field_type == 'array':
+            item = self._item_maker(schema.get('items'), field_id, salt)
+            return lambda i: [item(i + n) for n in range(i % 2 + 1)]
+        return self._item_maker(field_type, field_id, salt)
+
+    def _item_maker(self, field_type: str, field_id: str, salt: int) -> Callable[[int], object]:
+        if field_type == 'user':
+            return lambda i: USERS[(i * salt) % USER_COUNT]
+        if field_type == 'option':
+            options = [{'self': f'{BASE_URL}/rest/api/2/customFieldOption/{salt * 100 + n}',
+                        'value': f'選択肢{salt}-{n}', 'id': str(salt * 100 + n)} for n in range(OPTION_COUNT)]
+            return lambda i: options[(i * salt) % OPTION_COUNT]
+        if field_type in ('component', 'version'):
+            items = [{'self': f'{BASE_URL}/rest/api/2/{field_type}/{salt * 100 + n}', 'id': str(salt * 100 + n),
+                      'name': f'{field_type}-{n}'} for n in range(OPTION_COUNT)]
+            return lambda i: items[(i * salt) % OPTION_COUNT]
+        if field_type in NAMED_OBJECTS:
+            values = NAMED_OBJECTS[field_type]
+            return lambda i: values[i % len(values)]
+        if field_type == 'string':
+            # 短いテキスト（TOKEN など）は値の種類を限る
+            return lambda i: f'tok-{(i * salt) % 500:05d}'
+        if field_type == 'number':
+            return lambda i: float((i * salt) % 100)
+        if field_type == 'date':
+            return lambda i: (created_at(i) + timedelta(days=salt % 30)).strftime('%Y-%m-%d')
+        if field_type == 'datetime':
+            return lambda i: format_jira_datetime(created_at(i) + timedelta(hours=salt))
+        return lambda i: None
+
+
+def created_at(i: int) -> datetime:
+    return BASE_CREATED + CREATED_STEP * i
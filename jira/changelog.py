@@ -0,0 +1,216 @@
+"""
+変更履歴の一括取得とステータス滞在時間・初回応答の集計
+
+課題ごとの expand=changelog や /issue/{key}/changelog では課題数と同じ回数のリクエストが
+必要になるため、変更履歴の一括取得API（POST /rest/api/3/changelog/bulkfetch）で
+最大1000課題分のステータス遷移をまとめて取得する。検索結果のページから課題IDを
+1000件ずつのバッチにまとめ、バッチごとの取得（nextPageToken のページング）は並列に進める。
+取得した遷移はバッチ単位で課題ごとの集計（StatusDurations）に縮め、変更履歴そのものは保持しない。
+
+- ステータス滞在時間: 作成から最初の遷移までを作成時のステータスに、以降は遷移先の
+  ステータスに加算する。現在のステータスは集計時刻までを加算する
+- 初回応答: 作成時のステータスを最初に離れるまでの時間（まだ離れていなければ空）
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from csv_columns import IssueRecord, Layout
+from jira_governor import RequestGovernor
+
+logger = logging.getLogger(__name__)
+
+BULK_CHANGELOG_PATH = '/rest/api/3/changelog/bulkfetch'
+
+# 1リクエストで指定できる課題数と、1ページで返す変更履歴数の上限
+BULK_ISSUE_LIMIT = 1000
+BULK_RESULT_LIMIT = 10000
+
+# 集計に必要な課題のフィールド（現在のステータスと作成日時）
+CHANGELOG_LAYOUT = Layout('changelog', [
+    ('ステータス', 'status'),
+    ('作成日時', 'created'),
+])
+
+# ステータス滞在時間のサイドテーブル（課題 × 滞在したステータスごとに1行）
+TIME_IN_STATUS_HEADERS = [
+    '課題キー', '課題ID', '作成日時', '初回応答日時', '初回応答（時間）',
+    'ステータス', '滞在時間（時間）', '滞在回数', '現在のステータス'
+]
+
+# (遷移日時, 遷移元, 遷移先)
+Transition = Tuple[datetime, str, str]
+
+
+def parse_changelog_time(value) -> datetime:
+    """変更履歴・課題の日時（エポック秒・ミリ秒、または JIRA の日時文字列）をタイムゾーン付きに変換"""
+    if isinstance(value, (int, float)):
+        # 一括取得APIの created は数値で返る
+        return datetime.fromtimestamp(value / 1000 if value > 1e11 else value, timezone.utc)
+    try:
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f%z')
+    except ValueError:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def bulk_request(issue_ids: List[str], page_token: str = None) -> Dict:
+    """一括取得APIのリクエスト本文（ステータスの変更のみ）"""
+    body = {
+        'issueIdsOrKeys': issue_ids,
+        'fieldIds': ['status'],
+        'maxResults': BULK_RESULT_LIMIT
+    }
+    if page_token:
+        body['nextPageToken'] = page_token
+    return body
+
+
+def status_transitions(page: Dict) -> Dict[str, List[Transition]]:
+    """一括取得APIの1ページからステータスの遷移を課題IDごとに取り出す"""
+    transitions: Dict[str, List[Transition]] = {}
+    for changelog in page.get('issueChangeLogs') or []:
+        issue_transitions = transitions.setdefault(str(changelog.get('issueId')), [])
+        for history in changelog.get('changeHistories') or []:
+            items = [item for item in history.get('items') or []
+                     if (item.get('fieldId') or item.get('field')) == 'status']
+            if not items:
+                continue
+            changed = parse_changelog_time(history['created'])
+            for item in items:
+                issue_transitions.append((changed, item.get('fromString') or '', item.get('toString') or ''))
+    return transitions
+
+
+class StatusDurations:
+    """課題1件のステータス滞在時間と初回応答"""
+
+    __slots__ = ('key', 'id', 'created', 'status', 'first_response', 'durations', 'transitions')
+
+    def __init__(self, key: str, id: str, created: datetime, status: str, first_response: Optional[datetime],
+                 durations: Dict[str, List], transitions: int):
+        self.key = key
+        self.id = id
+        self.created = created
+        # 集計時点のステータス
+        self.status = status
+        self.first_response = first_response
+        # ステータス → [滞在秒数, 滞在回数]（滞在した順）
+        self.durations = durations
+        self.transitions = transitions
+
+    @property
+    def first_response_hours(self) -> Optional[float]:
+        if self.first_response is None:
+            return None
+        return (self.first_response - self.created).total_seconds() / 3600
+
+
+def reduce_status(key: str, issue_id: str, created: str, status: str, transitions: List[Transition],
+                  now: datetime) -> StatusDurations:
+    """作成日時・現在のステータス・遷移の一覧から滞在時間と初回応答を求める"""
+    created_at = parse_changelog_time(created)
+    transitions = sorted(transitions, key=lambda transition: transition[0])
+    initial = transitions[0][1] if transitions else status
+
+    durations: Dict[str, List] = {}
+    current, since = initial, created_at
+    first_response = None
+    for changed, _, to_status in transitions:
+        stay = durations.setdefault(current, [0.0, 0])
+        stay[0] += max(0.0, (changed - since).total_seconds())
+        stay[1] += 1
+        if first_response is None and to_status != initial:
+            first_response = changed
+        current, since = to_status, changed
+    stay = durations.setdefault(current, [0.0, 0])
+    stay[0] += max(0.0, (now - since).total_seconds())
+    stay[1] += 1
+    return StatusDurations(key, issue_id, created_at, current, first_response, durations, len(transitions))
+
+
+def iter_status_durations(pages: Iterable[List[IssueRecord]], status_of: Callable[[IssueRecord], str],
+                          fetch_page: Callable[[Dict], Dict], governor: RequestGovernor = None,
+                          now: datetime = None, batch_size: int = BULK_ISSUE_LIMIT) -> Iterator[StatusDurations]:
+    """
+    検索結果のページの課題ごとに StatusDurations を返すジェネレーター（検索結果と同じ順）
+
+    課題IDを batch_size 件ずつのバッチにまとめて一括取得APIを呼び出す。バッチの取得は
+    governor の同時実行数まで並列に進め、先読みはその2倍までに抑える。
+
+    Args:
+        pages: IssueRecord のページ（CHANGELOG_LAYOUT の列を含む射影で取得したもの）
+        status_of: 課題の現在のステータスを返す関数
+        fetch_page: 一括取得APIのリクエスト本文を受け取りレスポンス(dict)を返す関数
+        governor: 共有する RequestGovernor（省略時は新規作成）
+        now: 現在のステータスの滞在時間の終点（省略時は現在時刻）
+        batch_size: 1リクエストあたりの課題数
+    """
+    if governor is None:
+        governor = RequestGovernor()
+    now = now or datetime.now(timezone.utc)
+    batch_size = max(1, min(batch_size, BULK_ISSUE_LIMIT))
+
+    def fetch_batch(batch: List[Tuple[str, str, str, str]]) -> List[StatusDurations]:
+        ids = [issue_id for _, issue_id, _, _ in batch]
+        transitions: Dict[str, List[Transition]] = {}
+        page_token = None
+        while True:
+            page = governor.call(fetch_page, bulk_request(ids, page_token))
+            for issue_id, items in status_transitions(page).items():
+                transitions.setdefault(issue_id, []).extend(items)
+            page_token = page.get('nextPageToken')
+            if not page_token:
+                break
+        return [reduce_status(key, issue_id, created, status, transitions.get(issue_id, []), now)
+                for key, issue_id, created, status in batch]
+
+    lookahead = governor.max_concurrency * 2
+    with ThreadPoolExecutor(max_workers=governor.max_concurrency) as executor:
+        pending = []
+        batch = []
+        fetched = 0
+        try:
+            for issues in pages:
+                for issue in issues:
+                    # 課題は集計に必要な値だけにして、バッチが揃うまで保持する
+                    batch.append((issue.key, str(issue.id), issue.created, status_of(issue)))
+                    if len(batch) >= batch_size:
+                        pending.append(executor.submit(fetch_batch, batch))
+                        batch = []
+                # 先頭のバッチから順に、取得済みのものを返す
+                while pending and (pending[0].done() or len(pending) >= lookahead):
+                    results = pending.pop(0).result()
+                    fetched += len(results)
+                    logger.info(f"変更履歴の集計: {fetched}件")
+                    yield from results
+            if batch:
+                pending.append(executor.submit(fetch_batch, batch))
+            while pending:
+                results = pending.pop(0).result()
+                fetched += len(results)
+                logger.info(f"変更履歴の集計: {fetched}件")
+                yield from results
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+
+
+def _format_hours(hours: Optional[float]) -> str:
+    return '' if hours is None else f"{hours:.2f}"
+
+
+def duration_rows(summary: StatusDurations) -> List[List[str]]:
+    """サイドテーブルの行（滞在したステータスごとに1行）"""
+    created = summary.created.strftime('%Y-%m-%d %H:%M:%S')
+    first_response = ''
+    if summary.first_response is not None:
+        # 作成日時と同じタイムゾーンで表示する
+        first_response = summary.first_response.astimezone(summary.created.tzinfo).strftime('%Y-%m-%d %H:%M:%S')
+    first_hours = _format_hours(summary.first_response_hours)
+    return [
+        [summary.key, summary.id, created, first_response, first_hours,
+         status, _format_hours(seconds / 3600), str(visits), '○' if status == summary.status else '']
+        for status, (seconds, visits) in summary.durations.items()
+    ]
@@ -0,0 +1,75 @@
+"""
+ステータス滞在時間・初回応答（mode=changelog）: 変更履歴を一括取得してサイドテーブルを公開
+"""
+import csv
+import logging
+from datetime import datetime
+from typing import Dict
+
+from changelog import CHANGELOG_LAYOUT, TIME_IN_STATUS_HEADERS, duration_rows, iter_status_durations
+from csv_columns import IssueRecord
+from jira_exporter import LambdaJiraS3Exporter
+
+logger = logging.getLogger(__name__)
+
+# ステータス滞在時間・初回応答のサイドテーブル（S3_PREFIX 配下）
+TIME_IN_STATUS_KEY = 'changelog/SUPPORT_time_in_status.csv'
+
+
+def run_changelog_export(exporter: LambdaJiraS3Exporter, event: Dict) -> Dict:
+    """
+    ステータス滞在時間: JQL（既定は SUPPORT の全課題）の課題の変更履歴を一括取得APIでまとめて取得し、
+    課題 × ステータスごとの滞在時間と初回応答のサイドテーブルを changelog/ 配下に出力
+    
+    課題は課題IDのキーセットで取得し、1000件ごとに変更履歴を取得・集計しながら書き出すため、
+    全履歴でも課題1000件あたり検索10回と一括取得1回程度のリクエストで済む。
+    """
+    now = datetime.now()
+    jql = event.get('jql') or 'project = "SUPPORT"'
+    logger.info(f"ステータス滞在時間の集計開始 - JQLクエリ: {jql}")
+    
+    projector = exporter.build_projector([CHANGELOG_LAYOUT])
+    writer = exporter.open_s3_writer(f"{exporter.s3_prefix}{TIME_IN_STATUS_KEY}", {
+        'export_date': now.strftime('%Y-%m-%d'),
+        'data_type': 'time_in_status'
+    }, variants=True)
+    if writer is None:
+        raise Exception("S3設定が不完全なためステータス滞在時間を出力できません")
+    
+    def status_of(issue: IssueRecord) -> str:
+        return projector.render(CHANGELOG_LAYOUT, issue.row)[0]
+    
+    table = csv.writer(writer)
+    table.writerow(TIME_IN_STATUS_HEADERS)
+    issue_count = 0
+    row_count = 0
+    responded = 0
+    try:
+        pages = exporter.iter_issue_pages_by_id(jql, projector=projector)
+        for summary in iter_status_durations(pages, status_of, exporter.fetch_changelog_page, exporter.governor):
+            with exporter.metrics.stage('encode'):
+                rows = duration_rows(summary)
+                table.writerows(rows)
+            issue_count += 1
+            row_count += len(rows)
+            if summary.first_response is not None:
+                responded += 1
+    except Exception:
+        writer.abort()
+        raise
+    
+    csv_url = exporter.close_s3_writer(writer, 'ステータス滞在時間', row_count)
+    if not csv_url:
+        raise Exception("ステータス滞在時間のアップロードに失敗しました")
+    
+    logger.info(f"ステータス滞在時間の集計完了: {issue_count}件（{row_count}行）")
+    return {
+        'message': f"{issue_count}件の課題のステータス滞在時間を出力しました",
+        'mode': 'changelog',
+        'issue_count': issue_count,
+        'row_count': row_count,
+        'responded_count': responded,
+        'csv_url': csv_url,
+        'jql': jql,
+        'timestamp': now.isoformat()
+    }
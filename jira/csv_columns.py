@@ -0,0 +1,219 @@
+import sys
+from operator import itemgetter
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from field_registry import (
+    FieldRegistry, decode_any, decode_datetime, decode_display_name, decode_name, get_registry
+)
+
+
+# format_field_value の field_type → デコーダー
+DECODERS = {
+    'user': decode_display_name,
+    'status': decode_name,
+    'priority': decode_name,
+    'issuetype': decode_name,
+    'resolution': decode_name,
+    'datetime': decode_datetime,
+}
+
+
+def format_value(field_value, field_type: str = 'string') -> str:
+    """フィールド値をCSV用にフォーマット（field_type に対応するデコーダーで変換）"""
+    return DECODERS.get(field_type, decode_any)(field_value)
+
+
+# ----------------------------------------------------------------------
+# 列定義
+# ----------------------------------------------------------------------
+
+class Column:
+    """CSVの1列（課題のどのフィールドから値を取るか）"""
+
+    __slots__ = ('name', 'field')
+
+    def __init__(self, name: str, field: str = None):
+        self.name = name
+        # フィールドID・フィールド名・JQL句名のいずれか
+        # None の列は課題直下（key / id）から取得
+        self.field = field
+
+    def compile(self, registry: FieldRegistry) -> Tuple[str, Callable[[Dict, Dict], str]]:
+        """フィールドIDを解決し (フィールドID, (issue, fields) → セル値 の関数) を返す"""
+        if self.field is None:
+            name = self.name
+            return None, lambda issue, fields: issue.get(name, '')
+        field_id = registry.resolve(self.field)
+        decoder = registry.decoder(field_id)
+
+        def extract(issue, fields):
+            value = fields.get(field_id)
+            try:
+                return decoder(value)
+            except (KeyError, TypeError, AttributeError):
+                # フィールド定義と異なる形の値は汎用デコーダーで変換
+                return decode_any(value)
+        return field_id, extract
+
+
+# サポートプロジェクトで使う全列（カスタムフィールドは名前で指定し、IDとデコーダーは
+# custom_fields.json のフィールド定義から解決する）
+COLUMNS = {column.name: column for column in [
+    Column('issuetype', 'issuetype'),                    # 課題タイプ
+    Column('key'),                                       # 課題キー
+    Column('id'),                                        # 課題ID
+    Column('summary', 'summary'),                        # 要約
+    Column('function', '機能分類 (Function)'),           # 機能分類 (Function)
+    Column('inquiry', '問合せ分類 (Inquiry)'),           # 問合せ分類 (Inquiry)
+    Column('reporter', 'reporter'),                      # 報告者
+    Column('ts', 'TS'),                                  # TS（ユーザー型）
+    Column('assignee', 'assignee'),                      # 担当者
+    Column('priority', 'priority'),                      # 優先度
+    Column('status', 'status'),                          # ステータス
+    Column('resolution', 'resolution'),                  # 解決状況
+    Column('created', 'created'),                        # 作成日
+    Column('resolutiondate', 'resolutiondate'),          # 解決日
+    Column('token', 'TOKEN[Short text]'),                # TOKEN（同名のラベル型フィールドと区別）
+]}
+
+
+# 課題間で同じ値が繰り返される列（表示名・選択肢など）。射影時に intern して文字列を共有する
+REPEATED_COLUMNS = {'issuetype', 'function', 'inquiry', 'reporter', 'ts', 'assignee', 'priority', 'status', 'resolution'}
+
+
+class IssueRecord:
+    """
+    取得から CSV 出力までの課題の内部表現
+
+    検索APIの dict（ネストしたユーザー・優先度オブジェクトなど）は受信時に捨て、
+    基本行（RowProjector.project の結果）と、行以外で使う課題キー・ID・作成日時・更新日時だけを持つ。
+    """
+
+    __slots__ = ('key', 'id', 'created', 'updated', 'row')
+
+    def __init__(self, key: str, id: str, created: str, updated: str, row: Tuple[str, ...]):
+        self.key = key
+        self.id = id
+        self.created = created
+        self.updated = updated
+        self.row = row
+
+
+class Layout:
+    """CSVレイアウト（ヘッダー名と列の並び。prefix_headers は呼び出し側が値を渡す列）"""
+
+    def __init__(self, name: str, columns: Sequence[Tuple[str, str]], prefix_headers: Sequence[str] = ()):
+        self.name = name
+        self.prefix_headers = list(prefix_headers)
+        self.column_names = [column for _, column in columns]
+        self.headers = self.prefix_headers + [header for header, _ in columns]
+
+
+# 標準CSV（latest.csv / Google Apps Script 用 12列）
+STANDARD_LAYOUT = Layout('standard', [
+    ('課題タイプ', 'issuetype'),
+    ('課題キー', 'key'),
+    ('課題ID', 'id'),
+    ('要約', 'summary'),
+    ('機能分類 (Function)', 'function'),
+    ('問合せ分類 (Inquiry)', 'inquiry'),
+    ('報告者', 'reporter'),
+    ('TS', 'ts'),
+    ('担当者', 'assignee'),
+    ('優先度', 'priority'),
+    ('作成日', 'created'),
+    ('TOKEN', 'token'),
+])
+
+# 日次CSV（日次メタデータ5列 + 標準12列）
+DAILY_LAYOUT = Layout('daily', [
+    ('課題タイプ', 'issuetype'),
+    ('課題キー', 'key'),
+    ('課題ID', 'id'),
+    ('要約', 'summary'),
+    ('機能分類 (Function)', 'function'),
+    ('問合せ分類 (Inquiry)', 'inquiry'),
+    ('報告者', 'reporter'),
+    ('TS', 'ts'),
+    ('担当者', 'assignee'),
+    ('優先度', 'priority'),
+    ('作成日時', 'created'),
+    ('TOKEN', 'token'),
+], prefix_headers=['作成日', '年', '月', '日', 'エクスポート日'])
+
+# 手動エクスポート（15列）
+MANUAL_LAYOUT = Layout('manual', [
+    ('課題タイプ', 'issuetype'),
+    ('課題キー', 'key'),
+    ('課題ID', 'id'),
+    ('要約', 'summary'),
+    ('機能分類 (Function)', 'function'),
+    ('問合せ分類 (Inquiry)', 'inquiry'),
+    ('報告者', 'reporter'),
+    ('TS', 'ts'),
+    ('担当者', 'assignee'),
+    ('優先度', 'priority'),
+    ('ステータス', 'status'),
+    ('解決状況', 'resolution'),
+    ('作成日', 'created'),
+    ('解決日', 'resolutiondate'),
+    ('TOKEN', 'token'),
+])
+
+
+class RowProjector:
+    """
+    複数レイアウトで共有する行射影
+
+    使用するレイアウトの列の和集合を「基本行」とし、列ごとの取得関数を一度だけ作成する。
+    カスタムフィールドのIDとデコーダーはフィールド定義（FieldRegistry）から解決する。
+    COLUMNS にない列名は、そのままフィールド名・IDとして扱う。
+    課題は project() で基本行タプルに一度だけ変換し、各レイアウトの行は
+    render() で基本行から列を選び出すだけで作る（セルの再フォーマットはしない）。
+    """
+
+    def __init__(self, layouts: Sequence[Layout], registry: FieldRegistry = None):
+        registry = registry or get_registry()
+        names = []
+        for layout in layouts:
+            for name in layout.column_names:
+                if name not in names:
+                    names.append(name)
+
+        # COLUMNS にない列名はフィールド名・IDとして解決する（ジョブの列指定）
+        compiled = [(COLUMNS.get(name) or Column(name, name)).compile(registry) for name in names]
+        self.extractors = [extract for _, extract in compiled]
+        self.interned = [i for i, name in enumerate(names) if name in REPEATED_COLUMNS]
+
+        # JIRA検索APIで要求するフィールドID
+        self.fields = [field_id for field_id, _ in compiled if field_id]
+        self.field_ids = dict(zip(names, [field_id for field_id, _ in compiled]))
+
+        # レイアウトごとの基本行 → 行 の選択関数
+        self.positions = {name: i for i, name in enumerate(names)}
+        self.selectors = {}
+        for layout in layouts:
+            getter = itemgetter(*[self.positions[name] for name in layout.column_names])
+            if len(layout.column_names) == 1:
+                self.selectors[layout.name] = lambda base, getter=getter: [getter(base)]
+            else:
+                self.selectors[layout.name] = lambda base, getter=getter: list(getter(base))
+
+    def project(self, issue: Dict) -> Tuple[str, ...]:
+        """課題を基本行タプルに変換（繰り返し現れる列の値は intern して共有）"""
+        fields = issue.get('fields') or {}
+        row = [extract(issue, fields) for extract in self.extractors]
+        for i in self.interned:
+            row[i] = sys.intern(row[i])
+        return tuple(row)
+
+    def record(self, issue: Dict) -> IssueRecord:
+        """検索APIの課題を IssueRecord に変換（元の dict は保持しない）"""
+        fields = issue.get('fields') or {}
+        return IssueRecord(issue.get('key', ''), issue.get('id', ''), fields.get('created'), fields.get('updated'),
+                           self.project(issue))
+
+    def render(self, layout: Layout, base: Tuple[str, ...], prefix: Sequence = ()) -> List[str]:
+        """基本行から指定レイアウトの行を作成（prefix はレイアウト先頭のメタデータ列）"""
+        row = self.selectors[layout.name](base)
+        return list(prefix) + row if prefix else row
@@ -0,0 +1,101 @@
+"""
+Google Sheets へ配信済みの課題キーの索引と、連番付き差分ファイルのマニフェスト
+
+配信済みキーはプロジェクトごとのビットマップ（課題番号 n のビット）で保持するため、
+10万件でも十数KB程度。索引には差分ファイルの連番と直近のファイル一覧も含め、
+索引の保存を確定点とする（マニフェストは索引から作り直せる）。
+"""
+import json
+import zlib
+import base64
+import logging
+from datetime import datetime
+from typing import Dict, List
+
+from snapshot_store import split_issue_key
+
+logger = logging.getLogger(__name__)
+
+# S3_PREFIX 配下の索引・マニフェスト
+DELIVERY_INDEX_KEY = 'state/delivered_keys.json'
+DELTA_MANIFEST_KEY = 'deltas/manifest.json'
+
+# マニフェストに載せる直近の差分ファイル数
+MANIFEST_FILES = 60
+
+
+def delta_key(prefix: str, sequence: int) -> str:
+    """差分ファイルのキー（deltas/SUPPORT_delta_000001.csv）"""
+    return f"{prefix}deltas/SUPPORT_delta_{sequence:06d}.csv"
+
+
+class DeliveredKeyIndex:
+    """配信済み課題キーのビットマップ索引"""
+
+    def __init__(self, bitmaps: Dict[str, bytearray] = None, sequence: int = 0, files: List[Dict] = None):
+        self.bitmaps = bitmaps or {}
+        self.sequence = sequence
+        self.files = files or []
+
+    @classmethod
+    def load(cls, s3_client, bucket: str, key: str) -> 'DeliveredKeyIndex':
+        """S3から索引を読み込む（未作成なら空）"""
+        try:
+            response = s3_client.get_object(Bucket=bucket, Key=key)
+        except s3_client.exceptions.NoSuchKey:
+            logger.info(f"配信済みキー索引が未作成のため新規作成します: {key}")
+            return cls()
+        data = json.loads(response['Body'].read().decode('utf-8'))
+        bitmaps = {project: bytearray(zlib.decompress(base64.b64decode(encoded)))
+                   for project, encoded in data.get('projects', {}).items()}
+        return cls(bitmaps, data.get('sequence', 0), data.get('files', []))
+
+    def save(self, s3_client, bucket: str, key: str):
+        data = {
+            'sequence': self.sequence,
+            'files': self.files,
+            'projects': {project: base64.b64encode(zlib.compress(bytes(bitmap))).decode('ascii')
+                         for project, bitmap in self.bitmaps.items()}
+        }
+        s3_client.put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=json.dumps(data, ensure_ascii=False).encode('utf-8'),
+            ContentType='application/json'
+        )
+
+    def __contains__(self, issue_key: str) -> bool:
+        project, number = split_issue_key(issue_key)
+        bitmap = self.bitmaps.get(project)
+        return bool(bitmap) and number >> 3 < len(bitmap) and bool(bitmap[number >> 3] & (1 << (number & 7)))
+
+    def add(self, issue_key: str):
+        project, number = split_issue_key(issue_key)
+        bitmap = self.bitmaps.setdefault(project, bytearray())
+        if number >> 3 >= len(bitmap):
+            bitmap.extend(bytes((number >> 3) + 1 - len(bitmap)))
+        bitmap[number >> 3] |= 1 << (number & 7)
+
+    def count(self) -> int:
+        return sum(bin(byte).count('1') for bitmap in self.bitmaps.values() for byte in bitmap)
+
+    def record_delta(self, sequence: int, key: str, url: str, issue_count: int):
+        """公開した差分ファイルを記録（直近 MANIFEST_FILES 件のみ保持）"""
+        self.sequence = sequence
+        self.files.append({
+            'sequence': sequence,
+            'key': key,
+            'url': url,
+            'issue_count': issue_count,
+            'created': datetime.now().isoformat()
+        })
+        self.files = self.files[-MANIFEST_FILES:]
+
+    def manifest(self, headers: List[str]) -> Dict:
+        """Google Apps Script が読むマニフェスト"""
+        return {
+            'sequence': self.sequence,
+            'headers': headers,
+            'files': self.files,
+            'updated': datetime.now().isoformat()
+        }
@@ -0,0 +1,113 @@
+"""
+1回の実行で複数のエクスポートを行うジョブ定義
+
+ジョブごとに JQL・列・出力先（S3_PREFIX 配下のプレフィックス）を持ち、イベントの "jobs"
+または環境変数 EXPORT_JOBS（JSON配列）で指定する。
+
+    {"name": "open", "jql": "project = SUPPORT AND resolution = Unresolved",
+     "columns": "manual", "prefix": "jobs/open/", "filename": "latest.csv"}
+
+columns はレイアウト名（standard / manual）または列の一覧。列は COLUMNS の列名
+（ヘッダーは手動エクスポートと同じ）、フィールド名・ID（ヘッダーはその名前）、
+または [ヘッダー, 列名・フィールド名] の組で指定する。
+"""
+import os
+import re
+import json
+from typing import Dict, List
+
+from csv_columns import MANUAL_LAYOUT, STANDARD_LAYOUT, Layout
+
+# 列の一覧の代わりに指定できるレイアウト
+JOB_LAYOUTS = {layout.name: layout for layout in (STANDARD_LAYOUT, MANUAL_LAYOUT)}
+
+# COLUMNS の列名 → ヘッダー
+COLUMN_HEADERS = dict(zip(MANUAL_LAYOUT.column_names, MANUAL_LAYOUT.headers))
+
+DEFAULT_JOB_FILENAME = 'latest.csv'
+
+# S3のメタデータ・キーに使うためASCIIに限る
+_JOB_NAME = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+class ExportJob:
+    """1つのエクスポート（出力先は S3_PREFIX + key）"""
+
+    def __init__(self, name: str, jql: str, layout: Layout, prefix: str, filename: str):
+        self.name = name
+        self.jql = jql
+        self.layout = layout
+        self.prefix = prefix
+        self.filename = filename
+
+    @property
+    def key(self) -> str:
+        return f"{self.prefix}{self.filename}"
+
+
+def job_specs(event: Dict) -> List[Dict]:
+    """イベントの jobs（なければ環境変数 EXPORT_JOBS）"""
+    specs = event.get('jobs')
+    if specs is None:
+        config = os.environ.get('EXPORT_JOBS', '').strip()
+        if not config:
+            raise ValueError("ジョブを実行するにはイベントの jobs または EXPORT_JOBS を指定してください")
+        try:
+            specs = json.loads(config)
+        except ValueError:
+            raise ValueError("EXPORT_JOBS がJSONとして読み込めません")
+    if not isinstance(specs, list) or not specs:
+        raise ValueError("jobs にはジョブの配列を指定してください")
+    return specs
+
+
+def job_layout(name: str, columns) -> Layout:
+    """columns（レイアウト名または列の一覧）からジョブのレイアウトを作成"""
+    if isinstance(columns, str):
+        if columns not in JOB_LAYOUTS:
+            raise ValueError(f"ジョブ {name}: 未知のレイアウトです: {columns}（{' / '.join(JOB_LAYOUTS)}）")
+        layout = JOB_LAYOUTS[columns]
+        columns = list(zip(layout.headers, layout.column_names))
+
+    if not isinstance(columns, list) or not columns:
+        raise ValueError(f"ジョブ {name}: columns にはレイアウト名または列の一覧を指定してください")
+    pairs = []
+    for column in columns:
+        if isinstance(column, str):
+            pairs.append((COLUMN_HEADERS.get(column, column), column))
+        elif isinstance(column, (list, tuple)) and len(column) == 2 and all(isinstance(part, str) for part in column):
+            pairs.append((column[0], column[1]))
+        else:
+            raise ValueError(f"ジョブ {name}: 列の指定が不正です: {column}")
+    # 射影はジョブごとに作るため、レイアウト名はジョブ名でよい
+    return Layout(name, pairs)
+
+
+def parse_jobs(specs: List[Dict]) -> List[ExportJob]:
+    """ジョブ定義を検証して ExportJob の一覧にする（ジョブ名・出力先の重複は不可）"""
+    jobs = []
+    names = set()
+    keys = set()
+    for spec in specs:
+        if not isinstance(spec, dict):
+            raise ValueError(f"ジョブの指定が不正です: {spec}")
+        name = str(spec.get('name') or '')
+        if not _JOB_NAME.match(name):
+            raise ValueError(f"ジョブ名には英数字・-・_ を指定してください: {name!r}")
+        if name in names:
+            raise ValueError(f"ジョブ名が重複しています: {name}")
+        jql = spec.get('jql')
+        if not jql:
+            raise ValueError(f"ジョブ {name}: jql を指定してください")
+
+        prefix = str(spec.get('prefix') or f"jobs/{name}/").lstrip('/')
+        if not prefix.endswith('/'):
+            prefix += '/'
+        job = ExportJob(name, jql, job_layout(name, spec.get('columns', STANDARD_LAYOUT.name)), prefix,
+                        str(spec.get('filename') or DEFAULT_JOB_FILENAME))
+        if job.key in keys:
+            raise ValueError(f"ジョブ {name}: 出力先が他のジョブと重複しています: {job.key}")
+        names.add(name)
+        keys.add(job.key)
+        jobs.append(job)
+    return jobs
@@ -0,0 +1,156 @@
+"""
+エクスポートの段階別の所要時間とカウンター
+
+段階（接続・ページ取得・デコード・CSVエンコード・S3アップロード）ごとの所要時間と、
+ページ数・リトライ数・送受信バイト数・行数などのカウンターを1回の実行分ためておき、
+CloudWatch Embedded Metric Format（EMF）のJSON行として出力する。
+EMF の行はログに書くだけでメトリクスになるため、PutMetricData の呼び出しは不要。
+"""
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List
+
+# EMF のメトリクス名と単位（段階の時間はミリ秒）
+COUNTER_UNITS = {
+    'pages': 'Count',
+    'changelog_pages': 'Count',
+    'issues': 'Count',
+    'rows': 'Count',
+    'retries': 'Count',
+    'throttled': 'Count',
+    'connections': 'Count',
+    'uploads': 'Count',
+    'unchanged': 'Count',
+    'bytes_in': 'Bytes',
+    'bytes_out': 'Bytes',
+}
+
+# 出力に含めるアップロードごとの記録の上限（ログ1行のサイズを抑える）
+MAX_UPLOAD_RECORDS = 50
+
+
+class ExportMetrics:
+    """1回の実行分の段階別の所要時間とカウンター（スレッドセーフ）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # 段階 → [回数, 合計秒, 最大秒]
+            self.stages: Dict[str, List[float]] = {}
+            self.counters: Dict[str, int] = {}
+            self.uploads: List[Dict] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        """with ブロックの所要時間を段階 name に加算する"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+
+    def add_time(self, name: str, seconds: float):
+        with self.lock:
+            stage = self.stages.setdefault(name, [0, 0.0, 0.0])
+            stage[0] += 1
+            stage[1] += seconds
+            stage[2] = max(stage[2], seconds)
+
+    def count(self, name: str, value: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record_upload(self, key: str, seconds: float, size: int):
+        """S3アップロード1件（完了までの時間と書き込んだバイト数）"""
+        self.add_time('upload', seconds)
+        self.count('uploads')
+        self.count('bytes_out', size)
+        with self.lock:
+            if len(self.uploads) < MAX_UPLOAD_RECORDS:
+                self.uploads.append({'key': key, 'ms': round(seconds * 1000, 1), 'bytes': size})
+
+    def summary(self) -> Dict:
+        """段階別の所要時間（ミリ秒）・カウンター・アップロードごとの記録"""
+        with self.lock:
+            return {
+                'stages': {name: {'count': int(count), 'total_ms': round(total * 1000, 1),
+                                  'max_ms': round(longest * 1000, 1)}
+                           for name, (count, total, longest) in self.stages.items()},
+                'counters': dict(self.counters),
+                'uploads': list(self.uploads)
+            }
+
+    def flush(self) -> Dict:
+        """summary() を返して次の実行のためにリセット"""
+        summary = self.summary()
+        self.reset()
+        return summary
+
+
+def emf_document(summary: Dict, namespace: str, dimensions: Dict[str, str], extra: Dict[str, float] = None) -> Dict:
+    """
+    summary() を CloudWatch EMF のドキュメントに変換
+
+    段階の合計時間は "<段階>Ms"、カウンターはそのままの名前のメトリクスにする。
+    extra は追加のメトリクス（ミリ秒）。アップロードごとの記録はメトリクスにしない
+    プロパティとして含める（CloudWatch Logs Insights で検索できる）。
+    """
+    values = {}
+    units = {}
+    for name, stage in summary['stages'].items():
+        values[f'{name}Ms'] = stage['total_ms']
+        units[f'{name}Ms'] = 'Milliseconds'
+    for name, value in summary['counters'].items():
+        values[name] = value
+        units[name] = COUNTER_UNITS.get(name, 'Count')
+    for name, value in (extra or {}).items():
+        values[name] = value
+        units[name] = 'Milliseconds'
+
+    document = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': namespace,
+                'Dimensions': [sorted(dimensions)],
+                'Metrics': [{'Name': name, 'Unit': units[name]} for name in values]
+            }]
+        },
+        'upload_details': summary['uploads']
+    }
+    document.update(dimensions)
+    document.update(values)
+    return document
+
+
+def emit_emf(summary: Dict, namespace: str, dimensions: Dict[str, str], extra: Dict[str, float] = None):
+    """EMF のJSONを1行で標準出力に書く（ロガーの接頭辞が付くと EMF として解釈されないため print）"""
+    print(json.dumps(emf_document(summary, namespace, dimensions, extra), ensure_ascii=False), flush=True)
+
+
+class ChunkTimer:
+    """
+    チャンクの受信待ち時間を計る反復子
+
+    本文を受信しながらデコードする場合に、全体の時間から waited を引くと
+    デコードだけの時間になる。
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks: Iterator[bytes] = iter(chunks)
+        self.waited = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        started = time.perf_counter()
+        try:
+            return next(self.chunks)
+        finally:
+            self.waited += time.perf_counter() - started
@@ -0,0 +1,340 @@
+"""
+大規模エクスポートのコーディネーター／ワーカー分割
+
+コーディネーターは JQL を作成日時（created）の重ならない期間に分割して計画（plan.json）を
+S3に保存し、期間ごとの処理をワーカー（同じLambda関数を mode=worker で非同期に呼び出し）へ
+振り分けて終了する。ワーカーは担当期間の課題をシャードCSVとして書き出して完了マーカーを置き、
+同じレーンの次のシャードのワーカーを呼び出す。全シャードのマーカーが揃うと連結（mode=merge）を
+呼び出し、シャードはS3上でコピー（UploadPartCopy）して期間順に連結する。
+どの実行も1シャード分の処理しか行わないため、全体の所要時間は1回のタイムアウトに縛られない。
+ワーカーは開始時に実行中マーカーを置き、一定時間マーカーが更新されないレーン（ワーカーが
+強制終了された、次のシャードの呼び出しが失われた）は連結の呼び出し時に検出して呼び出し直す。
+"""
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from jira_search import split_order_by
+
+logger = logging.getLogger(__name__)
+
+# マルチパートアップロードの最小パートサイズ（最終パートを除く）。これより小さいシャードは
+# 読み込んで次のパートにまとめ、大きいシャードは UploadPartCopy でS3上のままコピーする
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+# これより短い期間は件数が多くても分割しない（JQLの日時は分単位）
+MIN_WINDOW = timedelta(minutes=1)
+
+JQL_DATETIME_FORMAT = '%Y/%m/%d %H:%M'
+
+
+def window_jql(jql: str, start: datetime, end: datetime, order_by: str = 'ORDER BY created ASC') -> str:
+    """JQLに作成日時の範囲 [start, end) を追加"""
+    where, _ = split_order_by(jql)
+    window = (f'created >= "{start.strftime(JQL_DATETIME_FORMAT)}" '
+              f'AND created < "{end.strftime(JQL_DATETIME_FORMAT)}"')
+    condition = f"({where}) AND {window}" if where else window
+    return f"{condition} {order_by}".strip()
+
+
+def plan_windows(count: Callable[[datetime, datetime], int], start: datetime, end: datetime,
+                 shard_size: int) -> List[Tuple[datetime, datetime, int]]:
+    """
+    [start, end) を1期間あたり shard_size 件以下になるよう二分割していく
+
+    count(start, end) は期間内の課題数を返す関数（検索APIの件数のみ取得）。
+    前半の件数を数えれば後半は差し引きで分かるため、分割1回につき件数取得は1回。
+    課題のない期間は除き、(開始, 終了, 件数) を期間順に返す。
+    """
+    windows = []
+    pending = [(start, end, count(start, end))]
+    while pending:
+        window_start, window_end, total = pending.pop()
+        if not total:
+            continue
+        if total <= shard_size or window_end - window_start <= MIN_WINDOW:
+            windows.append((window_start, window_end, total))
+            continue
+
+        # 分単位に丸めた中間点で分割
+        middle = window_start + (window_end - window_start) / 2
+        middle = middle.replace(second=0, microsecond=0)
+        if middle <= window_start:
+            middle = window_start + MIN_WINDOW
+        first = count(window_start, middle)
+        # 後半を先に積み、前半から処理する
+        pending.append((middle, window_end, max(total - first, 0)))
+        pending.append((window_start, middle, first))
+
+    windows.sort(key=lambda window: window[0])
+    return windows
+
+
+# ----------------------------------------------------------------------
+# シャードの配置（S3_PREFIX 配下の shards/<run_id>/）
+# ----------------------------------------------------------------------
+
+def run_prefix(prefix: str, run_id: str) -> str:
+    return f"{prefix}shards/{run_id}/"
+
+
+def plan_key(prefix: str, run_id: str) -> str:
+    """コーディネーターが保存する計画（期間ごとの JQL・シャードのキー・出力先）"""
+    return f"{run_prefix(prefix, run_id)}plan.json"
+
+
+def shard_key(prefix: str, run_id: str, shard: int) -> str:
+    return f"{run_prefix(prefix, run_id)}part-{shard:05d}.csv"
+
+
+def marker_key(shard_csv_key: str, status: str) -> str:
+    """シャードの実行中（running）・完了（done）・失敗（failed）マーカー"""
+    return f"{shard_csv_key[:-len('.csv')]}.{status}.json"
+
+
+def lane_shards(shard: int, shard_count: int, lanes: int) -> List[int]:
+    """shard と同じレーン（lanes 個おき）で後に続くシャード"""
+    return list(range(shard + lanes, shard_count, lanes))
+
+
+def list_objects(s3_client, bucket: str, prefix: str) -> List[Dict]:
+    """prefix 配下のオブジェクト（Key・LastModified など。ページングして全件）"""
+    objects = []
+    token = None
+    while True:
+        params = {'Bucket': bucket, 'Prefix': prefix}
+        if token:
+            params['ContinuationToken'] = token
+        response = s3_client.list_objects_v2(**params)
+        objects.extend(response.get('Contents') or [])
+        if not response.get('IsTruncated'):
+            return objects
+        token = response['NextContinuationToken']
+
+
+def list_keys(s3_client, bucket: str, prefix: str) -> List[str]:
+    """prefix 配下のキー（ページングして全件）"""
+    return [item['Key'] for item in list_objects(s3_client, bucket, prefix)]
+
+
+def shard_marker_times(s3_client, bucket: str, prefix: str, run_id: str) -> Dict[int, Dict[str, datetime]]:
+    """シャード番号 → {マーカーの状態（running / done / failed）: 更新日時}"""
+    markers = {}
+    base = run_prefix(prefix, run_id)
+    for item in list_objects(s3_client, bucket, base):
+        name = item['Key'][len(base):]
+        if not name.startswith('part-') or not name.endswith('.json'):
+            continue
+        number, _, status = name[len('part-'):-len('.json')].partition('.')
+        if status in ('running', 'done', 'failed'):
+            markers.setdefault(int(number), {})[status] = item['LastModified']
+    return markers
+
+
+def finished_status(times: Dict[str, datetime]) -> str:
+    """マーカーから決まるシャードの状態（done / failed、完了したものが優先。未完了なら None）"""
+    if 'done' in times:
+        return 'done'
+    return 'failed' if 'failed' in times else None
+
+
+def shard_markers(s3_client, bucket: str, prefix: str, run_id: str) -> Dict[int, str]:
+    """シャード番号 → マーカーの状態（done / failed、完了したものが優先）"""
+    markers = {}
+    for shard, times in shard_marker_times(s3_client, bucket, prefix, run_id).items():
+        status = finished_status(times)
+        if status:
+            markers[shard] = status
+    return markers
+
+
+def stalled_shards(marker_times: Dict[int, Dict[str, datetime]], shard_count: int, lanes: int,
+                   now: datetime, timeout: float) -> List[int]:
+    """
+    timeout 秒を過ぎても進まないレーンの、次に処理するはずのシャード
+
+    レーンの最初の未完了シャードについて、実行中マーカー（呼び出し時・開始時に置く）と
+    レーンの直前のシャードの完了・失敗マーカーのうち新しい方から timeout 秒を過ぎていれば止まったとみなす。
+    timeout は1回の実行の上限（Lambdaのタイムアウト）より長くしておけば、実行中のワーカーを誤検出しない。
+    """
+    stalled = []
+    for lane in range(min(lanes, shard_count)):
+        last = None
+        for shard in [lane] + lane_shards(lane, shard_count, lanes):
+            times = marker_times.get(shard, {})
+            if finished_status(times):
+                last = max(at for status, at in times.items() if status != 'running')
+                continue
+            started = max([at for at in (last, times.get('running')) if at is not None], default=None)
+            if started is not None and (now - started).total_seconds() > timeout:
+                stalled.append(shard)
+            break
+    return sorted(stalled)
+
+
+def put_json(s3_client, bucket: str, key: str, payload: Dict, **kwargs):
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+        ContentType='application/json; charset=utf-8',
+        **kwargs
+    )
+
+
+def get_json(s3_client, bucket: str, key: str) -> Dict:
+    """JSONオブジェクトを読み込む（未作成なら None）"""
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    return json.loads(response['Body'].read().decode('utf-8'))
+
+
+def acquire_lock(s3_client, bucket: str, key: str, owner: Dict) -> bool:
+    """条件付き書き込み（If-None-Match: *）でロックを作成（既にあれば False）"""
+    from botocore.exceptions import ClientError
+    try:
+        put_json(s3_client, bucket, key, owner, IfNoneMatch='*')
+        return True
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('PreconditionFailed', 'ConditionalRequestConflict', '412'):
+            return False
+        raise
+
+
+# ----------------------------------------------------------------------
+# ワーカーの呼び出し
+# ----------------------------------------------------------------------
+
+class InProcessDispatcher:
+    """
+    ワーカー・連結を同じプロセス内のスレッドで実行するスタンドイン（ローカル検証用）
+
+    run(payload, dispatcher) はハンドラー全体ではなくモードの処理だけを実行する関数で、
+    エクスポーター（メトリクス・成果物マニフェスト）は呼び出し元と共有する。
+    invoke() は非同期呼び出しと同じく結果を待たず、join() で全ての完了を待つ。
+    """
+
+    # 呼び出し元が join() で全ての完了を待つ（呼び出した処理が途中で失われない）ため監視は不要
+    detached = False
+
+    def __init__(self, run: Callable[[Dict, 'InProcessDispatcher'], Dict], max_workers: int = 8):
+        self.run = run
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.futures = []
+        self.lock = threading.Lock()
+
+    def invoke(self, payload: Dict):
+        # Lambda呼び出しと同じくJSONを経由させる
+        payload = json.loads(json.dumps(payload))
+        with self.lock:
+            self.futures.append(self.executor.submit(self.run, payload, self))
+
+    def join(self) -> List[Dict]:
+        """呼び出した処理（実行中に追加で呼び出されたものを含む）の完了を待って結果（失敗したものは例外）を返す"""
+        results = []
+        while True:
+            with self.lock:
+                if len(results) >= len(self.futures):
+                    break
+                future = self.futures[len(results)]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        self.executor.shutdown()
+        return results
+
+
+class LambdaDispatcher:
+    """ワーカー・連結をLambda関数として非同期呼び出し（InvocationType=Event）する"""
+
+    # 呼び出した実行の完了を誰も待たないため、止まったレーンは監視（mode=merge, watch）で検出する
+    detached = True
+
+    def __init__(self, function_name: str, client=None):
+        self.function_name = function_name
+        if client is None:
+            import boto3
+            client = boto3.client('lambda')
+        self.client = client
+
+    def invoke(self, payload: Dict):
+        response = self.client.invoke(
+            FunctionName=self.function_name,
+            InvocationType='Event',
+            Payload=json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        )
+        # 非同期呼び出しはキューに入った時点で 202 を返す
+        if response.get('StatusCode') != 202:
+            raise Exception(f"ワーカーの呼び出しに失敗しました: {response.get('StatusCode')}")
+
+
+# ----------------------------------------------------------------------
+# シャードの連結
+# ----------------------------------------------------------------------
+
+def concat_objects(s3_client, bucket: str, key: str, head: bytes, sources: List[str], extra_args: Dict = None,
+                   min_part_size: int = MIN_PART_SIZE) -> int:
+    """
+    head に続けて sources を順に連結した key をマルチパートアップロードで作成し、サイズを返す
+
+    min_part_size 以上のシャードは UploadPartCopy でS3上のままコピーし、本文は読み込まない。
+    最終パート以外は min_part_size 以上でなければならないため、小さいシャードと head は
+    読み込んでまとめ、まとめた分が足りなければ次の大きいシャードの先頭だけを範囲指定で
+    読み込んで1パートにする。読み込む量はシャード1つあたり min_part_size 未満に収まる。
+    """
+    upload_id = s3_client.create_multipart_upload(Bucket=bucket, Key=key, **(extra_args or {}))['UploadId']
+    parts = []
+    buffer = bytearray(head)
+    size = 0
+
+    def read(source: str, start: int, end: int) -> bytes:
+        return s3_client.get_object(Bucket=bucket, Key=source, Range=f"bytes={start}-{end - 1}")['Body'].read()
+
+    def upload_buffer():
+        number = len(parts) + 1
+        response = s3_client.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number,
+                                         Body=bytes(buffer))
+        parts.append({'PartNumber': number, 'ETag': response['ETag']})
+        buffer.clear()
+
+    def copy_part(source: str, start: int, end: int):
+        number = len(parts) + 1
+        response = s3_client.upload_part_copy(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number,
+                                              CopySource={'Bucket': bucket, 'Key': source},
+                                              CopySourceRange=f"bytes={start}-{end - 1}")
+        parts.append({'PartNumber': number, 'ETag': response['CopyPartResult']['ETag']})
+
+    try:
+        for source in sources:
+            length = s3_client.head_object(Bucket=bucket, Key=source)['ContentLength']
+            size += length
+            offset = 0
+            if buffer and length >= min_part_size:
+                # まとめた分を最小サイズまで埋めて1パートにする
+                offset = min_part_size - len(buffer) if len(buffer) < min_part_size else 0
+                if offset:
+                    buffer += read(source, 0, offset)
+                upload_buffer()
+            if length - offset >= min_part_size:
+                copy_part(source, offset, length)
+            elif length > offset:
+                buffer += read(source, offset, length)
+                if len(buffer) >= min_part_size:
+                    upload_buffer()
+        if buffer or not parts:
+            upload_buffer()
+        s3_client.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id,
+                                            MultipartUpload={'Parts': parts})
+    except BaseException:
+        try:
+            s3_client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        except Exception as e:
+            logger.warning(f"連結の中止に失敗しました: {str(e)}")
+        raise
+    return len(head) + size
@@ -0,0 +1,406 @@
+"""
+大規模エクスポート（mode=coordinator / worker / merge）: 作成日時の期間ごとのシャードに分割して取得・連結
+
+コーディネーター・ワーカー・連結はそれぞれ別の実行（非同期呼び出し）で、互いの完了を待たない。
+進捗は S3 の shards/<run_id>/ 配下の計画（plan.json）とシャードごとのマーカーで共有する。
+Lambda上では監視（mode=merge, "watch": true）が一定間隔で連結を呼び出し、止まったレーンを呼び出し直す。
+"""
+import io
+import os
+import csv
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+
+from csv_columns import STANDARD_LAYOUT
+from fanout import (acquire_lock, concat_objects, finished_status, get_json, lane_shards, list_keys, marker_key,
+                    plan_key, plan_windows, put_json, run_prefix, shard_key, shard_marker_times, shard_markers,
+                    stalled_shards, window_jql)
+from jira_exporter import CSV_CONTENT_TYPE, LambdaJiraS3Exporter, to_jira_time
+from s3_stream import VARIANT_SUFFIXES, compress_bytes
+
+logger = logging.getLogger(__name__)
+
+# 連結の結果（連結後も残し、再度の連結・状況確認に返す）
+RESULT_NAME = 'result.json'
+
+# マーカーが更新されないレーンを止まったとみなすまでの秒数（Lambdaのタイムアウトの上限900秒より長くする）
+DEFAULT_SHARD_TIMEOUT = 1800
+
+# 監視が連結を呼び出す間隔（秒。Lambdaのタイムアウトより短くする。0 なら監視しない）
+DEFAULT_WATCH_INTERVAL = 300
+
+# 止まったシャードを呼び出し直す回数（超えたら失敗マーカーを置いてレーンの次へ進む）
+MAX_STALL_RETRIES = 2
+
+# 連結した圧縮版のキー（full/<name>.csv.concat.gz）と Content-Type
+CONCAT_VARIANT_INFIX = '.concat'
+CONCAT_VARIANT_CONTENT_TYPES = {'gzip': 'application/gzip', 'zstd': 'application/zstd'}
+
+
+def stream_shard_export(exporter: LambdaJiraS3Exporter, jql: str, key: str, metadata: Dict) -> Dict:
+    """JQLの検索結果を標準レイアウトのシャードCSV（ヘッダーなし）と圧縮版としてS3へ書き出す"""
+    writer = exporter.open_s3_writer(key, metadata, variants=True, skip_unchanged=False)
+    if writer is None:
+        raise Exception("S3設定が不完全なためシャードを書き出せません")
+    
+    shard_csv = csv.writer(writer)
+    issue_count = 0
+    try:
+        for issues in exporter.iter_issue_pages(jql):
+            with exporter.metrics.stage('encode'):
+                for issue in issues:
+                    shard_csv.writerow(exporter.projector.render(STANDARD_LAYOUT, issue.row))
+            issue_count += len(issues)
+        writer.close()
+    except Exception:
+        writer.abort()
+        raise
+    
+    logger.info(f"シャード書き出し完了: {key} ({issue_count}件, {writer.bytes_written} bytes)")
+    return {'issue_count': issue_count, 'bytes': writer.bytes_written}
+
+
+def dispatch_shard(exporter: LambdaJiraS3Exporter, run_id: str, shard: int, dispatcher, **options):
+    """実行中マーカーを置いてからシャードのワーカーを呼び出す（マーカーの時刻で止まったレーンを検出する）"""
+    key = shard_key(exporter.s3_prefix, run_id, shard)
+    put_json(exporter.s3_client, exporter.s3_bucket, marker_key(key, 'running'), {
+        'run_id': run_id, 'shard': shard, 'attempt': options.get('attempt', 0),
+        'dispatched': datetime.now().isoformat()
+    })
+    dispatcher.invoke(dict({'mode': 'worker', 'run_id': run_id, 'shard': shard}, **options))
+
+
+def csv_header() -> bytes:
+    """連結ファイル先頭のヘッダー行（csv.writer と同じ書式）"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(STANDARD_LAYOUT.headers)
+    return buffer.getvalue().encode('utf-8')
+
+
+def run_coordinator_export(exporter: LambdaJiraS3Exporter, event: Dict, dispatcher) -> Dict:
+    """
+    コーディネーター: JQLを作成日時の期間に分割して計画を保存し、最初のワーカーを呼び出す
+    
+    期間は件数のみの検索で1期間あたり shard_size 件以下になるよう決める。
+    ワーカーは workers 本のレーンに分けて呼び出し、各ワーカーは終了時に同じレーンの次のシャードを
+    呼び出すため、JIRAへの同時実行は workers 件まで。シャードの完了は待たずに終了する。
+    """
+    now = datetime.now()
+    jql = event.get('jql') or 'project = "SUPPORT" ORDER BY created ASC'
+    shard_size = max(1, int(event.get('shard_size') or os.environ.get('FANOUT_SHARD_SIZE', 20000)))
+    workers = max(1, int(event.get('workers') or os.environ.get('FANOUT_WORKERS', 8)))
+    run_id = event.get('run_id') or now.strftime('%Y%m%d%H%M%S')
+    filename = f"{event.get('name') or 'SUPPORT_full_' + now.strftime('%Y%m%d_%H%M%S')}.csv"
+    shard_timeout = float(event.get('shard_timeout') or os.environ.get('FANOUT_SHARD_TIMEOUT', DEFAULT_SHARD_TIMEOUT))
+    watch_interval = float(event.get('watch_interval', os.environ.get('FANOUT_WATCH_INTERVAL', DEFAULT_WATCH_INTERVAL)))
+    
+    # 対象期間（未指定なら最も古い課題から現在まで）
+    if event.get('start_date'):
+        start = datetime.strptime(event['start_date'], '%Y-%m-%d')
+    else:
+        first = exporter.first_created(jql)
+        if first is None:
+            return {'message': '該当する課題はありませんでした', 'mode': 'coordinator', 'issue_count': 0,
+                    'jql': jql, 'timestamp': now.isoformat()}
+        start = to_jira_time(first).replace(second=0, microsecond=0)
+    if event.get('end_date'):
+        end = datetime.strptime(event['end_date'], '%Y-%m-%d') + timedelta(days=1)
+    else:
+        # タイムゾーンの差で直近の課題を取りこぼさないよう翌々日0時まで（未来の期間は0件なので分割されない）
+        end = datetime.combine(now.date(), datetime.min.time()) + timedelta(days=2)
+    
+    windows = plan_windows(lambda a, b: exporter.count_issues(window_jql(jql, a, b)), start, end, shard_size)
+    planned = sum(count for _, _, count in windows)
+    summary = {
+        'mode': 'coordinator',
+        'run_id': run_id,
+        'jql': jql,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'shard_count': len(windows),
+        'planned': planned,
+        'timestamp': now.isoformat()
+    }
+    if not windows:
+        summary.update({'message': '該当する課題はありませんでした', 'issue_count': 0})
+        return summary
+    
+    logger.info(f"コーディネーター開始: {start} 〜 {end} {planned}件を{len(windows)}シャードに分割 (並列数 {workers})")
+    put_json(exporter.s3_client, exporter.s3_bucket, plan_key(exporter.s3_prefix, run_id), {
+        'run_id': run_id,
+        'jql': jql,
+        'filename': filename,
+        'workers': workers,
+        'planned': planned,
+        'shard_timeout': shard_timeout,
+        'watch_interval': watch_interval,
+        'shards': [
+            {'shard': shard, 'jql': window_jql(jql, window_start, window_end), 'planned': count}
+            for shard, (window_start, window_end, count) in enumerate(windows)
+        ],
+        'timestamp': now.isoformat()
+    })
+    
+    for shard in range(min(workers, len(windows))):
+        dispatch_shard(exporter, run_id, shard, dispatcher)
+    if watch_interval > 0 and dispatcher.detached:
+        dispatcher.invoke({'mode': 'merge', 'run_id': run_id, 'watch': True})
+    
+    summary.update({
+        'message': f'{len(windows)}シャードのワーカーを{min(workers, len(windows))}レーンで呼び出しました',
+        'status': 'dispatched',
+        # 進捗の確認・連結の再実行に使うイベント
+        'merge_event': {'mode': 'merge', 'run_id': run_id}
+    })
+    return summary
+
+
+def run_worker_export(exporter: LambdaJiraS3Exporter, event: Dict, dispatcher) -> Dict:
+    """
+    ワーカー: 計画のうち担当シャードの課題を書き出して完了マーカーを置く
+    
+    開始時に実行中マーカーを置き直す。失敗しても例外にはせず（非同期呼び出しの自動再試行は使わない）、
+    1回だけ再実行したうえで失敗マーカーを置く。その後、同じレーンの次のシャードを呼び出し
+    （"chain": false の場合を除く）、全シャードのマーカーが揃っていれば連結を呼び出す。
+    """
+    run_id = event['run_id']
+    shard = int(event['shard'])
+    s3_client, bucket, prefix = exporter.s3_client, exporter.s3_bucket, exporter.s3_prefix
+    plan = get_json(s3_client, bucket, plan_key(prefix, run_id))
+    if plan is None:
+        raise Exception(f"計画が見つかりません: {run_id}")
+    
+    jql = plan['shards'][shard]['jql']
+    key = shard_key(prefix, run_id, shard)
+    if get_json(s3_client, bucket, marker_key(key, 'done')) is not None:
+        # 止まったとみなして呼び出し直したシャードが重複して届いた場合など
+        logger.info(f"シャード {shard} は完了済みです")
+        return {'mode': 'worker', 'run_id': run_id, 'shard': shard, 'shard_key': key, 'skipped': True}
+    put_json(s3_client, bucket, marker_key(key, 'running'), {
+        'run_id': run_id, 'shard': shard, 'attempt': int(event.get('attempt', 0)),
+        'started': datetime.now().isoformat()
+    })
+    logger.info(f"シャード {shard} 開始 - JQLクエリ: {jql}")
+    metadata = {'run_id': run_id, 'shard': str(shard), 'data_type': 'shard'}
+    result = {'mode': 'worker', 'run_id': run_id, 'shard': shard, 'shard_key': key, 'failed_shards': []}
+    try:
+        try:
+            written = stream_shard_export(exporter, jql, key, metadata)
+        except Exception as e:
+            logger.warning(f"シャード {shard} を再実行します: {str(e)}")
+            written = stream_shard_export(exporter, jql, key, metadata)
+        result.update(written)
+        put_json(s3_client, bucket, marker_key(key, 'done'), result)
+    except Exception as e:
+        logger.error(f"シャードエラー ({shard}): {str(e)}")
+        result.update({'failed_shards': [shard], 'error': str(e)})
+        put_json(s3_client, bucket, marker_key(key, 'failed'), result)
+    
+    shard_count = len(plan['shards'])
+    if event.get('chain', True):
+        following = lane_shards(shard, shard_count, plan['workers'])
+        if following:
+            dispatch_shard(exporter, run_id, following[0], dispatcher)
+    
+    # 最後に終わったワーカーが連結を呼び出す（同時に終わって重複しても連結は1回だけ行われる）
+    if len(shard_markers(s3_client, bucket, prefix, run_id)) == shard_count:
+        dispatcher.invoke({'mode': 'merge', 'run_id': run_id})
+    return result
+
+
+def run_merge_export(exporter: LambdaJiraS3Exporter, event: Dict, dispatcher) -> Dict:
+    """
+    連結: 全シャードが完了していれば full/ 配下に標準レイアウトのCSV（と圧縮版）を作成
+    
+    何度呼び出してもよく、未完了なら進捗（pending / failed_shards）を返す。
+    shard_timeout 秒を過ぎても進まないレーン（ワーカーの強制終了・呼び出しの消失）は自動で呼び出し直し、
+    MAX_STALL_RETRIES 回を超えたシャードは失敗として記録してレーンの次へ進む。
+    "retry_failed": true で失敗したシャード、"retry_pending": true で完了マーカーのない
+    シャードのワーカーをすぐに呼び出し直す。
+    シャードはS3上でコピーして連結し、連結後にシャードとマーカーを削除する。
+    """
+    if event.get('watch'):
+        return watch_merge(exporter, event, dispatcher)
+    run_id = event['run_id']
+    s3_client, bucket, prefix = exporter.s3_client, exporter.s3_bucket, exporter.s3_prefix
+    base = run_prefix(prefix, run_id)
+    finished = get_json(s3_client, bucket, base + RESULT_NAME)
+    if finished is not None:
+        return finished
+    plan = get_json(s3_client, bucket, plan_key(prefix, run_id))
+    if plan is None:
+        raise Exception(f"計画が見つかりません: {run_id}")
+    
+    shard_count = len(plan['shards'])
+    marker_times = shard_marker_times(s3_client, bucket, prefix, run_id)
+    stalled = stalled_shards(marker_times, shard_count, plan['workers'], datetime.now(timezone.utc),
+                             plan.get('shard_timeout', DEFAULT_SHARD_TIMEOUT))
+    stalled_retry = []
+    for shard in stalled:
+        if redispatch_stalled_shard(exporter, plan, shard, dispatcher):
+            stalled_retry.append(shard)
+    
+    markers = shard_markers(s3_client, bucket, prefix, run_id) if stalled else {
+        shard: finished_status(times) for shard, times in marker_times.items() if finished_status(times)}
+    failed = sorted(shard for shard, status in markers.items() if status == 'failed')
+    pending = [shard for shard in range(shard_count) if shard not in markers]
+    retry = (failed if event.get('retry_failed') else []) + (
+        [shard for shard in pending if shard not in stalled_retry] if event.get('retry_pending') else [])
+    for shard in sorted(retry):
+        if shard in failed:
+            s3_client.delete_object(Bucket=bucket, Key=marker_key(shard_key(prefix, run_id, shard), 'failed'))
+        dispatch_shard(exporter, run_id, shard, dispatcher, chain=False)
+    retry = sorted(retry + stalled_retry)
+    
+    summary = {
+        'mode': 'merge',
+        'run_id': run_id,
+        'shard_count': shard_count,
+        'done': shard_count - len(failed) - len(pending),
+        'pending': pending,
+        'failed_shards': [] if event.get('retry_failed') else failed,
+        'stalled': stalled,
+        'retried': retry,
+        'timestamp': datetime.now().isoformat()
+    }
+    if failed or pending:
+        # 不完全なファイルは作らない（完了したシャードはそのまま残す）
+        summary['status'] = 'running' if retry or not failed else 'failed'
+        return summary
+    
+    if not acquire_lock(s3_client, bucket, base + 'merge.lock', {'run_id': run_id}):
+        # 連結中に強制終了された実行のロックは shard_timeout を過ぎたら外して取り直す
+        locked = s3_client.head_object(Bucket=bucket, Key=base + 'merge.lock')['LastModified']
+        if (datetime.now(timezone.utc) - locked).total_seconds() <= plan.get('shard_timeout', DEFAULT_SHARD_TIMEOUT):
+            summary['status'] = 'merging'
+            return summary
+        logger.warning(f"連結のロックが古いため取り直します: {run_id}")
+        s3_client.delete_object(Bucket=bucket, Key=base + 'merge.lock')
+        if not acquire_lock(s3_client, bucket, base + 'merge.lock', {'run_id': run_id}):
+            summary['status'] = 'merging'
+            return summary
+    
+    try:
+        result = merge_shard_files(exporter, plan)
+    except Exception:
+        # 次の連結の呼び出しでやり直せるようロックを外す
+        s3_client.delete_object(Bucket=bucket, Key=base + 'merge.lock')
+        raise
+    summary.update(result)
+    summary['status'] = 'complete'
+    put_json(s3_client, bucket, base + RESULT_NAME, summary)
+    
+    for key in list_keys(s3_client, bucket, base + 'part-'):
+        s3_client.delete_object(Bucket=bucket, Key=key)
+    return summary
+
+
+def redispatch_stalled_shard(exporter: LambdaJiraS3Exporter, plan: Dict, shard: int, dispatcher) -> bool:
+    """
+    止まったレーンのシャードを呼び出し直す（呼び出し直したら True）
+    
+    呼び出し直した回数は実行中マーカーに残し、MAX_STALL_RETRIES 回を超えたら失敗マーカーを置いて
+    レーンの次のシャードを呼び出す（1シャードが毎回タイムアウトしてもレーン全体は止めない）。
+    """
+    s3_client, bucket, prefix = exporter.s3_client, exporter.s3_bucket, exporter.s3_prefix
+    run_id = plan['run_id']
+    key = shard_key(prefix, run_id, shard)
+    attempt = (get_json(s3_client, bucket, marker_key(key, 'running')) or {}).get('attempt', 0) + 1
+    if attempt <= MAX_STALL_RETRIES:
+        logger.warning(f"シャード {shard} が進まないため呼び出し直します（{attempt}回目）")
+        dispatch_shard(exporter, run_id, shard, dispatcher, attempt=attempt)
+        return True
+    
+    error = f"{MAX_STALL_RETRIES}回呼び出し直しても{plan.get('shard_timeout', DEFAULT_SHARD_TIMEOUT):.0f}秒以内に終わりませんでした"
+    logger.error(f"シャードエラー ({shard}): {error}")
+    put_json(s3_client, bucket, marker_key(key, 'failed'), {
+        'mode': 'worker', 'run_id': run_id, 'shard': shard, 'shard_key': key, 'failed_shards': [shard],
+        'error': error
+    })
+    following = lane_shards(shard, len(plan['shards']), plan['workers'])
+    if following:
+        dispatch_shard(exporter, run_id, following[0], dispatcher)
+    return False
+
+
+def watch_merge(exporter: LambdaJiraS3Exporter, event: Dict, dispatcher) -> Dict:
+    """
+    監視（mode=merge, "watch": true）: watch_interval 秒待ってから連結を呼び出し、
+    未完了なら次の監視を呼び出す（止まったレーンは連結の中で呼び出し直される）
+    
+    コーディネーターがLambda上で1回呼び出し、完了・失敗したら終わる。
+    """
+    run_id = event['run_id']
+    plan = get_json(exporter.s3_client, exporter.s3_bucket, plan_key(exporter.s3_prefix, run_id))
+    if plan is None:
+        raise Exception(f"計画が見つかりません: {run_id}")
+    time.sleep(plan.get('watch_interval', DEFAULT_WATCH_INTERVAL))
+    
+    summary = run_merge_export(exporter, {'mode': 'merge', 'run_id': run_id}, dispatcher)
+    if summary.get('status') in ('running', 'merging'):
+        dispatcher.invoke({'mode': 'merge', 'run_id': run_id, 'watch': True})
+    return summary
+
+
+def merge_shard_files(exporter: LambdaJiraS3Exporter, plan: Dict) -> Dict:
+    """完了したシャードを期間順に連結し、成果物として記録"""
+    s3_client, bucket, prefix = exporter.s3_client, exporter.s3_bucket, exporter.s3_prefix
+    run_id = plan['run_id']
+    keys = [shard_key(prefix, run_id, shard) for shard in range(len(plan['shards']))]
+    issue_count = sum(get_json(s3_client, bucket, marker_key(key, 'done'))['issue_count'] for key in keys)
+    if issue_count != plan['planned']:
+        logger.warning(f"実行中に課題が増減しました: 計画 {plan['planned']}件 / 取得 {issue_count}件")
+    
+    full_key = f"{prefix}full/{plan['filename']}"
+    metadata = {'run_id': run_id, 'issue_count': str(issue_count), 'data_type': 'full_export'}
+    header = csv_header()
+    started = time.perf_counter()
+    
+    # 圧縮版は各シャードの圧縮ストリーム（gzip のメンバー・zstd のフレーム）を連結したもの。
+    # 最初のメンバーしか展開しないHTTPクライアントがあるため Content-Encoding は付けず、
+    # 別のキー（.concat.gz）にダウンロード用のファイルとして置く（HTTPで読むのは無圧縮版）
+    variants = {}
+    for encoding in exporter.compressed_variants:
+        variant_key = full_key + CONCAT_VARIANT_INFIX + VARIANT_SUFFIXES[encoding]
+        size = concat_objects(s3_client, bucket, variant_key, compress_bytes(header, encoding),
+                              [key + VARIANT_SUFFIXES[encoding] for key in keys],
+                              {'ContentType': CONCAT_VARIANT_CONTENT_TYPES[encoding], 'Metadata': metadata})
+        variants[encoding] = {'key': variant_key, 'bytes': size, 'content_encoding': None,
+                              'members': len(keys) + 1}
+    size = concat_objects(s3_client, bucket, full_key, header, keys,
+                          {'ContentType': CSV_CONTENT_TYPE, 'Metadata': metadata})
+    
+    exporter.metrics.record_upload(full_key, time.perf_counter() - started,
+                                   size + sum(variant['bytes'] for variant in variants.values()))
+    url = exporter.object_url(full_key)
+    exporter.record_artifact(full_key, url, issue_count, size, CSV_CONTENT_TYPE, variants)
+    logger.info(f"連結S3アップロード完了: {url} ({size} bytes, {len(keys)}シャード)")
+    return {
+        'message': f"{issue_count}件の課題を{len(keys)}シャードで取得してS3にアップロードしました",
+        'issue_count': issue_count,
+        'full_filename': plan['filename'],
+        'full_csv_url': url
+    }
+
+
+def run_fanout_export(exporter: LambdaJiraS3Exporter, event: Dict, dispatcher) -> Dict:
+    """mode に応じてコーディネーター・ワーカー・連結のいずれかを実行"""
+    mode = event.get('mode')
+    if mode == 'coordinator':
+        return run_coordinator_export(exporter, event, dispatcher)
+    if mode == 'worker':
+        return run_worker_export(exporter, event, dispatcher)
+    if mode == 'merge':
+        return run_merge_export(exporter, event, dispatcher)
+    raise ValueError(f"未対応のモードです: {mode}")
+
+
+def wait_for_merge(exporter: LambdaJiraS3Exporter, run_id: str, dispatcher) -> Dict:
+    """プロセス内で呼び出した処理の完了を待ち、連結の結果（未完了なら進捗）を返す（ローカル検証用）"""
+    for result in dispatcher.join():
+        if isinstance(result, Exception):
+            logger.error(f"ワーカーエラー: {str(result)}")
+    return run_merge_export(exporter, {'mode': 'merge', 'run_id': run_id}, dispatcher)
+
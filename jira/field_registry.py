@@ -0,0 +1,389 @@
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+# get_custom_fields.py が出力するフィールド定義（キャッシュがない場合の初期値）
+DEFAULT_FIELDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'custom_fields.json')
+
+# フィールド定義キャッシュ（Lambda は S3_PREFIX 配下、手動実行はローカルファイル）
+FIELD_CACHE_KEY = 'state/fields.json'
+DEFAULT_FIELD_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'jira_exporter', 'fields.json')
+
+# キャッシュの有効期間（JIRA_FIELDS_TTL で上書き、秒）
+DEFAULT_FIELDS_TTL = 24 * 60 * 60
+
+# 更新に失敗した後、次に更新を試みるまでの間隔（秒）
+REFRESH_RETRY_INTERVAL = 5 * 60
+
+T = TypeVar('T')
+
+
+# ----------------------------------------------------------------------
+# 値のデコーダー（None は空文字に変換）
+# ----------------------------------------------------------------------
+
+def decode_raw(value) -> str:
+    """文字列フィールド（要約など）はそのまま（文字列以外の値は汎用デコーダーで変換）"""
+    if value is None:
+        return ''
+    return value if isinstance(value, str) else decode_any(value)
+
+
+def decode_name(value) -> str:
+    """name を持つオブジェクト（課題タイプ・優先度・ステータス・解決状況）"""
+    if value is None:
+        return ''
+    return value.get('name', '') if isinstance(value, dict) else str(value)
+
+
+def decode_display_name(value) -> str:
+    """ユーザー型フィールド（報告者・担当者・TS）"""
+    if value is None:
+        return ''
+    return value.get('displayName', '') if isinstance(value, dict) else str(value)
+
+
+def decode_datetime(value) -> str:
+    """日時フィールドを YYYY-MM-DD HH:MM:SS に変換（変換できなければそのまま）"""
+    if not value:
+        return ''
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).strftime('%Y-%m-%d %H:%M:%S')
+    except (AttributeError, ValueError):
+        return str(value)
+
+
+def decode_any(value) -> str:
+    """カスタムフィールドやその他のフィールド（値の形から判定）"""
+    if value is None:
+        return ''
+    if isinstance(value, dict):
+        # オブジェクト型のカスタムフィールド（選択肢など）
+        for attr in ('value', 'name', 'displayName'):
+            if attr in value:
+                return str(value[attr])
+        return str(value)
+    if isinstance(value, list):
+        # 配列型のカスタムフィールド（マルチセレクトなど）
+        return ', '.join(str(item.get('value', item.get('name', item))) if isinstance(item, dict) else str(item)
+                         for item in value)
+    return str(value)
+
+
+# ----------------------------------------------------------------------
+# schema 別のデコーダー（値の形を調べずに型どおり取り出す）
+# ----------------------------------------------------------------------
+
+def decode_option(value) -> str:
+    """単一選択（option）"""
+    return '' if value is None else str(value['value'])
+
+
+def decode_string(value) -> str:
+    """文字列・数値"""
+    return '' if value is None else str(value)
+
+
+def decode_option_list(value) -> str:
+    """複数選択（array of option）"""
+    return '' if value is None else ', '.join([str(item['value']) for item in value])
+
+
+def decode_name_list(value) -> str:
+    """コンポーネント・バージョンなど（array of name を持つオブジェクト）"""
+    return '' if value is None else ', '.join([str(item['name']) for item in value])
+
+
+def decode_user_list(value) -> str:
+    """複数ユーザー（array of user）"""
+    return '' if value is None else ', '.join([item['displayName'] for item in value])
+
+
+def decode_string_list(value) -> str:
+    """ラベルなど（array of string）"""
+    return '' if value is None else ', '.join([str(item) for item in value])
+
+
+SCHEMA_DECODERS = {
+    'string': decode_raw,
+    'number': decode_string,
+    'date': decode_raw,
+    'datetime': decode_datetime,
+    'user': decode_display_name,
+    'option': decode_option,
+    'issuetype': decode_name,
+    'priority': decode_name,
+    'status': decode_name,
+    'resolution': decode_name,
+    'project': decode_name,
+    'securitylevel': decode_name,
+}
+
+ARRAY_DECODERS = {
+    'option': decode_option_list,
+    'string': decode_string_list,
+    'user': decode_user_list,
+    'component': decode_name_list,
+    'version': decode_name_list,
+}
+
+
+class FieldRegistry:
+    """
+    JIRAのフィールド定義（/rest/api/2/field）の参照用レジストリ
+
+    フィールドID・フィールド名・JQL句名（例: "TOKEN[Short text]"）のいずれからでも
+    IDを引け、schema.type / schema.items からフィールドごとのデコーダーを作成する。
+    """
+
+    def __init__(self, fields: List[Dict]):
+        self.fields = {field['id']: field for field in fields}
+        self.names = {}
+        for field in fields:
+            for name in [field['id'], field.get('name')] + list(field.get('clauseNames') or []):
+                if name:
+                    self.names.setdefault(name, set()).add(field['id'])
+
+    @classmethod
+    def load(cls, path: str = None) -> 'FieldRegistry':
+        """custom_fields.json からレジストリを作成（JIRA_FIELDS_FILE で上書き可能）"""
+        path = path or os.environ.get('JIRA_FIELDS_FILE') or DEFAULT_FIELDS_FILE
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        fields = data.get('all_fields', data) if isinstance(data, dict) else data
+        logger.info(f"フィールド定義読み込み: {path} ({len(fields)}件)")
+        return cls(fields)
+
+    def resolve(self, name: str) -> str:
+        """フィールドID・名前・JQL句名からフィールドIDを取得"""
+        ids = self.names.get(name)
+        if not ids:
+            raise ValueError(f"フィールドが見つかりません: {name}（get_custom_fields.py で custom_fields.json を更新してください）")
+        if len(ids) > 1:
+            candidates = ', '.join(f"{field_id}: {self.fields[field_id]['clauseNames'][-1]}" for field_id in sorted(ids))
+            raise ValueError(f"フィールド名が重複しています: {name}（{candidates} のいずれかのJQL句名を指定してください）")
+        return next(iter(ids))
+
+    def schema(self, field_id: str) -> Dict:
+        """フィールドの schema（未定義なら空）"""
+        return (self.fields.get(field_id) or {}).get('schema') or {}
+
+    def decoder(self, field_id: str) -> Callable:
+        """schema に応じたデコーダー（未知の型は汎用デコーダー）"""
+        schema = self.schema(field_id)
+        if schema.get('type') == 'array':
+            return ARRAY_DECODERS.get(schema.get('items'), decode_any)
+        return SCHEMA_DECODERS.get(schema.get('type'), decode_any)
+
+
+def fields_ttl() -> float:
+    try:
+        return float(os.environ.get('JIRA_FIELDS_TTL', DEFAULT_FIELDS_TTL))
+    except ValueError:
+        logger.warning(f"JIRA_FIELDS_TTL が不正です。{DEFAULT_FIELDS_TTL} を使用します")
+        return DEFAULT_FIELDS_TTL
+
+
+def _parse_cache(data) -> Dict:
+    """キャッシュ（または custom_fields.json）を {fields, fetched_at} に変換（取得時刻が不明なら None）"""
+    fields = data.get('all_fields', data) if isinstance(data, dict) else data
+    fetched_at = None
+    if isinstance(data, dict) and data.get('fetched_at'):
+        fetched_at = datetime.fromisoformat(data['fetched_at']).timestamp()
+    return {'fields': fields, 'fetched_at': fetched_at}
+
+
+def _cache_body(fields: List[Dict], fetched_at: float) -> bytes:
+    return json.dumps({
+        'fetched_at': datetime.fromtimestamp(fetched_at).astimezone().isoformat(),
+        'all_fields': fields
+    }, ensure_ascii=False).encode('utf-8')
+
+
+class FileFieldStore:
+    """ローカルファイルのフィールド定義キャッシュ"""
+
+    def __init__(self, path: str = None):
+        self.path = path or os.environ.get('JIRA_FIELDS_CACHE') or DEFAULT_FIELD_CACHE_FILE
+
+    def read(self) -> Optional[Dict]:
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, encoding='utf-8') as f:
+            return _parse_cache(json.load(f))
+
+    def write(self, fields: List[Dict], fetched_at: float):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(_cache_body(fields, fetched_at))
+        os.replace(tmp, self.path)
+
+
+class S3FieldStore:
+    """S3上のフィールド定義キャッシュ（ウォームスタート・他の実行環境と共有）"""
+
+    def __init__(self, s3_client, bucket: str, key: str):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+
+    def read(self) -> Optional[Dict]:
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key)
+        except self.s3_client.exceptions.NoSuchKey:
+            return None
+        return _parse_cache(json.loads(response['Body'].read().decode('utf-8')))
+
+    def write(self, fields: List[Dict], fetched_at: float):
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Body=_cache_body(fields, fetched_at),
+            ContentType='application/json; charset=utf-8'
+        )
+
+
+class RegistrySource:
+    """
+    TTL付きキャッシュからフィールド定義のレジストリを提供する
+
+    初回はキャッシュ（なければ同梱の custom_fields.json）から読み込み、JIRA APIは呼ばない。
+    キャッシュが有効期間を過ぎていれば、古い定義を返しつつバックグラウンドで
+    /rest/api/2/field を取得してキャッシュを更新し、完了後の current() から新しい定義を返す。
+    列のフィールド名が解決できない場合（フィールドの名前変更・作り直し）は build() が
+    その場で取得し直すため、custom_fields.json を更新して再デプロイする必要はない。
+    """
+
+    def __init__(self, fetch_fields: Callable[[], List[Dict]], store=None, ttl: float = None,
+                 fallback_path: str = None):
+        self.fetch_fields = fetch_fields
+        self.store = store
+        self.ttl = ttl if ttl is not None else fields_ttl()
+        self.fallback_path = fallback_path
+        self.lock = threading.Lock()
+        self.registry: Optional[FieldRegistry] = None
+        self.fetched_at: Optional[float] = None
+        self.failed_at = 0.0
+        self.thread: Optional[threading.Thread] = None
+        # 定義が入れ替わるたびに増える（行射影の作り直しの判定用）
+        self.version = 0
+
+    def current(self, refresh: bool = True) -> FieldRegistry:
+        """
+        現在のレジストリ（有効期間切れならバックグラウンドで更新を開始）
+
+        refresh=False ではキャッシュ（または同梱の定義）を読むだけで更新を始めない。Lambda の
+        initフェーズでは実行の合間にスレッドが止まるため、更新は最初の実行まで遅らせる。
+        """
+        with self.lock:
+            if self.registry is None:
+                self._load_initial()
+            if refresh and self._stale() and not (self.thread and self.thread.is_alive()) and \
+                    time.time() - self.failed_at >= REFRESH_RETRY_INTERVAL:
+                self.thread = threading.Thread(target=self._refresh_in_background, name='field-refresh', daemon=True)
+                self.thread.start()
+            return self.registry
+
+    def _load_initial(self):
+        cached = None
+        if self.store:
+            try:
+                cached = self.store.read()
+            except Exception as e:
+                logger.warning(f"フィールド定義キャッシュ読み込みエラー: {str(e)}")
+        if cached:
+            logger.info(f"フィールド定義キャッシュ読み込み: {len(cached['fields'])}件")
+            self._set(FieldRegistry(cached['fields']), cached['fetched_at'])
+        else:
+            # 取得時刻が不明なため、すぐにバックグラウンドで更新する
+            self._set(FieldRegistry.load(self.fallback_path), None)
+
+    def _set(self, registry: FieldRegistry, fetched_at: Optional[float]):
+        self.registry = registry
+        self.fetched_at = fetched_at
+        self.version += 1
+
+    def _stale(self) -> bool:
+        return self.fetched_at is None or time.time() - self.fetched_at >= self.ttl
+
+    def _refresh_in_background(self):
+        try:
+            # 他の実行環境が更新済みのキャッシュがあれば、APIを呼ばずにそれを使う
+            cached = self.store.read() if self.store else None
+            if cached and cached['fetched_at'] and time.time() - cached['fetched_at'] < self.ttl:
+                with self.lock:
+                    if cached['fetched_at'] != self.fetched_at:
+                        self._set(FieldRegistry(cached['fields']), cached['fetched_at'])
+                return
+            self.refresh()
+        except Exception as e:
+            with self.lock:
+                self.failed_at = time.time()
+            logger.warning(f"フィールド定義の更新に失敗しました（現在の定義を使い続けます）: {str(e)}")
+
+    def refresh(self) -> FieldRegistry:
+        """/rest/api/2/field を取得してキャッシュとレジストリを更新"""
+        fields = self.fetch_fields()
+        fetched_at = time.time()
+        registry = FieldRegistry(fields)
+        if self.store:
+            try:
+                self.store.write(fields, fetched_at)
+            except Exception as e:
+                logger.warning(f"フィールド定義キャッシュ保存エラー: {str(e)}")
+        with self.lock:
+            self._set(registry, fetched_at)
+        logger.info(f"フィールド定義を更新しました: {len(fields)}件")
+        return registry
+
+    def build(self, factory: Callable[[FieldRegistry], T], refresh: bool = True) -> T:
+        """
+        factory(レジストリ) を実行し、フィールドが解決できなければ定義を取得し直して1回だけ再試行
+
+        refresh=False では取得し直さず（JIRA APIを呼ばず）、解決できなければ ValueError を送出する。
+        """
+        registry = self.current(refresh)
+        if not refresh:
+            return factory(registry)
+        try:
+            return factory(registry)
+        except ValueError as e:
+            logger.warning(f"{str(e)} - フィールド定義を取得し直します")
+        self.wait()
+        latest = self.current()
+        if latest is registry:
+            latest = self.refresh()
+        return factory(latest)
+
+    def wait(self, timeout: float = None):
+        """実行中のバックグラウンド更新の完了を待つ"""
+        thread = self.thread
+        if thread and thread.is_alive():
+            thread.join(timeout)
+
+
+_default_registry = None
+_default_source: Optional[RegistrySource] = None
+
+
+def configure_registry(source: Optional[RegistrySource]):
+    """get_registry() が返すレジストリの取得元を設定（None で同梱の定義に戻す）"""
+    global _default_source
+    _default_source = source
+
+
+def get_registry() -> FieldRegistry:
+    """プロセス内で共有するレジストリ（取得元が設定されていればそのキャッシュ、なければ同梱の定義）"""
+    global _default_registry
+    if _default_source is not None:
+        return _default_source.current()
+    if _default_registry is None:
+        _default_registry = FieldRegistry.load()
+    return _default_registry
@@ -1,8 +1,12 @@
 import os
+import time
 import requests
 import json
 from dotenv import load_dotenv
 
+from csv_columns import COLUMNS
+from field_registry import FieldRegistry, FileFieldStore
+
 # .envファイルを読み込み
 load_dotenv()
 
@@ -75,23 +79,22 @@ def get_custom_fields():
         else:
             print("⚠️  自動検出できませんでした。手動で確認してください。")
         
-        print("\n📝 コード更新用:")
+        print("\n📝 CSV列のフィールド解決結果:")
         print("=" * 50)
-        print("以下のフィールドIDを simple_manual_jira_exporter.py と")
-        print("simple_lambda_jira_exporter.py の customfield_XXXXX 部分に設定してください:")
+        print("エクスポーターはフィールド定義キャッシュから名前でフィールドIDを解決します（コードの修正は不要です）")
+        print("キャッシュは有効期間（JIRA_FIELDS_TTL）を過ぎると自動で更新され、custom_fields.json はキャッシュがない場合の初期値です")
         print()
         
-        if found_fields:
-            field_list = list(found_fields.values())
-            for i, field_id in enumerate(field_list[:5]):  # 最大5個
-                print(f"'customfield_{10001 + i}' → '{field_id}'  # {list(found_fields.keys())[i]}")
-        else:
-            print("# 手動で以下のように設定してください:")
-            print("'customfield_10001' → 'customfield_XXXXX'  # 機能分類 (Function)")
-            print("'customfield_10002' → 'customfield_XXXXX'  # 問合せ分類 (Inquiry)")
-            print("'customfield_10003' → 'customfield_XXXXX'  # TS")
-            print("'customfield_10004' → 'customfield_XXXXX'  # TS ID")
-            print("'customfield_10005' → 'customfield_XXXXX'  # TOKEN")
+        registry = FieldRegistry(fields)
+        for column in COLUMNS.values():
+            if column.field is None:
+                continue
+            try:
+                field_id = registry.resolve(column.field)
+                schema = registry.schema(field_id)
+                print(f"'{column.field}' → {field_id}  # {schema.get('type', '?')}")
+            except ValueError as e:
+                print(f"⚠️  {str(e)}")
         
         print(f"\n💾 全フィールド情報をファイルに保存: custom_fields.json")
         
@@ -103,8 +106,13 @@ def get_custom_fields():
                 'found_target_fields': found_fields
             }, f, indent=2, ensure_ascii=False)
         
+        # 手動エクスポーターのキャッシュも更新（次回の実行で取得し直さない）
+        store = FileFieldStore()
+        store.write(fields, time.time())
+        print(f"💾 フィールド定義キャッシュを更新: {store.path}")
+        
         print("\n🔧 次のステップ:")
-        print("1. 上記のフィールドIDをコードに反映")
+        print("1. 解決できなかったフィールドがあれば csv_columns.py の列定義の名前を修正")
         print("2. python simple_manual_jira_exporter.py でテスト実行")
         print("3. CSVの出力内容を確認")
         
@@ -9,6 +9,13 @@ const CONFIG = {
   // S3の固定CSVファイルURL
   CSV_URL: 'https://your-company-exports.s3.amazonaws.com/project-exports/latest.csv',
   
+  // 差分ファイルのマニフェストURL（未配信の課題だけを連番付きで公開）
+  DELTA_MANIFEST_URL: 'https://your-company-exports.s3.amazonaws.com/project-exports/deltas/manifest.json',
+  
+  // true: 差分ファイルを連番順にそのまま追記 / false: latest.csv を課題キーで重複チェックして追記
+  // 既存のシートの取り込み方法を変えないよう既定は false（切り替え初回は課題キーで照合する）
+  USE_DELTAS: false,
+  
   // Google SheetsのスプレッドシートID
   SPREADSHEET_ID: 'YOUR_SPREADSHEET_ID',
   
@@ -25,18 +32,19 @@ const CONFIG = {
 
 /**
  * エラーハンドリング付きHTTPリクエスト
+ * headers に If-None-Match を指定した場合は 304 もそのまま返す
  */
-function fetchWithRetry(url, retries = CONFIG.MAX_RETRIES) {
+function fetchWithRetry(url, retries = CONFIG.MAX_RETRIES, headers = {}) {
   for (let i = 0; i < retries; i++) {
     try {
       const response = UrlFetchApp.fetch(url, {
         muteHttpExceptions: true,
-        headers: {
+        headers: Object.assign({
           'User-Agent': 'GoogleAppsScript-JIRASync/1.0'
-        }
+        }, headers)
       });
       
-      if (response.getResponseCode() === 200) {
+      if (response.getResponseCode() === 200 || response.getResponseCode() === 304) {
         return response;
       } else {
         throw new Error(`HTTP ${response.getResponseCode()}: ${response.getContentText()}`);
@@ -65,10 +73,125 @@ function validateData(data) {
   return true;
 }
 
+/**
+ * マニフェストから未取り込みの差分ファイル一覧を取得
+ * 
+ * マニフェストには直近の差分ファイルのみ載るため、取り込みが大きく遅れると欠番になる。
+ * 欠番の差分ファイルはS3に残っていれば連番からURLを求めて取得する（csvText に本文を持つ）。
+ * 取得できないものがあれば resync: true を返し、呼び出し側は課題キーで重複チェックして追記する。
+ */
+function fetchPendingDeltas(lastSequence) {
+  const response = fetchWithRetry(CONFIG.DELTA_MANIFEST_URL);
+  const manifest = JSON.parse(response.getContentText('UTF-8'));
+  const files = manifest.files.filter(file => file.sequence > lastSequence);
+  
+  if (lastSequence > 0 && files.length > 0 && files[0].sequence !== lastSequence + 1) {
+    const missing = [];
+    for (let sequence = lastSequence + 1; sequence < files[0].sequence; sequence++) {
+      const url = files[0].url.replace(/_\d{6}\.csv$/, `_${String(sequence).padStart(6, '0')}.csv`);
+      const fileResponse = UrlFetchApp.fetch(url, { muteHttpExceptions: true });
+      if (fileResponse.getResponseCode() !== 200) {
+        console.warn(`差分ファイル ${sequence} を取得できません（HTTP ${fileResponse.getResponseCode()}）。課題キーで照合して取り込みます`);
+        return { headers: manifest.headers, files: files, resync: true };
+      }
+      missing.push({ sequence: sequence, url: url, csvText: fileResponse.getContentText('UTF-8') });
+    }
+    console.log(`マニフェストにない差分ファイル ${lastSequence + 1}〜${files[0].sequence - 1} を取得しました`);
+    return { headers: manifest.headers, files: missing.concat(files), resync: false };
+  }
+  
+  return { headers: manifest.headers, files: files, resync: false };
+}
+
+/**
+ * 差分ファイルを取得してGoogle Sheetsに追記
+ * 差分ファイルには配信済みの課題が含まれないため、重複チェックせずに追記する
+ */
+function updateSheetsFromDeltas() {
+  const startTime = new Date();
+  let status = 'SUCCESS';
+  let message = '';
+  let rowCount = 0;
+  
+  try {
+    const properties = PropertiesService.getScriptProperties();
+    const savedSequence = properties.getProperty('LAST_DELTA_SEQUENCE');
+    const deltas = fetchPendingDeltas(Number(savedSequence || 0));
+    
+    console.log(`未取り込みの差分ファイル: ${deltas.files.length}件`);
+    
+    const spreadsheet = SpreadsheetApp.openById(CONFIG.SPREADSHEET_ID);
+    const dataSheet = spreadsheet.getSheetByName(CONFIG.WORKSHEET_NAME) ||
+      spreadsheet.insertSheet(CONFIG.WORKSHEET_NAME);
+    
+    // 新しいシートの場合はヘッダーを追加
+    if (dataSheet.getLastRow() === 0) {
+      const headerRange = dataSheet.getRange(1, 1, 1, deltas.headers.length);
+      headerRange.setValues([deltas.headers]);
+      headerRange.setFontWeight('bold');
+      headerRange.setBackground('#f0f0f0');
+      dataSheet.autoResizeColumns(1, deltas.headers.length);
+    }
+    
+    // latest.csv から切り替えた初回と、欠番の差分ファイルを取得できなかった場合は既存の課題キーと照合する
+    let existingKeys = null;
+    if ((!savedSequence || deltas.resync) && dataSheet.getLastRow() > 1) {
+      const existingData = dataSheet.getRange(2, 2, dataSheet.getLastRow() - 1, 1).getValues();
+      existingKeys = new Set(existingData.map(row => row[0]));
+    }
+    
+    deltas.files.forEach(file => {
+      const csvData = Utilities.parseCsv(file.csvText || fetchWithRetry(file.url).getContentText('UTF-8'));
+      validateData(csvData);
+      
+      let newDataRows = csvData.slice(1); // ヘッダーを除く
+      if (existingKeys) {
+        newDataRows = newDataRows.filter(row => !existingKeys.has(row[1])); // B列が課題キー
+      }
+      
+      if (newDataRows.length > 0) {
+        const range = dataSheet.getRange(dataSheet.getLastRow() + 1, 1, newDataRows.length, newDataRows[0].length);
+        range.setValues(newDataRows);
+        rowCount += newDataRows.length;
+      }
+      
+      // ファイルごとに取り込み済みの連番を記録（途中で失敗しても次回は続きから取り込む）
+      properties.setProperty('LAST_DELTA_SEQUENCE', String(file.sequence));
+    });
+    
+    if (rowCount > 0) {
+      message = `データ追記完了: ${rowCount}件の新規課題データ（差分ファイル${deltas.files.length}件）`;
+    } else {
+      message = `データ確認完了: 新規課題データはありませんでした`;
+    }
+    console.log(message);
+    
+  } catch (error) {
+    status = 'ERROR';
+    message = `エラー: ${error.message}`;
+    console.error(message);
+    console.error(error.stack);
+  }
+  
+  // ログを記録
+  logExecution(startTime, new Date(), status, message, rowCount);
+  
+  return {
+    status: status,
+    message: message,
+    rowCount: rowCount,
+    executionTime: new Date() - startTime
+  };
+}
+
 /**
  * S3からCSVデータを取得してGoogle Sheetsを更新
  */
 function updateSheetsFromS3() {
+  if (CONFIG.USE_DELTAS) {
+    return updateSheetsFromDeltas();
+  }
+  
   const startTime = new Date();
   let status = 'SUCCESS';
   let message = '';
@@ -77,8 +200,22 @@ function updateSheetsFromS3() {
   try {
     console.log('S3からCSVデータ取得開始...');
     
-    // S3からCSVデータを取得
-    const response = fetchWithRetry(CONFIG.CSV_URL);
+    // S3からCSVデータを取得（前回と同じ ETag なら 304 が返り、取り込みを省略する）
+    const properties = PropertiesService.getScriptProperties();
+    const savedEtag = properties.getProperty('LATEST_CSV_ETAG');
+    const response = fetchWithRetry(CONFIG.CSV_URL, CONFIG.MAX_RETRIES,
+      savedEtag ? { 'If-None-Match': savedEtag } : {});
+    if (response.getResponseCode() === 304) {
+      message = 'データ確認完了: latest.csv は前回から変更がありません';
+      console.log(message);
+      logExecution(startTime, new Date(), status, message, rowCount);
+      return {
+        status: status,
+        message: message,
+        rowCount: rowCount,
+        executionTime: new Date() - startTime
+      };
+    }
     const csvText = response.getContentText('UTF-8');
     
     if (!csvText.trim()) {
@@ -126,10 +263,10 @@ function updateSheetsFromS3() {
       if (existingRows > 1) {
         // 既存データの課題キーを取得（B列：課題キー）
         const existingData = dataSheet.getRange(2, 2, existingRows - 1, 1).getValues();
-        const existingKeys = existingData.map(row => row[0]);
+        const existingKeys = new Set(existingData.map(row => row[0]));
         
         // 新しいデータから重複を除外
-        newDataRows = dataRows.filter(row => !existingKeys.includes(row[1])); // B列が課題キー
+        newDataRows = dataRows.filter(row => !existingKeys.has(row[1])); // B列が課題キー
       }
       
       if (newDataRows.length > 0) {
@@ -150,6 +287,13 @@ function updateSheetsFromS3() {
     }
     console.log(message);
     
+    // 取り込みが完了した内容の ETag を保存（次回の If-None-Match）
+    const responseHeaders = response.getHeaders();
+    const etag = responseHeaders['ETag'] || responseHeaders['Etag'];
+    if (etag) {
+      properties.setProperty('LATEST_CSV_ETAG', etag);
+    }
+    
   } catch (error) {
     status = 'ERROR';
     message = `エラー: ${error.message}`;
@@ -224,6 +368,7 @@ function logExecution(startTime, endTime, status, message, rowCount) {
 function checkConfiguration() {
   console.log('=== 設定確認 ===');
   console.log(`CSV URL: ${CONFIG.CSV_URL}`);
+  console.log(`差分マニフェストURL: ${CONFIG.DELTA_MANIFEST_URL} (${CONFIG.USE_DELTAS ? '使用' : '未使用'})`);
   console.log(`スプレッドシートID: ${CONFIG.SPREADSHEET_ID}`);
   console.log(`データシート名: ${CONFIG.WORKSHEET_NAME}`);
   console.log(`ログシート名: ${CONFIG.LOG_WORKSHEET_NAME}`);
@@ -333,6 +478,10 @@ function clearDataSheet() {
     
     if (dataSheet) {
       dataSheet.clear();
+      // 差分ファイルはマニフェストにある最初のファイルから取り込み直す
+      PropertiesService.getScriptProperties().deleteProperty('LAST_DELTA_SEQUENCE');
+      // latest.csv も変更の有無にかかわらず次回取り込み直す
+      PropertiesService.getScriptProperties().deleteProperty('LATEST_CSV_ETAG');
       console.log('データシートをクリアしました');
     } else {
       console.log('データシートが見つかりません');
@@ -1,23 +1,28 @@
+// Lambda（snapshot / join モード）が出力するSFDC結合結果のCSV（非公開）
+// 取引先名・月額を含むため公開せず、joined/* だけを読める IAM ユーザーのキーで署名して取得する。
+// スクリプトプロパティに AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY を設定しておくこと。
+const S3_BUCKET = "your-company-exports";
+const S3_REGION = "us-east-1";
+const JOINED_CSV_KEY = "project-exports/joined/SUPPORT_sfdc_joined.csv";
+
+// 空の本文の SHA-256（GET の x-amz-content-sha256）
+const EMPTY_PAYLOAD_SHA256 = "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855";
+
 function joinSupDataWithSfdcKeepComments() {
   // スプレッドシートのIDを指定
   const spreadsheetId = "YOUR_IMPACT_CHECK_SPREADSHEET_ID";
   const ss = SpreadsheetApp.openById(spreadsheetId);
   
-  // 2つのシートを取得
-  const supSheet = ss.getSheetByName("サポート課題データ");
-  const sfdcSheet = ss.getSheetByName("sfdc");
-  
-  if (!supSheet || !sfdcSheet) {
-    Logger.log("シートが見つかりません。シート名を確認してください。");
+  // 結合はLambda側で実施済み（トークンキーのハッシュ索引で結合したCSVを取得する）
+  const response = fetchS3Object(JOINED_CSV_KEY);
+  if (response.getResponseCode() !== 200) {
+    Logger.log(`結合結果を取得できません: HTTP ${response.getResponseCode()}`);
     return;
   }
-  
-  // フィルターをクリア
-  if (supSheet.getFilter()) {
-    supSheet.getFilter().remove();
-  }
-  if (sfdcSheet.getFilter()) {
-    sfdcSheet.getFilter().remove();
+  const joinedCsv = Utilities.parseCsv(response.getContentText("UTF-8"));
+  if (joinedCsv.length === 0) {
+    Logger.log("結合結果が空です");
+    return;
   }
   
   // 結果シート名
@@ -25,7 +30,7 @@ function joinSupDataWithSfdcKeepComments() {
   let resultSheet = ss.getSheetByName(resultSheetName);
   
   // 既存のコメントを保存
-  let existingComments = {};
+  const existingComments = new Map();
   if (resultSheet) {
     const existingData = resultSheet.getDataRange().getValues();
     const existingHeaders = existingData[0];
@@ -39,7 +44,7 @@ function joinSupDataWithSfdcKeepComments() {
         const key = existingData[i][keyIndex];
         const comment = existingData[i][commentIndex];
         if (key && comment) {
-          existingComments[key] = comment;
+          existingComments.set(key, comment);
         }
       }
     }
@@ -48,92 +53,20 @@ function joinSupDataWithSfdcKeepComments() {
     ss.deleteSheet(resultSheet);
   }
   
-  // データを取得
-  const supData = supSheet.getDataRange().getValues();
-  const sfdcData = sfdcSheet.getDataRange().getValues();
-  
-  // ヘッダー行を取得
-  const supHeaders = supData[0];
-  const sfdcHeaders = sfdcData[0];
-  
-  // SUP課題データから抽出したい列を定義
-  const extractColumns = [
-    "課題タイプ",
-    "課題キー", 
-    "要約",
-    "報告者",
-    "TS",
-    "担当者",
-    "TOKEN"
-  ];
-  
-  // 抽出したい列のインデックスを取得
-  const extractIndexes = extractColumns.map(col => {
-    const index = supHeaders.indexOf(col);
-    if (index === -1) {
-      Logger.log(`警告: 列「${col}」が見つかりません`);
-    }
-    return index;
-  }).filter(index => index !== -1);
-  
-  // TOKENの列のインデックスを取得
-  const tokenIndex = supHeaders.indexOf("TOKEN");
-  const tokenKeyIndex = sfdcHeaders.indexOf("トークンキー");
-  const kadaiKeyIndex = supHeaders.indexOf("課題キー");
-  
-  if (tokenIndex === -1 || tokenKeyIndex === -1 || kadaiKeyIndex === -1) {
+  // 課題キーの列インデックス（ループの外で一度だけ求める）
+  const kadaiKeyIndex = joinedCsv[0].indexOf("課題キー");
+  if (kadaiKeyIndex === -1) {
     Logger.log("必要なカラムが見つかりません");
     return;
   }
   
-  // sfdcのデータをトークンキーでマッピング
-  const tokenMap = {};
-  for (let i = 1; i < sfdcData.length; i++) {
-    const tokenKey = sfdcData[i][tokenKeyIndex];
-    if (tokenKey) {
-      tokenMap[tokenKey] = sfdcData[i];
-    }
-  }
+  // ヘッダー行（結合結果の列 + コメント）
+  const joinedData = [[...joinedCsv[0], "コメント"]];
   
-  // JOINした結果を格納する配列
-  const joinedData = [];
-  
-  // ヘッダー行を作成（抽出したい列のみ + sfdc情報 + コメント）
-  const combinedHeaders = [
-    ...extractColumns,
-    "契約管理: エンドユーザ: 取引先名",
-    "合計月額",
-    "コメント"
-  ];
-  joinedData.push(combinedHeaders);
-  
-  // データをJOIN
-  for (let i = 1; i < supData.length; i++) {
-    const supRow = supData[i];
-    const token = supRow[tokenIndex];
-    const kadaiKey = supRow[kadaiKeyIndex];
-    
-    // 抽出したい列のデータのみを取得
-    const extractedRow = extractIndexes.map(index => supRow[index]);
-    
-    // sfdcデータを追加
-    if (token && tokenMap[token]) {
-      // マッチするデータがある場合
-      const sfdcRow = tokenMap[token];
-      const torihikisaki = sfdcRow[sfdcHeaders.indexOf("契約管理: エンドユーザ: 取引先名")] || "";
-      const gokei = sfdcRow[sfdcHeaders.indexOf("合計月額")] || "";
-      
-      extractedRow.push(torihikisaki, gokei);
-    } else {
-      // マッチするデータがない場合は空文字を追加
-      extractedRow.push("", "");
-    }
-    
-    // 既存のコメントを復元
-    const existingComment = existingComments[kadaiKey] || "";
-    extractedRow.push(existingComment);
-    
-    joinedData.push(extractedRow);
+  // 既存のコメントを課題キーで復元
+  for (let i = 1; i < joinedCsv.length; i++) {
+    const row = joinedCsv[i];
+    joinedData.push([...row, existingComments.get(row[kadaiKeyIndex]) || ""]);
   }
   
   // 新しいシートを作成
@@ -159,7 +92,71 @@ function joinSupDataWithSfdcKeepComments() {
   
   Logger.log(`JOIN処理が完了しました。既存のコメントも復元されています。`);
   Logger.log(`処理件数: ${joinedData.length - 1}件`);
-  Logger.log(`復元されたコメント数: ${Object.keys(existingComments).length}件`);
+  Logger.log(`復元されたコメント数: ${existingComments.size}件`);
+}
+
+// S3のオブジェクトを SigV4 で署名したGETで取得（muteHttpExceptions、ステータスは呼び出し側で確認）
+function fetchS3Object(key) {
+  const props = PropertiesService.getScriptProperties();
+  const accessKeyId = props.getProperty("AWS_ACCESS_KEY_ID");
+  const secretAccessKey = props.getProperty("AWS_SECRET_ACCESS_KEY");
+  if (!accessKeyId || !secretAccessKey) {
+    throw new Error("スクリプトプロパティ AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY が設定されていません");
+  }
+  
+  const host = `${S3_BUCKET}.s3.${S3_REGION}.amazonaws.com`;
+  const path = "/" + key.split("/").map(awsUriEncode).join("/");
+  const amzDate = Utilities.formatDate(new Date(), "UTC", "yyyyMMdd'T'HHmmss'Z'");
+  const dateStamp = amzDate.substring(0, 8);
+  const scope = `${dateStamp}/${S3_REGION}/s3/aws4_request`;
+  const signedHeaders = "host;x-amz-content-sha256;x-amz-date";
+  
+  const canonicalRequest = [
+    "GET",
+    path,
+    "",
+    `host:${host}`,
+    `x-amz-content-sha256:${EMPTY_PAYLOAD_SHA256}`,
+    `x-amz-date:${amzDate}`,
+    "",
+    signedHeaders,
+    EMPTY_PAYLOAD_SHA256
+  ].join("\n");
+  const stringToSign = ["AWS4-HMAC-SHA256", amzDate, scope, toHex(sha256(canonicalRequest))].join("\n");
+  
+  // 署名キー: 日付 → リージョン → サービス → aws4_request の順にHMACを重ねる
+  let signingKey = toBytes("AWS4" + secretAccessKey);
+  [dateStamp, S3_REGION, "s3", "aws4_request"].forEach(part => {
+    signingKey = Utilities.computeHmacSha256Signature(toBytes(part), signingKey);
+  });
+  const signature = toHex(Utilities.computeHmacSha256Signature(toBytes(stringToSign), signingKey));
+  
+  return UrlFetchApp.fetch(`https://${host}${path}`, {
+    muteHttpExceptions: true,
+    headers: {
+      "x-amz-date": amzDate,
+      "x-amz-content-sha256": EMPTY_PAYLOAD_SHA256,
+      "Authorization": `AWS4-HMAC-SHA256 Credential=${accessKeyId}/${scope}, ` +
+        `SignedHeaders=${signedHeaders}, Signature=${signature}`
+    }
+  });
+}
+
+// SigV4 のURIエンコード（英数字と -._~ 以外をエンコード）
+function awsUriEncode(value) {
+  return encodeURIComponent(value).replace(/[!'()*]/g, c => "%" + c.charCodeAt(0).toString(16).toUpperCase());
+}
+
+function toBytes(value) {
+  return Utilities.newBlob(value).getBytes();
+}
+
+function sha256(value) {
+  return Utilities.computeDigest(Utilities.DigestAlgorithm.SHA_256, value, Utilities.Charset.UTF_8);
+}
+
+function toHex(bytes) {
+  return bytes.map(b => ((b + 256) % 256).toString(16).padStart(2, "0")).join("");
 }
 
 // 毎朝7:30の自動実行トリガーを設定する関数
@@ -0,0 +1,125 @@
+"""
+ハンドラーのプロファイル（イベントの "profile" で有効化）
+
+- "cprofile"（または true）: cProfile で関数ごとの時間を計測し、累積時間順のテキストレポートと
+  pstats 形式（snakeviz などで開ける .prof）を作る。計測するのはハンドラーのスレッドのみで、
+  並列取得・パートのアップロードのワーカースレッドは含まれない
+- "sample": 一定間隔で全スレッドのスタックを採取し、折りたたみ形式（flamegraph.pl / speedscope で
+  開ける .folded）と、関数ごとのサンプル数のテキストレポートを作る
+"""
+import io
+import os
+import sys
+import time
+import pstats
+import marshal
+import cProfile
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ('cprofile', 'sample')
+
+# サンプリング間隔（秒）とレポートに載せる関数の数
+SAMPLE_INTERVAL = 0.005
+REPORT_LIMIT = 40
+
+
+def profile_mode(value) -> Optional[str]:
+    """イベントの "profile" の値をプロファイル方式に変換（無効なら None）"""
+    if value is True:
+        return 'cprofile'
+    if not value:
+        return None
+    mode = str(value).strip().lower()
+    if mode in PROFILE_MODES:
+        return mode
+    logger.warning(f"未対応のプロファイル方式を無視します: {value}")
+    return None
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class HandlerProfiler:
+    """start() から stop() までを計測し、reports() で S3 に保存するレポートを返す"""
+
+    def __init__(self, mode: str, interval: float = SAMPLE_INTERVAL):
+        self.mode = mode
+        self.interval = interval
+        self.profiler = None
+        self.stacks = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = None
+        self.started = self.elapsed = 0.0
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.mode == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.thread = threading.Thread(target=self._sample_loop, name='profiler', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        if self.profiler:
+            self.profiler.disable()
+        if self.thread:
+            self.stopped.set()
+            self.thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def reports(self) -> Dict[str, Tuple[bytes, str]]:
+        """拡張子 → (本文, Content-Type)。テキストレポートは '.txt'"""
+        if self.mode == 'cprofile':
+            output = io.StringIO()
+            stats = pstats.Stats(self.profiler, stream=output)
+            output.write(f"cProfile: {self.elapsed:.2f}秒（ハンドラーのスレッドのみ）\n")
+            stats.sort_stats('cumulative').print_stats(REPORT_LIMIT)
+            stats.sort_stats('tottime').print_stats(REPORT_LIMIT)
+            return {
+                '.txt': (output.getvalue().encode('utf-8'), 'text/plain; charset=utf-8'),
+                '.prof': (marshal.dumps(stats.stats), 'application/octet-stream')
+            }
+
+        # 関数ごとのサンプル数（自身: スタックの末尾、累積: スタックに含まれる）
+        own_counts = Counter()
+        total_counts = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            own_counts[frames[-1]] += count
+            for label in set(frames):
+                total_counts[label] += count
+        total = sum(self.stacks.values()) or 1
+
+        lines = [f"サンプリング: {self.elapsed:.2f}秒, {self.samples}回（{self.interval * 1000:g}ms 間隔・全スレッド）", '']
+        for title, counts in (('自身のサンプル数', own_counts), ('累積のサンプル数', total_counts)):
+            lines.append(f"{title}（上位{REPORT_LIMIT}件）")
+            for label, count in counts.most_common(REPORT_LIMIT):
+                lines.append(f"{count:8d} {count / total:6.1%}  {label}")
+            lines.append('')
+        folded = ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+        return {
+            '.txt': ('\n'.join(lines).encode('utf-8'), 'text/plain; charset=utf-8'),
+            '.folded': (folded.encode('utf-8'), 'text/plain; charset=utf-8')
+        }
@@ -0,0 +1,159 @@
+"""
+増分同期（mode=incremental）: 前回のウォーターマーク以降に更新された課題だけを公開
+
+ウォーターマーク（state/watermark.json）は増分CSVの公開に成功した場合のみ進める。
+更新日時の範囲内は課題IDのキーセットでページングする。
+"""
+import csv
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional
+
+from csv_columns import STANDARD_LAYOUT
+from jira_exporter import LambdaJiraS3Exporter, parse_jira_datetime, to_jira_time
+
+logger = logging.getLogger(__name__)
+
+# 増分同期のウォーターマーク（S3_PREFIX 配下）
+WATERMARK_KEY = 'state/watermark.json'
+
+
+def load_watermark(exporter: LambdaJiraS3Exporter) -> Dict:
+    """S3から増分同期のウォーターマークを読み込む（未作成なら None）"""
+    if not exporter.s3_client or not exporter.s3_bucket:
+        return None
+    
+    try:
+        response = exporter.s3_client.get_object(Bucket=exporter.s3_bucket,
+                                                 Key=f"{exporter.s3_prefix}{WATERMARK_KEY}")
+        return json.loads(response['Body'].read().decode('utf-8'))
+    except exporter.s3_client.exceptions.NoSuchKey:
+        return None
+
+
+def save_watermark(exporter: LambdaJiraS3Exporter, updated: str, issue_count: int, csv_url: str):
+    """
+    増分同期のウォーターマークをS3に保存
+    
+    公開（アップロード）成功後にのみ呼び出す。PutObject は単一オブジェクトの
+    置き換えなので、読み手は常に旧値か新値のどちらかを見る。
+    """
+    watermark = {
+        'updated': updated,
+        'issue_count': issue_count,
+        'csv_url': csv_url,
+        'saved_at': datetime.now().isoformat()
+    }
+    exporter.s3_client.put_object(
+        Bucket=exporter.s3_bucket,
+        Key=f"{exporter.s3_prefix}{WATERMARK_KEY}",
+        Body=json.dumps(watermark, ensure_ascii=False).encode('utf-8'),
+        ContentType='application/json'
+    )
+    logger.info(f"ウォーターマーク更新: {updated}")
+
+
+def advance_watermark(current: Optional[str], updated_values: Iterable[str], started: datetime) -> Optional[str]:
+    """
+    取得した課題の更新日時の最大値までウォーターマークを進める（後退はさせない）
+    
+    課題はID順のキーセットで取得するため、実行中に更新された課題が取得済みの位置にあると
+    今回は取得されない。次回の対象に残るよう、実行開始時刻 started（aware）より先には進めない。
+    """
+    latest = current
+    for updated in updated_values:
+        if updated and (not latest or parse_jira_datetime(updated) > parse_jira_datetime(latest)):
+            latest = updated
+    if latest and parse_jira_datetime(latest) > started:
+        latest = started.strftime('%Y-%m-%dT%H:%M:%S.000%z')
+        if current and parse_jira_datetime(current) > parse_jira_datetime(latest):
+            latest = current
+    return latest
+
+
+def build_incremental_jql(watermark: Dict) -> str:
+    """ウォーターマーク以降に更新された課題を取得するJQLを作成"""
+    if not watermark:
+        # 初回は前日0時以降の更新を対象とする
+        return 'project = "SUPPORT" AND updated >= startOfDay(-1) ORDER BY id ASC'
+    
+    # JQLの日時は分単位のため、同じ分の更新を取りこぼさないよう >= で重複取得する
+    since = to_jira_time(parse_jira_datetime(watermark['updated']))
+    
+    return f'project = "SUPPORT" AND updated >= "{since.strftime("%Y/%m/%d %H:%M")}" ORDER BY id ASC'
+
+
+def run_incremental_export(exporter: LambdaJiraS3Exporter) -> Dict:
+    """
+    増分同期: 前回のウォーターマーク以降に更新された課題だけを取得して公開
+    
+    更新日時の範囲内を課題IDのキーセットでページングし（件数上限なし）、増分CSVへ
+    ストリーミング出力する。オフセットのページングと違い、実行中の更新で順序がずれても
+    抜けが出ない（取得済みの位置で更新された課題は次回の対象になる）。
+    """
+    now = datetime.now()
+    started = datetime.now(timezone.utc)
+    watermark = load_watermark(exporter)
+    jql = build_incremental_jql(watermark)
+    since = watermark['updated'] if watermark else 'startOfDay(-1)'
+    filename = f"SUPPORT_updated_{now.strftime('%Y%m%d_%H%M%S')}.csv"
+    
+    logger.info(f"増分同期開始 - JQLクエリ: {jql}")
+    
+    writer = None
+    issue_count = 0
+    new_updated = watermark['updated'] if watermark else None
+    try:
+        for issues in exporter.iter_issue_pages_by_id(jql):
+            if writer is None:
+                # 更新がなければファイルは作らない
+                writer = exporter.open_s3_writer(f"{exporter.s3_prefix}incremental/{filename}", {
+                    'updated_since': since,
+                    'export_date': now.isoformat(),
+                    'data_type': 'incremental_updated'
+                }, variants=True, skip_unchanged=False)
+                if writer is None:
+                    raise Exception("S3設定が不完全なため増分ファイルを出力できません")
+                incremental_csv = csv.writer(writer)
+                incremental_csv.writerow(STANDARD_LAYOUT.headers)
+            with exporter.metrics.stage('encode'):
+                for issue in issues:
+                    incremental_csv.writerow(exporter.issue_to_row(issue))
+            new_updated = advance_watermark(new_updated, (issue.updated for issue in issues), started)
+            issue_count += len(issues)
+    except Exception:
+        if writer is not None:
+            writer.abort()
+        raise
+    
+    logger.info(f"更新課題: {issue_count}件")
+    
+    if not issue_count:
+        return {
+            'message': '前回同期以降に更新された課題はありませんでした',
+            'mode': 'incremental',
+            'issue_count': 0,
+            'updated_since': since,
+            'jql': jql,
+            'timestamp': now.isoformat()
+        }
+    
+    incremental_url = exporter.close_s3_writer(writer, '増分', issue_count)
+    if not incremental_url:
+        raise Exception("増分ファイルのアップロードに失敗したためウォーターマークを更新しません")
+    
+    # 公開成功後にのみウォーターマークを進める
+    save_watermark(exporter, new_updated, issue_count, incremental_url)
+    
+    return {
+        'message': f'{issue_count}件の更新課題をS3にアップロードしました',
+        'mode': 'incremental',
+        'issue_count': issue_count,
+        'updated_since': since,
+        'watermark': new_updated,
+        'incremental_filename': filename,
+        'incremental_csv_url': incremental_url,
+        'jql': jql,
+        'timestamp': now.isoformat()
+    }
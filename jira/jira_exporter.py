@@ -0,0 +1,725 @@
+"""
+JIRA→S3 エクスポーター本体（Lambda の各モードで共有）
+
+検索APIのページ取得・行射影・CSVのストリーミング出力・成果物マニフェストなど、
+モードに依存しない処理をまとめる。モードごとの処理は *_export.py、
+イベントの振り分けは lambda_jira_exporter.py が行う。
+"""
+import os
+import csv
+import json
+import time
+import base64
+import logging
+from datetime import datetime
+from io import StringIO
+from typing import Dict, Iterator, List
+
+from changelog import BULK_CHANGELOG_PATH
+from csv_columns import DAILY_LAYOUT, STANDARD_LAYOUT, IssueRecord, RowProjector, format_value
+from delivery_index import DELIVERY_INDEX_KEY, DELTA_MANIFEST_KEY, DeliveredKeyIndex, delta_key
+from export_metrics import ChunkTimer, ExportMetrics
+from field_registry import FIELD_CACHE_KEY, RegistrySource, S3FieldStore, configure_registry
+from handler_profiler import HandlerProfiler
+from jira_governor import JiraRequestError, RequestGovernor
+from jira_http import JiraHttpClient
+from jira_search import iter_keyset_pages, iter_pages, split_order_by
+from json_stream import decode_search_page, prune_issue
+from s3_stream import (
+    ARTIFACT_MANIFEST_KEY, CONTENT_SHA256_METADATA, VARIANT_SUFFIXES, ArtifactManifest, CompressedVariantWriter,
+    S3MultipartWriter, compress_bytes, content_etag, content_sha256, matches_stored, parse_variant_encodings,
+    stored_object
+)
+
+logger = logging.getLogger(__name__)
+
+# 公開CSVの Content-Type（Content-Encoding は圧縮版にのみ付ける）
+CSV_CONTENT_TYPE = 'text/csv; charset=utf-8'
+
+
+def create_s3_client():
+    """S3クライアントを作成（LOCAL_S3_DIR が設定されていればファイルシステム上のスタンドイン）"""
+    local_dir = os.environ.get('LOCAL_S3_DIR')
+    if local_dir:
+        from local_s3 import LocalS3Client
+        logger.info(f"ローカルS3を使用: {local_dir}")
+        return LocalS3Client(local_dir)
+    # boto3 は読み込みに時間がかかるため必要になった時点で読み込む
+    import boto3
+    return boto3.client('s3')
+
+
+class LambdaJiraS3Exporter:
+    def __init__(self, refresh_fields: bool = True):
+        """
+        環境変数から設定を読み込む Lambda用 JIRA→S3 エクスポーター
+        
+        refresh_fields=False（initフェーズ）ではフィールド定義をキャッシュから読むだけで、
+        JIRAからの更新は最初の実行（sync_fields）で始める。
+        """
+        self.jira_url = os.environ.get('JIRA_URL', '').rstrip('/')
+        self.username = os.environ.get('JIRA_USERNAME', '')
+        self.api_token = os.environ.get('JIRA_API_TOKEN', '')
+        
+        # S3設定
+        self.s3_bucket = os.environ.get('S3_BUCKET', '')
+        self.s3_prefix = os.environ.get('S3_PREFIX', 'project-exports/')
+        
+        # 設定チェック
+        if not all([self.jira_url, self.username, self.api_token]):
+            raise ValueError("JIRA_URL, JIRA_USERNAME, JIRA_API_TOKEN を環境変数に設定してください")
+        
+        # AWS S3クライアント（LOCAL_S3_DIR 指定時はローカルのファイルシステムを使用）
+        self.s3_client = create_s3_client() if self.s3_bucket else None
+        
+        # 日次エクスポートをParquetでも出力するか
+        self.parquet_export = os.environ.get('PARQUET_EXPORT', '').lower() == 'true'
+        
+        # Google Sheets 向けに未配信の課題だけの差分ファイルを出力するか
+        self.delta_export = os.environ.get('DELTA_EXPORT', 'true').lower() == 'true'
+        
+        # 公開CSVと一緒に出力する圧縮版（例: "gzip,zstd"、空で無効）
+        self.compressed_variants = parse_variant_encodings(os.environ.get('COMPRESSED_VARIANTS', 'gzip'))
+        
+        # 公開CSVが既存と同じ内容（SHA-256、なければETagが一致）なら書き込まない
+        self.skip_unchanged = os.environ.get('SKIP_UNCHANGED_UPLOADS', 'true').lower() == 'true'
+        
+        # この実行で公開した成果物（manifest.json に行数・サイズを記録）
+        self.artifacts = ArtifactManifest()
+        
+        # この実行の段階別の所要時間とカウンター（lambda_handler が EMF として出力）
+        self.metrics = ExportMetrics()
+        
+        # Basic認証のヘッダー作成
+        credentials = f"{self.username}:{self.api_token}"
+        encoded_credentials = base64.b64encode(credentials.encode('utf-8')).decode('utf-8')
+        self.auth_header = f"Basic {encoded_credentials}"
+        
+        # JIRA API用のHTTPクライアント（keep-alive 接続プール・gzip・タイムアウト）
+        self.http = JiraHttpClient(self.jira_url, {
+            'Authorization': self.auth_header,
+            'Accept': 'application/json'
+        }, metrics=self.metrics)
+        
+        # JIRA APIの流量制御（リトライ・レート制限・同時実行数調整）
+        self.governor = RequestGovernor(metrics=self.metrics)
+        
+        # フィールド定義（S3のキャッシュから読み込み、有効期間切れならバックグラウンドで更新）
+        field_store = None
+        if self.s3_client and self.s3_bucket:
+            field_store = S3FieldStore(self.s3_client, self.s3_bucket, f"{self.s3_prefix}{FIELD_CACHE_KEY}")
+        self.fields = RegistrySource(self.fetch_fields, field_store)
+        configure_registry(self.fields)
+        
+        # 標準CSV・日次CSVで共有する行射影
+        self.projector = self.build_projector([STANDARD_LAYOUT, DAILY_LAYOUT], refresh=refresh_fields)
+        self.fields_version = self.fields.version
+    
+    def fetch_fields(self) -> List[Dict]:
+        """フィールド定義の一覧（/rest/api/2/field）を取得"""
+        def fetch() -> List[Dict]:
+            response = self.http.get('/rest/api/2/field')
+            if response.status != 200:
+                raise JiraRequestError(f"フィールド取得エラー: {response.status}", response.status,
+                                       response.headers.get('retry-after'))
+            return json.loads(response.body.decode('utf-8'))
+        
+        return self.governor.call(fetch)
+    
+    def build_projector(self, layouts, refresh: bool = True) -> RowProjector:
+        """現在のフィールド定義で行射影を作成（列のフィールドが見つからなければ定義を取得し直す）"""
+        return self.fields.build(lambda registry: RowProjector(layouts, registry), refresh)
+    
+    def sync_fields(self):
+        """バックグラウンドで更新されたフィールド定義を行射影に反映（ウォームスタート時）"""
+        self.fields.current()
+        if self.fields.version == self.fields_version:
+            return
+        try:
+            self.projector = self.build_projector([STANDARD_LAYOUT, DAILY_LAYOUT])
+            self.fields_version = self.fields.version
+            logger.info("更新されたフィールド定義を反映しました")
+        except Exception as e:
+            logger.error(f"フィールド定義の反映エラー（前回の定義を使用します）: {str(e)}")
+    
+    def test_connection(self) -> bool:
+        """JIRA接続テスト"""
+        try:
+            response = self.http.get('/rest/api/2/myself')
+            if response.status == 200:
+                user_info = json.loads(response.body.decode('utf-8'))
+                logger.info(f"JIRA接続成功: {user_info.get('displayName', 'Unknown')}")
+                return True
+            else:
+                logger.error(f"JIRA接続失敗: {response.status}")
+                return False
+        except Exception as e:
+            logger.error(f"JIRA接続エラー: {str(e)}")
+            return False
+    
+    def search_issues(self, jql: str, max_results: int = 1000) -> List[IssueRecord]:
+        """JQLクエリで課題を検索（サポートプロジェクト用カスタムフィールド対応）"""
+        all_issues = []
+        for issues in self.iter_issue_pages(jql, max_results):
+            all_issues.extend(issues)
+        return all_issues
+    
+    def search_page(self, jql: str, fields: List[str], start_at: int = 0, max_results: int = 100,
+                    projector: RowProjector = None) -> Dict:
+        """
+        検索APIを1回呼び出して結果のJSONを返す（HTTPエラーは JiraRequestError）
+        
+        projector を指定すると課題は IssueRecord、省略時は prune_issue で縮めた dict として返す。
+        """
+        params = {
+            'jql': jql,
+            'fields': ','.join(fields),
+            'maxResults': max_results,
+            'startAt': start_at
+        }
+        
+        # 課題は受信しながら1件ずつデコードし、CSVに必要な値だけに縮める
+        transform = projector.record if projector else prune_issue
+        
+        def decode(chunks) -> Dict:
+            # 受信待ちを除いたデコードの時間
+            timer = ChunkTimer(chunks)
+            started = time.perf_counter()
+            page = decode_search_page(timer, transform)
+            self.metrics.add_time('decode', time.perf_counter() - started - timer.waited)
+            return page
+        
+        with self.metrics.stage('page_fetch'):
+            response = self.http.get('/rest/api/2/search', params, body_handler=decode)
+        if response.status == 200:
+            self.metrics.count('pages')
+            self.metrics.count('issues', len(response.body.get('issues') or []))
+            return response.body
+        
+        # 接続テストは行わず、最初の検索で認証エラーを検出する
+        if response.status in (401, 403):
+            raise JiraRequestError(f"JIRA接続に失敗しました（認証エラー: {response.status}）", response.status)
+        raise JiraRequestError(f"検索エラー: {response.status}", response.status, response.headers.get('retry-after'))
+    
+    def iter_issue_pages(self, jql: str, max_results: int = None,
+                         projector: RowProjector = None) -> Iterator[List[IssueRecord]]:
+        """JQLクエリの検索結果を IssueRecord のページ単位で返す（max_results=None で件数上限なし）"""
+        # サポートプロジェクト専用 - CSVの列に必要なフィールドのみ取得
+        # 更新日は増分同期のウォーターマーク用
+        projector = projector or self.projector
+        fields = projector.fields + ['updated']
+        
+        def fetch_page(start_at: int, page_size: int) -> Dict:
+            return self.search_page(jql, fields, start_at, page_size, projector)
+        
+        # 1ページ目で総件数を確認し、残りページを並列取得（リトライ・流量制御付き）
+        return iter_pages(fetch_page, max_results, governor=self.governor)
+    
+    def iter_issue_pages_by_id(self, jql: str, after_id: int = None,
+                               projector: RowProjector = None) -> Iterator[List[IssueRecord]]:
+        """JQLの検索結果を課題IDのキーセットで IssueRecord のページ単位で返す（全件取得用・件数上限なし）"""
+        projector = projector or self.projector
+        fields = projector.fields + ['updated']
+        
+        def fetch_page(page_jql: str, page_size: int) -> Dict:
+            return self.search_page(page_jql, fields, 0, page_size, projector)
+        
+        return iter_keyset_pages(fetch_page, jql, after_id, governor=self.governor)
+    
+    def fetch_changelog_page(self, payload: Dict) -> Dict:
+        """変更履歴の一括取得APIを1回呼び出して結果のJSONを返す（HTTPエラーは JiraRequestError）"""
+        with self.metrics.stage('changelog_fetch'):
+            response = self.http.post(BULK_CHANGELOG_PATH, payload)
+        if response.status == 200:
+            self.metrics.count('changelog_pages')
+            return json.loads(response.body.decode('utf-8'))
+        if response.status in (401, 403):
+            raise JiraRequestError(f"JIRA接続に失敗しました（認証エラー: {response.status}）", response.status)
+        raise JiraRequestError(f"変更履歴取得エラー: {response.status}", response.status,
+                               response.headers.get('retry-after'))
+    
+    def count_issues(self, jql: str) -> int:
+        """JQLに一致する課題数（課題本体は取得しない）"""
+        return self.governor.call(self.search_page, jql, ['key'], 0, 0)['total']
+    
+    def first_created(self, jql: str) -> datetime:
+        """JQLに一致する課題のうち最も古い作成日時（該当なしは None）"""
+        where, _ = split_order_by(jql)
+        result = self.governor.call(self.search_page, f"{where} ORDER BY created ASC", ['created'], 0, 1)
+        issues = result.get('issues') or []
+        return parse_jira_datetime(issues[0]['fields']['created']) if issues else None
+    
+    def format_field_value(self, field_value, field_type: str = 'string') -> str:
+        """フィールド値をCSV用にフォーマット（サポートプロジェクト用拡張）"""
+        return format_value(field_value, field_type)
+    
+    def issue_to_row(self, issue: IssueRecord) -> List[str]:
+        """課題を標準CSVの1行に変換"""
+        return self.projector.render(STANDARD_LAYOUT, issue.row)
+    
+    def issue_to_daily_row(self, issue: IssueRecord, date_info: Dict) -> List[str]:
+        """課題を日次CSVの1行に変換（日次メタデータ + 課題データ）"""
+        prefix = [
+            date_info.get('date_label', ''),           # 作成日
+            date_info.get('year', ''),                 # 年
+            date_info.get('month', ''),                # 月
+            date_info.get('day', ''),                  # 日
+            date_info.get('export_date', ''),          # エクスポート日
+        ]
+        return self.projector.render(DAILY_LAYOUT, issue.row, prefix)
+    
+    def issues_to_csv_string(self, issues: List[IssueRecord]) -> str:
+        """課題をCSV文字列に変換"""
+        if not issues:
+            return ""
+        
+        output = StringIO()
+        writer = csv.writer(output)
+        writer.writerow(STANDARD_LAYOUT.headers)
+        
+        with self.metrics.stage('encode'):
+            for issue in issues:
+                writer.writerow(self.issue_to_row(issue))
+        
+        return output.getvalue()
+    
+    def issues_to_daily_csv_string(self, issues: List[IssueRecord], date_info: Dict = None) -> str:
+        """課題を日次CSV文字列に変換（メタデータ付き・date_info は全行共通）"""
+        if not issues:
+            return create_daily_csv_header()
+        
+        output = StringIO()
+        writer = csv.writer(output)
+        writer.writerow(DAILY_LAYOUT.headers)
+        
+        with self.metrics.stage('encode'):
+            for issue in issues:
+                writer.writerow(self.issue_to_daily_row(issue, date_info or {}))
+        
+        return output.getvalue()
+    
+    
+    def upload_latest_to_s3(self, csv_content: str, issue_count: int = None) -> str:
+        """S3に最新CSVファイル（固定名）をアップロード"""
+        if not self.s3_client or not self.s3_bucket:
+            logger.warning("S3設定が不完全です")
+            return ""
+        
+        try:
+            latest_key = f"{self.s3_prefix}latest.csv"
+            
+            # 公開読み取り権限はバケットポリシーで設定済み
+            latest_url = self.put_csv_artifact(latest_key, csv_content, {
+                'last_updated': datetime.now().isoformat(),
+                'data_type': 'latest_snapshot'
+            }, issue_count)
+            
+            logger.info(f"最新ファイルS3アップロード完了: {latest_url}")
+            
+            return latest_url
+            
+        except Exception as e:
+            logger.error(f"最新ファイルS3アップロードエラー: {str(e)}")
+            return ""
+    
+    def upload_daily_to_s3(self, csv_content: str, filename: str, year: int, month: int, day: int,
+                           issue_count: int = None) -> str:
+        """S3に日次CSVファイルをアップロード"""
+        if not self.s3_client or not self.s3_bucket:
+            logger.warning("S3設定が不完全です")
+            return ""
+        
+        try:
+            # 日次ファイル用のキー
+            daily_key = f"{self.s3_prefix}daily/{filename}"
+            
+            # 公開読み取り権限はバケットポリシーで設定済み
+            # メタデータを追加
+            daily_url = self.put_csv_artifact(daily_key, csv_content, {
+                'year': str(year),
+                'month': str(month),
+                'day': str(day),
+                'export_date': datetime.now().strftime('%Y-%m-%d'),
+                'data_type': 'daily_created'
+            }, issue_count)
+            
+            logger.info(f"日次S3アップロード完了: {daily_url}")
+            
+            return daily_url
+            
+        except Exception as e:
+            logger.error(f"日次S3アップロードエラー: {str(e)}")
+            return ""
+    
+    def object_url(self, key: str) -> str:
+        return f"https://{self.s3_bucket}.s3.amazonaws.com/{key}"
+    
+    def put_csv_artifact(self, key: str, csv_content: str, metadata: Dict, row_count: int = None) -> str:
+        """
+        CSVを無圧縮版と圧縮版（COMPRESSED_VARIANTS）でS3に保存してURLを返す
+        
+        圧縮版を先に保存し、無圧縮版を最後に保存する。エラーは呼び出し側で処理する。
+        既存と同じ内容のオブジェクトは書き込まず、どれも書き込まなかった場合は
+        成果物マニフェストを更新せずに unchanged として記録する。
+        """
+        started = time.perf_counter()
+        body = csv_content.encode('utf-8')
+        variants = {}
+        written = 0
+        for encoding in self.compressed_variants:
+            variant_key = key + VARIANT_SUFFIXES[encoding]
+            compressed = compress_bytes(body, encoding)
+            if self.put_if_changed(variant_key, compressed, ContentType=CSV_CONTENT_TYPE,
+                                   ContentEncoding=encoding, Metadata=metadata):
+                written += len(compressed)
+            variants[encoding] = {'key': variant_key, 'bytes': len(compressed)}
+        
+        raw_written = self.put_if_changed(key, body, ContentType=CSV_CONTENT_TYPE, Metadata=metadata)
+        url = self.object_url(key)
+        if not raw_written and not written:
+            self.metrics.add_time('upload', time.perf_counter() - started)
+            self.record_unchanged(key)
+            return url
+        
+        self.metrics.record_upload(key, time.perf_counter() - started, written + (len(body) if raw_written else 0))
+        if row_count is not None:
+            self.record_artifact(key, url, row_count, len(body), CSV_CONTENT_TYPE, variants)
+        return url
+    
+    def put_if_changed(self, key: str, body: bytes, **kwargs) -> bool:
+        """
+        本文が既存オブジェクト（HEAD）と異なる場合だけ put_object する（書き込んだら True）
+        
+        本文の SHA-256 をメタデータに入れて保存し、次回はそれと比べる（なければETagと比べる）。
+        """
+        if not self.skip_unchanged:
+            self.s3_client.put_object(Bucket=self.s3_bucket, Key=key, Body=body, **kwargs)
+            return True
+        sha256 = content_sha256(body)
+        if matches_stored(stored_object(self.s3_client, self.s3_bucket, key), sha256, content_etag(body)):
+            return False
+        kwargs['Metadata'] = dict(kwargs.get('Metadata') or {}, **{CONTENT_SHA256_METADATA: sha256})
+        self.s3_client.put_object(Bucket=self.s3_bucket, Key=key, Body=body, **kwargs)
+        return True
+    
+    def artifact_name(self, key: str) -> str:
+        """成果物マニフェストでの名前（S3_PREFIX からの相対パス）"""
+        return key[len(self.s3_prefix):] if key.startswith(self.s3_prefix) else key
+    
+    def record_unchanged(self, key: str, label: str = ''):
+        """既存と同じ内容のため書き込まなかった成果物を記録（レスポンスの unchanged）"""
+        self.metrics.count('unchanged')
+        self.artifacts.record_unchanged(self.artifact_name(key))
+        logger.info(f"{label}内容に変更がないためS3への書き込みをスキップ: {self.object_url(key)}")
+    
+    def record_artifact(self, key: str, url: str, row_count: int, size: int, content_type: str, variants: Dict):
+        """公開した成果物を成果物マニフェストに記録（保存は save_artifact_manifest）"""
+        name = self.artifact_name(key)
+        # 公開したファイルの行数の合計
+        self.metrics.count('rows', row_count)
+        self.artifacts.record(name, {
+            'url': url,
+            'rows': row_count,
+            'bytes': size,
+            'content_type': content_type,
+            'updated': datetime.now().isoformat(),
+            'variants': {encoding: dict(variant, url=self.object_url(variant['key']))
+                         for encoding, variant in variants.items()}
+        })
+    
+    def save_artifact_manifest(self):
+        """この実行で公開した成果物を manifest.json に反映"""
+        if not self.s3_client or not self.s3_bucket:
+            return
+        try:
+            count = self.artifacts.save(self.s3_client, self.s3_bucket, f"{self.s3_prefix}{ARTIFACT_MANIFEST_KEY}")
+            if count:
+                logger.info(f"成果物マニフェスト更新: {count}件")
+        except Exception as e:
+            logger.error(f"成果物マニフェスト更新エラー: {str(e)}")
+    
+    def open_s3_writer(self, key: str, metadata: Dict, content_type: str = CSV_CONTENT_TYPE,
+                       variants: bool = False, skip_unchanged: bool = True):
+        """
+        S3へのストリーミング書き込みを開始（S3未設定なら None）
+        
+        variants=True の場合は圧縮版（COMPRESSED_VARIANTS）も同時に書き込み、公開CSVとして
+        既存と同じ内容なら書き込まない（SKIP_UNCHANGED_UPLOADS、毎回新しいキーなら skip_unchanged=False）。
+        """
+        if not self.s3_client or not self.s3_bucket:
+            logger.warning("S3設定が不完全です")
+            return None
+        
+        skip_unchanged = variants and skip_unchanged and self.skip_unchanged
+        
+        # 公開読み取り権限はバケットポリシーで設定済み
+        if variants and self.compressed_variants:
+            return CompressedVariantWriter(
+                self.s3_client,
+                self.s3_bucket,
+                key,
+                self.compressed_variants,
+                content_type=content_type,
+                metadata=metadata,
+                skip_unchanged=skip_unchanged
+            )
+        return S3MultipartWriter(
+            self.s3_client,
+            self.s3_bucket,
+            key,
+            content_type=content_type,
+            metadata=metadata,
+            skip_unchanged=skip_unchanged
+        )
+    
+    def close_s3_writer(self, writer, label: str, row_count: int = None) -> str:
+        """
+        ストリーミング書き込みを完了してURLを返す（失敗時は空文字）
+        
+        row_count を指定した場合は成果物マニフェストに行数・サイズを記録する。
+        """
+        if writer is None:
+            return ""
+        
+        try:
+            # 残りのパートの送信と完了までの時間（それまでのパートは書き込み中にバックグラウンドで送信済み）
+            started = time.perf_counter()
+            writer.close()
+            url = self.object_url(writer.key)
+            if writer.unchanged:
+                self.metrics.add_time('upload', time.perf_counter() - started)
+                self.record_unchanged(writer.key, label)
+                return url
+            variants = writer.variant_sizes() if isinstance(writer, CompressedVariantWriter) else {}
+            self.metrics.record_upload(writer.key, time.perf_counter() - started,
+                                       writer.bytes_written + sum(variant['bytes'] for variant in variants.values()))
+            sizes = ''.join(f", {encoding}: {variant['bytes']} bytes" for encoding, variant in variants.items())
+            logger.info(f"{label}S3アップロード完了: {url} ({writer.bytes_written} bytes{sizes})")
+            if row_count is not None:
+                self.record_artifact(writer.key, url, row_count, writer.bytes_written, writer.content_type, variants)
+            return url
+        except Exception as e:
+            logger.error(f"{label}S3アップロードエラー: {str(e)}")
+            return ""
+    
+    def stream_daily_export(self, jql: str, filename: str, year: int, month: int, day: int,
+                            export_date: str, update_latest: bool = True) -> Dict:
+        """
+        課題をページ単位で取得しながら日次CSVと最新CSVをS3へストリーミング出力
+        
+        後続ページの取得・CSVエンコード・パートのアップロードが並行して進み、
+        メモリ上には先読み中のページとアップロード待ちのパートだけを保持する。
+        課題が0件の場合、日次ファイルはヘッダーのみで作成し、最新ファイルは更新しない。
+        update_latest=False（バックフィル）の場合も最新ファイルは更新しない。
+        PARQUET_EXPORT=true の場合は同じ課題を型付きParquetとしても
+        parquet/year=/month=/day=/ パーティションに出力する（pyarrow が必要）。
+        最新ファイルを更新する場合は、まだ配信していない課題だけの差分ファイルも出力する。
+        """
+        daily_writer = self.open_s3_writer(f"{self.s3_prefix}daily/{filename}", {
+            'year': str(year),
+            'month': str(month),
+            'day': str(day),
+            'export_date': export_date,
+            'data_type': 'daily_created'
+        }, variants=True)
+        latest_writer = None
+        if update_latest:
+            latest_writer = self.open_s3_writer(f"{self.s3_prefix}latest.csv", {
+                'last_updated': datetime.now().isoformat(),
+                'data_type': 'latest_snapshot'
+            }, variants=True)
+        
+        # 列指向出力（オプション）
+        parquet_writer = parquet = None
+        if self.parquet_export:
+            # pyarrow はParquet出力を有効にした場合のみ読み込む
+            from parquet_writer import ParquetIssueWriter, parquet_available, partition_key
+            if parquet_available():
+                parquet_writer = self.open_s3_writer(
+                    partition_key(self.s3_prefix, year, month, day, filename.replace('.csv', '.parquet')),
+                    {'export_date': export_date, 'data_type': 'daily_created_parquet'},
+                    content_type='application/vnd.apache.parquet'
+                )
+                if parquet_writer:
+                    parquet = ParquetIssueWriter(parquet_writer, self.projector, export_date)
+            else:
+                logger.warning("pyarrow が利用できないためParquet出力をスキップします")
+        
+        # 未配信の課題だけの連番付き差分ファイル（Google Sheets は重複チェックなしで追記できる）
+        delta_writer = delivered = None
+        if update_latest and self.delta_export and self.s3_client:
+            delivered = DeliveredKeyIndex.load(self.s3_client, self.s3_bucket,
+                                               f"{self.s3_prefix}{DELIVERY_INDEX_KEY}")
+            delta_writer = self.open_s3_writer(delta_key(self.s3_prefix, delivered.sequence + 1), {
+                'sequence': str(delivered.sequence + 1),
+                'export_date': export_date,
+                'data_type': 'delta'
+            }, variants=True, skip_unchanged=False)
+        
+        writers = [w for w in (daily_writer, latest_writer, parquet_writer, delta_writer) if w]
+        
+        daily_csv = csv.writer(daily_writer) if daily_writer else None
+        latest_csv = csv.writer(latest_writer) if latest_writer else None
+        if daily_csv:
+            daily_csv.writerow(DAILY_LAYOUT.headers)
+        if latest_csv:
+            latest_csv.writerow(STANDARD_LAYOUT.headers)
+        delta_csv = csv.writer(delta_writer) if delta_writer else None
+        if delta_csv:
+            delta_csv.writerow(STANDARD_LAYOUT.headers)
+        
+        # 日次メタデータ列は全行共通
+        date_prefix = [f"{year}年{month}月{day}日", year, month, day, export_date]
+        
+        issue_count = 0
+        delta_count = 0
+        try:
+            for issues in self.iter_issue_pages(jql):
+                with self.metrics.stage('encode'):
+                    for issue in issues:
+                        # 課題は受信時に1回だけ射影済みで、両レイアウトはその結果から作る
+                        base = issue.row
+                        if daily_csv:
+                            daily_csv.writerow(self.projector.render(DAILY_LAYOUT, base, date_prefix))
+                        if latest_csv:
+                            row = self.projector.render(STANDARD_LAYOUT, base)
+                            latest_csv.writerow(row)
+                            if delta_csv and issue.key not in delivered:
+                                delivered.add(issue.key)
+                                delta_csv.writerow(row)
+                                delta_count += 1
+                        if parquet:
+                            parquet.add(issue)
+                issue_count += len(issues)
+            if parquet:
+                parquet.close()
+        except Exception:
+            for writer in writers:
+                writer.abort()
+            raise
+        
+        # 日次ファイルは公開済み判定（バックフィルの再実行時のスキップ）に使うため最後に完了させる
+        parquet_url = self.close_s3_writer(parquet_writer, 'Parquet', issue_count)
+        
+        latest_url = ""
+        if issue_count:
+            latest_url = self.close_s3_writer(latest_writer, '最新ファイル', issue_count)
+        elif latest_writer:
+            latest_writer.abort()
+        
+        delta_url = ""
+        if delta_count:
+            delta_url = self.publish_delta(delta_writer, delivered, delta_count)
+        elif delta_writer:
+            delta_writer.abort()
+            # 前回マニフェストの書き込みに失敗していても索引から作り直す
+            self.save_delta_manifest(delivered)
+        
+        daily_url = self.close_s3_writer(daily_writer, '日次', issue_count)
+        
+        return {
+            'issue_count': issue_count,
+            'daily_url': daily_url,
+            'latest_url': latest_url,
+            'parquet_url': parquet_url,
+            'delta_url': delta_url,
+            'delta_count': delta_count
+        }
+    
+    def publish_delta(self, writer: S3MultipartWriter, delivered: DeliveredKeyIndex, delta_count: int) -> str:
+        """
+        差分ファイルを公開して配信済みキー索引・マニフェストを更新（失敗時は空文字）
+        
+        差分ファイル → 索引 → マニフェスト の順に書き込み、索引の保存を確定点とする。
+        マニフェストの書き込みに失敗しても、次回の実行で索引から作り直される。
+        """
+        delta_url = self.close_s3_writer(writer, '差分', delta_count)
+        if not delta_url:
+            return ""
+        
+        try:
+            delivered.record_delta(delivered.sequence + 1, writer.key, delta_url, delta_count)
+            delivered.save(self.s3_client, self.s3_bucket, f"{self.s3_prefix}{DELIVERY_INDEX_KEY}")
+        except Exception as e:
+            logger.error(f"配信済みキー索引の保存エラー: {str(e)}")
+            return ""
+        
+        logger.info(f"差分ファイル公開: 連番 {delivered.sequence} ({delta_count}件)")
+        self.save_delta_manifest(delivered)
+        return delta_url
+    
+    def save_delta_manifest(self, delivered: DeliveredKeyIndex):
+        """差分ファイルのマニフェストを索引の内容で書き込む"""
+        try:
+            self.s3_client.put_object(
+                Bucket=self.s3_bucket,
+                Key=f"{self.s3_prefix}{DELTA_MANIFEST_KEY}",
+                Body=json.dumps(delivered.manifest(STANDARD_LAYOUT.headers), ensure_ascii=False).encode('utf-8'),
+                ContentType='application/json; charset=utf-8',
+                # 毎回取得し直させる
+                CacheControl='no-cache'
+            )
+        except Exception as e:
+            logger.error(f"差分マニフェスト更新エラー: {str(e)}")
+    
+    def object_exists(self, key: str) -> bool:
+        """S3にオブジェクトが存在するか"""
+        if not self.s3_client or not self.s3_bucket:
+            return False
+        
+        from botocore.exceptions import ClientError
+        try:
+            self.s3_client.head_object(Bucket=self.s3_bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+    
+    def save_profile(self, profiler: HandlerProfiler, mode: str) -> str:
+        """プロファイルのレポートを profiles/ 配下に保存してテキストレポートのURLを返す（失敗時は空文字）"""
+        if not self.s3_client or not self.s3_bucket:
+            logger.warning("S3設定が不完全です")
+            return ""
+        
+        try:
+            base_key = f"{self.s3_prefix}profiles/{mode}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{profiler.mode}"
+            for suffix, (body, content_type) in profiler.reports().items():
+                self.s3_client.put_object(
+                    Bucket=self.s3_bucket,
+                    Key=base_key + suffix,
+                    Body=body,
+                    ContentType=content_type
+                )
+            url = self.object_url(base_key + '.txt')
+            logger.info(f"プロファイル保存完了: {url}")
+            return url
+        except Exception as e:
+            logger.error(f"プロファイル保存エラー: {str(e)}")
+            return ""
+    
+    def daily_exists(self, filename: str) -> bool:
+        """日次ファイルがS3に公開済みか（マルチパートは完了するまで見えないため、存在すれば完全なファイル）"""
+        return self.object_exists(f"{self.s3_prefix}daily/{filename}")
+
+
+def parse_jira_datetime(value: str) -> datetime:
+    """JIRAの日時文字列（例: 2024-01-02T10:11:12.000+0900）を datetime に変換"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f%z')
+    except ValueError:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def to_jira_time(value: datetime) -> datetime:
+    """JQLの日時リテラル用に JIRA_TIMEZONE（未設定なら元のオフセット）の時刻へ変換（tzinfo なし）"""
+    timezone_name = os.environ.get('JIRA_TIMEZONE')
+    if timezone_name:
+        from zoneinfo import ZoneInfo
+        value = value.astimezone(ZoneInfo(timezone_name))
+    return value.replace(tzinfo=None)
+
+
+def create_daily_csv_header():
+    """日次CSV用のヘッダーのみのCSVを作成"""
+    return ','.join(DAILY_LAYOUT.headers) + '\n'
@@ -0,0 +1,196 @@
+import os
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# リトライ対象のHTTPステータス（スロットリング・一時的なサーバーエラー）
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+THROTTLE_STATUSES = {429, 503}
+
+
+class JiraRequestError(Exception):
+    """JIRA APIリクエストの失敗（HTTPステータスと Retry-After を保持）"""
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[str] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = parse_retry_after(retry_after)
+
+    @property
+    def retryable(self) -> bool:
+        # status なしはネットワークエラー扱い
+        return self.status is None or self.status in RETRYABLE_STATUSES
+
+    @property
+    def throttled(self) -> bool:
+        return self.status in THROTTLE_STATUSES
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """Retry-After ヘッダー（秒数 または HTTP-date）を待機秒数に変換"""
+    if value is None or value == '':
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"{name} が不正です。{default} を使用します")
+        return default
+
+
+class TokenBucket:
+    """1秒あたりのリクエスト数を制限するトークンバケット"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """トークンを1つ取得（不足していれば補充されるまで待機）"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RequestGovernor:
+    """
+    JIRA APIリクエストの流量制御
+
+    - 429 の Retry-After を優先し、それ以外はジッター付き指数バックオフでリトライ
+    - トークンバケットで1秒あたりのリクエスト数を制限
+    - 同時実行数とページサイズをAIMD（加算増加・乗算減少）で調整
+      スロットリング時は同時実行数を、応答遅延時はページサイズを半減し、
+      目標レイテンシ内で成功するたびに少しずつ戻す
+    """
+
+    def __init__(self, max_concurrency: int = None, max_rps: float = None, max_retries: int = None,
+                 max_page_size: int = 100, min_page_size: int = 25, target_latency: float = None,
+                 base_delay: float = 1.0, max_delay: float = 30.0, metrics=None):
+        self.max_concurrency = max(1, int(max_concurrency or _env_float('JIRA_SEARCH_CONCURRENCY', 4)))
+        self.max_retries = int(max_retries if max_retries is not None else _env_float('JIRA_MAX_RETRIES', 5))
+        self.target_latency = target_latency if target_latency is not None else _env_float('JIRA_TARGET_LATENCY', 5.0)
+        self.max_page_size = max_page_size
+        self.min_page_size = min(min_page_size, max_page_size)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.bucket = TokenBucket(max_rps if max_rps is not None else _env_float('JIRA_MAX_RPS', 10.0))
+
+        self.cond = threading.Condition()
+        self.in_flight = 0
+        self.concurrency_limit = float(self.max_concurrency)
+        self.page_size_limit = float(max_page_size)
+
+        # 統計
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+
+        # リトライ数の記録先（export_metrics.ExportMetrics、省略可）
+        self.metrics = metrics
+
+    @property
+    def concurrency(self) -> int:
+        """現在許可されている同時実行数"""
+        return max(1, int(self.concurrency_limit))
+
+    @property
+    def page_size(self) -> int:
+        """現在のページサイズ"""
+        return max(self.min_page_size, int(self.page_size_limit))
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """流量制御・リトライ付きで fn を実行（リトライ上限到達時は例外を送出）"""
+        attempt = 0
+        while True:
+            self._acquire_slot()
+            self.bucket.acquire()
+            started = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+            except JiraRequestError as e:
+                error = e
+            except OSError as e:
+                # 接続エラー・タイムアウト
+                error = JiraRequestError(str(e))
+            else:
+                self._on_success(time.monotonic() - started)
+                return result
+            finally:
+                # 想定外の例外（応答の解析エラーなど）でも枠を返す
+                self._release_slot()
+
+            if not error.retryable or attempt >= self.max_retries:
+                raise error
+
+            delay = self._on_failure(error, attempt)
+            attempt += 1
+            logger.warning(f"リトライ {attempt}/{self.max_retries}: {str(error)} ({delay:.1f}秒後)")
+            time.sleep(delay)
+
+    def _acquire_slot(self):
+        with self.cond:
+            while self.in_flight >= self.concurrency:
+                self.cond.wait()
+            self.in_flight += 1
+            self.requests += 1
+
+    def _release_slot(self):
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify_all()
+
+    def _on_success(self, latency: float):
+        with self.cond:
+            if latency <= self.target_latency:
+                self.concurrency_limit = min(self.max_concurrency,
+                                             self.concurrency_limit + 1.0 / self.concurrency_limit)
+                self.page_size_limit = min(self.max_page_size, self.page_size_limit + self.min_page_size / 5.0)
+            else:
+                self.page_size_limit = max(self.min_page_size, self.page_size_limit / 2)
+            self.cond.notify_all()
+
+    def _on_failure(self, error: JiraRequestError, attempt: int) -> float:
+        with self.cond:
+            self.retries += 1
+            if error.throttled:
+                self.throttled += 1
+                self.concurrency_limit = max(1.0, self.concurrency_limit / 2)
+                self.page_size_limit = max(self.min_page_size, self.page_size_limit / 2)
+        if self.metrics:
+            self.metrics.count('retries')
+            if error.throttled:
+                self.metrics.count('throttled')
+
+        if error.retry_after is not None:
+            # 同時に待機したワーカーが一斉に再送しないよう少しずらす
+            return error.retry_after + random.uniform(0, self.base_delay)
+        # フルジッター付き指数バックオフ
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
@@ -0,0 +1,197 @@
+"""
+Lambda用の軽量HTTPクライアント（http.client ベース・外部依存なし）
+
+- ホストごとの keep-alive 接続プールで TCP/TLS ハンドシェイクをページごとに繰り返さない
+- Accept-Encoding: gzip を送り、受信しながら展開する
+- 本文をまとめずにチャンクのまま処理できる（body_handler）
+- リクエストごとのタイムアウト
+"""
+import os
+import ssl
+import json
+import zlib
+import logging
+import threading
+import http.client
+import urllib.parse
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 受信・展開の単位
+READ_CHUNK_SIZE = 64 * 1024
+
+# 保持するアイドル接続数の上限
+MAX_IDLE_CONNECTIONS = 16
+
+DEFAULT_TIMEOUT = 30.0
+
+# 再利用した接続がサーバー側で切断済みだった場合の例外（新しい接続で1回だけ再送する）
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                           ConnectionResetError, BrokenPipeError)
+
+
+def _env_timeout() -> float:
+    try:
+        return float(os.environ.get('JIRA_HTTP_TIMEOUT', DEFAULT_TIMEOUT))
+    except ValueError:
+        return DEFAULT_TIMEOUT
+
+
+class HttpResponse:
+    """展開済みのレスポンス（body_handler を指定した場合、200 の body はその戻り値）"""
+
+    __slots__ = ('status', 'headers', 'body')
+
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class JiraHttpClient:
+    """
+    1つのJIRAサイトに対する keep-alive 接続プール
+
+    スレッドセーフ。同時に使われる接続数は呼び出し側（RequestGovernor）の
+    同時実行数で決まり、使い終わった接続はアイドルとして再利用する。
+    """
+
+    def __init__(self, base_url: str, headers: Dict[str, str] = None, timeout: float = None, metrics=None):
+        parts = urllib.parse.urlsplit(base_url)
+        self.scheme = parts.scheme or 'https'
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip('/')
+        self.headers = dict(headers or {})
+        self.headers.setdefault('Accept-Encoding', 'gzip')
+        self.timeout = timeout if timeout is not None else _env_timeout()
+
+        self.ssl_context = ssl.create_default_context() if self.scheme == 'https' else None
+        self.idle: List[http.client.HTTPConnection] = []
+        self.lock = threading.Lock()
+
+        # 接続の作成数（再利用の効果の確認用）
+        self.connections_opened = 0
+
+        # 接続時間・受信バイト数の記録先（export_metrics.ExportMetrics、省略可）
+        self.metrics = metrics
+
+    def _connect(self, timeout: float) -> http.client.HTTPConnection:
+        with self.lock:
+            self.connections_opened += 1
+        if self.metrics:
+            self.metrics.count('connections')
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.host, self.port, timeout=timeout, context=self.ssl_context)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _acquire(self, timeout: float) -> Tuple[http.client.HTTPConnection, bool]:
+        """アイドル接続を取り出す（なければ新規作成）。(接続, 再利用したか) を返す"""
+        with self.lock:
+            conn = self.idle.pop() if self.idle else None
+        if conn is None:
+            return self._connect(timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _release(self, conn: http.client.HTTPConnection):
+        with self.lock:
+            if len(self.idle) < MAX_IDLE_CONNECTIONS:
+                self.idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """アイドル接続をすべて閉じる"""
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+    def _iter_body(self, response: http.client.HTTPResponse) -> Iterator[bytes]:
+        """レスポンス本文をチャンク単位で読み、gzip なら受信しながら展開して返す"""
+        decompressor = None
+        if (response.getheader('Content-Encoding') or '').lower() == 'gzip':
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        while True:
+            chunk = response.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            if self.metrics:
+                self.metrics.count('bytes_in', len(chunk))
+            yield decompressor.decompress(chunk) if decompressor else chunk
+        if decompressor:
+            yield decompressor.flush()
+
+    def get(self, path: str, params: Dict = None, headers: Dict[str, str] = None,
+            timeout: float = None, body_handler: Callable[[Iterable[bytes]], object] = None) -> HttpResponse:
+        """
+        GETリクエスト（path は base_url からの相対パス）
+
+        body_handler を指定すると、ステータス 200 の本文は展開済みチャンクの列として
+        body_handler に渡し、その戻り値を body とする（本文全体をメモリに持たない）。
+        """
+        return self.request('GET', path, params, None, headers, timeout, body_handler)
+
+    def post(self, path: str, payload: Dict, headers: Dict[str, str] = None,
+             timeout: float = None, body_handler: Callable[[Iterable[bytes]], object] = None) -> HttpResponse:
+        """
+        JSON本文のPOSTリクエスト（読み取り専用のAPI向け）
+
+        再利用した接続が切断済みだった場合は GET と同様に1回だけ再送するため、
+        副作用のあるAPIには使わない。
+        """
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        return self.request('POST', path, None, body, dict({'Content-Type': 'application/json'}, **(headers or {})),
+                            timeout, body_handler)
+
+    def request(self, method: str, path: str, params: Dict = None, body: bytes = None,
+                headers: Dict[str, str] = None, timeout: float = None,
+                body_handler: Callable[[Iterable[bytes]], object] = None) -> HttpResponse:
+        """リクエストを送信してレスポンスを返す（get / post から呼ばれる）"""
+        url = self.base_path + path
+        if params:
+            url += '?' + urllib.parse.urlencode(params)
+        request_headers = dict(self.headers, **(headers or {}))
+        timeout = timeout if timeout is not None else self.timeout
+
+        for attempt in range(2):
+            conn, reused = self._acquire(timeout)
+            try:
+                if conn.sock is None and self.metrics:
+                    # TCP/TLS の接続時間を分けて計測する（通常は request() 内で接続される）
+                    with self.metrics.stage('connect'):
+                        conn.connect()
+                conn.request(method, url, body=body, headers=request_headers)
+                response = conn.getresponse()
+                chunks = self._iter_body(response)
+                if body_handler and response.status == 200:
+                    response_body = body_handler(chunks)
+                    # 接続を再利用できるよう、読み残した本文を読み切る
+                    for _ in chunks:
+                        pass
+                else:
+                    response_body = b''.join(chunks)
+            except STALE_CONNECTION_ERRORS as e:
+                conn.close()
+                if reused and attempt == 0:
+                    # サーバー側で閉じられていたアイドル接続なので新しい接続で再送
+                    continue
+                raise ConnectionError(f"接続エラー: {str(e) or type(e).__name__}")
+            except (http.client.HTTPException, zlib.error) as e:
+                # 途中で切れたレスポンス・壊れた gzip 本文など（呼び出し側では接続エラーとしてリトライ）
+                conn.close()
+                raise ConnectionError(f"接続エラー: {str(e) or type(e).__name__}")
+            except (OSError, ValueError):
+                # ValueError は body_handler のデコードエラー
+                conn.close()
+                raise
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            return HttpResponse(response.status, {k.lower(): v for k, v in response.getheaders()}, response_body)
@@ -0,0 +1,190 @@
+import os
+import re
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from csv_columns import IssueRecord
+from jira_governor import RequestGovernor
+
+logger = logging.getLogger(__name__)
+
+# JIRA Cloud の /rest/api/2/search が1回で返す最大件数
+PAGE_SIZE = 100
+
+# JQL の ORDER BY 句（条件なしで ORDER BY だけのJQLを含む）
+_ORDER_BY = re.compile(r'(?:^|\s+)ORDER\s+BY\s+.*$', re.IGNORECASE | re.DOTALL)
+
+# 並列取得数のデフォルト（JIRA_SEARCH_CONCURRENCY で上書き）
+DEFAULT_CONCURRENCY = 4
+
+
+def get_search_concurrency() -> int:
+    """環境変数 JIRA_SEARCH_CONCURRENCY から並列取得数を取得（1 なら逐次取得）"""
+    try:
+        return max(1, int(os.environ.get('JIRA_SEARCH_CONCURRENCY', DEFAULT_CONCURRENCY)))
+    except ValueError:
+        logger.warning(f"JIRA_SEARCH_CONCURRENCY が不正です。{DEFAULT_CONCURRENCY} を使用します")
+        return DEFAULT_CONCURRENCY
+
+
+def iter_pages(fetch_page: Callable[[int, int], Dict], max_results: int = None,
+               concurrency: int = None, page_size: int = PAGE_SIZE,
+               governor: RequestGovernor = None) -> Iterator[List[Dict]]:
+    """
+    検索結果をページ単位で順番に返すジェネレーター
+
+    1ページ目で total を確認し、残りの startAt を上限付きワーカープールで並列取得する。
+    各リクエストは governor 経由で実行され、ページサイズと同時実行数は
+    governor の調整値に従う。ページは startAt 順に返すため、逐次取得した場合と
+    同じ順序になる。呼び出し側がページを処理している間も後続ページの取得は進むが、
+    先読みは同時実行数の2倍までに抑える。リトライしても取得できないページがあれば
+    JiraRequestError を送出する（部分的な結果で終了しない）。
+
+    Args:
+        fetch_page: (start_at, max_results) を受け取り検索APIのレスポンス(dict)を返す関数
+        max_results: 取得する最大件数（None なら上限なし）
+        concurrency: 並列取得数の上限（省略時は環境変数から取得）
+        page_size: 1リクエストあたりの最大取得件数
+        governor: 共有する RequestGovernor（省略時は新規作成）
+    """
+    if concurrency is None:
+        concurrency = get_search_concurrency()
+    if governor is None:
+        governor = RequestGovernor(max_concurrency=concurrency, max_page_size=page_size)
+    if max_results is None:
+        max_results = float('inf')
+
+    first = governor.call(fetch_page, 0, int(min(governor.page_size, max_results)))
+    first_issues = first.get('issues', [])[:int(min(len(first.get('issues', [])), max_results))]
+    total = min(first.get('total', 0), max_results)
+    logger.info(f"取得中: {len(first_issues)} / {first.get('total', 0)}")
+
+    if first_issues:
+        yield first_issues
+    if not first_issues or len(first_issues) >= total:
+        return
+
+    # 未取得範囲 (start_at, size) のキューと、順番待ちのページ
+    ranges = []
+    pages = {}
+    next_start = next_yield = fetched = len(first_issues)
+    lookahead = concurrency * 2
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = {}
+        try:
+            while ranges or next_start < total or pending:
+                # 取りこぼし範囲の再取得は先読み上限に関係なく優先する
+                while len(pending) < governor.concurrency and (
+                        ranges or (next_start < total and len(pending) + len(pages) < lookahead)):
+                    if ranges:
+                        start_at, size = ranges.pop()
+                    else:
+                        start_at, size = next_start, int(min(governor.page_size, total - next_start))
+                        next_start += size
+                    future = executor.submit(governor.call, fetch_page, start_at, size)
+                    pending[future] = (start_at, size)
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start_at, size = pending.pop(future)
+                    if start_at >= total:
+                        continue
+
+                    issues = future.result().get('issues', [])
+                    if not issues:
+                        # 取得中に課題が減った場合はここで打ち切る
+                        total = start_at
+                        continue
+
+                    pages[start_at] = issues
+                    fetched += len(issues)
+                    logger.info(f"取得中: {fetched} / {first.get('total', 0)}")
+
+                    # サーバー側で件数が切り詰められた場合は残りを再取得
+                    if len(issues) < size:
+                        ranges.append((start_at + len(issues), size - len(issues)))
+
+                # 先頭から連続したページを順番に返す
+                while next_yield in pages and next_yield < total:
+                    issues = pages.pop(next_yield)
+                    next_yield += len(issues)
+                    yield issues
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+
+
+def fetch_all_pages(fetch_page: Callable[[int, int], Dict], max_results: int = None,
+                    concurrency: int = None, page_size: int = PAGE_SIZE,
+                    governor: RequestGovernor = None) -> List[Dict]:
+    """検索結果の全ページを取得して課題リストを返す（iter_pages の結果を結合）"""
+    all_issues = []
+    for issues in iter_pages(fetch_page, max_results, concurrency, page_size, governor):
+        all_issues.extend(issues)
+    return all_issues
+
+
+def split_order_by(jql: str) -> Tuple[str, str]:
+    """JQLを条件部分と ORDER BY 句に分ける"""
+    match = _ORDER_BY.search(jql)
+    if not match:
+        return jql.strip(), ''
+    return jql[:match.start()].strip(), match.group(0).strip()
+
+
+def keyset_jql(jql: str, after_id: int = None) -> str:
+    """JQLの ORDER BY を課題ID順に置き換え、after_id より後の課題に絞り込む"""
+    where, _ = split_order_by(jql)
+    if after_id is not None:
+        where = f"({where}) AND id > {int(after_id)}" if where else f"id > {int(after_id)}"
+    return f"{where} ORDER BY id ASC".strip()
+
+
+def iter_keyset_pages(fetch_page: Callable[[str, int], Dict], jql: str, after_id: int = None,
+                      page_size: int = PAGE_SIZE, governor: RequestGovernor = None) -> Iterator[List[Dict]]:
+    """
+    課題IDのキーセットで検索結果をページ単位で返すジェネレーター（件数上限なし）
+
+    各ページは startAt=0 で「前ページの最後の課題IDより後」を課題ID順に取得するため、
+    オフセットが深くなっても遅くならず、取得中に課題が増減しても抜け・重複が出ない。
+    ページは前ページの結果に依存するので並列取得はせず、呼び出し側がページを
+    処理している間に次の1ページだけ先読みする。after_id を渡すと、そのIDの次の課題から
+    再開する（各ページの最後の課題の id を保存しておけばよい）。
+
+    Args:
+        fetch_page: (jql, max_results) を受け取り検索APIのレスポンス(dict)を返す関数
+        jql: 検索条件（ORDER BY は無視される）
+        after_id: この課題IDより後から取得する（None なら先頭から）
+        page_size: 1リクエストあたりの最大取得件数
+        governor: 共有する RequestGovernor（省略時は新規作成）
+    """
+    if governor is None:
+        governor = RequestGovernor(max_concurrency=1, max_page_size=page_size)
+
+    def fetch(last_id):
+        return governor.call(fetch_page, keyset_jql(jql, last_id), governor.page_size)
+
+    fetched = 0
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(fetch, after_id)
+        try:
+            while True:
+                issues = future.result().get('issues', [])
+                if not issues:
+                    return
+                # 次ページの条件は最後の課題IDだけで決まるので、すぐに先読みを始める
+                last = issues[-1]
+                last_id = int(last.id if isinstance(last, IssueRecord) else last['id'])
+                future = executor.submit(fetch, last_id)
+                fetched += len(issues)
+                logger.info(f"取得中: {fetched}件（課題ID {last_id} まで）")
+                yield issues
+        except BaseException:
+            future.cancel()
+            raise
@@ -0,0 +1,98 @@
+"""
+複数ジョブ（mode=jobs）: ジョブごとの JQL・列・出力先のエクスポートを1回の実行で並列に行う
+"""
+import os
+import csv
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict
+
+from csv_columns import RowProjector
+from export_jobs import ExportJob, job_specs, parse_jobs
+from jira_exporter import LambdaJiraS3Exporter
+
+logger = logging.getLogger(__name__)
+
+
+def stream_job_export(exporter: LambdaJiraS3Exporter, job: ExportJob, projector: RowProjector,
+                      export_date: str) -> Dict:
+    """ジョブのJQLの検索結果をジョブのレイアウトでS3へストリーミング出力（0件はヘッダーのみ）"""
+    writer = exporter.open_s3_writer(f"{exporter.s3_prefix}{job.key}", {
+        'job': job.name,
+        'export_date': export_date,
+        'data_type': 'job'
+    }, variants=True)
+    if writer is None:
+        raise Exception("S3設定が不完全なためジョブを出力できません")
+    
+    job_csv = csv.writer(writer)
+    job_csv.writerow(job.layout.headers)
+    issue_count = 0
+    try:
+        for issues in exporter.iter_issue_pages(job.jql, projector=projector):
+            with exporter.metrics.stage('encode'):
+                for issue in issues:
+                    job_csv.writerow(projector.render(job.layout, issue.row))
+            issue_count += len(issues)
+    except Exception:
+        writer.abort()
+        raise
+    
+    url = exporter.close_s3_writer(writer, f"ジョブ {job.name} ", issue_count)
+    if not url:
+        raise Exception(f"ジョブの出力ファイルのアップロードに失敗しました: {job.key}")
+    return {'issue_count': issue_count, 'csv_url': url}
+
+
+def run_jobs_export(exporter: LambdaJiraS3Exporter, event: Dict) -> Dict:
+    """
+    複数ジョブ: イベントの jobs（なければ EXPORT_JOBS）のエクスポートを1回の実行で並列に行う
+    
+    各ジョブは自身の JQL・列・出力先でCSVをストリーミング出力する。JIRAへのリクエストは
+    エクスポーターの接続プールと RequestGovernor を共有するため、ジョブ数に関係なく
+    全体のレート・同時実行数の上限を守る。失敗したジョブがあっても他のジョブは続行する。
+    """
+    now = datetime.now()
+    jobs = parse_jobs(job_specs(event))
+    concurrency = max(1, int(event.get('concurrency') or os.environ.get('EXPORT_JOB_CONCURRENCY', 4)))
+    
+    logger.info(f"ジョブ開始: {', '.join(job.name for job in jobs)} ({len(jobs)}件, 並列数 {concurrency})")
+    
+    def export_job(job: ExportJob) -> Dict:
+        started = time.perf_counter()
+        logger.info(f"ジョブ {job.name} 開始 - JQLクエリ: {job.jql}")
+        projector = exporter.build_projector([job.layout])
+        result = stream_job_export(exporter, job, projector, now.strftime('%Y-%m-%d'))
+        logger.info(f"ジョブ {job.name} 完了: {result['issue_count']}件")
+        return {
+            'name': job.name,
+            'status': 'exported',
+            'key': job.key,
+            'issue_count': result['issue_count'],
+            'csv_url': result['csv_url'],
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+    
+    results = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(export_job, job): job for job in jobs}
+        for future, job in futures.items():
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.error(f"ジョブエラー ({job.name}): {str(e)}")
+                results.append({'name': job.name, 'status': 'failed', 'key': job.key, 'error': str(e)})
+    
+    exported = [r for r in results if r['status'] == 'exported']
+    failed = [r['name'] for r in results if r['status'] == 'failed']
+    
+    return {
+        'message': f"ジョブ完了: {len(exported)}件を出力、{len(failed)}件は失敗",
+        'mode': 'jobs',
+        'issue_count': sum(r['issue_count'] for r in exported),
+        'failed_jobs': failed,
+        'jobs': results,
+        'timestamp': now.isoformat()
+    }
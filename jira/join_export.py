@@ -0,0 +1,73 @@
+"""
+SFDC結合（mode=join、snapshot の後にも実行）: スナップショットの全件CSVとSFDCエクスポートをトークンで結合して公開
+"""
+import csv
+import logging
+from datetime import datetime
+from typing import Dict
+
+from jira_exporter import LambdaJiraS3Exporter
+from sfdc_join import (
+    JOIN_HEADERS, JOINED_CSV_KEY, SFDC_EXPORT_KEY, SFDC_INDEX_KEY, iter_csv_rows, join_issue_rows, load_token_index
+)
+from snapshot_store import SNAPSHOT_CSV_KEY
+
+logger = logging.getLogger(__name__)
+
+
+def run_join_export(exporter: LambdaJiraS3Exporter) -> Dict:
+    """
+    スナップショットの全件CSVをSFDCエクスポートとトークンで結合して公開
+    
+    SFDC側は「トークンキー」のハッシュ索引（SFDCファイルの ETag が変わったときだけ作り直す）、
+    課題側はスナップショットCSVをS3から1行ずつ読みながら結合する。
+    コメントはスプレッドシート側（join_sfdc.gs）で課題キーごとに引き継ぐ。
+    """
+    now = datetime.now()
+    index, rebuilt = load_token_index(
+        exporter.s3_client, exporter.s3_bucket,
+        f"{exporter.s3_prefix}{SFDC_EXPORT_KEY}", f"{exporter.s3_prefix}{SFDC_INDEX_KEY}"
+    )
+    
+    try:
+        body = exporter.s3_client.get_object(Bucket=exporter.s3_bucket,
+                                             Key=f"{exporter.s3_prefix}{SNAPSHOT_CSV_KEY}")['Body']
+    except exporter.s3_client.exceptions.NoSuchKey:
+        raise Exception("スナップショットCSVがありません。先に snapshot モードを実行してください")
+    rows = iter_csv_rows(body)
+    headers = next(rows)
+    
+    writer = exporter.open_s3_writer(f"{exporter.s3_prefix}{JOINED_CSV_KEY}", {
+        'last_updated': now.isoformat(),
+        'data_type': 'sfdc_joined'
+    }, variants=True)
+    if writer is None:
+        raise Exception("S3設定が不完全なため結合結果を出力できません")
+    
+    issue_count = 0
+    matched_count = 0
+    try:
+        joined_csv = csv.writer(writer)
+        joined_csv.writerow(JOIN_HEADERS)
+        with exporter.metrics.stage('encode'):
+            for row, matched in join_issue_rows(rows, headers, index):
+                joined_csv.writerow(row)
+                issue_count += 1
+                matched_count += matched
+    except Exception:
+        writer.abort()
+        raise
+    joined_url = exporter.close_s3_writer(writer, 'SFDC結合', issue_count)
+    if not joined_url:
+        raise Exception("SFDC結合結果のアップロードに失敗しました")
+    
+    return {
+        'message': f'SFDC結合完了: {issue_count}件中 {matched_count}件が契約と一致',
+        'mode': 'join',
+        'issue_count': issue_count,
+        'matched_count': matched_count,
+        'token_count': len(index),
+        'index_rebuilt': rebuilt,
+        'joined_csv_url': joined_url,
+        'timestamp': now.isoformat()
+    }
@@ -0,0 +1,138 @@
+"""
+検索APIレスポンスの逐次JSONデコード
+
+レスポンス本文をチャンク単位で受け取り、issues 配列を1課題ずつデコードする。
+各課題はデコード直後に CSV に必要な値だけの形（prune_issue）に縮めるため、
+本文全体のバイト列・文字列・オブジェクトツリーを同時に保持しない。
+"""
+import sys
+import json
+import codecs
+from typing import Callable, Dict, Iterable
+
+_decoder = json.JSONDecoder()
+
+_WHITESPACE = ' \t\n\r'
+
+# オブジェクト型フィールドのうちデコーダーが参照する属性（self・avatarUrls などは捨てる）
+KEPT_ATTRIBUTES = ('value', 'name', 'displayName')
+
+
+def prune_value(value):
+    """フィールド値から CSV の変換に使う属性だけを残す"""
+    if isinstance(value, dict):
+        # 表示名・優先度名などは課題間で繰り返すため intern して同じ文字列を共有する
+        kept = {attr: sys.intern(value[attr]) if isinstance(value[attr], str) else value[attr]
+                for attr in KEPT_ATTRIBUTES if attr in value}
+        # 想定外の形のオブジェクトは汎用デコーダーが扱えるようそのまま残す
+        return kept or value
+    if isinstance(value, list):
+        return [prune_value(item) for item in value]
+    return value
+
+
+def prune_issue(issue: Dict) -> Dict:
+    """課題を id・key と縮めたフィールド値だけの dict にする"""
+    pruned = {attr: issue[attr] for attr in ('id', 'key') if attr in issue}
+    pruned['fields'] = {field_id: prune_value(value) for field_id, value in (issue.get('fields') or {}).items()}
+    return pruned
+
+
+class _ChunkReader:
+    """チャンクを必要な分だけ読み足しながら JSON の値を1つずつ取り出す"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """次のチャンクを読み足す（終端なら False）"""
+        if self.eof:
+            return False
+        for chunk in self.chunks:
+            text = self.decoder.decode(chunk)
+            if text:
+                # 読み終えた部分を捨ててから足す
+                self.buffer = self.buffer[self.pos:] + text
+                self.pos = 0
+                return True
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(b'', final=True)
+        self.pos = 0
+        self.eof = True
+        return False
+
+    def peek(self) -> str:
+        """空白を読み飛ばして次の1文字を返す（終端なら空文字）"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def take(self, expected: str) -> str:
+        """次の1文字を読み、expected に含まれなければ ValueError"""
+        char = self.peek()
+        if not char or char not in expected:
+            raise ValueError(f"検索レスポンスのJSONが不正です（位置 {self.pos}: {char!r}）")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """次の JSON の値を1つデコード（途中で切れていればチャンクを読み足して再試行）"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # 数値・リテラルは続きが次のチャンクにある可能性があるため、終端以外では読み足して確認する
+            # （"-3." や "1e" のように小数部・指数部の途中で切れた数値も同様）
+            partial = end == len(self.buffer) or (
+                isinstance(value, (int, float)) and self.buffer[end] in '.eE+-')
+            if partial and not self.eof:
+                # 読み足すと位置がずれるため、終端に達した場合もデコードし直す
+                self.fill()
+                continue
+            self.pos = end
+            return value
+
+
+def decode_search_page(chunks: Iterable[bytes], transform: Callable[[Dict], object] = prune_issue) -> Dict:
+    """
+    検索APIのレスポンス本文（チャンクの列）をデコードする
+
+    issues 以外のトップレベルの値（total・startAt など）はそのまま、
+    issues の各要素は transform を適用した結果のリストとして返す。
+    """
+    reader = _ChunkReader(chunks)
+    page = {}
+    reader.take('{')
+    if reader.peek() == '}':
+        return page
+
+    while True:
+        key = reader.value()
+        reader.take(':')
+        if key == 'issues' and reader.peek() == '[':
+            reader.take('[')
+            issues = []
+            if reader.peek() == ']':
+                reader.take(']')
+            else:
+                while True:
+                    issue = reader.value()
+                    issues.append(transform(issue) if transform else issue)
+                    if reader.take(',]') == ']':
+                        break
+            page['issues'] = issues
+        else:
+            page[key] = reader.value()
+        if reader.take(',}') == '}':
+            return page
@@ -1,345 +1,213 @@
+import time
+
+# モジュール読み込み（Lambdaのinitフェーズ）の開始時刻
+_INIT_STARTED = time.perf_counter()
+
 import os
-import csv
 import json
-import urllib.request
-import urllib.error
-import urllib.parse
-import base64
-import boto3
-from datetime import datetime
-from typing import List, Dict
+from datetime import datetime, timedelta
+from typing import Dict
 import logging
-from io import StringIO
+
+from export_metrics import emit_emf
+from jira_exporter import LambdaJiraS3Exporter
+
+# モードごとの処理（run_*_export）・プロファイラーは使う分岐の中で読み込む
+# （initフェーズで使わないモジュールを読み込まず、コールドスタートの INIT_DURATION を短くする）
 
 # Lambda用ロガー設定
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-class LambdaJiraS3Exporter:
-    def __init__(self):
-        """
-        環境変数から設定を読み込む Lambda用 JIRA→S3 エクスポーター
-        """
-        self.jira_url = os.environ.get('JIRA_URL', '').rstrip('/')
-        self.username = os.environ.get('JIRA_USERNAME', '')
-        self.api_token = os.environ.get('JIRA_API_TOKEN', '')
-        
-        # S3設定
-        self.s3_bucket = os.environ.get('S3_BUCKET', '')
-        self.s3_prefix = os.environ.get('S3_PREFIX', 'project-exports/')
-        
-        # 設定チェック
-        if not all([self.jira_url, self.username, self.api_token]):
-            raise ValueError("JIRA_URL, JIRA_USERNAME, JIRA_API_TOKEN を環境変数に設定してください")
-        
-        # AWS S3クライアント
-        self.s3_client = boto3.client('s3') if self.s3_bucket else None
-        
-        # Basic認証のヘッダー作成
-        credentials = f"{self.username}:{self.api_token}"
-        encoded_credentials = base64.b64encode(credentials.encode('utf-8')).decode('utf-8')
-        self.auth_header = f"Basic {encoded_credentials}"
-    
-    def test_connection(self) -> bool:
-        """JIRA接続テスト"""
-        try:
-            req = urllib.request.Request(f"{self.jira_url}/rest/api/2/myself")
-            req.add_header('Authorization', self.auth_header)
-            req.add_header('Accept', 'application/json')
-            
-            with urllib.request.urlopen(req) as response:
-                if response.status == 200:
-                    user_info = json.loads(response.read().decode('utf-8'))
-                    logger.info(f"JIRA接続成功: {user_info.get('displayName', 'Unknown')}")
-                    return True
-                else:
-                    logger.error(f"JIRA接続失敗: {response.status}")
-                    return False
-        except Exception as e:
-            logger.error(f"JIRA接続エラー: {str(e)}")
-            return False
+# 実行終了時にフィールド定義のバックグラウンド更新を待つ上限（秒）
+FIELD_REFRESH_WAIT = 10
+
+
+def create_dispatcher(exporter: LambdaJiraS3Exporter, context):
+    """
+    ワーカー・連結の呼び出し方法（Lambda上では自身の関数を非同期呼び出し、ローカルではプロセス内）
     
-    def search_issues(self, jql: str, max_results: int = 1000) -> List[Dict]:
-        """JQLクエリで課題を検索（サポートプロジェクト用カスタムフィールド対応）"""
-        # サポートプロジェクト専用 - 10フィールドのみ取得
-        fields = [
-            'issuetype',           # 課題タイプ
-            'summary',             # 要約
-            'reporter',            # 報告者
-            'assignee',            # 担当者
-            'priority',            # 優先度
-            'created',             # 作成日
-            # サポート専用カスタムフィールド
-            'customfield_10141',   # 機能分類 (Function)
-            'customfield_10140',   # 問合せ分類 (Inquiry)
-            'customfield_10129',   # TS
-            'customfield_10163'    # TOKEN
-        ]
-        
-        all_issues = []
-        start_at = 0
-        
-        while True:
-            params = {
-                'jql': jql,
-                'fields': ','.join(fields),
-                'maxResults': min(100, max_results - len(all_issues)),
-                'startAt': start_at
-            }
-            
-            try:
-                # URLパラメータを構築
-                query_string = urllib.parse.urlencode(params)
-                url = f"{self.jira_url}/rest/api/2/search?{query_string}"
-                
-                req = urllib.request.Request(url)
-                req.add_header('Authorization', self.auth_header)
-                req.add_header('Accept', 'application/json')
-                
-                with urllib.request.urlopen(req) as response:
-                    if response.status != 200:
-                        logger.error(f"検索エラー: {response.status}")
-                        break
-                    
-                    data = json.loads(response.read().decode('utf-8'))
-                    issues = data.get('issues', [])
-                
-                    if not issues:
-                        break
-                    
-                    all_issues.extend(issues)
-                    logger.info(f"取得中: {len(all_issues)} / {data.get('total', 0)}")
-                    
-                    if len(all_issues) >= data.get('total', 0) or len(all_issues) >= max_results:
-                        break
-                    
-                    start_at += len(issues)
-                    
-            except Exception as e:
-                logger.error(f"検索エラー: {str(e)}")
-                break
-        
-        return all_issues
+    プロセス内ではハンドラーを経由せず、エクスポーターを共有してモードの処理だけを実行する。
+    """
+    from fanout import InProcessDispatcher, LambdaDispatcher
+    from fanout_export import run_fanout_export
+    function_name = os.environ.get('WORKER_FUNCTION_NAME') or getattr(context, 'function_name', None)
+    if function_name and not os.environ.get('LOCAL_S3_DIR'):
+        return LambdaDispatcher(function_name)
+    return InProcessDispatcher(lambda payload, dispatcher: run_fanout_export(exporter, payload, dispatcher),
+                               max_workers=int(os.environ.get('FANOUT_WORKERS', 8)) + 1)
+
+
+_exporter = None
+_cold_start = True
+
+
+def get_exporter(init: bool = False) -> LambdaJiraS3Exporter:
+    """
+    プロセス内で共有するエクスポーター
     
-    def format_field_value(self, field_value, field_type: str = 'string') -> str:
-        """フィールド値をCSV用にフォーマット（サポートプロジェクト用拡張）"""
-        if field_value is None:
-            return ''
-        
-        if field_type == 'user':
-            return field_value.get('displayName', '') if isinstance(field_value, dict) else str(field_value)
-        elif field_type == 'status':
-            return field_value.get('name', '') if isinstance(field_value, dict) else str(field_value)
-        elif field_type == 'priority':
-            return field_value.get('name', '') if isinstance(field_value, dict) else str(field_value)
-        elif field_type == 'issuetype':
-            return field_value.get('name', '') if isinstance(field_value, dict) else str(field_value)
-        elif field_type == 'resolution':
-            return field_value.get('name', '') if isinstance(field_value, dict) else str(field_value)
-        elif field_type == 'datetime':
-            if field_value:
-                try:
-                    dt = datetime.fromisoformat(field_value.replace('Z', '+00:00'))
-                    return dt.strftime('%Y-%m-%d %H:%M:%S')
-                except:
-                    return str(field_value)
-            return ''
-        else:
-            # カスタムフィールドやその他のフィールド
-            if isinstance(field_value, dict):
-                # オブジェクト型のカスタムフィールド（選択肢など）
-                if 'value' in field_value:
-                    return str(field_value['value'])
-                elif 'name' in field_value:
-                    return str(field_value['name'])
-                elif 'displayName' in field_value:
-                    return str(field_value['displayName'])
-                else:
-                    return str(field_value)
-            elif isinstance(field_value, list):
-                # 配列型のカスタムフィールド（マルチセレクトなど）
-                return ', '.join([str(item.get('value', item.get('name', item))) if isinstance(item, dict) else str(item) for item in field_value])
-            else:
-                return str(field_value)
+    S3クライアント・認証ヘッダー・流量制御（学習済みの同時実行数とページサイズ）・行射影を
+    ウォームスタートの実行間で再利用する。init=True（initフェーズ）ではフィールド定義の
+    バックグラウンド更新を始めない（実行の合間に止まるため、最初の実行の sync_fields で始める）。
+    """
+    global _exporter
+    if _exporter is None:
+        _exporter = LambdaJiraS3Exporter(refresh_fields=not init)
+    return _exporter
+
+
+def lambda_handler(event, context):
+    """
+    Lambda関数のエントリーポイント（init時間と実行時間をレスポンスとログに記録）
     
-    def issues_to_csv_string(self, issues: List[Dict]) -> str:
-        """課題をCSV文字列に変換"""
-        if not issues:
-            return ""
-        
-        # サポートプロジェクト専用ヘッダー（11列）- 指定された順番
-        headers = [
-            '課題タイプ',
-            '課題キー', 
-            '課題ID',
-            '要約',
-            '機能分類 (Function)',
-            '問合せ分類 (Inquiry)',
-            '報告者',
-            'TS',
-            '担当者',
-            '優先度',
-            '作成日',
-            'TOKEN'
-        ]
-        
-        output = StringIO()
-        writer = csv.writer(output)
-        writer.writerow(headers)
-        
-        for issue in issues:
-            fields = issue.get('fields', {})
-            
-            # 指定された順番でデータ行を作成
-            row = [
-                self.format_field_value(fields.get('issuetype'), 'issuetype'),     # 課題タイプ
-                issue.get('key', ''),                                              # 課題キー
-                issue.get('id', ''),                                               # 課題ID
-                fields.get('summary', ''),                                         # 要約
-                self.format_field_value(fields.get('customfield_10141')),         # 機能分類 (Function)
-                self.format_field_value(fields.get('customfield_10140')),         # 問合せ分類 (Inquiry)
-                self.format_field_value(fields.get('reporter'), 'user'),          # 報告者
-                self.format_field_value(fields.get('customfield_10129'), 'user'), # TS（ユーザー型）
-                self.format_field_value(fields.get('assignee'), 'user'),          # 担当者
-                self.format_field_value(fields.get('priority'), 'priority'),      # 優先度
-                self.format_field_value(fields.get('created'), 'datetime'),       # 作成日
-                self.format_field_value(fields.get('customfield_10163'))          # TOKEN
-            ]
-            
-            writer.writerow(row)
-        
-        return output.getvalue()
+    段階別の所要時間とカウンターはレスポンスの metrics に含め、EMF のログ行としても出力する。
+    イベントに "profile": "cprofile" / "sample"（true は cprofile）を指定すると
+    ハンドラーをプロファイルしてレポートを profiles/ 配下に保存する。
+    """
+    global _cold_start
+    started = time.perf_counter()
+    mode = (event or {}).get('mode') or os.environ.get('EXPORT_MODE', 'daily')
+    if _exporter is not None:
+        _exporter.metrics.reset()
+        _exporter.sync_fields()
     
-    def issues_to_daily_csv_string(self, issues: List[Dict]) -> str:
-        """課題を日次CSV文字列に変換（メタデータ付き）"""
-        if not issues:
-            return create_daily_csv_header()
-        
-        # 日次CSV用ヘッダー（日付情報を追加）
-        headers = [
-            '作成日', '年', '月', '日', 'エクスポート日',  # 日次メタデータ
-            '課題タイプ', '課題キー', '課題ID', '要約',
-            '機能分類 (Function)', '問合せ分類 (Inquiry)', '報告者', 'TS',
-            '担当者', '優先度', '作成日時', 'TOKEN'
-        ]
-        
-        output = StringIO()
-        writer = csv.writer(output)
-        writer.writerow(headers)
-        
-        for issue in issues:
-            fields = issue.get('fields', {})
-            date_info = issue.get('date_info', {})
-            
-            # 日次メタデータ + 課題データの行を作成
-            row = [
-                date_info.get('date_label', ''),           # 作成日
-                date_info.get('year', ''),                 # 年
-                date_info.get('month', ''),                # 月
-                date_info.get('day', ''),                  # 日
-                date_info.get('export_date', ''),          # エクスポート日
-                self.format_field_value(fields.get('issuetype'), 'issuetype'),     # 課題タイプ
-                issue.get('key', ''),                                              # 課題キー
-                issue.get('id', ''),                                               # 課題ID
-                fields.get('summary', ''),                                         # 要約
-                self.format_field_value(fields.get('customfield_10141')),         # 機能分類 (Function)
-                self.format_field_value(fields.get('customfield_10140')),         # 問合せ分類 (Inquiry)
-                self.format_field_value(fields.get('reporter'), 'user'),          # 報告者
-                self.format_field_value(fields.get('customfield_10129'), 'user'), # TS（ユーザー型）
-                self.format_field_value(fields.get('assignee'), 'user'),          # 担当者
-                self.format_field_value(fields.get('priority'), 'priority'),      # 優先度
-                self.format_field_value(fields.get('created'), 'datetime'),       # 作成日時
-                self.format_field_value(fields.get('customfield_10163'))          # TOKEN
-            ]
-            
-            writer.writerow(row)
-        
-        return output.getvalue()
+    profiler = None
+    if (event or {}).get('profile'):
+        from handler_profiler import HandlerProfiler, profile_mode
+        profile = profile_mode(event['profile'])
+        if profile:
+            profiler = HandlerProfiler(profile)
+            profiler.start()
+    try:
+        response = handle_event(event, context, mode)
+    finally:
+        if profiler:
+            profiler.stop()
     
+    # この実行で公開した成果物の行数・サイズを manifest.json に反映
+    if _exporter is not None:
+        _exporter.save_artifact_manifest()
+        # 実行終了後はLambdaが一時停止するため、フィールド定義の更新中なら待つ
+        _exporter.fields.wait(FIELD_REFRESH_WAIT)
     
-    def upload_latest_to_s3(self, csv_content: str) -> str:
-        """S3に最新CSVファイル（固定名）をアップロード"""
-        if not self.s3_client or not self.s3_bucket:
-            logger.warning("S3設定が不完全です")
-            return ""
-        
-        try:
-            latest_key = f"{self.s3_prefix}latest.csv"
-            
-            self.s3_client.put_object(
-                Bucket=self.s3_bucket,
-                Key=latest_key,
-                Body=csv_content.encode('utf-8'),
-                ContentType='text/csv',
-                ContentEncoding='utf-8',
-                # 公開読み取り権限はバケットポリシーで設定済み
-                Metadata={
-                    'last_updated': datetime.now().isoformat(),
-                    'data_type': 'latest_snapshot'
-                }
-            )
-            
-            latest_url = f"https://{self.s3_bucket}.s3.amazonaws.com/{latest_key}"
-            logger.info(f"最新ファイルS3アップロード完了: {latest_url}")
-            
-            return latest_url
-            
-        except Exception as e:
-            logger.error(f"最新ファイルS3アップロードエラー: {str(e)}")
-            return ""
-    
-    def upload_daily_to_s3(self, csv_content: str, filename: str, year: int, month: int, day: int) -> str:
-        """S3に日次CSVファイルをアップロード"""
-        if not self.s3_client or not self.s3_bucket:
-            logger.warning("S3設定が不完全です")
-            return ""
-        
-        try:
-            # 日次ファイル用のキー
-            daily_key = f"{self.s3_prefix}daily/{filename}"
-            
-            self.s3_client.put_object(
-                Bucket=self.s3_bucket,
-                Key=daily_key,
-                Body=csv_content.encode('utf-8'),
-                ContentType='text/csv',
-                ContentEncoding='utf-8',
-                # 公開読み取り権限はバケットポリシーで設定済み
-                # メタデータを追加
-                Metadata={
-                    'year': str(year),
-                    'month': str(month),
-                    'day': str(day),
-                    'export_date': datetime.now().strftime('%Y-%m-%d'),
-                    'data_type': 'daily_created'
-                }
-            )
-            
-            # 日次ファイルのURLを返す
-            daily_url = f"https://{self.s3_bucket}.s3.amazonaws.com/{daily_key}"
-            logger.info(f"日次S3アップロード完了: {daily_url}")
-            
-            return daily_url
-            
-        except Exception as e:
-            logger.error(f"日次S3アップロードエラー: {str(e)}")
-            return ""
+    timing = {
+        'cold_start': _cold_start,
+        'init_ms': round(INIT_DURATION * 1000, 1),
+        'handler_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+    _cold_start = False
+    logger.info(f"実行時間: {json.dumps(timing)}")
     
+    body = json.loads(response['body'])
+    body['timing'] = timing
+    if _exporter is not None:
+        # 既存と同じ内容のため書き込まなかった成果物（利用側は取り込みを省略できる）
+        body['unchanged'] = _exporter.artifacts.take_unchanged()
+        metrics = _exporter.metrics.flush()
+        body['metrics'] = metrics
+        publish_metrics(metrics, mode, timing)
+        if profiler:
+            body['profile_url'] = _exporter.save_profile(profiler, mode)
+    response['body'] = json.dumps(body, ensure_ascii=False)
+    return response
 
 
-def lambda_handler(event, context):
-    """Lambda関数のエントリーポイント（前日作成課題取得版）"""
+def publish_metrics(metrics: Dict, mode: str, timing: Dict):
+    """段階別の所要時間とカウンターを EMF のログ行として出力（METRICS_NAMESPACE が空なら出力しない）"""
+    namespace = os.environ.get('METRICS_NAMESPACE', 'JiraExporter')
+    if not namespace:
+        return
+    try:
+        emit_emf(metrics, namespace, {
+            'FunctionName': os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local'),
+            'Mode': mode
+        }, {'initMs': timing['init_ms'] if timing['cold_start'] else 0, 'handlerMs': timing['handler_ms']})
+    except Exception as e:
+        logger.error(f"メトリクス出力エラー: {str(e)}")
+
+
+def handle_event(event, context, mode: str):
+    """イベントに応じたエクスポートを実行（前日作成課題取得版 / 増分同期 / スナップショット / SFDC結合 / バックフィル / 複数ジョブ / ステータス滞在時間 / 分割エクスポート・連結）"""
     
     try:
-        # 前日作成された課題を取得
+        # 増分同期モード（mode は event または環境変数 EXPORT_MODE で指定、lambda_handler で解釈済み）
+        if mode == 'incremental':
+            from incremental_export import run_incremental_export
+            exporter = get_exporter()
+            return {
+                'statusCode': 200,
+                'body': json.dumps(run_incremental_export(exporter), ensure_ascii=False)
+            }
+        
+        # 累積スナップショット（{"mode": "snapshot"}、作り直す場合は "rebuild": true）
+        if mode == 'snapshot':
+            from snapshot_export import run_snapshot_export
+            exporter = get_exporter()
+            return {
+                'statusCode': 200,
+                'body': json.dumps(run_snapshot_export(exporter, event or {}), ensure_ascii=False)
+            }
+        
+        # SFDC契約データとの結合のみ実行（{"mode": "join"}）
+        if mode == 'join':
+            from join_export import run_join_export
+            exporter = get_exporter()
+            return {
+                'statusCode': 200,
+                'body': json.dumps(run_join_export(exporter), ensure_ascii=False)
+            }
+        
+        # 期間指定のバックフィル（例: {"mode": "backfill", "start_date": "2024-01-01", "end_date": "2024-03-31"}）
+        if mode == 'backfill':
+            from backfill_export import run_backfill_export
+            exporter = get_exporter()
+            result = run_backfill_export(exporter, event)
+            return {
+                'statusCode': 500 if result['failed_dates'] else 200,
+                'body': json.dumps(result, ensure_ascii=False)
+            }
+        
+        # 複数ジョブ（例: {"mode": "jobs", "jobs": [{"name": "open", "jql": "...", "columns": "manual"}]}）
+        if mode == 'jobs':
+            from jobs_export import run_jobs_export
+            exporter = get_exporter()
+            result = run_jobs_export(exporter, event or {})
+            return {
+                'statusCode': 500 if result['failed_jobs'] else 200,
+                'body': json.dumps(result, ensure_ascii=False)
+            }
+        
+        # ステータス滞在時間・初回応答（例: {"mode": "changelog", "jql": "project = SUPPORT"}）
+        if mode == 'changelog':
+            from changelog_export import run_changelog_export
+            exporter = get_exporter()
+            return {
+                'statusCode': 200,
+                'body': json.dumps(run_changelog_export(exporter, event or {}), ensure_ascii=False)
+            }
+        
+        # 大規模エクスポート（例: {"mode": "coordinator", "jql": "project = SUPPORT"}）
+        # ワーカー（mode=worker）・連結（mode=merge）は非同期に呼び出され、連結は進捗の確認にも使える
+        if mode in ('coordinator', 'worker', 'merge'):
+            from fanout_export import run_fanout_export, wait_for_merge
+            exporter = get_exporter()
+            dispatcher = create_dispatcher(exporter, context)
+            result = run_fanout_export(exporter, dict(event or {}, mode=mode), dispatcher)
+            if not dispatcher.detached and mode == 'coordinator' and result.get('shard_count'):
+                # ローカルでは全シャードの完了を待って連結の結果を返す
+                result = wait_for_merge(exporter, result['run_id'], dispatcher)
+            return {
+                'statusCode': 500 if result.get('failed_shards') else 200,
+                'body': json.dumps(result, ensure_ascii=False)
+            }
+        
+        # 前日作成された課題を取得（件数上限なし・ページ単位でストリーミング出力）
         jql = 'project = "SUPPORT" AND created >= startOfDay(-1) AND created < startOfDay() ORDER BY created ASC'
-        max_results = 5000
         
         # 前日の日付情報を取得
-        import datetime
-        today = datetime.datetime.now()
+        today = datetime.now()
         # 前日の日付を計算
-        yesterday = today - datetime.timedelta(days=1)
+        yesterday = today - timedelta(days=1)
         year = yesterday.year
         month = yesterday.month
         day = yesterday.day
@@ -351,37 +219,17 @@ def lambda_handler(event, context):
         logger.info(f"対象期間: {year}年{month}月{day}日")
         logger.info(f"日次ファイル名: {filename}")
         
-        # エクスポーター初期化
-        exporter = LambdaJiraS3Exporter()
-        
-        # 接続テスト
-        if not exporter.test_connection():
-            raise Exception("JIRA接続に失敗しました")
+        # エクスポーター（ウォームスタートでは前回の実行で作成したものを再利用）
+        exporter = get_exporter()
         
-        # 課題検索
-        issues = exporter.search_issues(jql, max_results)
+        # 課題検索 → CSV変換 → S3アップロード（日次ファイル・最新ファイル）
+        result = exporter.stream_daily_export(jql, filename, year, month, day, today.strftime('%Y-%m-%d'))
+        issue_count = result['issue_count']
         
-        # 日次データにメタデータを追加
-        daily_data = []
-        if issues:
-            for issue in issues:
-                # 各課題に日付情報を追加
-                issue['date_info'] = {
-                    'year': year,
-                    'month': month,
-                    'day': day,
-                    'export_date': today.strftime('%Y-%m-%d'),
-                    'date_label': f"{year}年{month}月{day}日"
-                }
-                daily_data.append(issue)
+        logger.info(f"前日作成課題: {issue_count}件")
         
-        logger.info(f"前日作成課題: {len(daily_data)}件")
-        
-        if not daily_data:
+        if not issue_count:
             logger.warning("前日作成された課題が見つかりませんでした")
-            # 空データでもファイルを作成（ヘッダーのみ）
-            empty_csv = create_daily_csv_header()
-            daily_url = exporter.upload_daily_to_s3(empty_csv, filename, year, month, day)
             
             return {
                 'statusCode': 200,
@@ -391,33 +239,25 @@ def lambda_handler(event, context):
                     'date_info': f"{year}年{month}月{day}日",
                     'jql': jql,
                     'daily_filename': filename,
-                    'daily_csv_url': daily_url,
+                    'daily_csv_url': result['daily_url'],
+                    'parquet_url': result['parquet_url'],
                     'timestamp': today.isoformat()
                 }, ensure_ascii=False)
             }
         
-        # 日次CSV作成（メタデータ付き）
-        daily_csv_content = exporter.issues_to_daily_csv_string(daily_data)
-        
-        # 標準CSV作成（Google Apps Script用）
-        standard_csv_content = exporter.issues_to_csv_string(daily_data)
-        
-        # S3アップロード（日次ファイル）
-        daily_url = exporter.upload_daily_to_s3(daily_csv_content, filename, year, month, day)
-        
-        # S3アップロード（最新ファイル）
-        latest_url = exporter.upload_latest_to_s3(standard_csv_content)
-        
-        logger.info(f"日次エクスポート完了: {len(daily_data)}件")
+        logger.info(f"日次エクスポート完了: {issue_count}件")
         
         # レスポンス
         response_body = {
             'message': f'{year}年{month}月{day}日に作成されたサポート課題をS3にアップロードしました',
-            'issue_count': len(daily_data),
+            'issue_count': issue_count,
             'date_info': f"{year}年{month}月{day}日",
             'daily_filename': filename,
-            'daily_csv_url': daily_url,
-            'latest_csv_url': latest_url,
+            'daily_csv_url': result['daily_url'],
+            'latest_csv_url': result['latest_url'],
+            'parquet_url': result['parquet_url'],
+            'delta_csv_url': result['delta_url'],
+            'delta_count': result['delta_count'],
             'note': 'Google Apps Scriptが前日作成課題データを取得してGoogle Sheetsに追記します',
             'jql': jql,
             'date_range': '前日作成課題（前日00:00〜23:59）',
@@ -442,16 +282,16 @@ def lambda_handler(event, context):
         }
 
 
-def create_daily_csv_header():
-    """日次CSV用のヘッダーのみのCSVを作成"""
-    headers = [
-        '作成日', '年', '月', '日', 'エクスポート日',
-        '課題タイプ', '課題キー', '課題ID', '要約',
-        '機能分類 (Function)', '問合せ分類 (Inquiry)', '報告者', 'TS',
-        '担当者', '優先度', '作成日時', 'TOKEN'
-    ]
-    return ','.join(headers) + '\n'
+# Lambda上ではinitフェーズでエクスポーター（boto3の読み込みとS3クライアント作成）を済ませておく
+# （フィールド定義はキャッシュから読むだけで、JIRAからの更新は最初の実行で始める）
+if os.environ.get('AWS_LAMBDA_FUNCTION_NAME'):
+    try:
+        get_exporter(init=True)
+    except Exception as e:
+        logger.warning(f"エクスポーターの事前作成に失敗しました（実行時に再試行します）: {str(e)}")
 
+# モジュール読み込みにかかった時間（コールドスタートのinit時間）
+INIT_DURATION = time.perf_counter() - _INIT_STARTED
 
 
 # ローカルテスト用
@@ -0,0 +1,187 @@
+"""
+ローカル検証用のファイルシステムベース S3 クライアント
+
+boto3 の S3 クライアントのうちエクスポーターが使う API だけを実装する。
+環境変数 LOCAL_S3_DIR を設定すると、エクスポーターは実際のS3の代わりに
+<LOCAL_S3_DIR>/<バケット名>/<キー> へ書き込む。
+
+    LOCAL_S3_DIR=/tmp/s3 S3_BUCKET=exports python lambda_jira_exporter.py
+"""
+import os
+import io
+import json
+import uuid
+import shutil
+import hashlib
+from datetime import datetime, timezone
+from typing import Dict
+
+from botocore.exceptions import ClientError
+
+
+def _client_error(code: str, operation: str, message: str, status: int = 404) -> ClientError:
+    return ClientError({'Error': {'Code': code, 'Message': message}, 'ResponseMetadata': {'HTTPStatusCode': status}},
+                       operation)
+
+
+def _byte_range(value: str, size: int) -> slice:
+    """Range / CopySourceRange（bytes=開始-終了、終了を含む）"""
+    start, _, end = value[len('bytes='):].partition('-')
+    return slice(int(start), min(int(end), size - 1) + 1 if end else size)
+
+
+class LocalS3Client:
+    """<root>/<bucket>/<key> にオブジェクト、<root>/.meta 配下にメタデータを保存する S3 スタンドイン"""
+
+    class exceptions:
+        class NoSuchKey(ClientError):
+            pass
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def _path(self, bucket: str, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, bucket, key))
+        if not path.startswith(os.path.join(self.root, bucket) + os.sep):
+            raise ValueError(f"不正なキーです: {key}")
+        return path
+
+    def _meta_path(self, bucket: str, key: str) -> str:
+        return os.path.join(self.root, '.meta', bucket, key + '.json')
+
+    def _write(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _store(self, bucket: str, key: str, body: bytes, etag: str, content_type: str = None,
+               content_encoding: str = None, metadata: Dict = None) -> Dict:
+        meta = {
+            'ETag': etag,
+            'ContentType': content_type or 'binary/octet-stream',
+            'Metadata': {k.lower(): str(v) for k, v in (metadata or {}).items()},
+            'LastModified': datetime.now(timezone.utc).isoformat()
+        }
+        if content_encoding:
+            meta['ContentEncoding'] = content_encoding
+        self._write(self._path(bucket, key), body)
+        self._write(self._meta_path(bucket, key), json.dumps(meta).encode('utf-8'))
+        return {'ETag': etag}
+
+    def _head(self, bucket: str, key: str, operation: str) -> Dict:
+        path = self._path(bucket, key)
+        if not os.path.exists(path):
+            if operation == 'GetObject':
+                raise self.exceptions.NoSuchKey({'Error': {'Code': 'NoSuchKey', 'Message': key},
+                                                 'ResponseMetadata': {'HTTPStatusCode': 404}}, operation)
+            raise _client_error('404', operation, 'Not Found')
+        with open(self._meta_path(bucket, key), encoding='utf-8') as f:
+            meta = json.load(f)
+        meta['LastModified'] = datetime.fromisoformat(meta['LastModified'])
+        meta['ContentLength'] = os.path.getsize(path)
+        return meta
+
+    def put_object(self, Bucket: str, Key: str, Body=b'', ContentType: str = None, ContentEncoding: str = None,
+                   Metadata: Dict = None, **kwargs) -> Dict:
+        if hasattr(Body, 'read'):
+            Body = Body.read()
+        if isinstance(Body, str):
+            Body = Body.encode('utf-8')
+        # 条件付き書き込み（IfNoneMatch='*' は既存のキーがあれば 412）
+        if kwargs.get('IfNoneMatch') == '*' and os.path.exists(self._path(Bucket, Key)):
+            raise _client_error('PreconditionFailed', 'PutObject', 'At least one of the pre-conditions you '
+                                'specified did not hold', 412)
+        etag = f'"{hashlib.md5(Body).hexdigest()}"'
+        return self._store(Bucket, Key, Body, etag, ContentType, ContentEncoding, Metadata)
+
+    def head_object(self, Bucket: str, Key: str, **kwargs) -> Dict:
+        return self._head(Bucket, Key, 'HeadObject')
+
+    def get_object(self, Bucket: str, Key: str, **kwargs) -> Dict:
+        response = self._head(Bucket, Key, 'GetObject')
+        with open(self._path(Bucket, Key), 'rb') as f:
+            body = f.read()
+        if kwargs.get('Range'):
+            body = body[_byte_range(kwargs['Range'], len(body))]
+            response['ContentLength'] = len(body)
+        response['Body'] = io.BytesIO(body)
+        return response
+
+    def delete_object(self, Bucket: str, Key: str, **kwargs) -> Dict:
+        for path in (self._path(Bucket, Key), self._meta_path(Bucket, Key)):
+            if os.path.exists(path):
+                os.remove(path)
+        return {}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = '', **kwargs) -> Dict:
+        base = os.path.join(self.root, Bucket)
+        contents = []
+        for directory, _, files in os.walk(base):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                key = os.path.relpath(os.path.join(directory, name), base).replace(os.sep, '/')
+                if key.startswith(Prefix):
+                    head = self._head(Bucket, key, 'ListObjectsV2')
+                    contents.append({'Key': key, 'Size': head['ContentLength'], 'ETag': head['ETag'],
+                                     'LastModified': head['LastModified']})
+        contents.sort(key=lambda item: item['Key'])
+        response = {'KeyCount': len(contents), 'IsTruncated': False, 'Prefix': Prefix}
+        if contents:
+            response['Contents'] = contents
+        return response
+
+    # マルチパートアップロード
+
+    def _upload_dir(self, upload_id: str) -> str:
+        return os.path.join(self.root, '.multipart', upload_id)
+
+    def create_multipart_upload(self, Bucket: str, Key: str, ContentType: str = None, ContentEncoding: str = None,
+                                Metadata: Dict = None, **kwargs) -> Dict:
+        upload_id = uuid.uuid4().hex
+        self._write(os.path.join(self._upload_dir(upload_id), 'upload.json'), json.dumps({
+            'ContentType': ContentType, 'ContentEncoding': ContentEncoding, 'Metadata': Metadata or {}
+        }).encode('utf-8'))
+        return {'Bucket': Bucket, 'Key': Key, 'UploadId': upload_id}
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body=b'', **kwargs) -> Dict:
+        if hasattr(Body, 'read'):
+            Body = Body.read()
+        self._write(os.path.join(self._upload_dir(UploadId), f"{PartNumber:05d}.part"), Body)
+        return {'ETag': f'"{hashlib.md5(Body).hexdigest()}"'}
+
+    def upload_part_copy(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, CopySource: Dict,
+                         CopySourceRange: str = None, **kwargs) -> Dict:
+        with open(self._path(CopySource['Bucket'], CopySource['Key']), 'rb') as f:
+            body = f.read()
+        if CopySourceRange:
+            body = body[_byte_range(CopySourceRange, len(body))]
+        etag = self.upload_part(Bucket=Bucket, Key=Key, UploadId=UploadId, PartNumber=PartNumber, Body=body)['ETag']
+        return {'CopyPartResult': {'ETag': etag, 'LastModified': datetime.now(timezone.utc)}}
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload: Dict,
+                                  **kwargs) -> Dict:
+        upload_dir = self._upload_dir(UploadId)
+        with open(os.path.join(upload_dir, 'upload.json'), encoding='utf-8') as f:
+            upload = json.load(f)
+
+        body = bytearray()
+        digests = b''
+        for part in MultipartUpload['Parts']:
+            with open(os.path.join(upload_dir, f"{part['PartNumber']:05d}.part"), 'rb') as f:
+                data = f.read()
+            body += data
+            digests += hashlib.md5(data).digest()
+
+        # S3 と同じく「各パートのMD5を連結したもののMD5-パート数」をETagとする
+        etag = f'"{hashlib.md5(digests).hexdigest()}-{len(MultipartUpload["Parts"])}"'
+        self._store(Bucket, Key, bytes(body), etag, upload['ContentType'], upload['ContentEncoding'],
+                    upload['Metadata'])
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        return {'Bucket': Bucket, 'Key': Key, 'ETag': etag}
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str, **kwargs) -> Dict:
+        shutil.rmtree(self._upload_dir(UploadId), ignore_errors=True)
+        return {}
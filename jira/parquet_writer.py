@@ -0,0 +1,126 @@
+import logging
+from datetime import datetime, timezone
+from typing import List, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow はオプション（Lambdaではレイヤーで追加）
+    pa = None
+    pq = None
+
+from csv_columns import IssueRecord, RowProjector
+
+logger = logging.getLogger(__name__)
+
+# 1行グループあたりの行数
+ROW_GROUP_SIZE = 10000
+
+# Parquetの列名 → (基本行の列名, 型)
+# 値の種類が少ない列は辞書エンコード（カテゴリ）にする
+PARQUET_COLUMNS = [
+    ('issue_key', 'key', 'string'),
+    ('issue_id', 'id', 'int64'),
+    ('issuetype', 'issuetype', 'category'),
+    ('summary', 'summary', 'string'),
+    ('function', 'function', 'category'),
+    ('inquiry', 'inquiry', 'category'),
+    ('reporter', 'reporter', 'string'),
+    ('ts', 'ts', 'string'),
+    ('assignee', 'assignee', 'string'),
+    ('priority', 'priority', 'category'),
+    ('created', 'created', 'timestamp'),
+    ('token', 'token', 'string'),
+]
+
+
+def parquet_available() -> bool:
+    """pyarrow が利用可能か"""
+    return pa is not None
+
+
+def partition_key(prefix: str, year: int, month: int, day: int, filename: str) -> str:
+    """Hiveスタイルのパーティションキー（parquet/year=YYYY/month=MM/day=DD/ファイル名）"""
+    return f"{prefix}parquet/year={year}/month={month:02d}/day={day:02d}/{filename}"
+
+
+def parse_created(value) -> datetime:
+    """JIRAの作成日時（例: 2024-01-02T10:11:12.000+0900）をUTCの datetime に変換"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f%z')
+    except ValueError:
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+class ParquetIssueWriter:
+    """
+    基本行タプルを型付きParquetとして書き出すライター
+
+    行は ROW_GROUP_SIZE ごとに行グループとして出力先（S3MultipartWriter など
+    write() を持つオブジェクト）へ書き込むため、保持するのは1行グループ分だけ。
+    """
+
+    def __init__(self, sink, projector: RowProjector, export_date: str):
+        if pa is None:
+            raise ImportError("Parquet出力には pyarrow が必要です")
+
+        self.projector = projector
+        self.positions = [projector.positions[column] for _, column, _ in PARQUET_COLUMNS]
+        names = [name for name, _, _ in PARQUET_COLUMNS]
+        self.id_index = names.index('issue_id')
+        self.created_index = names.index('created')
+        self.export_date = datetime.strptime(export_date, '%Y-%m-%d').date()
+
+        fields = []
+        for name, _, kind in PARQUET_COLUMNS:
+            if kind == 'category':
+                fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+            elif kind == 'timestamp':
+                fields.append(pa.field(name, pa.timestamp('ms', tz='UTC')))
+            elif kind == 'int64':
+                fields.append(pa.field(name, pa.int64()))
+            else:
+                fields.append(pa.field(name, pa.string()))
+        fields.append(pa.field('export_date', pa.date32()))
+        self.schema = pa.schema(fields)
+
+        self.writer = pq.ParquetWriter(sink, self.schema, compression='snappy')
+        self.rows: List[Tuple] = []
+        self.row_count = 0
+
+    def add(self, issue: IssueRecord):
+        """1課題分の行を追加（作成日時は元の文字列から型付きで変換）"""
+        row = [issue.row[i] for i in self.positions]
+        row[self.id_index] = int(row[self.id_index]) if row[self.id_index] else None
+        row[self.created_index] = parse_created(issue.created)
+        self.rows.append(row)
+        if len(self.rows) >= ROW_GROUP_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if not self.rows:
+            return
+        columns = [list(values) for values in zip(*self.rows)]
+        arrays = []
+        for (name, _, kind), values in zip(PARQUET_COLUMNS, columns):
+            if kind == 'category':
+                arrays.append(pa.array([v or None for v in values], pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array([v if v != '' else None for v in values], self.schema.field(name).type))
+        arrays.append(pa.array([self.export_date] * len(self.rows), pa.date32()))
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self.row_count += len(self.rows)
+        self.rows = []
+
+    def close(self):
+        """残りの行を書き込んでParquetのフッターを出力"""
+        self._flush()
+        self.writer.close()
@@ -0,0 +1,128 @@
+"""
+ダッシュボード用の集計テーブル（週別・TS別・機能分類別・問合せ分類別・優先度別の件数）
+
+スナップショット更新時に変更された課題だけを「変更前の行を減算・変更後の行を加算」で
+反映するため、全履歴を集計し直すことはない。集計値はスナップショットの
+データベースに一緒に保存し、公開用に小さな JSON / CSV として出力する。
+集計を更新するのはスナップショット（mode=snapshot）だけで、日次・増分エクスポートでは更新しない。
+"""
+import csv
+import json
+from datetime import datetime, timedelta
+from io import StringIO
+from typing import Dict, List, Optional, Sequence
+
+# 値が空の課題の集計キー
+UNSET = '(未設定)'
+
+# 集計名 → 行の列名
+ROLLUP_DIMENSIONS = [
+    ('week', '作成日'),
+    ('ts', 'TS'),
+    ('function', '機能分類 (Function)'),
+    ('inquiry', '問合せ分類 (Inquiry)'),
+    ('priority', '優先度'),
+]
+
+# 複数選択の列（セルは選択肢を ", " で連結した値）。選択肢ごとに1件として数える
+MULTI_VALUE_DIMENSIONS = {'function'}
+MULTI_VALUE_SEPARATOR = ', '
+
+# 保存する集計値の形式（変わったらスナップショットの行から集計し直す）
+ROLLUP_VERSION = 2
+
+# 公開CSVのヘッダー
+ROLLUP_HEADERS = {
+    'week': ['週（開始日）', 'ISO週', '件数'],
+    'ts': ['TS', '件数'],
+    'function': ['機能分類 (Function)', '件数'],
+    'inquiry': ['問合せ分類 (Inquiry)', '件数'],
+    'priority': ['優先度', '件数'],
+}
+
+
+def week_start(created: str) -> str:
+    """作成日時（YYYY-MM-DD HH:MM:SS）からその週の月曜日（YYYY-MM-DD）を求める"""
+    try:
+        day = datetime.strptime(created[:10], '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return UNSET
+    return (day - timedelta(days=day.weekday())).strftime('%Y-%m-%d')
+
+
+def iso_week(monday: str) -> str:
+    """週の開始日から ISO週（例: 2024-W03）を求める"""
+    if monday == UNSET:
+        return ''
+    year, week, _ = datetime.strptime(monday, '%Y-%m-%d').isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+class RollupTables:
+    """集計名ごとの {キー: 件数}"""
+
+    def __init__(self, headers: Sequence[str], counts: Dict[str, Dict[str, int]] = None):
+        self.positions = [(name, list(headers).index(column)) for name, column in ROLLUP_DIMENSIONS]
+        self.counts = counts or {name: {} for name, _ in ROLLUP_DIMENSIONS}
+        self.issue_count = sum(self.counts['priority'].values())
+
+    @classmethod
+    def from_json(cls, headers: Sequence[str], text: str) -> Optional['RollupTables']:
+        """保存した集計値を復元（形式が古ければ None）"""
+        state = json.loads(text)
+        if state.get('version') != ROLLUP_VERSION:
+            return None
+        return cls(headers, state['counts'])
+
+    def to_json(self) -> str:
+        return json.dumps({'version': ROLLUP_VERSION, 'issue_count': self.issue_count, 'counts': self.counts},
+                          ensure_ascii=False)
+
+    def keys(self, row: List[str]):
+        """行の (集計名, キー)。複数選択の列は重複を除いた選択肢ごとに返す"""
+        for name, position in self.positions:
+            value = row[position]
+            if name == 'week':
+                yield name, week_start(value)
+            elif name in MULTI_VALUE_DIMENSIONS and value:
+                for option in dict.fromkeys(option.strip() for option in value.split(MULTI_VALUE_SEPARATOR)):
+                    yield name, option or UNSET
+            else:
+                yield name, value or UNSET
+
+    def apply(self, previous: List[str], current: List[str]):
+        """変更前の行（新規なら None）を減算し、変更後の行を加算"""
+        if previous is not None:
+            self.issue_count -= 1
+            for name, key in self.keys(previous):
+                table = self.counts[name]
+                table[key] = table.get(key, 0) - 1
+                if table[key] <= 0:
+                    del table[key]
+        if current is not None:
+            self.issue_count += 1
+            for name, key in self.keys(current):
+                table = self.counts[name]
+                table[key] = table.get(key, 0) + 1
+
+    def rows(self, name: str) -> List[List]:
+        """公開用の行（週別は週順、それ以外は件数の多い順。複数選択の列は合計が課題数を超える）"""
+        table = self.counts[name]
+        if name == 'week':
+            return [[week, iso_week(week), table[week]] for week in sorted(table)]
+        return [[key, count] for key, count in sorted(table.items(), key=lambda item: (-item[1], item[0]))]
+
+    def to_csv(self, name: str) -> str:
+        output = StringIO()
+        writer = csv.writer(output)
+        writer.writerow(ROLLUP_HEADERS[name])
+        writer.writerows(self.rows(name))
+        return output.getvalue()
+
+    def summary(self, updated: str) -> Dict:
+        """全集計をまとめた公開用JSON"""
+        return {
+            'issue_count': self.issue_count,
+            'updated': updated,
+            'rollups': {name: self.rows(name) for name, _ in ROLLUP_DIMENSIONS}
+        }
@@ -0,0 +1,446 @@
+import json
+import zlib
+import hashlib
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# マルチパートアップロードの最小パートサイズは 5MB（最終パートを除く）
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+
+# アップロード待ちのパート数の上限（メモリ使用量を一定に保つ）
+MAX_PENDING_PARTS = 2
+
+# skip_unchanged の場合に内容の SHA-256 が決まるまで一時ファイルにためる上限（超えたら書き込みながら送信する）
+DEFAULT_SPOOL_LIMIT = 256 * 1024 * 1024
+
+# 内容の SHA-256 を保存するユーザー定義メタデータ（x-amz-meta-content-sha256）
+CONTENT_SHA256_METADATA = 'content-sha256'
+
+# 圧縮版のキーの拡張子（Content-Encoding → 拡張子）
+VARIANT_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# 圧縮器に渡す単位（csv.writer の1行ごとの write をまとめる）
+COMPRESS_CHUNK_SIZE = 64 * 1024
+
+# S3_PREFIX 配下の成果物マニフェスト（行数・サイズ・圧縮版）
+ARTIFACT_MANIFEST_KEY = 'manifest.json'
+
+
+def create_compressor(encoding: str):
+    """Content-Encoding に対応するストリーミング圧縮器（compress / flush を持つ）"""
+    if encoding == 'gzip':
+        # gzip ヘッダーの mtime は 0 固定（同じ内容なら同じバイト列になる）
+        return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if encoding == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    raise ValueError(f"未対応の圧縮形式です: {encoding}")
+
+
+def compress_bytes(data: bytes, encoding: str) -> bytes:
+    compressor = create_compressor(encoding)
+    return compressor.compress(data) + compressor.flush()
+
+
+def content_etag(body: bytes) -> str:
+    """put_object 1回で保存した場合のETag（本文のMD5、SSE-S3 の場合）"""
+    return hashlib.md5(body).hexdigest()
+
+
+def multipart_etag(part_digests: List[bytes]) -> str:
+    """マルチパートアップロードのETag（各パートのMD5を連結したもののMD5-パート数）"""
+    return f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+
+
+def content_sha256(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+def stored_object(s3_client, bucket: str, key: str) -> Optional[Dict]:
+    """既存オブジェクトの HEAD の結果（存在しない・取得できない場合は None）"""
+    try:
+        return s3_client.head_object(Bucket=bucket, Key=key)
+    except Exception:
+        # 未作成（404）や権限エラーは変更ありとして扱い、書き込む
+        return None
+
+
+def stored_etag(s3_client, bucket: str, key: str) -> Optional[str]:
+    """既存オブジェクトのETag（HEAD のみ・引用符なし。存在しない・取得できない場合は None）"""
+    response = stored_object(s3_client, bucket, key)
+    return (response.get('ETag') or '').strip('"') or None if response else None
+
+
+def matches_stored(response: Optional[Dict], sha256: str, etag: str) -> bool:
+    """
+    既存オブジェクト（HEAD の結果）と内容が同じか
+
+    content-sha256 メタデータがあれば SHA-256 で比べる（SSE-KMS でもよい）。
+    メタデータのないオブジェクト（以前の実行や、一時ファイルに収まらず書き込みながら送信したもの）は
+    ETag で比べる。SSE-KMS ではETagが本文のMD5にならないため、その場合は常に変更ありになる。
+    """
+    if response is None:
+        return False
+    stored = (response.get('Metadata') or {}).get(CONTENT_SHA256_METADATA)
+    if stored:
+        return stored == sha256
+    return (response.get('ETag') or '').strip('"') == etag
+
+
+def parse_variant_encodings(value: str) -> List[str]:
+    """COMPRESSED_VARIANTS（例: "gzip,zstd"）を解釈（zstandard がなければ zstd は除外）"""
+    encodings = []
+    for name in (value or '').split(','):
+        name = name.strip().lower()
+        if not name or name in encodings:
+            continue
+        if name not in VARIANT_SUFFIXES:
+            logger.warning(f"未対応の圧縮形式を無視します: {name}")
+            continue
+        if name == 'zstd':
+            try:
+                import zstandard  # noqa: F401
+            except ImportError:
+                logger.warning("zstandard が利用できないため zstd 版の出力をスキップします")
+                continue
+        encodings.append(name)
+    return encodings
+
+
+class S3MultipartWriter:
+    """
+    S3へストリーミング書き込みするファイル風オブジェクト
+
+    write() されたデータをパートサイズごとにバックグラウンドでアップロードする。
+    1パートに満たないまま close() された場合は put_object 1回で保存する。
+    csv.writer の出力先としてそのまま使える（str は UTF-8 でエンコード）。
+
+    skip_unchanged=True の場合は書き込みながら内容の SHA-256 とETag（パートごとのMD5）を計算し、
+    パートを送らずに一時ファイルにためておく。close() で既存オブジェクト（HEAD）と比べて同じ内容なら
+    何も送らずに終わり（unchanged が True になる）、異なれば SHA-256 をメタデータに入れて保存する。
+    spool_limit を超えたら一時ファイルの分から送信を始めて書き込みながら送る（メタデータの SHA-256 は
+    付けられない）。この場合も close() で同じ内容と分かれば完了させずに送信済みのパートを破棄する。
+    """
+
+    def __init__(self, s3_client, bucket: str, key: str, content_type: str = 'text/csv',
+                 content_encoding: str = None, metadata: Dict = None, part_size: int = DEFAULT_PART_SIZE,
+                 skip_unchanged: bool = False, spool_limit: int = DEFAULT_SPOOL_LIMIT):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.content_type = content_type
+        self.extra_args = {'ContentType': content_type, 'Metadata': metadata or {}}
+        if content_encoding:
+            self.extra_args['ContentEncoding'] = content_encoding
+
+        self.buffer = bytearray()
+        self.bytes_written = 0
+        self.upload_id = None
+        self.parts = []
+        self.futures = []
+        self.executor = None
+        self.slots = threading.BoundedSemaphore(MAX_PENDING_PARTS)
+        self.closed = False
+        self.skip_unchanged = skip_unchanged
+        self.part_digests: List[bytes] = []
+        self.sha256 = hashlib.sha256()
+        self.unchanged = False
+        # 保存を完了したか（完了後の abort() では何もしない）
+        self.completed = False
+        # SHA-256 が決まるまでパートをためる一時ファイル（part_size まではメモリ上）
+        self.spool = tempfile.SpooledTemporaryFile(max_size=part_size) if skip_unchanged else None
+        self.spool_limit = spool_limit
+        self.spooled_parts: List[int] = []
+
+    def write(self, data) -> int:
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.buffer += data
+        self.bytes_written += len(data)
+        if self.skip_unchanged:
+            self.sha256.update(data)
+        if len(self.buffer) >= self.part_size:
+            self._flush_part()
+        return len(data)
+
+    def tell(self) -> int:
+        return self.bytes_written
+
+    def flush(self):
+        # パート単位でアップロードするため、ここでは何もしない
+        pass
+
+    def _flush_part(self):
+        body = bytes(self.buffer)
+        self.buffer = bytearray()
+        if self.skip_unchanged:
+            self.part_digests.append(hashlib.md5(body).digest())
+        if self.spool is not None and self.bytes_written <= self.spool_limit:
+            self.spool.write(body)
+            self.spooled_parts.append(len(body))
+            return
+        self._send_spooled_parts()
+        self._submit_part(body)
+
+    def _send_spooled_parts(self):
+        """一時ファイルにためたパートを送信して、以降は書き込みながら送る"""
+        if self.spool is None:
+            return
+        spool, self.spool = self.spool, None
+        try:
+            spool.seek(0)
+            for size in self.spooled_parts:
+                self._submit_part(spool.read(size))
+        finally:
+            spool.close()
+
+    def _submit_part(self, body: bytes):
+        if self.upload_id is None:
+            response = self.s3_client.create_multipart_upload(Bucket=self.bucket, Key=self.key, **self.extra_args)
+            self.upload_id = response['UploadId']
+            self.executor = ThreadPoolExecutor(max_workers=1)
+
+        part_number = len(self.futures) + 1
+        # 送信待ちが上限に達していれば空くまで待つ
+        self.slots.acquire()
+        self.futures.append(self.executor.submit(self._upload_part, part_number, body))
+
+    def _upload_part(self, part_number: int, body: bytes) -> Dict:
+        try:
+            response = self.s3_client.upload_part(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                PartNumber=part_number,
+                Body=body
+            )
+            return {'PartNumber': part_number, 'ETag': response['ETag']}
+        finally:
+            self.slots.release()
+
+    def close(self):
+        """残りのデータを書き込んでアップロードを完了する"""
+        if self.closed:
+            return
+        self.closed = True
+
+        compared = self.spool is not None
+        if compared:
+            # 全体が一時ファイルに収まった（何も送信していない）ので、送る前に既存と比べる
+            try:
+                if self._matches_stored():
+                    self.unchanged = True
+                    self.spool.close()
+                    self.spool = None
+                    return
+                self.extra_args['Metadata'] = dict(self.extra_args['Metadata'],
+                                                   **{CONTENT_SHA256_METADATA: self.sha256.hexdigest()})
+                self._send_spooled_parts()
+            except Exception:
+                self.abort()
+                raise
+
+        if self.upload_id is None:
+            body = bytes(self.buffer)
+            self.buffer = bytearray()
+            self.s3_client.put_object(Bucket=self.bucket, Key=self.key, Body=body, **self.extra_args)
+            self.completed = True
+            return
+
+        try:
+            if self.buffer:
+                self._flush_part()
+            parts = [future.result() for future in self.futures]
+            if self.skip_unchanged and not compared and self._matches_stored():
+                # 同じ内容のため完了させず、既存オブジェクト（ETag・更新日時）をそのまま残す
+                self.unchanged = True
+                self.abort()
+                return
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+            self.completed = True
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self.executor.shutdown(wait=False)
+
+    def _matches_stored(self) -> bool:
+        """書き込んだ内容（未送信の残りを含む）が既存オブジェクトと同じか"""
+        digests = self.part_digests + ([hashlib.md5(self.buffer).digest()] if self.buffer else [])
+        multipart = self.upload_id is not None or bool(self.spooled_parts)
+        etag = multipart_etag(digests) if multipart else content_etag(bytes(self.buffer))
+        return matches_stored(stored_object(self.s3_client, self.bucket, self.key), self.sha256.hexdigest(), etag)
+
+    def abort(self):
+        """アップロードを中止する（アップロード済みのパートも破棄）"""
+        self.closed = True
+        self.buffer = bytearray()
+        if self.spool is not None:
+            self.spool.close()
+            self.spool = None
+        if self.upload_id is None or self.completed:
+            return
+        for future in self.futures:
+            future.cancel()
+        try:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        except Exception as e:
+            logger.error(f"マルチパートアップロード中止エラー: {str(e)}")
+        self.executor.shutdown(wait=False)
+
+
+class CompressedVariantWriter:
+    """
+    無圧縮のオブジェクトと圧縮版（key.gz / key.zst）を同時にストリーミング書き込みする
+
+    圧縮版は Content-Encoding を付けて保存するため、HTTPクライアントは
+    透過的に展開できる。close() は圧縮版を先に完了させ、無圧縮版を最後に完了させる。
+    途中で失敗した場合は、この close() で保存した圧縮版を削除する（無圧縮版は前回のまま残るため、
+    新しい内容の圧縮版だけが公開された状態にしない）。
+    skip_unchanged=True の場合は各オブジェクトが既存と同じ内容なら保存しない
+    （圧縮は決定的なので、無圧縮版が同じなら圧縮版も同じになる）。
+    """
+
+    def __init__(self, s3_client, bucket: str, key: str, encodings: List[str], content_type: str = 'text/csv',
+                 metadata: Dict = None, part_size: int = DEFAULT_PART_SIZE, skip_unchanged: bool = False):
+        self.key = key
+        self.content_type = content_type
+        self.raw = S3MultipartWriter(s3_client, bucket, key, content_type=content_type,
+                                     metadata=metadata, part_size=part_size, skip_unchanged=skip_unchanged)
+        self.variants = [
+            (encoding, create_compressor(encoding),
+             S3MultipartWriter(s3_client, bucket, key + VARIANT_SUFFIXES[encoding], content_type=content_type,
+                               content_encoding=encoding, metadata=metadata, part_size=part_size,
+                               skip_unchanged=skip_unchanged))
+            for encoding in encodings
+        ]
+        self.pending = bytearray()
+
+    @property
+    def unchanged(self) -> bool:
+        """無圧縮版・圧縮版のどれも書き込まなかったか"""
+        return self.raw.unchanged and all(writer.unchanged for _, _, writer in self.variants)
+
+    @property
+    def bytes_written(self) -> int:
+        return self.raw.bytes_written
+
+    def write(self, data) -> int:
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.raw.write(data)
+        self.pending += data
+        if len(self.pending) >= COMPRESS_CHUNK_SIZE:
+            self._compress_pending()
+        return len(data)
+
+    def tell(self) -> int:
+        return self.raw.bytes_written
+
+    def flush(self):
+        pass
+
+    def _compress_pending(self):
+        data = bytes(self.pending)
+        self.pending = bytearray()
+        for _, compressor, writer in self.variants:
+            out = compressor.compress(data)
+            if out:
+                writer.write(out)
+
+    def close(self):
+        try:
+            self._compress_pending()
+            for _, compressor, writer in self.variants:
+                writer.write(compressor.flush())
+                writer.close()
+            self.raw.close()
+        except Exception:
+            self.abort()
+            self._delete_completed_variants()
+            raise
+
+    def _delete_completed_variants(self):
+        for encoding, _, writer in self.variants:
+            if not writer.completed:
+                continue
+            try:
+                writer.s3_client.delete_object(Bucket=writer.bucket, Key=writer.key)
+                logger.warning(f"無圧縮版を保存できなかったため圧縮版を削除しました: {writer.key}")
+            except Exception as e:
+                logger.error(f"圧縮版の削除エラー ({encoding}): {str(e)}")
+
+    def abort(self):
+        for _, _, writer in self.variants:
+            writer.abort()
+        self.raw.abort()
+
+    def variant_sizes(self) -> Dict[str, Dict]:
+        """圧縮形式 → {key, bytes}"""
+        return {encoding: {'key': writer.key, 'bytes': writer.bytes_written}
+                for encoding, _, writer in self.variants}
+
+
+class ArtifactManifest:
+    """
+    公開した成果物の行数・サイズ・圧縮版の一覧（manifest.json）
+
+    実行中は記録をためておき、save() でS3上のマニフェストに反映する。
+    キーは S3_PREFIX からの相対パス。
+    """
+
+    def __init__(self):
+        self.pending: Dict[str, Dict] = {}
+        # 既存と同じ内容のため書き込まなかった成果物（マニフェストの記録は前回のまま）
+        self.unchanged: List[str] = []
+        self.lock = threading.Lock()
+
+    def record(self, name: str, entry: Dict):
+        with self.lock:
+            self.pending[name] = entry
+
+    def record_unchanged(self, name: str):
+        with self.lock:
+            self.unchanged.append(name)
+
+    def take_unchanged(self) -> List[str]:
+        """書き込まなかった成果物の一覧を返してリセット"""
+        with self.lock:
+            unchanged, self.unchanged = self.unchanged, []
+        return sorted(unchanged)
+
+    def save(self, s3_client, bucket: str, key: str) -> int:
+        """記録した成果物をマニフェストに反映して件数を返す"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return 0
+        try:
+            manifest = json.loads(s3_client.get_object(Bucket=bucket, Key=key)['Body'].read().decode('utf-8'))
+        except s3_client.exceptions.NoSuchKey:
+            manifest = {'artifacts': {}}
+        manifest['artifacts'].update(pending)
+        manifest['updated'] = datetime.now().isoformat()
+        s3_client.put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=json.dumps(manifest, ensure_ascii=False, sort_keys=True).encode('utf-8'),
+            ContentType='application/json; charset=utf-8',
+            CacheControl='no-cache'
+        )
+        return len(pending)
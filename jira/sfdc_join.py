@@ -0,0 +1,122 @@
+"""
+SUPPORT課題とSFDC契約データのトークン結合
+
+SFDCのエクスポートCSV（S3に配置）から「トークンキー」→（取引先名, 合計月額）の
+ハッシュ索引を作り、課題の TOKEN で引いて結合する。索引はS3にキャッシュし、
+SFDCファイルの ETag が変わったときだけ作り直す。
+"""
+import csv
+import json
+import codecs
+import logging
+from io import StringIO
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# S3_PREFIX 配下のSFDCエクスポートと索引キャッシュ
+SFDC_EXPORT_KEY = 'sfdc/sfdc_export.csv'
+SFDC_INDEX_KEY = 'state/sfdc_index.json'
+
+# 結合結果（S3_PREFIX 配下）
+JOINED_CSV_KEY = 'joined/SUPPORT_sfdc_joined.csv'
+
+SFDC_TOKEN_HEADER = 'トークンキー'
+SFDC_ACCOUNT_HEADER = '契約管理: エンドユーザ: 取引先名'
+SFDC_AMOUNT_HEADER = '合計月額'
+
+# 結合結果の列（課題側の列 + SFDC側の列）
+JOIN_ISSUE_HEADERS = ['課題タイプ', '課題キー', '要約', '報告者', 'TS', '担当者', 'TOKEN']
+JOIN_HEADERS = JOIN_ISSUE_HEADERS + [SFDC_ACCOUNT_HEADER, SFDC_AMOUNT_HEADER]
+
+# プロセス内の索引キャッシュ（ETag → 索引）
+_index_cache: Dict[str, Dict[str, List[str]]] = {}
+
+
+def decode_sfdc_csv(data: bytes) -> str:
+    """SFDCのレポートCSVをデコード（UTF-8 / BOM付きUTF-8 / Shift_JIS）"""
+    try:
+        return data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return data.decode('cp932')
+
+
+def build_token_index(csv_text: str) -> Dict[str, List[str]]:
+    """トークンキー → [取引先名, 合計月額]（同じトークンが複数行ある場合は後の行を使う）"""
+    reader = csv.reader(StringIO(csv_text))
+    headers = next(reader, [])
+    try:
+        token_index = headers.index(SFDC_TOKEN_HEADER)
+    except ValueError:
+        raise ValueError(f"SFDCエクスポートに「{SFDC_TOKEN_HEADER}」列がありません")
+    account_index = headers.index(SFDC_ACCOUNT_HEADER) if SFDC_ACCOUNT_HEADER in headers else None
+    amount_index = headers.index(SFDC_AMOUNT_HEADER) if SFDC_AMOUNT_HEADER in headers else None
+
+    def cell(row: List[str], index: int) -> str:
+        return row[index] if index is not None and index < len(row) else ''
+
+    index = {}
+    for row in reader:
+        token = cell(row, token_index).strip()
+        if token:
+            index[token] = [cell(row, account_index), cell(row, amount_index)]
+    return index
+
+
+def load_token_index(s3_client, bucket: str, source_key: str, cache_key: str) -> Tuple[Dict[str, List[str]], bool]:
+    """
+    SFDCファイルの ETag を確認し、キャッシュ済みの索引を返す（変わっていれば作り直す）
+
+    戻り値は (索引, 作り直したか)。
+    """
+    etag = s3_client.head_object(Bucket=bucket, Key=source_key)['ETag']
+    if etag in _index_cache:
+        return _index_cache[etag], False
+
+    try:
+        cached = json.loads(s3_client.get_object(Bucket=bucket, Key=cache_key)['Body'].read().decode('utf-8'))
+    except s3_client.exceptions.NoSuchKey:
+        cached = None
+    if cached and cached.get('etag') == etag and cached.get('source_key') == source_key:
+        logger.info(f"SFDC索引キャッシュを使用: {len(cached['tokens'])}件")
+        _index_cache.clear()
+        _index_cache[etag] = cached['tokens']
+        return cached['tokens'], False
+
+    # ETag が変わった（または未作成）ので作り直す
+    data = s3_client.get_object(Bucket=bucket, Key=source_key)['Body'].read()
+    index = build_token_index(decode_sfdc_csv(data))
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=cache_key,
+        Body=json.dumps({'etag': etag, 'source_key': source_key, 'tokens': index}, ensure_ascii=False).encode('utf-8'),
+        ContentType='application/json'
+    )
+    logger.info(f"SFDC索引を作成: {source_key} ({len(index)}件)")
+    _index_cache.clear()
+    _index_cache[etag] = index
+    return index, True
+
+
+def iter_csv_rows(body) -> Iterator[List[str]]:
+    """S3オブジェクトの Body（read() を持つストリーム）をUTF-8のCSVとして1行ずつ読む"""
+    return csv.reader(codecs.getreader('utf-8')(body))
+
+
+def join_issue_rows(rows: Iterable[List[str]], headers: List[str],
+                    index: Dict[str, List[str]]) -> Iterator[Tuple[List[str], bool]]:
+    """
+    課題の行（headers の列順）を TOKEN で索引と結合し、(結合結果の行, 一致したか) を返す
+
+    列の位置はヘッダーから一度だけ求める。
+    """
+    try:
+        positions = [headers.index(header) for header in JOIN_ISSUE_HEADERS]
+    except ValueError as e:
+        raise ValueError(f"課題CSVに結合に必要な列がありません: {str(e)}")
+    token_position = headers.index('TOKEN')
+    missing = ['', '']
+
+    for row in rows:
+        match = index.get(row[token_position].strip())
+        yield [row[i] for i in positions] + (match or missing), match is not None
@@ -1,14 +1,27 @@
 import os
 import csv
+import json
 import requests
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Iterator
 import logging
 from dotenv import load_dotenv
 
+from changelog import (
+    BULK_CHANGELOG_PATH, CHANGELOG_LAYOUT, TIME_IN_STATUS_HEADERS, duration_rows, iter_status_durations
+)
+from csv_columns import MANUAL_LAYOUT, IssueRecord, RowProjector, format_value
+from field_registry import FileFieldStore, RegistrySource, configure_registry
+from jira_governor import JiraRequestError, RequestGovernor
+from jira_search import fetch_all_pages, iter_keyset_pages, split_order_by
+from json_stream import decode_search_page
+
 # .envファイルを読み込み
 load_dotenv()
 
+# 検索レスポンスを読み込む単位
+SEARCH_CHUNK_SIZE = 64 * 1024
+
 class JiraCSVExporter:
     def __init__(self):
         """
@@ -36,6 +49,30 @@ class JiraCSVExporter:
             format='%(asctime)s - %(levelname)s - %(message)s'
         )
         self.logger = logging.getLogger(__name__)
+        
+        # JIRA APIの流量制御（リトライ・レート制限・同時実行数調整）
+        self.governor = RequestGovernor()
+        
+        # フィールド定義（ローカルのキャッシュから読み込み、有効期間切れならバックグラウンドで更新）
+        self.fields = RegistrySource(self.fetch_fields, FileFieldStore())
+        configure_registry(self.fields)
+        
+        # 15列CSVの行射影
+        self.projector = self.fields.build(lambda registry: RowProjector([MANUAL_LAYOUT], registry))
+    
+    def fetch_fields(self) -> List[Dict]:
+        """フィールド定義の一覧（/rest/api/2/field）を取得"""
+        def fetch() -> List[Dict]:
+            response = self.session.get(f"{self.jira_url}/rest/api/2/field")
+            if response.status_code != 200:
+                raise JiraRequestError(
+                    f"✗ フィールド取得エラー: {response.status_code}",
+                    response.status_code,
+                    response.headers.get('Retry-After')
+                )
+            return response.json()
+        
+        return self.governor.call(fetch)
     
     def test_connection(self) -> bool:
         """JIRA接続テスト"""
@@ -67,109 +104,94 @@ class JiraCSVExporter:
             self.logger.error(f"✗ プロジェクト取得エラー: {str(e)}")
             return []
     
-    def search_issues(self, jql: str, max_results: int = 1000) -> List[Dict]:
-        """JQLクエリで課題を検索（サポートプロジェクト用カスタムフィールド対応）"""
-        # サポートプロジェクト専用 - 15フィールドのみ取得
-        fields = [
-            'issuetype',           # 課題タイプ
-            'summary',             # 要約
-            'reporter',            # 報告者
-            'assignee',            # 担当者
-            'priority',            # 優先度
-            'status',              # ステータス
-            'resolution',          # 解決状況
-            'created',             # 作成日
-            'resolutiondate',      # 解決日
-            # サポート専用カスタムフィールド
-            'customfield_10141',   # 機能分類 (Function)
-            'customfield_10140',   # 問合せ分類 (Inquiry)
-            'customfield_10129',   # TS
-            'customfield_10163'    # TOKEN
-        ]
-        
-        all_issues = []
-        start_at = 0
-        
-        while True:
-            params = {
-                'jql': jql,
-                'fields': ','.join(fields),
-                'maxResults': min(100, max_results - len(all_issues)),
-                'startAt': start_at
-            }
-            
-            try:
-                response = self.session.get(
-                    f"{self.jira_url}/rest/api/2/search",
-                    params=params
+    def search_page(self, jql: str, fields: List[str], start_at: int = 0, page_size: int = 100,
+                    projector: RowProjector = None) -> Dict:
+        """検索APIを1回呼び出して結果のJSONを返す（課題は IssueRecord・HTTPエラーは JiraRequestError）"""
+        params = {
+            'jql': jql,
+            'fields': ','.join(fields),
+            'maxResults': page_size,
+            'startAt': start_at
+        }
+        
+        response = self.session.get(
+            f"{self.jira_url}/rest/api/2/search",
+            params=params,
+            stream=True
+        )
+        
+        with response:
+            if response.status_code != 200:
+                raise JiraRequestError(
+                    f"✗ 検索エラー: {response.status_code}",
+                    response.status_code,
+                    response.headers.get('Retry-After')
                 )
-                
-                if response.status_code != 200:
-                    self.logger.error(f"✗ 検索エラー: {response.status_code}")
-                    break
-                
-                data = response.json()
-                issues = data.get('issues', [])
-                
-                if not issues:
-                    break
-                
-                all_issues.extend(issues)
-                self.logger.info(f"取得中: {len(all_issues)} / {data.get('total', 0)}")
-                
-                if len(all_issues) >= data.get('total', 0) or len(all_issues) >= max_results:
-                    break
-                
-                start_at += len(issues)
-                
-            except Exception as e:
-                self.logger.error(f"✗ 検索エラー: {str(e)}")
-                break
+            
+            # 課題は受信しながら1件ずつデコードし、CSVの行に射影した IssueRecord にする
+            return decode_search_page(response.iter_content(SEARCH_CHUNK_SIZE), (projector or self.projector).record)
+    
+    def search_issues(self, jql: str, max_results: int = 1000) -> List[IssueRecord]:
+        """JQLクエリで課題を検索（サポートプロジェクト用カスタムフィールド対応）"""
+        # サポートプロジェクト専用 - CSVの15列に必要なフィールドのみ取得
+        fields = self.projector.fields
+        
+        def fetch_page(start_at: int, page_size: int) -> Dict:
+            return self.search_page(jql, fields, start_at, page_size)
+        
+        # 1ページ目で総件数を確認し、残りページを並列取得（リトライ・流量制御付き）
+        return fetch_all_pages(fetch_page, max_results, governor=self.governor)
+    
+    def iter_issues_by_id(self, jql: str, after_id: int = None,
+                          projector: RowProjector = None) -> Iterator[List[IssueRecord]]:
+        """課題IDのキーセットで検索結果をページ単位で返す（件数上限なし・after_id の次から再開）"""
+        projector = projector or self.projector
+        fields = projector.fields
+        
+        def fetch_page(page_jql: str, page_size: int) -> Dict:
+            return self.search_page(page_jql, fields, 0, page_size, projector)
         
-        return all_issues
+        return iter_keyset_pages(fetch_page, jql, after_id, governor=self.governor)
+    
+    def fetch_changelog_page(self, payload: Dict) -> Dict:
+        """変更履歴の一括取得APIを1回呼び出して結果のJSONを返す（HTTPエラーは JiraRequestError）"""
+        response = self.session.post(f"{self.jira_url}{BULK_CHANGELOG_PATH}", json=payload)
+        if response.status_code != 200:
+            raise JiraRequestError(
+                f"✗ 変更履歴取得エラー: {response.status_code}",
+                response.status_code,
+                response.headers.get('Retry-After')
+            )
+        return response.json()
+    
+    def export_time_in_status(self, jql: str, filename: str) -> int:
+        """
+        課題 × ステータスごとの滞在時間と初回応答をCSVファイルに書き込み、課題数を返す
+        
+        変更履歴は一括取得APIで1000課題ずつまとめて取得し、取得しながら集計して書き込む。
+        """
+        projector = self.fields.build(lambda registry: RowProjector([CHANGELOG_LAYOUT], registry))
+        
+        def status_of(issue: IssueRecord) -> str:
+            return projector.render(CHANGELOG_LAYOUT, issue.row)[0]
+        
+        issue_count = 0
+        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(TIME_IN_STATUS_HEADERS)
+            pages = self.iter_issues_by_id(jql, projector=projector)
+            for summary in iter_status_durations(pages, status_of, self.fetch_changelog_page, self.governor):
+                writer.writerows(duration_rows(summary))
+                issue_count += 1
+        
+        self.logger.info(f"✓ ステータス滞在時間エクスポート完了: {filename} ({issue_count}件)")
+        return issue_count
     
     def format_field_value(self, field_value, field_type: str = 'string') -> str:
         """フィールド値をCSV用にフォーマット（サポートプロジェクト用拡張）"""
-        if field_value is None:
-            return ''
-        
-        if field_type == 'user':
-            return field_value.get('displayName', '') if isinstance(field_value, dict) else str(field_value)
-        elif field_type == 'status':
-            return field_value.get('name', '') if isinstance(field_value, dict) else str(field_value)
-        elif field_type == 'priority':
-            return field_value.get('name', '') if isinstance(field_value, dict) else str(field_value)
-        elif field_type == 'issuetype':
-            return field_value.get('name', '') if isinstance(field_value, dict) else str(field_value)
-        elif field_type == 'resolution':
-            return field_value.get('name', '') if isinstance(field_value, dict) else str(field_value)
-        elif field_type == 'datetime':
-            if field_value:
-                try:
-                    dt = datetime.fromisoformat(field_value.replace('Z', '+00:00'))
-                    return dt.strftime('%Y-%m-%d %H:%M:%S')
-                except:
-                    return str(field_value)
-            return ''
-        else:
-            # カスタムフィールドやその他のフィールド
-            if isinstance(field_value, dict):
-                # オブジェクト型のカスタムフィールド（選択肢など）
-                if 'value' in field_value:
-                    return str(field_value['value'])
-                elif 'name' in field_value:
-                    return str(field_value['name'])
-                elif 'displayName' in field_value:
-                    return str(field_value['displayName'])
-                else:
-                    return str(field_value)
-            elif isinstance(field_value, list):
-                # 配列型のカスタムフィールド（マルチセレクトなど）
-                return ', '.join([str(item.get('value', item.get('name', item))) if isinstance(item, dict) else str(item) for item in field_value])
-            else:
-                return str(field_value)
+        return format_value(field_value, field_type)
     
-    def export_to_csv(self, issues: List[Dict], filename: str = None) -> str:
+    def export_to_csv(self, issues: List[IssueRecord], filename: str = None) -> str:
         """課題をCSVファイルにエクスポート（サポートプロジェクト専用 16列）"""
         if filename is None:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -179,53 +201,14 @@ class JiraCSVExporter:
             self.logger.warning("エクスポートする課題がありません")
             return filename
         
-        # サポートプロジェクト専用ヘッダー（15列）- 指定された順番
-        headers = [
-            '課題タイプ',           # 1
-            '課題キー',             # 2
-            '課題ID',              # 3
-            '要約',                # 4
-            '機能分類 (Function)',  # 5
-            '問合せ分類 (Inquiry)', # 6
-            '報告者',              # 7
-            'TS',                 # 8
-            '担当者',              # 9
-            '優先度',              # 10
-            'ステータス',           # 11
-            '解決状況',            # 12
-            '作成日',              # 13
-            '解決日',              # 14
-            'TOKEN'               # 15
-        ]
-        
         try:
             with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
                 writer = csv.writer(csvfile)
-                writer.writerow(headers)
+                writer.writerow(MANUAL_LAYOUT.headers)
                 
+                # サポートプロジェクト専用データ行（15列）- 指定された順番
                 for issue in issues:
-                    fields = issue.get('fields', {})
-                    
-                    # サポートプロジェクト専用データ行（15列）- 指定された順番
-                    row = [
-                        self.format_field_value(fields.get('issuetype'), 'issuetype'),     # 1. 課題タイプ
-                        issue.get('key', ''),                                              # 2. 課題キー
-                        issue.get('id', ''),                                               # 3. 課題ID
-                        fields.get('summary', ''),                                         # 4. 要約
-                        self.format_field_value(fields.get('customfield_10141')),         # 5. 機能分類 (Function)
-                        self.format_field_value(fields.get('customfield_10140')),         # 6. 問合せ分類 (Inquiry)
-                        self.format_field_value(fields.get('reporter'), 'user'),          # 7. 報告者
-                        self.format_field_value(fields.get('customfield_10129'), 'user'), # 8. TS（ユーザー型）
-                        self.format_field_value(fields.get('assignee'), 'user'),          # 9. 担当者
-                        self.format_field_value(fields.get('priority'), 'priority'),      # 10. 優先度
-                        self.format_field_value(fields.get('status'), 'status'),          # 11. ステータス
-                        self.format_field_value(fields.get('resolution'), 'resolution'),  # 12. 解決状況
-                        self.format_field_value(fields.get('created'), 'datetime'),       # 13. 作成日
-                        self.format_field_value(fields.get('resolutiondate'), 'datetime'), # 14. 解決日
-                        self.format_field_value(fields.get('customfield_10163'))          # 15. TOKEN
-                    ]
-                    
-                    writer.writerow(row)
+                    writer.writerow(self.projector.render(MANUAL_LAYOUT, issue.row))
             
             self.logger.info(f"✓ CSVエクスポート完了: {filename} ({len(issues)}件, 15列)")
             return filename
@@ -233,6 +216,78 @@ class JiraCSVExporter:
         except Exception as e:
             self.logger.error(f"✗ CSVエクスポートエラー: {str(e)}")
             raise
+    
+    def load_checkpoint(self, filename: str, jql: str) -> Dict:
+        """同じJQLで中断したエクスポートのチェックポイント（なければ None）"""
+        try:
+            with open(checkpoint_path(filename), encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if checkpoint.get('jql') != jql or not os.path.exists(filename):
+            return None
+        return checkpoint
+    
+    def export_all_to_csv(self, jql: str, filename: str, checkpoint: Dict = None) -> int:
+        """
+        課題IDのキーセットで全件を取得しながらCSVファイルへ書き込み、件数を返す（件数上限なし）
+        
+        ページを書き込むたびに最後の課題ID・件数・ファイルサイズをチェックポイント
+        （<ファイル名>.checkpoint.json）に保存する。checkpoint を渡すと、ファイルを
+        その時点のサイズに切り詰めて続きの課題IDから再開する。完了したらチェックポイントを削除する。
+        """
+        if checkpoint:
+            after_id = checkpoint['last_id']
+            issue_count = checkpoint['issue_count']
+            csvfile = open(filename, 'r+', newline='', encoding='utf-8')
+            csvfile.seek(checkpoint['size'])
+            csvfile.truncate()
+            self.logger.info(f"✓ 再開: 課題ID {after_id} の次から（{issue_count}件 書き込み済み）")
+        else:
+            after_id = None
+            issue_count = 0
+            csvfile = open(filename, 'w', newline='', encoding='utf-8')
+        
+        try:
+            with csvfile:
+                writer = csv.writer(csvfile)
+                if not checkpoint:
+                    writer.writerow(MANUAL_LAYOUT.headers)
+                
+                for issues in self.iter_issues_by_id(jql, after_id):
+                    for issue in issues:
+                        writer.writerow(self.projector.render(MANUAL_LAYOUT, issue.row))
+                    issue_count += len(issues)
+                    
+                    # 書き込んだ位置までを確定させてからチェックポイントを更新
+                    csvfile.flush()
+                    save_checkpoint(filename, {
+                        'jql': jql,
+                        'last_id': int(issues[-1].id),
+                        'issue_count': issue_count,
+                        'size': csvfile.tell(),
+                        'updated': datetime.now().isoformat()
+                    })
+        except Exception as e:
+            self.logger.error(f"✗ CSVエクスポートエラー: {str(e)}（同じファイル名で再実行すると続きから再開できます）")
+            raise
+        
+        if os.path.exists(checkpoint_path(filename)):
+            os.remove(checkpoint_path(filename))
+        self.logger.info(f"✓ CSVエクスポート完了: {filename} ({issue_count}件, 15列)")
+        return issue_count
+
+
+def checkpoint_path(filename: str) -> str:
+    return f"{filename}.checkpoint.json"
+
+
+def save_checkpoint(filename: str, checkpoint: Dict):
+    """チェックポイントを一時ファイル経由で置き換える（書き込み途中で中断しても壊れない）"""
+    path = checkpoint_path(filename)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
 
 
 def main():
@@ -240,6 +295,7 @@ def main():
     print("=== サポートプロジェクト専用 JIRA CSV Export Tool ===")
     print()
     
+    exporter = None
     try:
         # エクスポーター初期化
         exporter = JiraCSVExporter()
@@ -286,18 +342,6 @@ def main():
             print("無効な選択です。サポートプロジェクトの全課題を取得します。")
             jql = "project = SUPPORT"
         
-        print("\n検索中...")
-        
-        # 課題検索（サポートプロジェクトの場合は制限を緩和）
-        max_results = 5000  # サポートプロジェクトの全データを取得
-        issues = exporter.search_issues(jql, max_results=max_results)
-        
-        if not issues:
-            print("該当する課題が見つかりませんでした。")
-            return
-        
-        print(f"\n{len(issues)}件の課題が見つかりました。")
-        
         # ファイル名入力
         default_filename = f"SUPPORT_project_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
         filename = input(f"ファイル名を入力してください (デフォルト: {default_filename}): ").strip()
@@ -305,20 +349,62 @@ def main():
         if not filename:
             filename = default_filename
         
-        # CSVエクスポート
-        print("\nエクスポート中...")
-        result_filename = exporter.export_to_csv(issues, filename)
+        _, order_by = split_order_by(jql)
+        if order_by:
+            # 並び順の指定があるJQLは startAt のページングで取得（件数上限なし）
+            print("\n検索中...")
+            issues = exporter.search_issues(jql, max_results=None)
+            
+            if not issues:
+                print("該当する課題が見つかりませんでした。")
+                return
+            
+            print(f"\n{len(issues)}件の課題が見つかりました。")
+            
+            # CSVエクスポート
+            print("\nエクスポート中...")
+            result_filename = exporter.export_to_csv(issues, filename)
+            issue_count = len(issues)
+        else:
+            # 課題ID順のキーセットページングで取得しながら書き込む（件数上限なし・中断後は再開可能）
+            checkpoint = exporter.load_checkpoint(filename, jql)
+            if checkpoint:
+                answer = input(f"前回中断したエクスポートがあります（{checkpoint['issue_count']}件）。"
+                               f"続きから再開しますか (Y/n): ").strip().lower()
+                if answer == 'n':
+                    checkpoint = None
+            
+            print("\n検索・エクスポート中...")
+            issue_count = exporter.export_all_to_csv(jql, filename, checkpoint)
+            result_filename = filename
+            
+            if not issue_count:
+                os.remove(filename)
+                print("該当する課題が見つかりませんでした。")
+                return
         
         print(f"\n✓ エクスポート完了!")
         print(f"  ファイル: {result_filename}")
-        print(f"  件数: {len(issues)}件")
+        print(f"  件数: {issue_count}件")
         print(f"  列数: 15列（サポートプロジェクト専用フォーマット）")
         print(f"  実行時刻: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         
+        # ステータス滞在時間・初回応答（変更履歴の一括取得、別ファイル）
+        answer = input("\nステータス滞在時間・初回応答も出力しますか (y/N): ").strip().lower()
+        if answer == 'y':
+            status_filename = f"{os.path.splitext(result_filename)[0]}_time_in_status.csv"
+            print("\n変更履歴を取得中...")
+            exporter.export_time_in_status(jql, status_filename)
+            print(f"  ファイル: {status_filename}")
+        
     except KeyboardInterrupt:
         print("\n処理を中断しました。")
     except Exception as e:
         print(f"\nエラーが発生しました: {str(e)}")
+    finally:
+        # フィールド定義キャッシュの更新中なら保存まで待つ
+        if exporter:
+            exporter.fields.wait()
 
 
 if __name__ == "__main__":
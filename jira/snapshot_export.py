@@ -0,0 +1,179 @@
+"""
+累積スナップショット（mode=snapshot）: 更新された課題を upsert して全件CSVと集計テーブルを公開
+"""
+import csv
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Dict
+
+from csv_columns import MANUAL_LAYOUT
+from incremental_export import advance_watermark, build_incremental_jql
+from join_export import run_join_export
+from jira_exporter import LambdaJiraS3Exporter
+from rollups import ROLLUP_DIMENSIONS, RollupTables
+from sfdc_join import SFDC_EXPORT_KEY
+from snapshot_store import SNAPSHOT_CSV_KEY, SNAPSHOT_DB_KEY, SnapshotStore
+
+logger = logging.getLogger(__name__)
+
+
+def run_snapshot_export(exporter: LambdaJiraS3Exporter, event: Dict) -> Dict:
+    """
+    累積スナップショット: 前回以降に更新された課題だけを upsert し、全件CSVを出力
+    
+    スナップショット（state/snapshot.sqlite3）は課題IDごとに手動エクスポートと同じ15列の行を持つ。
+    変更された課題の変更前後の行で集計テーブル（週別・TS別など）も差分更新する。
+    初回（または rebuild=true）は全課題を取得して作成し、見つからなかった課題（削除・他プロジェクトへの
+    移動）はスナップショットから除く。更新日時のウォーターマークはデータベース内に保存し、
+    全件CSVの公開に成功した場合のみデータベースごとS3へ書き戻す。
+    変更も削除もなければ全件CSV・データベース・集計テーブルは書き出さない（ウォーターマークも進めないため、
+    次回は同じ課題を取得し直すが、行が同じなので変更にはならない）。
+    """
+    now = datetime.now()
+    started = datetime.now(timezone.utc)
+    store = SnapshotStore.load(exporter.s3_client, exporter.s3_bucket, f"{exporter.s3_prefix}{SNAPSHOT_DB_KEY}")
+    try:
+        watermark = store.get_meta('updated')
+        rebuild = bool(event.get('rebuild') or not watermark)
+        # 全件取得・差分取得とも課題IDのキーセットでページング（深いオフセットを使わず、
+        # 実行中の更新で順序がずれても抜けが出ない）
+        if rebuild:
+            jql = 'project = "SUPPORT" ORDER BY id ASC'
+        else:
+            jql = build_incremental_jql({'updated': watermark})
+        logger.info(f"スナップショット更新開始 - JQLクエリ: {jql}")
+        
+        # 集計テーブル（未作成・形式が古ければ現在のスナップショットから一度だけ作る）
+        rollup_state = store.get_meta('rollups')
+        rollups = RollupTables.from_json(MANUAL_LAYOUT.headers, rollup_state) if rollup_state else None
+        if rollups is None:
+            rollup_state = None
+            rollups = RollupTables(MANUAL_LAYOUT.headers)
+            for row in store.iter_rows():
+                rollups.apply(None, row)
+        
+        projector = exporter.build_projector([MANUAL_LAYOUT])
+        fetched = 0
+        changed = 0
+        latest_updated = watermark
+        seen_ids = set()
+        for issues in exporter.iter_issue_pages_by_id(jql, projector=projector):
+            records = [(int(issue.id), issue.key, issue.updated, projector.render(MANUAL_LAYOUT, issue.row))
+                       for issue in issues]
+            latest_updated = advance_watermark(latest_updated, (issue.updated for issue in issues), started)
+            with exporter.metrics.stage('snapshot_upsert'):
+                previous_rows = store.upsert(records)
+            # 変更された課題だけを集計に反映（変更前の行を減算して変更後の行を加算）
+            current_rows = {issue_id: row for issue_id, _, _, row in records}
+            for issue_id, previous in previous_rows.items():
+                rollups.apply(previous, current_rows[issue_id])
+            changed += len(previous_rows)
+            fetched += len(issues)
+            if rebuild:
+                seen_ids.update(current_rows)
+        
+        if rebuild:
+            # 全件を取得し直したときに見つからなかった課題（削除・移動）を除き、集計からも減算
+            removed_rows = store.remove_missing(seen_ids)
+            for previous in removed_rows.values():
+                rollups.apply(previous, None)
+            changed += len(removed_rows)
+        
+        total = store.count()
+        logger.info(f"スナップショット: 取得 {fetched}件 / 変更 {changed}件 / 全 {total}件")
+        
+        snapshot_key = f"{exporter.s3_prefix}{SNAPSHOT_CSV_KEY}"
+        unchanged = not changed and bool(watermark and rollup_state)
+        if unchanged:
+            # 前回公開した全件CSV・保存したデータベースのままでよい
+            exporter.record_unchanged(snapshot_key, 'スナップショット')
+            snapshot_url = exporter.object_url(snapshot_key)
+        else:
+            snapshot_url = publish_snapshot(exporter, store, snapshot_key, total, now.isoformat())
+            if latest_updated:
+                store.set_meta('updated', latest_updated)
+            store.set_meta('rollups', rollups.to_json())
+            store.save(exporter.s3_client, exporter.s3_bucket, f"{exporter.s3_prefix}{SNAPSHOT_DB_KEY}",
+                       {'issue_count': str(total), 'updated': latest_updated or ''})
+    finally:
+        store.close()
+    
+    if unchanged:
+        rollup_url = exporter.object_url(f"{exporter.s3_prefix}rollups/rollups.json")
+    else:
+        rollup_url = publish_rollups(exporter, rollups, now.isoformat())
+    
+    result = {
+        'message': f'スナップショットを更新しました（変更 {changed}件 / 全 {total}件）',
+        'mode': 'snapshot',
+        'fetched_count': fetched,
+        'changed_count': changed,
+        'issue_count': total,
+        'watermark': latest_updated,
+        'snapshot_csv_url': snapshot_url,
+        'rollups_url': rollup_url,
+        'jql': jql,
+        'timestamp': now.isoformat()
+    }
+    
+    # SFDCエクスポートが配置されていれば続けて結合結果も更新
+    # （スナップショットが変わらなくてもSFDC側が変わっていることがある。結合に失敗しても
+    # スナップショットの更新は確定済み）
+    if exporter.object_exists(f"{exporter.s3_prefix}{SFDC_EXPORT_KEY}"):
+        try:
+            result['join'] = run_join_export(exporter)
+        except Exception as e:
+            logger.error(f"SFDC結合エラー: {str(e)}")
+            result['join'] = {'error': str(e)}
+    return result
+
+
+def publish_snapshot(exporter: LambdaJiraS3Exporter, store: SnapshotStore, key: str, total: int,
+                     updated: str) -> str:
+    """主キー順に読み出して全件CSVを出力（既存と同じ内容なら書き込まない）"""
+    writer = exporter.open_s3_writer(key, {
+        'last_updated': updated,
+        'issue_count': str(total),
+        'data_type': 'snapshot'
+    }, variants=True)
+    if writer is None:
+        raise Exception("S3設定が不完全なためスナップショットを出力できません")
+    try:
+        snapshot_csv = csv.writer(writer)
+        snapshot_csv.writerow(MANUAL_LAYOUT.headers)
+        with exporter.metrics.stage('encode'):
+            for row in store.iter_rows():
+                snapshot_csv.writerow(row)
+    except Exception:
+        writer.abort()
+        raise
+    snapshot_url = exporter.close_s3_writer(writer, 'スナップショット', total)
+    if not snapshot_url:
+        raise Exception("スナップショットCSVのアップロードに失敗したためデータベースを更新しません")
+    return snapshot_url
+
+
+def publish_rollups(exporter: LambdaJiraS3Exporter, rollups: RollupTables, updated: str) -> str:
+    """集計テーブルを rollups/ 配下に公開（全集計のJSONと集計ごとのCSV、失敗時は空文字）"""
+    try:
+        for name, _ in ROLLUP_DIMENSIONS:
+            exporter.s3_client.put_object(
+                Bucket=exporter.s3_bucket,
+                Key=f"{exporter.s3_prefix}rollups/by_{name}.csv",
+                Body=rollups.to_csv(name).encode('utf-8'),
+                ContentType='text/csv; charset=utf-8'
+            )
+        key = f"{exporter.s3_prefix}rollups/rollups.json"
+        exporter.s3_client.put_object(
+            Bucket=exporter.s3_bucket,
+            Key=key,
+            Body=json.dumps(rollups.summary(updated), ensure_ascii=False).encode('utf-8'),
+            ContentType='application/json; charset=utf-8'
+        )
+        url = f"https://{exporter.s3_bucket}.s3.amazonaws.com/{key}"
+        logger.info(f"集計テーブル公開: {url}")
+        return url
+    except Exception as e:
+        logger.error(f"集計テーブルS3アップロードエラー: {str(e)}")
+        return ""
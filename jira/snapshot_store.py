@@ -0,0 +1,178 @@
+"""
+課題IDをキーとする累積スナップショット（S3上のSQLiteデータベース）
+
+各実行では取得した課題だけを upsert し、全件CSVは課題キー順（プロジェクト・番号）の
+インデックスを先頭から読むだけで出力する。課題の移動でキーが変わっても課題IDは変わらないため、
+同じ行の課題キーを更新する。データベースは Lambda の /tmp に
+ダウンロードして更新し、最後にS3へ書き戻す。
+"""
+import os
+import json
+import sqlite3
+import logging
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# S3_PREFIX 配下のスナップショットデータベース
+SNAPSHOT_DB_KEY = 'state/snapshot.sqlite3'
+
+# 累積スナップショットの全件CSV（S3_PREFIX 配下）
+SNAPSHOT_CSV_KEY = 'snapshot/SUPPORT_snapshot.csv'
+
+# 既存行をまとめて引くときの1クエリあたりのキー数（SQLiteの変数上限 999 未満）
+LOOKUP_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+    id INTEGER PRIMARY KEY,
+    issue_key TEXT NOT NULL,
+    project TEXT NOT NULL,
+    num INTEGER NOT NULL,
+    updated TEXT,
+    row TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS issues_key_order ON issues (project, num);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def split_issue_key(issue_key: str) -> Tuple[str, int]:
+    """課題キー（例: SUPPORT-123）をプロジェクトと番号に分ける（番号順に並べるため）"""
+    project, _, number = issue_key.rpartition('-')
+    return project, int(number)
+
+
+class SnapshotStore:
+    """課題ID → 課題キー・最新の行 を保持するスナップショット"""
+
+    def __init__(self, path: str):
+        self.path = path
+        # 書き込みはまとめてコミットする（ジャーナルは /tmp 上なので同期不要）
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA synchronous = OFF')
+        self._migrate()
+        self.conn.executescript(SCHEMA)
+
+    def _migrate(self):
+        """課題キーを主キーとしていた旧形式なら課題を破棄し、次の実行で作り直させる"""
+        columns = [column[1] for column in self.conn.execute('PRAGMA table_info(issues)')]
+        if not columns or 'id' in columns:
+            return
+        logger.warning("スナップショットが旧形式（課題キーが主キー）のため作り直します")
+        self.conn.executescript("""
+            DROP INDEX IF EXISTS issues_issue_key;
+            DROP TABLE issues;
+            DELETE FROM meta WHERE name IN ('updated', 'rollups');
+        """)
+
+    @classmethod
+    def load(cls, s3_client, bucket: str, key: str) -> 'SnapshotStore':
+        """S3からデータベースをダウンロード（未作成なら空のスナップショット）"""
+        fd, path = tempfile.mkstemp(suffix='.sqlite3')
+        with os.fdopen(fd, 'wb') as f:
+            try:
+                body = s3_client.get_object(Bucket=bucket, Key=key)['Body']
+                while True:
+                    chunk = body.read(8 * 1024 * 1024)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                logger.info(f"スナップショット読み込み: {key}")
+            except s3_client.exceptions.NoSuchKey:
+                logger.info(f"スナップショットが未作成のため新規作成します: {key}")
+        return cls(path)
+
+    def save(self, s3_client, bucket: str, key: str, metadata: Dict = None):
+        """データベースをS3へ書き戻す"""
+        self.conn.commit()
+        with open(self.path, 'rb') as f:
+            s3_client.put_object(
+                Bucket=bucket,
+                Key=key,
+                Body=f,
+                ContentType='application/vnd.sqlite3',
+                Metadata=metadata or {}
+            )
+        logger.info(f"スナップショット保存: {key} ({os.path.getsize(self.path)} bytes)")
+
+    def close(self):
+        self.conn.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def get_meta(self, name: str) -> str:
+        row = self.conn.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, name: str, value: str):
+        self.conn.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (name, value))
+
+    def count(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM issues').fetchone()[0]
+
+    def get_rows(self, issue_ids: List[int]) -> Dict[int, List[str]]:
+        """課題IDごとの現在の行（スナップショットにない課題は含まない）"""
+        rows = {}
+        for i in range(0, len(issue_ids), LOOKUP_BATCH):
+            batch = issue_ids[i:i + LOOKUP_BATCH]
+            placeholders = ','.join('?' * len(batch))
+            for issue_id, row in self.conn.execute(
+                    f'SELECT id, row FROM issues WHERE id IN ({placeholders})', batch):
+                rows[issue_id] = json.loads(row)
+        return rows
+
+    def upsert(self, records: Iterable[Tuple[int, str, str, List[str]]]) -> Dict[int, List[str]]:
+        """
+        (課題ID, 課題キー, 更新日時, 行) をまとめて追加・更新
+
+        変更前の行を {課題ID: 行} で返す（新規の課題は None、内容が同じ課題は含まない）。
+        """
+        # 同じ課題が複数回含まれる場合は最後のものを使う
+        records = list({int(record[0]): record for record in records}.values())
+        current = self.get_rows([int(issue_id) for issue_id, _, _, _ in records])
+        changed = {}
+        params = []
+        for issue_id, issue_key, updated, row in records:
+            issue_id = int(issue_id)
+            previous = current.get(issue_id)
+            if previous == row:
+                continue
+            changed[issue_id] = previous
+            project, number = split_issue_key(issue_key)
+            params.append((issue_id, issue_key, project, number, updated, json.dumps(row, ensure_ascii=False)))
+
+        # 主キー（課題ID）で置き換え（古いSQLiteでも使える構文）
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO issues (id, issue_key, project, num, updated, row) VALUES (?, ?, ?, ?, ?, ?)',
+            params
+        )
+        return changed
+
+    def remove_missing(self, seen_ids: Iterable[int]) -> Dict[int, List[str]]:
+        """
+        seen_ids にない課題（削除・他プロジェクトへの移動）を削除
+
+        全件を取得し直した後に呼び出す。削除した行を {課題ID: 行} で返す。
+        """
+        self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS seen (id INTEGER PRIMARY KEY)')
+        self.conn.execute('DELETE FROM seen')
+        self.conn.executemany('INSERT OR IGNORE INTO seen (id) VALUES (?)', ((int(i),) for i in seen_ids))
+        removed = {
+            issue_id: json.loads(row)
+            for issue_id, row in self.conn.execute('SELECT id, row FROM issues WHERE id NOT IN (SELECT id FROM seen)')
+        }
+        self.conn.execute('DELETE FROM issues WHERE id NOT IN (SELECT id FROM seen)')
+        self.conn.execute('DROP TABLE seen')
+        if removed:
+            logger.info(f"スナップショットから削除: {len(removed)}件")
+        return removed
+
+    def iter_rows(self) -> Iterator[List[str]]:
+        """全課題の行を課題キー順（プロジェクト・番号）に返す"""
+        for (row,) in self.conn.execute('SELECT row FROM issues ORDER BY project, num, id'):
+            yield json.loads(row)
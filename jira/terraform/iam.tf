@@ -40,12 +40,21 @@ resource "aws_iam_policy" "lambda_policy" {
         Action = [
           "s3:GetObject",
           "s3:PutObject",
-          "s3:PutObjectAcl"
+          "s3:PutObjectAcl",
+          "s3:DeleteObject",
+          "s3:ListBucket",
+          "s3:AbortMultipartUpload"
         ]
         Resource = [
           "${aws_s3_bucket.jira_exports.arn}",
           "${aws_s3_bucket.jira_exports.arn}/*"
         ]
+      },
+      {
+        # コーディネーターが自身をワーカーとして呼び出す
+        Effect   = "Allow"
+        Action   = "lambda:InvokeFunction"
+        Resource = "arn:aws:lambda:${var.aws_region}:*:function:${var.lambda_function_name}"
       }
     ]
   })
@@ -63,4 +72,26 @@ resource "aws_iam_role_policy_attachment" "lambda_policy_attachment" {
 resource "aws_iam_role_policy_attachment" "lambda_basic_execution" {
   role       = aws_iam_role.lambda_execution_role.name
   policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
-}
\ No newline at end of file
+}
+
+# Read-only IAM user for join_sfdc.gs: it signs its S3 requests (SigV4) to fetch the private joined CSV
+resource "aws_iam_user" "joined_csv_reader" {
+  name = "${var.lambda_function_name}-joined-reader"
+  tags = var.tags
+}
+
+resource "aws_iam_user_policy" "joined_csv_reader" {
+  name = "${var.lambda_function_name}-joined-read"
+  user = aws_iam_user.joined_csv_reader.name
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = "s3:GetObject"
+        Resource = "${aws_s3_bucket.jira_exports.arn}/${var.s3_prefix}joined/*"
+      }
+    ]
+  })
+}
@@ -8,6 +8,136 @@ data "archive_file" "lambda_zip" {
     filename = "lambda_jira_exporter.py"
   }
   
+  source {
+    content  = file("${path.module}/../jira_exporter.py")
+    filename = "jira_exporter.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../incremental_export.py")
+    filename = "incremental_export.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../snapshot_export.py")
+    filename = "snapshot_export.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../join_export.py")
+    filename = "join_export.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../backfill_export.py")
+    filename = "backfill_export.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../changelog_export.py")
+    filename = "changelog_export.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../jobs_export.py")
+    filename = "jobs_export.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../fanout_export.py")
+    filename = "fanout_export.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../jira_search.py")
+    filename = "jira_search.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../jira_governor.py")
+    filename = "jira_governor.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../jira_http.py")
+    filename = "jira_http.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../json_stream.py")
+    filename = "json_stream.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../export_metrics.py")
+    filename = "export_metrics.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../handler_profiler.py")
+    filename = "handler_profiler.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../s3_stream.py")
+    filename = "s3_stream.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../csv_columns.py")
+    filename = "csv_columns.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../field_registry.py")
+    filename = "field_registry.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../parquet_writer.py")
+    filename = "parquet_writer.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../fanout.py")
+    filename = "fanout.py"
+  }
+
+  source {
+    content  = file("${path.module}/../export_jobs.py")
+    filename = "export_jobs.py"
+  }
+
+  source {
+    content  = file("${path.module}/../changelog.py")
+    filename = "changelog.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../snapshot_store.py")
+    filename = "snapshot_store.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../delivery_index.py")
+    filename = "delivery_index.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../sfdc_join.py")
+    filename = "sfdc_join.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../rollups.py")
+    filename = "rollups.py"
+  }
+  
+  source {
+    content  = file("${path.module}/../custom_fields.json")
+    filename = "custom_fields.json"
+  }
+  
   source {
     content  = file("${path.module}/../requirements.txt")
     filename = "requirements.txt"
@@ -21,10 +151,13 @@ resource "aws_lambda_function" "jira_exporter" {
   role            = aws_iam_role.lambda_execution_role.arn
   handler         = "lambda_jira_exporter.lambda_handler"
   runtime         = "python3.9"
-  timeout         = 300
-  memory_size     = 512
+  timeout         = var.lambda_timeout
+  memory_size     = 256  # CSVはS3へストリーミング出力するため件数に依存しない
   
   source_code_hash = data.archive_file.lambda_zip.output_base64sha256
+  
+  # Parquet出力を有効にする場合は pyarrow を含むレイヤーを指定
+  layers = var.lambda_layers
 
   environment {
     variables = {
@@ -33,12 +166,36 @@ resource "aws_lambda_function" "jira_exporter" {
       JIRA_API_TOKEN = var.jira_api_token
       S3_BUCKET      = aws_s3_bucket.jira_exports.bucket
       S3_PREFIX      = var.s3_prefix
+      JIRA_SEARCH_CONCURRENCY = var.jira_search_concurrency
+      JIRA_MAX_RPS            = var.jira_max_rps
+      JIRA_HTTP_TIMEOUT       = var.jira_http_timeout
+      EXPORT_MODE             = var.export_mode
+      BACKFILL_CONCURRENCY    = var.backfill_concurrency
+      EXPORT_JOBS             = var.export_jobs
+      EXPORT_JOB_CONCURRENCY  = var.export_job_concurrency
+      FANOUT_WORKERS          = var.fanout_workers
+      FANOUT_SHARD_SIZE       = var.fanout_shard_size
+      FANOUT_SHARD_TIMEOUT    = var.fanout_shard_timeout
+      FANOUT_WATCH_INTERVAL   = var.fanout_watch_interval
+      PARQUET_EXPORT          = var.parquet_export ? "true" : "false"
+      DELTA_EXPORT            = var.delta_export ? "true" : "false"
+      COMPRESSED_VARIANTS     = var.compressed_variants
+      SKIP_UNCHANGED_UPLOADS  = var.skip_unchanged_uploads ? "true" : "false"
+      METRICS_NAMESPACE       = var.metrics_namespace
+      JIRA_FIELDS_TTL         = var.jira_fields_ttl
     }
   }
 
   tags = var.tags
 }
 
+# Coordinator workers and merges are invoked asynchronously; failed shards are recorded
+# in markers and re-run through {"mode": "merge", "retry_failed": true}, so Lambda must not retry them
+resource "aws_lambda_function_event_invoke_config" "jira_exporter" {
+  function_name          = aws_lambda_function.jira_exporter.function_name
+  maximum_retry_attempts = 0
+}
+
 # CloudWatch Log Group for Lambda
 resource "aws_cloudwatch_log_group" "lambda_log_group" {
   name              = "/aws/lambda/${var.lambda_function_name}"
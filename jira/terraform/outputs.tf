@@ -38,3 +38,7 @@ output "s3_daily_prefix" {
   value       = "${var.s3_prefix}daily/"
 }
 
+output "joined_csv_reader_user" {
+  description = "IAM user whose access key join_sfdc.gs uses to fetch the private joined CSV"
+  value       = aws_iam_user.joined_csv_reader.name
+}
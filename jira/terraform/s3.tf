@@ -33,7 +33,7 @@ resource "aws_s3_bucket_public_access_block" "jira_exports_pab" {
   restrict_public_buckets = false
 }
 
-# S3 Bucket policy for public read access to latest.csv
+# S3 Bucket policy for public read access to latest.csv (and its compressed variants), the delta files and the rollups
 resource "aws_s3_bucket_policy" "jira_exports_policy" {
   bucket = aws_s3_bucket.jira_exports.id
   depends_on = [aws_s3_bucket_public_access_block.jira_exports_pab]
@@ -46,7 +46,13 @@ resource "aws_s3_bucket_policy" "jira_exports_policy" {
         Effect    = "Allow"
         Principal = "*"
         Action    = "s3:GetObject"
-        Resource  = "${aws_s3_bucket.jira_exports.arn}/${var.s3_prefix}latest.csv"
+        # joined/*（取引先名・月額を含む）は公開せず、joined_csv_reader の署名付きリクエストでのみ読む
+        Resource  = [
+          "${aws_s3_bucket.jira_exports.arn}/${var.s3_prefix}latest.csv",
+          "${aws_s3_bucket.jira_exports.arn}/${var.s3_prefix}latest.csv.*",
+          "${aws_s3_bucket.jira_exports.arn}/${var.s3_prefix}deltas/*",
+          "${aws_s3_bucket.jira_exports.arn}/${var.s3_prefix}rollups/*"
+        ]
       }
     ]
   })
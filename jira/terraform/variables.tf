@@ -40,6 +40,120 @@ variable "jira_api_token" {
   sensitive   = true
 }
 
+variable "jira_search_concurrency" {
+  description = "Number of JIRA search pages fetched in parallel"
+  type        = number
+  default     = 4
+}
+
+variable "jira_max_rps" {
+  description = "Maximum JIRA API requests per second (token bucket)"
+  type        = number
+  default     = 10
+}
+
+variable "jira_http_timeout" {
+  description = "Timeout in seconds for each JIRA API request"
+  type        = number
+  default     = 30
+}
+
+variable "export_mode" {
+  description = "Default export mode: daily (issues created yesterday), incremental (issues updated since the last watermark), snapshot (full-state CSV and rollups) or jobs (every job in export_jobs)"
+  type        = string
+  default     = "daily"
+}
+
+variable "backfill_concurrency" {
+  description = "Number of days exported in parallel by backfill mode (all days share the JIRA request budget)"
+  type        = number
+  default     = 4
+}
+
+variable "export_jobs" {
+  description = "JSON array of export jobs run by jobs mode when the event has no jobs (name, jql, columns, prefix, filename)"
+  type        = string
+  default     = ""
+}
+
+variable "export_job_concurrency" {
+  description = "Number of export jobs run in parallel by jobs mode (all jobs share the JIRA connection pool and request budget)"
+  type        = number
+  default     = 4
+}
+
+variable "fanout_workers" {
+  description = "Number of worker lanes a coordinator export runs in parallel (each lane invokes its next shard when one finishes)"
+  type        = number
+  default     = 8
+}
+
+variable "fanout_shard_size" {
+  description = "Maximum number of issues per coordinator shard (each worker must finish one shard within lambda_timeout)"
+  type        = number
+  default     = 20000
+}
+
+variable "fanout_shard_timeout" {
+  description = "Seconds without marker progress after which a coordinator lane counts as stalled and its shard is invoked again (keep above lambda_timeout)"
+  type        = number
+  default     = 1800
+}
+
+variable "fanout_watch_interval" {
+  description = "Seconds between the merge watch invocations that re-dispatch stalled lanes (0 disables the watch)"
+  type        = number
+  default     = 300
+}
+
+variable "lambda_timeout" {
+  description = "Lambda timeout in seconds (each coordinator worker exports one shard per invocation, so keep this above a single shard's run time)"
+  type        = number
+  default     = 900
+}
+
+variable "parquet_export" {
+  description = "Also write the daily export as Parquet under parquet/year=/month=/day= (requires a pyarrow layer)"
+  type        = bool
+  default     = false
+}
+
+variable "delta_export" {
+  description = "Publish numbered delta files of not-yet-delivered issues for the Google Sheets consumer"
+  type        = bool
+  default     = true
+}
+
+variable "compressed_variants" {
+  description = "Comma-separated Content-Encodings (gzip, zstd) of the compressed copies published next to each CSV"
+  type        = string
+  default     = "gzip"
+}
+
+variable "skip_unchanged_uploads" {
+  description = "Skip S3 writes of published CSVs whose SHA-256 (or, for older objects, ETag) matches the stored object"
+  type        = bool
+  default     = true
+}
+
+variable "metrics_namespace" {
+  description = "CloudWatch namespace of the per-invocation stage timings and counters logged in Embedded Metric Format (empty disables)"
+  type        = string
+  default     = "JiraExporter"
+}
+
+variable "jira_fields_ttl" {
+  description = "Seconds the cached JIRA field metadata (state/fields.json) is used before it is refreshed in the background"
+  type        = number
+  default     = 86400
+}
+
+variable "lambda_layers" {
+  description = "Lambda layer ARNs (e.g. a layer providing pyarrow for Parquet output)"
+  type        = list(string)
+  default     = []
+}
+
 variable "schedule_expression" {
   description = "CloudWatch Events schedule expression"
   type        = string
@@ -0,0 +1,74 @@
+"""
+エクスポーターのテスト共通設定
+
+jira/ と jira/benchmarks/ を import パスに追加し、ローカル検索APIスタブ（jira_stub.JiraStub）と
+ローカルS3（local_s3.LocalS3Client）のフィクスチャを提供する。
+
+    cd jira && python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIR, '..', 'benchmarks'))
+sys.path.insert(0, os.path.join(TESTS_DIR, '..'))
+
+from jira_governor import JiraRequestError  # noqa: E402
+from jira_http import JiraHttpClient  # noqa: E402
+from jira_stub import JiraStub  # noqa: E402
+from json_stream import decode_search_page  # noqa: E402
+from local_s3 import LocalS3Client  # noqa: E402
+
+
+@pytest.fixture
+def local_s3(tmp_path):
+    """一時ディレクトリに書き込むローカルS3クライアント"""
+    return LocalS3Client(str(tmp_path / 's3'))
+
+
+class StubSearch:
+    """JiraStub の検索APIを呼び出す fetch_page（iter_pages / iter_keyset_pages 用）"""
+
+    def __init__(self, stub: JiraStub, fields=('summary',)):
+        self.stub = stub
+        self.http = JiraHttpClient(stub.start())
+        self.fields = ','.join(fields)
+        self.calls = []
+
+    def search(self, jql: str, start_at: int, max_results: int):
+        self.calls.append((jql, start_at, max_results))
+        params = {'jql': jql, 'fields': self.fields, 'startAt': start_at, 'maxResults': max_results}
+        response = self.http.get('/rest/api/2/search', params, body_handler=decode_search_page)
+        if response.status != 200:
+            raise JiraRequestError(f"検索エラー: {response.status}", response.status,
+                                   response.headers.get('retry-after'))
+        return response.body
+
+    def by_offset(self, start_at: int, max_results: int):
+        """iter_pages 用（startAt でページング）"""
+        return self.search('project = SUPPORT', start_at, max_results)
+
+    def by_jql(self, jql: str, max_results: int):
+        """iter_keyset_pages 用（JQL の id > N でページング）"""
+        return self.search(jql, 0, max_results)
+
+    def close(self):
+        self.http.close()
+        self.stub.stop()
+
+
+@pytest.fixture
+def jira_stub():
+    """JiraStub を起動して StubSearch を返すファクトリー（テスト終了時に停止）"""
+    searches = []
+
+    def start(total: int, **kwargs) -> StubSearch:
+        search = StubSearch(JiraStub(total, **kwargs))
+        searches.append(search)
+        return search
+
+    yield start
+    for search in searches:
+        search.close()
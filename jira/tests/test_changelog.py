@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from changelog import (
+    bulk_request, duration_rows, iter_status_durations, parse_changelog_time, reduce_status, status_transitions
+)
+from csv_columns import IssueRecord
+from jira_governor import RequestGovernor
+from jira_stub import JiraStub
+from synthetic import FIRST_ID, STATUSES, created_at, format_jira_datetime
+
+JST = timezone(timedelta(hours=9))
+CREATED = '2024-06-03T09:00:00.000+0900'
+START = datetime(2024, 6, 3, 9, 0, tzinfo=JST)
+
+
+def at(hours: float) -> datetime:
+    return START + timedelta(hours=hours)
+
+
+def hours_by_status(summary):
+    return {status: (round(seconds / 3600, 6), visits) for status, (seconds, visits) in summary.durations.items()}
+
+
+# ----------------------------------------------------------------------
+# reduce_status
+# ----------------------------------------------------------------------
+
+def test_reduce_status_without_transitions():
+    summary = reduce_status('SUPPORT-1', '10000', CREATED, 'Open', [], at(5))
+
+    assert hours_by_status(summary) == {'Open': (5.0, 1)}
+    assert summary.status == 'Open'
+    assert summary.first_response is None
+    assert summary.first_response_hours is None
+    assert summary.transitions == 0
+
+
+def test_reduce_status_accumulates_time_per_status():
+    transitions = [
+        (at(2), 'Open', 'In Progress'),
+        (at(3.5), 'In Progress', 'Waiting'),
+        (at(6), 'Waiting', 'In Progress'),
+        (at(10), 'In Progress', 'Closed'),
+    ]
+
+    summary = reduce_status('SUPPORT-1', '10000', CREATED, 'Closed', transitions, at(12))
+
+    assert hours_by_status(summary) == {'Open': (2.0, 1), 'In Progress': (5.5, 2), 'Waiting': (2.5, 1),
+                                        'Closed': (2.0, 1)}
+    assert summary.first_response == at(2)
+    assert summary.first_response_hours == 2.0
+    assert summary.transitions == 4
+    # 全ステータスの合計は作成から集計時刻まで
+    assert sum(seconds for seconds, _ in summary.durations.values()) == 12 * 3600
+
+
+def test_reduce_status_sorts_transitions_and_uses_initial_status():
+    # 作成時のステータスは最初の遷移の遷移元（現在のステータスとは異なる）
+    transitions = [(at(4), 'Triage', 'Closed'), (at(1), 'New', 'Triage')]
+
+    summary = reduce_status('SUPPORT-1', '10000', CREATED, 'Closed', transitions, at(6))
+
+    assert list(summary.durations) == ['New', 'Triage', 'Closed']
+    assert hours_by_status(summary) == {'New': (1.0, 1), 'Triage': (3.0, 1), 'Closed': (2.0, 1)}
+    assert summary.first_response == at(1)
+
+
+def test_reduce_status_first_response_skips_transitions_into_initial_status():
+    transitions = [(at(1), 'Open', 'Open'), (at(3), 'Open', 'In Progress')]
+
+    summary = reduce_status('SUPPORT-1', '10000', CREATED, 'In Progress', transitions, at(4))
+
+    assert summary.first_response == at(3)
+    assert hours_by_status(summary) == {'Open': (3.0, 2), 'In Progress': (1.0, 1)}
+
+
+def test_reduce_status_clamps_transitions_before_creation():
+    # 時計のずれなどで作成日時より前の遷移があっても負の滞在時間にしない
+    summary = reduce_status('SUPPORT-1', '10000', CREATED, 'In Progress', [(at(-1), 'Open', 'In Progress')], at(2))
+
+    assert hours_by_status(summary) == {'Open': (0.0, 1), 'In Progress': (3.0, 1)}
+
+
+def test_duration_rows_formats_hours_and_current_status():
+    transitions = [(datetime(2024, 6, 3, 1, 30, tzinfo=timezone.utc), 'Open', 'Closed')]
+    summary = reduce_status('SUPPORT-1', '10000', CREATED, 'Closed', transitions, at(3))
+
+    assert duration_rows(summary) == [
+        ['SUPPORT-1', '10000', '2024-06-03 09:00:00', '2024-06-03 10:30:00', '1.50', 'Open', '1.50', '1', ''],
+        ['SUPPORT-1', '10000', '2024-06-03 09:00:00', '2024-06-03 10:30:00', '1.50', 'Closed', '1.50', '1', '○'],
+    ]
+
+
+# ----------------------------------------------------------------------
+# 一括取得APIのレスポンス
+# ----------------------------------------------------------------------
+
+@pytest.mark.parametrize('value', [1717372800000, 1717372800, 1717372800.0, '2024-06-03T09:00:00.000+0900',
+                                   '2024-06-03T00:00:00Z', '2024-06-03T00:00:00+00:00'])
+def test_parse_changelog_time(value):
+    assert parse_changelog_time(value) == datetime(2024, 6, 3, tzinfo=timezone.utc)
+
+
+def test_status_transitions_keeps_status_items_only():
+    page = {'issueChangeLogs': [
+        {'issueId': 10000, 'changeHistories': [
+            {'created': 1717372800000, 'items': [
+                {'field': 'assignee', 'fromString': 'a', 'toString': 'b'},
+                {'fieldId': 'status', 'fromString': 'Open', 'toString': 'In Progress'},
+            ]},
+            {'created': 1717376400000, 'items': [{'field': 'summary', 'fromString': 'x', 'toString': 'y'}]},
+        ]},
+        {'issueId': '10001', 'changeHistories': [
+            {'created': 1717380000000, 'items': [{'field': 'status', 'fromString': None, 'toString': 'Closed'}]},
+        ]},
+    ]}
+
+    assert status_transitions(page) == {
+        '10000': [(datetime(2024, 6, 3, tzinfo=timezone.utc), 'Open', 'In Progress')],
+        '10001': [(datetime(2024, 6, 3, 2, tzinfo=timezone.utc), '', 'Closed')],
+    }
+    assert status_transitions({}) == {}
+
+
+def test_bulk_request():
+    assert bulk_request(['1', '2']) == {'issueIdsOrKeys': ['1', '2'], 'fieldIds': ['status'], 'maxResults': 10000}
+    assert bulk_request(['1'], '500')['nextPageToken'] == '500'
+
+
+# ----------------------------------------------------------------------
+# iter_status_durations（JiraStub の一括取得API）
+# ----------------------------------------------------------------------
+
+def test_iter_status_durations_against_stub():
+    stub = JiraStub(250, changelog_page_size=40)
+    requests = []
+
+    def fetch_page(payload):
+        requests.append(payload)
+        return stub.changelog_body(payload)
+
+    records = [IssueRecord(f'SUPPORT-{i + 1}', str(FIRST_ID + i), format_jira_datetime(created_at(i)), None,
+                           (STATUSES[i % 3]['name'],)) for i in range(250)]
+    pages = [records[i:i + 60] for i in range(0, 250, 60)]
+    now = created_at(250) + timedelta(days=10)
+    governor = RequestGovernor(max_concurrency=3, max_rps=0, max_page_size=100)
+
+    summaries = list(iter_status_durations(pages, lambda record: record.row[0], fetch_page, governor, now,
+                                           batch_size=70))
+
+    # 検索結果と同じ順に全課題を返す
+    assert [summary.key for summary in summaries] == [record.key for record in records]
+    # バッチは70件ずつ、1バッチの変更履歴が40件を超えると nextPageToken でページングする
+    assert sorted(len(payload['issueIdsOrKeys']) for payload in requests if 'nextPageToken' not in payload) == [
+        40, 70, 70, 70]
+    assert any('nextPageToken' in payload for payload in requests)
+
+    for i, summary in enumerate(summaries):
+        assert summary.status == STATUSES[i % 3]['name']
+        assert summary.transitions == i % 3
+        total = sum(seconds for seconds, _ in summary.durations.values())
+        assert total == pytest.approx((now - created_at(i)).total_seconds())
+        if i % 3 == 0:
+            assert summary.first_response is None
+            assert list(summary.durations) == ['Open']
+        else:
+            span = timedelta(hours=i % 72 + 1)
+            assert summary.first_response == created_at(i) + span * (i % 4 + 1) / 5
@@ -0,0 +1,188 @@
+import csv
+import random
+from datetime import datetime
+from io import StringIO
+
+import pytest
+
+from csv_columns import DAILY_LAYOUT, STANDARD_LAYOUT, RowProjector, format_value
+from field_registry import FieldRegistry, decode_raw
+from synthetic import IssueFactory
+
+# 元の issues_to_csv_string（lambda_jira_exporter.py）のヘッダーと列
+BASELINE_HEADERS = ['課題タイプ', '課題キー', '課題ID', '要約', '機能分類 (Function)', '問合せ分類 (Inquiry)',
+                    '報告者', 'TS', '担当者', '優先度', '作成日', 'TOKEN']
+BASELINE_FIELDS = ['issuetype', 'summary', 'customfield_10141', 'customfield_10140', 'reporter',
+                   'customfield_10129', 'assignee', 'priority', 'created', 'customfield_10163']
+
+
+def baseline_format_field_value(field_value, field_type: str = 'string') -> str:
+    """元の format_field_value"""
+    if field_value is None:
+        return ''
+    if field_type == 'user':
+        return field_value.get('displayName', '') if isinstance(field_value, dict) else str(field_value)
+    elif field_type in ('status', 'priority', 'issuetype', 'resolution'):
+        return field_value.get('name', '') if isinstance(field_value, dict) else str(field_value)
+    elif field_type == 'datetime':
+        if field_value:
+            try:
+                dt = datetime.fromisoformat(field_value.replace('Z', '+00:00'))
+                return dt.strftime('%Y-%m-%d %H:%M:%S')
+            except Exception:
+                return str(field_value)
+        return ''
+    else:
+        if isinstance(field_value, dict):
+            if 'value' in field_value:
+                return str(field_value['value'])
+            elif 'name' in field_value:
+                return str(field_value['name'])
+            elif 'displayName' in field_value:
+                return str(field_value['displayName'])
+            else:
+                return str(field_value)
+        elif isinstance(field_value, list):
+            return ', '.join([str(item.get('value', item.get('name', item))) if isinstance(item, dict) else str(item)
+                              for item in field_value])
+        else:
+            return str(field_value)
+
+
+def baseline_csv(issues) -> str:
+    """元の issues_to_csv_string"""
+    fmt = baseline_format_field_value
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(BASELINE_HEADERS)
+    for issue in issues:
+        fields = issue.get('fields', {})
+        writer.writerow([
+            fmt(fields.get('issuetype'), 'issuetype'),
+            issue.get('key', ''),
+            issue.get('id', ''),
+            fields.get('summary', ''),
+            fmt(fields.get('customfield_10141')),
+            fmt(fields.get('customfield_10140')),
+            fmt(fields.get('reporter'), 'user'),
+            fmt(fields.get('customfield_10129'), 'user'),
+            fmt(fields.get('assignee'), 'user'),
+            fmt(fields.get('priority'), 'priority'),
+            fmt(fields.get('created'), 'datetime'),
+            fmt(fields.get('customfield_10163')),
+        ])
+    return output.getvalue()
+
+
+def make_issue(i: int):
+    """JIRA検索APIと同じ形の課題（値の有無と形は乱数で変える）"""
+    rng = random.Random(i)
+
+    def maybe(value):
+        return value if rng.random() < 0.8 else None
+
+    def user():
+        return maybe({'displayName': f'ユーザー{rng.randint(1, 20)}', 'accountId': str(rng.randint(1, 20))})
+
+    options = rng.sample(['機能A', '機能B', '機能C'], rng.randint(0, 2))
+    return {'key': f'SUPPORT-{i + 1}', 'id': str(10000 + i), 'fields': {
+        'issuetype': {'name': rng.choice(['問合せ', '障害', 'タスク'])},
+        'summary': rng.choice(['ログインできない', 'カンマ, を含む', '"引用符"', '改行\nを含む']),
+        'customfield_10141': [{'value': option, 'id': str(n)} for n, option in enumerate(options)],
+        'customfield_10140': maybe({'value': rng.choice(['仕様', '操作方法'])}),
+        'reporter': user(),
+        'customfield_10129': user(),
+        'assignee': user(),
+        'priority': maybe({'name': rng.choice(['高', '中', '低'])}),
+        'created': f'2024-06-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:15:00.000+0900',
+        'customfield_10163': maybe(rng.choice([f'TOKEN-{i}', i])),
+    }}
+
+
+def projected_csv(projector: RowProjector, issues) -> str:
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(STANDARD_LAYOUT.headers)
+    for issue in issues:
+        writer.writerow(projector.render(STANDARD_LAYOUT, projector.record(issue).row))
+    return output.getvalue()
+
+
+@pytest.fixture(scope='module')
+def registry():
+    return FieldRegistry.load()
+
+
+@pytest.fixture(scope='module')
+def projector(registry):
+    return RowProjector([STANDARD_LAYOUT, DAILY_LAYOUT], registry)
+
+
+def test_standard_layout_matches_baseline_headers():
+    assert STANDARD_LAYOUT.headers == BASELINE_HEADERS
+    assert DAILY_LAYOUT.headers[5:] == BASELINE_HEADERS[:10] + ['作成日時', 'TOKEN']
+
+
+def test_projector_requests_baseline_fields(projector):
+    assert sorted(projector.fields) == sorted(BASELINE_FIELDS)
+
+
+def test_projector_matches_baseline_csv(projector):
+    issues = [make_issue(i) for i in range(300)]
+
+    assert projected_csv(projector, issues) == baseline_csv(issues)
+
+
+def test_projector_matches_baseline_csv_for_synthetic_field_shapes(registry, projector):
+    # benchmarks の合成課題（custom_fields.json のスキーマどおりの値）
+    factory = IssueFactory(registry)
+    issues = [factory.issue(i, BASELINE_FIELDS + ['updated']) for i in range(300)]
+
+    assert projected_csv(projector, issues) == baseline_csv(issues)
+
+
+def test_projector_matches_baseline_for_missing_and_unexpected_values(projector):
+    issues = [
+        {'key': 'SUPPORT-1', 'id': '10000', 'fields': {}},
+        {'key': 'SUPPORT-2', 'id': '10001', 'fields': {field: None for field in BASELINE_FIELDS}},
+        {'key': 'SUPPORT-3', 'id': '10002', 'fields': {
+            # フィールド定義と異なる形の値
+            'issuetype': 'Bug', 'summary': 'カンマ, と "引用符"\n改行', 'customfield_10141': [{'value': 'A'}, 'B'],
+            'customfield_10140': {'id': '1'}, 'reporter': 'someone', 'customfield_10129': {'name': 'ts'},
+            'assignee': {}, 'priority': {'id': '3'}, 'created': '2024-06-01T10:11:12Z',
+            'customfield_10163': 12345,
+        }},
+        {'key': 'SUPPORT-4', 'id': '10003', 'fields': {'created': 'not a date', 'customfield_10163': {'name': 'x'}}},
+    ]
+
+    assert projected_csv(projector, issues) == baseline_csv(issues)
+
+
+@pytest.mark.parametrize('value, field_type', [
+    (None, 'user'), ({'displayName': '山田'}, 'user'), ({'name': 'High'}, 'priority'), ('Done', 'status'),
+    ('2024-01-02T03:04:05.000+0900', 'datetime'), ('', 'datetime'), ({'value': '選択肢'}, 'string'),
+    ([{'name': 'a'}, {'value': 'b'}, 3], 'string'), (1.5, 'string'),
+])
+def test_format_value_matches_baseline(value, field_type):
+    assert format_value(value, field_type) == baseline_format_field_value(value, field_type)
+
+
+def test_decode_raw_decodes_non_string_values():
+    assert decode_raw('要約') == '要約'
+    assert decode_raw(None) == ''
+    # 文字列型のフィールドに想定外の形の値が入っていても元の format_field_value と同じ結果にする
+    assert decode_raw({'name': 'x'}) == 'x'
+    assert decode_raw(12345) == '12345'
+
+
+def test_record_keeps_only_row_and_issue_metadata(projector):
+    issue = make_issue(7)
+    issue['fields']['updated'] = '2024-06-30T10:00:00.000+0900'
+
+    record = projector.record(issue)
+
+    assert (record.key, record.id) == ('SUPPORT-8', '10007')
+    assert record.created == issue['fields']['created']
+    assert record.updated == '2024-06-30T10:00:00.000+0900'
+    assert record.row == projector.project(issue)
+    assert not hasattr(record, '__dict__')
@@ -0,0 +1,77 @@
+from delivery_index import MANIFEST_FILES, DeliveredKeyIndex, delta_key
+
+BUCKET = 'test-bucket'
+INDEX_KEY = 'state/delivered_keys.json'
+
+
+def test_delta_key():
+    assert delta_key('project-exports/', 7) == 'project-exports/deltas/SUPPORT_delta_000007.csv'
+
+
+def test_add_and_contains():
+    index = DeliveredKeyIndex()
+    for issue_key in ['SUPPORT-1', 'SUPPORT-8', 'SUPPORT-1000', 'ADMIN-3', 'SUPPORT-8']:
+        index.add(issue_key)
+
+    assert 'SUPPORT-1' in index
+    assert 'SUPPORT-8' in index
+    assert 'SUPPORT-1000' in index
+    assert 'ADMIN-3' in index
+    assert 'SUPPORT-2' not in index
+    assert 'SUPPORT-9' not in index
+    # ビットマップの範囲外・未知のプロジェクト
+    assert 'SUPPORT-100000' not in index
+    assert 'OTHER-1' not in index
+    assert 'ADMIN-1' not in index
+    assert index.count() == 4
+
+
+def test_bitmap_size_follows_largest_number():
+    index = DeliveredKeyIndex()
+    index.add('SUPPORT-0')
+    index.add('SUPPORT-7')
+    assert len(index.bitmaps['SUPPORT']) == 1
+
+    index.add('SUPPORT-8')
+    assert len(index.bitmaps['SUPPORT']) == 2
+
+    index.add('SUPPORT-99999')
+    assert len(index.bitmaps['SUPPORT']) == 12500
+
+
+def test_save_and_load_round_trip(local_s3):
+    index = DeliveredKeyIndex()
+    for number in range(1, 100001, 3):
+        index.add(f'SUPPORT-{number}')
+    index.record_delta(1, 'deltas/SUPPORT_delta_000001.csv', 'https://example/1', 5)
+    index.save(local_s3, BUCKET, INDEX_KEY)
+
+    # 10万件でも圧縮したビットマップは小さい
+    assert local_s3.head_object(Bucket=BUCKET, Key=INDEX_KEY)['ContentLength'] < 20000
+
+    loaded = DeliveredKeyIndex.load(local_s3, BUCKET, INDEX_KEY)
+    assert loaded.count() == index.count() == 33334
+    assert 'SUPPORT-4' in loaded and 'SUPPORT-5' not in loaded
+    assert loaded.sequence == 1
+    assert loaded.files == index.files
+
+
+def test_load_missing_index_is_empty(local_s3):
+    index = DeliveredKeyIndex.load(local_s3, BUCKET, INDEX_KEY)
+
+    assert index.count() == 0
+    assert index.sequence == 0
+    assert index.files == []
+
+
+def test_record_delta_keeps_recent_files_in_manifest():
+    index = DeliveredKeyIndex()
+    for sequence in range(1, MANIFEST_FILES + 11):
+        index.record_delta(sequence, delta_key('', sequence), f'https://example/{sequence}', sequence)
+
+    manifest = index.manifest(['課題キー'])
+    assert manifest['sequence'] == MANIFEST_FILES + 10
+    assert manifest['headers'] == ['課題キー']
+    assert len(manifest['files']) == MANIFEST_FILES
+    assert [f['sequence'] for f in manifest['files']] == list(range(11, MANIFEST_FILES + 11))
+    assert manifest['files'][-1]['key'] == f'deltas/SUPPORT_delta_{MANIFEST_FILES + 10:06d}.csv'
@@ -0,0 +1,319 @@
+import gzip
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from botocore.exceptions import ClientError
+
+from fanout import (
+    MIN_WINDOW, concat_objects, get_json, marker_key, plan_key, plan_windows, put_json, shard_key, stalled_shards,
+    window_jql
+)
+from fanout_export import MAX_STALL_RETRIES, csv_header, dispatch_shard, run_merge_export
+from jira_exporter import LambdaJiraS3Exporter
+from s3_stream import compress_bytes
+
+BUCKET = 'test-bucket'
+START = datetime(2024, 1, 1)
+END = datetime(2024, 1, 31)
+
+
+# ----------------------------------------------------------------------
+# 作成日時による期間の分割
+# ----------------------------------------------------------------------
+
+def test_window_jql_adds_created_range():
+    start, end = datetime(2024, 1, 2, 3, 4), datetime(2024, 1, 5)
+
+    assert window_jql('project = SUPPORT ORDER BY key', start, end) == (
+        '(project = SUPPORT) AND created >= "2024/01/02 03:04" AND created < "2024/01/05 00:00" '
+        'ORDER BY created ASC')
+    assert window_jql('', start, end, 'ORDER BY id ASC') == (
+        'created >= "2024/01/02 03:04" AND created < "2024/01/05 00:00" ORDER BY id ASC')
+
+
+def counter(created):
+    """作成日時の一覧から期間内の件数を返す count（呼び出し回数を記録）"""
+    calls = []
+
+    def count(start, end):
+        calls.append((start, end))
+        return sum(1 for value in created if start <= value < end)
+
+    return count, calls
+
+
+def test_plan_windows_splits_until_each_window_fits():
+    created = [datetime(2024, 1, 1 + day % 30, hour) for day in range(30) for hour in range(0, 24, 3)]
+    count, calls = counter(created)
+
+    windows = plan_windows(count, START, END, shard_size=50)
+
+    # 期間は重ならず順に並び、全件をちょうど1回ずつ含む
+    assert all(total <= 50 for _, _, total in windows)
+    assert sum(total for _, _, total in windows) == len(created)
+    assert all(previous[1] <= current[0] for previous, current in zip(windows, windows[1:]))
+    for start, end, total in windows:
+        assert total == sum(1 for value in created if start <= value < end)
+    # 件数を数えるのは全体と各分割の前半だけ（後半は差し引きで求める）
+    assert calls[0] == (START, END)
+    assert all(end - start < END - START for start, end in calls[1:])
+
+
+def test_plan_windows_skips_empty_ranges():
+    created = [datetime(2024, 1, 2), datetime(2024, 1, 29)]
+    count, _ = counter(created)
+
+    windows = plan_windows(count, START, END, shard_size=1)
+
+    assert [total for _, _, total in windows] == [1, 1]
+    assert plan_windows(counter([])[0], START, END, shard_size=10) == []
+
+
+def test_plan_windows_stops_at_one_minute():
+    # 同じ分に作成された課題は分割できないので shard_size を超えても1期間にする
+    created = [datetime(2024, 1, 10, 12, 30)] * 20
+    count, _ = counter(created)
+
+    windows = plan_windows(count, START, END, shard_size=5)
+
+    assert len(windows) == 1
+    start, end, total = windows[0]
+    assert total == 20
+    assert end - start <= MIN_WINDOW
+
+
+# ----------------------------------------------------------------------
+# concat_objects
+# ----------------------------------------------------------------------
+
+@pytest.fixture
+def parts(local_s3, monkeypatch):
+    """連結で作られたパートの (種類, サイズ) を記録する"""
+    recorded = []
+    upload_part = local_s3.upload_part
+    upload_part_copy = local_s3.upload_part_copy
+
+    def record_upload(**kwargs):
+        recorded.append(('upload', len(kwargs['Body'])))
+        return upload_part(**kwargs)
+
+    def record_copy(**kwargs):
+        start, _, end = kwargs['CopySourceRange'][len('bytes='):].partition('-')
+        recorded.append(('copy', int(end) - int(start) + 1))
+        # LocalS3Client の upload_part_copy は内部で upload_part を呼ぶため記録しない
+        monkeypatch.setattr(local_s3, 'upload_part', upload_part)
+        try:
+            return upload_part_copy(**kwargs)
+        finally:
+            monkeypatch.setattr(local_s3, 'upload_part', record_upload)
+
+    monkeypatch.setattr(local_s3, 'upload_part', record_upload)
+    monkeypatch.setattr(local_s3, 'upload_part_copy', record_copy)
+    return recorded
+
+
+def put_sources(s3_client, sizes):
+    bodies = []
+    for i, size in enumerate(sizes):
+        body = bytes((i + j) % 251 for j in range(size))
+        s3_client.put_object(Bucket=BUCKET, Key=f'part-{i:05d}.csv', Body=body)
+        bodies.append(body)
+    return [f'part-{i:05d}.csv' for i in range(len(sizes))], b''.join(bodies)
+
+
+def read(s3_client, key):
+    return s3_client.get_object(Bucket=BUCKET, Key=key)['Body'].read()
+
+
+@pytest.mark.parametrize('head_size, sizes', [
+    (0, []),
+    (10, []),
+    (10, [0, 0]),
+    (10, [5, 5, 5]),
+    (10, [250, 250]),
+    (10, [99, 1, 300, 40]),
+    (150, [100, 100, 7]),
+    (0, [100, 100, 100]),
+])
+def test_concat_objects_concatenates_in_order(local_s3, parts, head_size, sizes):
+    keys, expected = put_sources(local_s3, sizes)
+    head = b'H' * head_size
+
+    size = concat_objects(local_s3, BUCKET, 'merged.csv', head, keys, min_part_size=100)
+
+    assert read(local_s3, 'merged.csv') == head + expected
+    assert size == head_size + sum(sizes)
+    # 最終パート以外は最小サイズ以上
+    assert all(part_size >= 100 for _, part_size in parts[:-1])
+
+
+def test_concat_objects_copies_large_shards_server_side(local_s3, parts):
+    keys, expected = put_sources(local_s3, [500, 20, 500])
+
+    concat_objects(local_s3, BUCKET, 'merged.csv', b'header\n', keys, min_part_size=100)
+
+    assert read(local_s3, 'merged.csv') == b'header\n' + expected
+    # head は1つ目のシャードの先頭で、2つ目は3つ目の先頭で最小サイズまで埋め、残りはコピー
+    assert parts == [('upload', 100), ('copy', 407), ('upload', 100), ('copy', 420)]
+
+
+def test_concat_objects_randomized(local_s3):
+    rng = random.Random(3)
+    for trial in range(50):
+        sizes = [rng.choice([0, 1, 5, 40, 99, 100, 101, 250]) for _ in range(rng.randint(0, 6))]
+        keys, expected = put_sources(local_s3, sizes)
+        head = b'H' * rng.randint(0, 30)
+
+        concat_objects(local_s3, BUCKET, f'merged-{trial}.csv', head, keys, min_part_size=100)
+
+        assert read(local_s3, f'merged-{trial}.csv') == head + expected
+
+
+def test_concat_objects_aborts_on_missing_shard(local_s3, monkeypatch):
+    keys, _ = put_sources(local_s3, [50])
+    aborted = []
+    abort = local_s3.abort_multipart_upload
+    monkeypatch.setattr(local_s3, 'abort_multipart_upload', lambda **kwargs: aborted.append(kwargs) or abort(**kwargs))
+
+    with pytest.raises(ClientError):
+        concat_objects(local_s3, BUCKET, 'merged.csv', b'', keys + ['missing.csv'], min_part_size=100)
+
+    assert len(aborted) == 1
+    with pytest.raises(ClientError):
+        read(local_s3, 'merged.csv')
+
+
+# ----------------------------------------------------------------------
+# 止まったレーンの検出
+# ----------------------------------------------------------------------
+
+def at(minutes: float) -> datetime:
+    return datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=minutes)
+
+
+def test_stalled_shards_uses_latest_marker_of_each_lane():
+    marker_times = {
+        # レーン0: 0 が完了してから 2 を呼び出していない（直前の完了から判定）
+        0: {'running': at(0), 'done': at(5)},
+        # レーン1: 1 は実行中マーカーだけが古い
+        1: {'running': at(0)},
+        # 3 は失敗済み、5 は新しい実行中マーカーがある（レーン1の先頭 1 で止まっているため見ない）
+        3: {'failed': at(1)},
+        5: {'running': at(59)},
+    }
+
+    assert stalled_shards(marker_times, 6, 2, at(40), timeout=1800) == [1, 2]
+    assert stalled_shards(marker_times, 6, 2, at(32), timeout=1800) == [1]
+    assert stalled_shards(marker_times, 6, 2, at(30), timeout=1800) == []
+
+
+def test_stalled_shards_ignores_finished_and_unstarted_lanes():
+    finished = {shard: {'running': at(0), 'done': at(1)} for shard in range(4)}
+
+    assert stalled_shards(finished, 4, 2, at(100), timeout=1800) == []
+    # 一度も呼び出されていないレーンは時刻がないため判定しない
+    assert stalled_shards({}, 4, 2, at(100), timeout=1800) == []
+    # 失敗のあとに完了したシャードは完了として扱い、その時刻から次のシャードを判定する
+    retried = {0: {'failed': at(0), 'done': at(50)}}
+    assert stalled_shards(retried, 2, 1, at(60), timeout=1800) == []
+    assert stalled_shards(retried, 2, 1, at(90), timeout=1800) == [1]
+
+
+# ----------------------------------------------------------------------
+# 連結（run_merge_export）
+# ----------------------------------------------------------------------
+
+class RecordingDispatcher:
+    """呼び出したイベントを記録するだけのディスパッチャー（Lambdaの非同期呼び出しの代わり）"""
+
+    detached = True
+
+    def __init__(self):
+        self.events = []
+
+    def invoke(self, event):
+        self.events.append(event)
+
+
+@pytest.fixture
+def exporter(tmp_path, monkeypatch):
+    monkeypatch.setenv('LOCAL_S3_DIR', str(tmp_path / 's3'))
+    for name, value in {'JIRA_URL': 'https://jira.example', 'JIRA_USERNAME': 'u', 'JIRA_API_TOKEN': 't',
+                        'S3_BUCKET': BUCKET, 'S3_PREFIX': 'exports/', 'COMPRESSED_VARIANTS': 'gzip'}.items():
+        monkeypatch.setenv(name, value)
+    return LambdaJiraS3Exporter(refresh_fields=False)
+
+
+def put_plan(exporter, shard_count: int, workers: int, **options):
+    plan = dict({'run_id': 'r1', 'jql': 'project = SUPPORT', 'filename': 'all.csv', 'workers': workers,
+                 'planned': shard_count, 'shard_timeout': 1800, 'watch_interval': 0,
+                 'shards': [{'shard': shard, 'jql': f'shard {shard}', 'planned': 1} for shard in range(shard_count)]},
+                **options)
+    put_json(exporter.s3_client, BUCKET, plan_key(exporter.s3_prefix, 'r1'), plan)
+    return plan
+
+
+def put_shard(exporter, shard: int, body: bytes):
+    key = shard_key(exporter.s3_prefix, 'r1', shard)
+    exporter.s3_client.put_object(Bucket=BUCKET, Key=key, Body=body)
+    exporter.s3_client.put_object(Bucket=BUCKET, Key=key + '.gz', Body=compress_bytes(body, 'gzip'))
+    put_json(exporter.s3_client, BUCKET, marker_key(key, 'done'), {'shard': shard, 'issue_count': 1})
+
+
+def marker(exporter, shard: int, status: str):
+    return get_json(exporter.s3_client, BUCKET, marker_key(shard_key(exporter.s3_prefix, 'r1', shard), status))
+
+
+def test_merge_publishes_concatenated_gzip_without_content_encoding(exporter):
+    put_plan(exporter, 3, 2)
+    bodies = [f'SUPPORT-{shard},要約{shard}\r\n'.encode('utf-8') for shard in range(3)]
+    for shard, body in enumerate(bodies):
+        put_shard(exporter, shard, body)
+
+    summary = run_merge_export(exporter, {'mode': 'merge', 'run_id': 'r1'}, RecordingDispatcher())
+
+    assert summary['status'] == 'complete'
+    raw = read(exporter.s3_client, 'exports/full/all.csv')
+    assert raw == csv_header() + b''.join(bodies)
+    # 連結したgzipは複数メンバーのため、Content-Encoding を付けずに別のキーに置く
+    concatenated = exporter.s3_client.get_object(Bucket=BUCKET, Key='exports/full/all.csv.concat.gz')
+    assert 'ContentEncoding' not in concatenated
+    assert concatenated['ContentType'] == 'application/gzip'
+    assert gzip.decompress(concatenated['Body'].read()) == raw
+    with pytest.raises(ClientError):
+        read(exporter.s3_client, 'exports/full/all.csv.gz')
+
+
+def test_merge_redispatches_stalled_lane(exporter):
+    put_plan(exporter, 4, 2, shard_timeout=0)
+    put_shard(exporter, 0, b'a\r\n')
+    dispatcher = RecordingDispatcher()
+    dispatch_shard(exporter, 'r1', 1, dispatcher)
+
+    summary = run_merge_export(exporter, {'mode': 'merge', 'run_id': 'r1'}, dispatcher)
+
+    # レーン0は 0 の完了後に 2 が呼び出されず、レーン1は 1 が終わっていない
+    assert summary['status'] == 'running'
+    assert summary['stalled'] == summary['retried'] == [1, 2]
+    assert dispatcher.events[1:] == [{'mode': 'worker', 'run_id': 'r1', 'shard': 1, 'attempt': 1},
+                                     {'mode': 'worker', 'run_id': 'r1', 'shard': 2, 'attempt': 1}]
+    assert marker(exporter, 1, 'running')['attempt'] == 1
+
+
+def test_merge_fails_shard_after_max_stall_retries(exporter):
+    put_plan(exporter, 4, 2, shard_timeout=0)
+    dispatcher = RecordingDispatcher()
+    put_shard(exporter, 0, b'a\r\n')
+    put_shard(exporter, 2, b'c\r\n')
+    dispatch_shard(exporter, 'r1', 1, dispatcher, attempt=MAX_STALL_RETRIES)
+    dispatcher.events.clear()
+
+    summary = run_merge_export(exporter, {'mode': 'merge', 'run_id': 'r1'}, dispatcher)
+
+    # 失敗として記録し、レーンの次のシャードへ進む
+    assert marker(exporter, 1, 'failed')['failed_shards'] == [1]
+    assert dispatcher.events == [{'mode': 'worker', 'run_id': 'r1', 'shard': 3}]
+    assert summary['stalled'] == [1]
+    assert summary['retried'] == []
+    assert summary['pending'] == [3]
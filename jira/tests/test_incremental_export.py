@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta, timezone
+
+from incremental_export import advance_watermark, build_incremental_jql
+from jira_exporter import parse_jira_datetime
+
+JST = timezone(timedelta(hours=9))
+STARTED = datetime(2024, 6, 1, 12, 0, tzinfo=JST)
+
+
+def test_parse_jira_datetime():
+    assert parse_jira_datetime('2024-06-01T11:30:45.123+0900') == datetime(2024, 6, 1, 11, 30, 45, 123000, JST)
+    assert parse_jira_datetime('2024-06-01T02:30:45Z') == datetime(2024, 6, 1, 2, 30, 45, tzinfo=timezone.utc)
+    # オフセットが異なっても同じ時刻として比較できる
+    assert parse_jira_datetime('2024-06-01T11:30:00.000+0900') == parse_jira_datetime('2024-06-01T02:30:00.000+0000')
+
+
+def test_build_incremental_jql_without_watermark():
+    assert build_incremental_jql(None) == 'project = "SUPPORT" AND updated >= startOfDay(-1) ORDER BY id ASC'
+    assert build_incremental_jql({}) == build_incremental_jql(None)
+
+
+def test_build_incremental_jql_converts_to_jira_timezone(monkeypatch):
+    monkeypatch.setenv('JIRA_TIMEZONE', 'Asia/Tokyo')
+
+    assert build_incremental_jql({'updated': '2024-06-01T02:30:45.000+0000'}) == (
+        'project = "SUPPORT" AND updated >= "2024/06/01 11:30" ORDER BY id ASC')
+
+
+def test_build_incremental_jql_keeps_watermark_offset(monkeypatch):
+    monkeypatch.delenv('JIRA_TIMEZONE', raising=False)
+
+    assert build_incremental_jql({'updated': '2024-06-01T11:30:00.000+0900'}) == (
+        'project = "SUPPORT" AND updated >= "2024/06/01 11:30" ORDER BY id ASC')
+
+
+def test_advance_watermark_takes_latest_updated():
+    updated = ['2024-06-01T10:00:00.000+0900', '2024-06-01T11:30:00.000+0900', None,
+               '2024-06-01T09:00:00.000+0900']
+
+    assert advance_watermark('2024-06-01T08:00:00.000+0900', updated, STARTED) == '2024-06-01T11:30:00.000+0900'
+
+
+def test_advance_watermark_compares_across_offsets():
+    # 02:31Z は 11:30+0900 より後
+    updated = ['2024-06-01T11:30:00.000+0900', '2024-06-01T02:31:00.000+0000']
+
+    assert advance_watermark(None, updated, STARTED) == '2024-06-01T02:31:00.000+0000'
+
+
+def test_advance_watermark_never_regresses():
+    current = '2024-06-01T11:00:00.000+0900'
+
+    assert advance_watermark(current, ['2024-06-01T10:00:00.000+0900'], STARTED) == current
+    assert advance_watermark(current, [], STARTED) == current
+    assert advance_watermark(None, [], STARTED) is None
+
+
+def test_advance_watermark_is_clamped_to_run_start():
+    # 実行中に更新された課題は取得済みの位置にあると取りこぼすため、開始時刻より先に進めない
+    updated = ['2024-06-01T11:00:00.000+0900', '2024-06-01T12:05:00.000+0900']
+
+    assert advance_watermark(None, updated, STARTED) == '2024-06-01T12:00:00.000+0900'
+    # 既に開始時刻より先なら据え置き
+    assert advance_watermark('2024-06-01T12:10:00.000+0900', updated, STARTED) == '2024-06-01T12:10:00.000+0900'
@@ -0,0 +1,203 @@
+import threading
+from email.utils import formatdate
+
+import pytest
+
+import jira_governor
+from jira_governor import JiraRequestError, RequestGovernor, parse_retry_after
+
+
+def make_governor(**kwargs) -> RequestGovernor:
+    # max_rps=0 でトークンバケットの待ちをなくす
+    options = dict(max_concurrency=8, max_rps=0, max_retries=3, max_page_size=100, min_page_size=25,
+                   target_latency=1.0, base_delay=1.0, max_delay=30.0)
+    options.update(kwargs)
+    return RequestGovernor(**options)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """リトライの待機秒数を記録する（実際には待たない）"""
+    delays = []
+    monkeypatch.setattr(jira_governor.time, 'sleep', delays.append)
+    return delays
+
+
+# ----------------------------------------------------------------------
+# Retry-After
+# ----------------------------------------------------------------------
+
+def test_parse_retry_after_seconds():
+    assert parse_retry_after('7') == 7.0
+    assert parse_retry_after('1.5') == 1.5
+    assert parse_retry_after('-3') == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('') is None
+    assert parse_retry_after('soon') is None
+
+
+def test_parse_retry_after_http_date():
+    value = parse_retry_after(formatdate(jira_governor.time.time() + 120, usegmt=True))
+    assert 118 <= value <= 120
+    # 過去の日時は待たない
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+
+
+def test_request_error_classification():
+    assert JiraRequestError('x', 429).throttled
+    assert JiraRequestError('x', 503).throttled
+    assert JiraRequestError('x', 502).retryable and not JiraRequestError('x', 502).throttled
+    assert JiraRequestError('x').retryable
+    assert not JiraRequestError('x', 400).retryable
+    assert JiraRequestError('x', 429, '12').retry_after == 12.0
+
+
+# ----------------------------------------------------------------------
+# AIMD（加算増加・乗算減少）
+# ----------------------------------------------------------------------
+
+def test_fast_success_increases_limits_additively():
+    governor = make_governor()
+    governor.concurrency_limit = 4.0
+    governor.page_size_limit = 50.0
+
+    governor._on_success(0.1)
+
+    assert governor.concurrency_limit == pytest.approx(4.25)
+    assert governor.page_size_limit == pytest.approx(55.0)
+    assert governor.concurrency == 4
+
+
+def test_fast_success_is_capped_at_maximum():
+    governor = make_governor()
+    for _ in range(100):
+        governor._on_success(0.1)
+
+    assert governor.concurrency_limit == 8
+    assert governor.page_size_limit == 100
+
+
+def test_slow_success_halves_page_size_only():
+    governor = make_governor()
+
+    governor._on_success(5.0)
+    assert governor.page_size == 50
+    assert governor.concurrency == 8
+
+    governor._on_success(5.0)
+    governor._on_success(5.0)
+    assert governor.page_size == 25
+
+
+def test_throttled_failure_halves_concurrency_and_page_size(monkeypatch):
+    monkeypatch.setattr(jira_governor.random, 'uniform', lambda low, high: high)
+    governor = make_governor()
+
+    governor._on_failure(JiraRequestError('x', 429), 0)
+    assert (governor.concurrency, governor.page_size) == (4, 50)
+
+    for attempt in range(5):
+        governor._on_failure(JiraRequestError('x', 429), attempt)
+    assert (governor.concurrency, governor.page_size) == (1, 25)
+    assert governor.throttled == governor.retries == 6
+
+
+def test_server_error_keeps_limits():
+    governor = make_governor()
+    governor._on_failure(JiraRequestError('x', 502), 0)
+
+    assert (governor.concurrency, governor.page_size) == (8, 100)
+    assert governor.throttled == 0
+
+
+def test_retry_after_takes_precedence_over_backoff(monkeypatch):
+    monkeypatch.setattr(jira_governor.random, 'uniform', lambda low, high: high)
+    governor = make_governor(base_delay=0.5)
+
+    # Retry-After の秒数 + 最大 base_delay のずらし
+    assert governor._on_failure(JiraRequestError('x', 429, '10'), 4) == 10.5
+    # Retry-After なしはフルジッター付き指数バックオフ（max_delay で頭打ち）
+    assert governor._on_failure(JiraRequestError('x', 429), 2) == 2.0
+    assert governor._on_failure(JiraRequestError('x', 429), 10) == 30.0
+
+
+# ----------------------------------------------------------------------
+# call
+# ----------------------------------------------------------------------
+
+def test_call_retries_and_honours_retry_after(sleeps):
+    responses = [JiraRequestError('x', 429, '3'), JiraRequestError('x', 503, '2'), 'ok']
+
+    def fetch():
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    governor = make_governor(base_delay=0.0)
+    assert governor.call(fetch) == 'ok'
+    assert sleeps == [3.0, 2.0]
+    assert (governor.requests, governor.retries, governor.throttled) == (3, 2, 2)
+    assert governor.in_flight == 0
+
+
+def test_call_gives_up_after_max_retries(sleeps):
+    def fetch():
+        raise JiraRequestError('x', 500)
+
+    governor = make_governor(max_retries=2)
+    with pytest.raises(JiraRequestError):
+        governor.call(fetch)
+    assert governor.requests == 3
+    assert len(sleeps) == 2
+
+
+def test_call_does_not_retry_client_errors(sleeps):
+    def fetch():
+        raise JiraRequestError('x', 400)
+
+    governor = make_governor()
+    with pytest.raises(JiraRequestError):
+        governor.call(fetch)
+    assert governor.requests == 1
+    assert sleeps == []
+
+
+def test_call_releases_slot_on_unexpected_error():
+    def fetch():
+        raise ValueError('壊れたレスポンス')
+
+    governor = make_governor(max_concurrency=1)
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            governor.call(fetch)
+    assert governor.in_flight == 0
+
+    # 枠が返っていれば別スレッドからも実行できる
+    results = []
+    worker = threading.Thread(target=lambda: results.append(governor.call(lambda: 'ok')))
+    worker.start()
+    worker.join(5)
+    assert results == ['ok']
+
+
+def test_call_limits_in_flight_requests():
+    governor = make_governor(max_concurrency=2)
+    lock = threading.Lock()
+    active = []
+    peak = []
+
+    def fetch():
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        jira_governor.time.sleep(0.02)
+        with lock:
+            active.pop()
+
+    threads = [threading.Thread(target=governor.call, args=(fetch,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert max(peak) == 2
@@ -0,0 +1,61 @@
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from jira_http import JiraHttpClient
+from json_stream import decode_search_page
+
+BODY = b'{"issues": [], "total": 0}'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """/corrupt は gzip として展開できない本文、それ以外は gzip の JSON を返す"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        body = b'\x1f\x8b\x08\x00' + b'not gzip' * 8 if self.path.startswith('/corrupt') else gzip.compress(BODY)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_decompresses_gzip_body(server):
+    client = JiraHttpClient(server)
+
+    assert client.get('/ok').body == BODY
+    assert client.get('/ok', body_handler=decode_search_page).body == {'issues': [], 'total': 0}
+    # keep-alive 接続を再利用する
+    assert client.connections_opened == 1
+
+
+@pytest.mark.parametrize('body_handler', [None, decode_search_page])
+def test_corrupt_gzip_body_raises_connection_error(server, body_handler):
+    client = JiraHttpClient(server)
+    client.get('/ok')
+
+    with pytest.raises(ConnectionError):
+        client.get('/corrupt', body_handler=body_handler)
+
+    # 読みかけの接続はプールに戻さずに閉じ、次のリクエストは新しい接続で送る
+    assert client.idle == []
+    assert client.get('/ok').body == BODY
+    assert client.connections_opened == 2
@@ -0,0 +1,206 @@
+import re
+import threading
+
+import pytest
+
+from csv_columns import IssueRecord
+from jira_governor import JiraRequestError, RequestGovernor
+from jira_search import fetch_all_pages, iter_keyset_pages, iter_pages, keyset_jql
+
+FIRST_ID = 10000
+
+
+class FakeSearch:
+    """startAt / maxResults に応じて連番の課題を返す検索API（server_page_size で件数を切り詰める）"""
+
+    def __init__(self, total: int, server_page_size: int = 100, fail_at: int = None):
+        self.total = total
+        self.server_page_size = server_page_size
+        self.fail_at = fail_at
+        self.calls = []
+        self.queries = []
+        self.lock = threading.Lock()
+
+    def __call__(self, start_at: int, max_results: int):
+        with self.lock:
+            self.calls.append((start_at, max_results))
+        if start_at == self.fail_at:
+            raise JiraRequestError('検索エラー: 400', 400)
+        end = min(self.total, start_at + min(max_results, self.server_page_size))
+        return {'total': self.total, 'issues': [{'id': str(FIRST_ID + i)} for i in range(start_at, end)]}
+
+    def by_jql(self, jql: str, max_results: int):
+        """JQL の id > N 以降を返す（iter_keyset_pages 用）"""
+        self.queries.append(jql)
+        match = re.search(r'id > (\d+)', jql)
+        start_at = int(match.group(1)) - FIRST_ID + 1 if match else 0
+        return self(max(0, start_at), max_results)
+
+
+def make_governor(concurrency: int = 4, page_size: int = 50, max_retries: int = 3) -> RequestGovernor:
+    # テストでは流量制限とリトライの待ち時間を短くする
+    return RequestGovernor(max_concurrency=concurrency, max_rps=1000, max_retries=max_retries,
+                           max_page_size=page_size, min_page_size=min(25, page_size), base_delay=0.01,
+                           max_delay=0.05)
+
+
+def issue_ids(issues):
+    return [int(issue['id']) for issue in issues]
+
+
+def test_fetch_all_pages_returns_all_issues_in_order():
+    search = FakeSearch(437)
+    issues = fetch_all_pages(search, max_results=1000, concurrency=4, page_size=50)
+
+    assert issue_ids(issues) == list(range(FIRST_ID, FIRST_ID + 437))
+    assert all(size <= 50 for _, size in search.calls)
+
+
+def test_fetch_all_pages_stops_at_max_results():
+    search = FakeSearch(500)
+    issues = fetch_all_pages(search, max_results=120, concurrency=3, page_size=50)
+
+    assert issue_ids(issues) == list(range(FIRST_ID, FIRST_ID + 120))
+    # 上限より後のページは取得しない
+    assert max(start_at + size for start_at, size in search.calls) == 120
+
+
+def test_fetch_all_pages_follows_server_page_size():
+    # サーバーが maxResults を30件に切り詰めても取りこぼさない
+    search = FakeSearch(200, server_page_size=30)
+    issues = fetch_all_pages(search, max_results=1000, concurrency=4, page_size=50)
+
+    assert issue_ids(issues) == list(range(FIRST_ID, FIRST_ID + 200))
+
+
+def test_fetch_all_pages_sequential_matches_concurrent():
+    assert fetch_all_pages(FakeSearch(321), 1000, concurrency=1) == fetch_all_pages(FakeSearch(321), 1000,
+                                                                                     concurrency=8)
+
+
+def test_fetch_all_pages_empty_result():
+    search = FakeSearch(0)
+
+    assert fetch_all_pages(search, max_results=1000, concurrency=2) == []
+    assert len(search.calls) == 1
+
+
+def test_fetch_all_pages_retries_throttled_pages():
+    search = FakeSearch(300)
+    failures = {100: 2, 150: 1}
+
+    def fetch_page(start_at, max_results):
+        if failures.get(start_at):
+            failures[start_at] -= 1
+            raise JiraRequestError('検索エラー: 429', 429, '0')
+        return search(start_at, max_results)
+
+    governor = make_governor()
+    issues = fetch_all_pages(fetch_page, max_results=1000, concurrency=4, page_size=50, governor=governor)
+
+    assert issue_ids(issues) == list(range(FIRST_ID, FIRST_ID + 300))
+    assert governor.throttled == 3
+
+
+def test_fetch_all_pages_raises_when_a_page_cannot_be_fetched():
+    # 部分的な結果は返さない
+    with pytest.raises(JiraRequestError):
+        fetch_all_pages(FakeSearch(300, fail_at=100), max_results=1000, concurrency=2, page_size=50,
+                        governor=make_governor(2))
+    with pytest.raises(JiraRequestError):
+        fetch_all_pages(FakeSearch(300, fail_at=0), max_results=1000, governor=make_governor(2))
+
+
+# ----------------------------------------------------------------------
+# キーセット（課題ID順）による取得
+# ----------------------------------------------------------------------
+
+def test_keyset_jql_replaces_order_by():
+    assert keyset_jql('project = SUPPORT ORDER BY created ASC') == 'project = SUPPORT ORDER BY id ASC'
+    assert keyset_jql('project = SUPPORT order by created', 10123) == (
+        '(project = SUPPORT) AND id > 10123 ORDER BY id ASC')
+    assert keyset_jql('a = 1 OR b = 2', '7') == '(a = 1 OR b = 2) AND id > 7 ORDER BY id ASC'
+    assert keyset_jql('', 5) == 'id > 5 ORDER BY id ASC'
+    assert keyset_jql('ORDER BY key') == 'ORDER BY id ASC'
+
+
+def test_iter_keyset_pages_returns_all_issues_beyond_offset_cap():
+    search = FakeSearch(6120)
+    pages = list(iter_keyset_pages(search.by_jql, 'project = SUPPORT ORDER BY created ASC', page_size=100,
+                                   governor=make_governor(1, 100)))
+
+    assert issue_ids(issue for page in pages for issue in page) == list(range(FIRST_ID, FIRST_ID + 6120))
+    # 各ページは startAt=0 で前ページの最後の課題IDより後を取得する
+    assert search.queries[1] == f'(project = SUPPORT) AND id > {FIRST_ID + 99} ORDER BY id ASC'
+    # 最後は空ページで終了
+    assert len(search.queries) == 63
+
+
+def test_iter_keyset_pages_resumes_after_id():
+    search = FakeSearch(250)
+    pages = list(iter_keyset_pages(search.by_jql, 'project = SUPPORT', after_id=FIRST_ID + 199,
+                                   governor=make_governor(1)))
+
+    assert issue_ids(issue for page in pages for issue in page) == list(range(FIRST_ID + 200, FIRST_ID + 250))
+
+
+def test_iter_keyset_pages_follows_server_page_size():
+    # サーバーが要求より少なく返しても最後の課題IDから続ける
+    search = FakeSearch(130, server_page_size=30)
+    pages = list(iter_keyset_pages(search.by_jql, 'project = SUPPORT', governor=make_governor(1)))
+
+    assert issue_ids(issue for page in pages for issue in page) == list(range(FIRST_ID, FIRST_ID + 130))
+    assert [len(page) for page in pages] == [30, 30, 30, 30, 10]
+
+
+def test_iter_keyset_pages_accepts_issue_records():
+    records = [IssueRecord(f'SUPPORT-{i}', str(i), None, None, ()) for i in range(1, 8)]
+
+    def fetch_page(jql, max_results):
+        after = int(jql.split('id > ')[1].split()[0]) if 'id > ' in jql else 0
+        return {'issues': [record for record in records if int(record.id) > after][:3]}
+
+    pages = list(iter_keyset_pages(fetch_page, 'project = SUPPORT', governor=make_governor(1, 25)))
+
+    assert [[record.key for record in page] for page in pages] == [
+        ['SUPPORT-1', 'SUPPORT-2', 'SUPPORT-3'], ['SUPPORT-4', 'SUPPORT-5', 'SUPPORT-6'], ['SUPPORT-7']]
+
+
+def test_iter_keyset_pages_stops_prefetch_when_closed():
+    search = FakeSearch(1000)
+    pages = iter_keyset_pages(search.by_jql, 'project = SUPPORT', governor=make_governor(1))
+
+    next(pages)
+    pages.close()
+
+    # 1ページ目と先読みの1ページだけを取得する
+    assert len(search.queries) <= 2
+
+
+# ----------------------------------------------------------------------
+# ローカル検索APIスタブ（HTTP・ストリーミングデコードを含む）
+# ----------------------------------------------------------------------
+
+def test_iter_pages_against_stub(jira_stub):
+    search = jira_stub(437, max_page_size=30)
+    pages = list(iter_pages(search.by_offset, concurrency=4, page_size=50, governor=make_governor()))
+
+    assert issue_ids(issue for page in pages for issue in page) == list(range(FIRST_ID, FIRST_ID + 437))
+
+
+def test_iter_pages_retries_throttled_requests_against_stub(jira_stub):
+    search = jira_stub(300, throttle_rate=0.3, retry_after=0, seed=1)
+    governor = make_governor(max_retries=20)
+    pages = list(iter_pages(search.by_offset, concurrency=4, page_size=50, governor=governor))
+
+    assert issue_ids(issue for page in pages for issue in page) == list(range(FIRST_ID, FIRST_ID + 300))
+    assert governor.throttled == search.stub.stats['throttled'] > 0
+
+
+def test_iter_keyset_pages_against_stub(jira_stub):
+    search = jira_stub(1234)
+    pages = list(iter_keyset_pages(search.by_jql, 'project = SUPPORT ORDER BY created ASC',
+                                   governor=make_governor(1, 100)))
+
+    assert issue_ids(issue for page in pages for issue in page) == list(range(FIRST_ID, FIRST_ID + 1234))
+    assert all(start_at == 0 for _, start_at, _ in search.calls)
@@ -0,0 +1,132 @@
+import json
+
+import pytest
+
+from json_stream import _ChunkReader, decode_search_page, prune_issue
+from synthetic import IssueFactory
+
+PAGE = {
+    'expand': 'schema,names',
+    'startAt': 0,
+    'maxResults': 100,
+    'total': 1234567,
+    'issues': [
+        {'id': '10000', 'key': 'SUPPORT-1', 'self': 'https://example/10000', 'fields': {
+            'summary': 'ログインできない 😀', 'priority': {'self': 'x', 'iconUrl': 'y', 'name': '高', 'id': '2'},
+            'reporter': {'accountId': 'a', 'avatarUrls': {'48x48': 'z'}, 'displayName': '山田 太郎'},
+            'customfield_10141': [{'self': 'o', 'value': '機能A', 'id': '1'}, {'value': '機能B'}],
+            'customfield_10140': {'id': '9'}, 'customfield_10163': 3.25, 'resolution': None,
+        }},
+        {'id': '10001', 'key': 'SUPPORT-2', 'fields': {'summary': 'エスケープ \\" \\u3042 \n', 'labels': []}},
+    ],
+    'warningMessages': ['末尾のキー'],
+}
+
+
+def chunked(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def expected_page(page, transform=prune_issue):
+    expected = dict(page)
+    expected['issues'] = [transform(issue) for issue in page['issues']]
+    return expected
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 100000])
+def test_decode_search_page_with_any_chunk_boundary(size):
+    # 1バイト単位ではマルチバイト文字・数値・エスケープの途中でも分割される
+    body = json.dumps(PAGE, ensure_ascii=False, indent=1).encode('utf-8')
+
+    assert decode_search_page(chunked(body, size)) == expected_page(PAGE)
+
+
+def test_decode_search_page_prunes_issue_fields():
+    page = decode_search_page([json.dumps(PAGE).encode('utf-8')])
+    fields = page['issues'][0]['fields']
+
+    assert 'self' not in page['issues'][0]
+    assert fields['priority'] == {'name': '高'}
+    assert fields['reporter'] == {'displayName': '山田 太郎'}
+    assert fields['customfield_10141'] == [{'value': '機能A'}, {'value': '機能B'}]
+    # 残す属性がないオブジェクトはそのまま
+    assert fields['customfield_10140'] == {'id': '9'}
+    assert fields['resolution'] is None
+
+
+def test_decode_search_page_applies_transform_per_issue():
+    body = json.dumps(PAGE).encode('utf-8')
+
+    assert decode_search_page(chunked(body, 5), lambda issue: issue['key']) == dict(
+        PAGE, issues=['SUPPORT-1', 'SUPPORT-2'])
+    assert decode_search_page(chunked(body, 5), None) == PAGE
+
+
+@pytest.mark.parametrize('body', [b'{}', b' { } ', b'{"issues": [], "total": 0}', b'{"total": 5}',
+                                  b'{"issues": null}', b'{"total": 12, "startAt": -3.5e2, "x": true}'])
+def test_decode_search_page_small_bodies(body):
+    for size in (1, len(body)):
+        assert decode_search_page(chunked(body, size)) == json.loads(body)
+
+
+def test_decode_search_page_matches_json_loads_for_large_pages():
+    issues = [{'id': str(10000 + i), 'key': f'SUPPORT-{i + 1}', 'self': f'https://example/{i}', 'fields': {
+        'summary': f'要約 {i} "引用" \\ \t', 'labels': [f'l{n}' for n in range(i % 4)],
+        'assignee': None if i % 5 == 0 else {'displayName': f'担当{i % 7}', 'accountId': str(i % 7)},
+        'customfield_10163': i * 1.5e-3, 'customfield_10141': [{'value': '機能A', 'id': '1'}] * (i % 3),
+    }} for i in range(50)]
+    page = {'startAt': 0, 'maxResults': 50, 'total': 50, 'issues': issues}
+    body = json.dumps(page, ensure_ascii=False).encode('utf-8')
+
+    assert decode_search_page(chunked(body, 997)) == expected_page(page)
+
+
+def test_decode_search_page_matches_synthetic_pages():
+    factory = IssueFactory()
+    fields = list(factory.registry.fields)[:40]
+    page = {'startAt': 0, 'maxResults': 50, 'total': 50, 'issues': [factory.issue(i, fields) for i in range(50)]}
+    body = json.dumps(page, ensure_ascii=False).encode('utf-8')
+
+    assert decode_search_page(chunked(body, 997)) == expected_page(page)
+
+
+@pytest.mark.parametrize('body', [b'', b'[]', b'{"issues": [{"id": 1}', b'{"issues": [{"id": 1} {"id": 2}]}',
+                                  b'{"total": 1', b'{"total" 1}', b'{"total": tru'])
+def test_decode_search_page_rejects_malformed_json(body):
+    with pytest.raises(ValueError):
+        decode_search_page(chunked(body, 3))
+
+
+def test_chunk_reader_reads_numbers_split_across_chunks():
+    reader = _ChunkReader([b'12', b'34', b' 5', b'6'])
+
+    assert reader.value() == 1234
+    assert reader.value() == 56
+    assert reader.peek() == ''
+
+
+def test_chunk_reader_discards_consumed_text():
+    issue = json.dumps({'id': '1', 'fields': {'summary': 'x' * 1000}}).encode('utf-8')
+    reader = _ChunkReader(chunked(b'[' + b','.join([issue] * 200) + b']', 4096))
+    reader.take('[')
+    largest = 0
+    while True:
+        reader.value()
+        largest = max(largest, len(reader.buffer))
+        if reader.take(',]') == ']':
+            break
+
+    # 本文全体（約20万文字）ではなく、課題1件 + チャンク1つ程度しか保持しない
+    assert largest < len(issue) + 2 * 4096
+
+
+def test_chunk_reader_take_and_peek():
+    reader = _ChunkReader([b'  \n{', b'\t}'])
+
+    assert reader.peek() == '{'
+    assert reader.take('{') == '{'
+    with pytest.raises(ValueError):
+        reader.take(',')
+    assert reader.take('}') == '}'
+    assert reader.peek() == ''
+    assert not reader.fill()
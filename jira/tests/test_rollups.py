@@ -0,0 +1,139 @@
+import csv
+import random
+from io import StringIO
+
+from csv_columns import STANDARD_LAYOUT
+from rollups import ROLLUP_DIMENSIONS, UNSET, RollupTables, iso_week, week_start
+
+HEADERS = STANDARD_LAYOUT.headers
+
+
+def make_row(n: int, created: str, ts: str = 'TS-A', function: str = '機能A', inquiry: str = '質問',
+             priority: str = 'Medium') -> list:
+    return ['質問', f'SUPPORT-{n}', str(10000 + n), '要約', function, inquiry, '報告者', ts, '担当者', priority,
+            created, 'TOKEN']
+
+
+def recount(rows) -> RollupTables:
+    tables = RollupTables(HEADERS)
+    for row in rows:
+        tables.apply(None, row)
+    return tables
+
+
+def test_week_start_and_iso_week():
+    # 2024-01-01 は月曜日
+    assert week_start('2024-01-01 09:00:00') == '2024-01-01'
+    assert week_start('2024-01-07 23:59:59') == '2024-01-01'
+    assert week_start('2024-01-08 00:00:00') == '2024-01-08'
+    assert week_start('') == UNSET
+    assert week_start(None) == UNSET
+    assert iso_week('2024-01-01') == '2024-W01'
+    # 年をまたぐ週は ISO の年
+    assert iso_week(week_start('2021-01-01 10:00:00')) == '2020-W53'
+    assert iso_week(UNSET) == ''
+
+
+def test_apply_adds_and_subtracts_changed_rows():
+    tables = RollupTables(HEADERS)
+    old = make_row(1, '2024-01-02 10:00:00', ts='TS-A', priority='High')
+    new = make_row(1, '2024-01-02 10:00:00', ts='TS-B', priority='High')
+    tables.apply(None, old)
+    tables.apply(None, make_row(2, '2024-01-09 10:00:00', ts='', priority='High'))
+
+    tables.apply(old, new)
+
+    assert tables.issue_count == 2
+    assert tables.counts['ts'] == {'TS-B': 1, UNSET: 1}
+    assert tables.counts['priority'] == {'High': 2}
+    assert tables.counts['week'] == {'2024-01-01': 1, '2024-01-08': 1}
+
+    # 削除された課題（変更後なし）
+    tables.apply(new, None)
+    assert tables.issue_count == 1
+    assert tables.counts['ts'] == {UNSET: 1}
+    assert tables.counts['week'] == {'2024-01-08': 1}
+
+
+def test_incremental_updates_match_full_recount():
+    rng = random.Random(5)
+    current = {}
+    tables = RollupTables(HEADERS)
+    for _ in range(2000):
+        n = rng.randint(1, 300)
+        if rng.random() < 0.1:
+            row = None
+        else:
+            row = make_row(n, f'2024-0{rng.randint(1, 3)}-{rng.randint(10, 28)} 12:00:00',
+                           ts=rng.choice(['TS-A', 'TS-B', '']), function=rng.choice(['機能A', '機能B', '機能A, 機能B', '']),
+                           inquiry=rng.choice(['質問', '不具合', '']), priority=rng.choice(['High', 'Low']))
+        previous = current.get(n)
+        if previous is None and row is None:
+            continue
+        tables.apply(previous, row)
+        if row is None:
+            del current[n]
+        else:
+            current[n] = row
+
+    expected = recount(current.values())
+    assert tables.counts == expected.counts
+    assert tables.issue_count == len(current)
+
+
+def test_multi_select_function_counts_each_option_once():
+    tables = RollupTables(HEADERS)
+    old = make_row(1, '2024-01-02 10:00:00', function='機能A, 機能B')
+    tables.apply(None, old)
+    tables.apply(None, make_row(2, '2024-01-02 10:00:00', function='機能B'))
+    # 同じ選択肢が重複していても1件
+    tables.apply(None, make_row(3, '2024-01-02 10:00:00', function='機能C, 機能C'))
+
+    assert tables.counts['function'] == {'機能A': 1, '機能B': 2, '機能C': 1}
+    assert tables.issue_count == 3
+
+    # 変更前の選択肢ごとに減算し、変更後の選択肢ごとに加算
+    tables.apply(old, make_row(1, '2024-01-02 10:00:00', function='機能B, 機能D'))
+    assert tables.counts['function'] == {'機能B': 2, '機能C': 1, '機能D': 1}
+
+    tables.apply(make_row(3, '2024-01-02 10:00:00', function='機能C, 機能C'),
+                 make_row(3, '2024-01-02 10:00:00', function=''))
+    assert tables.counts['function'] == {'機能B': 2, '機能D': 1, UNSET: 1}
+    # 複数選択以外の列は値をそのままキーにする
+    assert tables.counts['priority'] == {'Medium': 3}
+
+
+def test_json_round_trip_restores_issue_count():
+    tables = recount([make_row(1, '2024-01-02 10:00:00'), make_row(2, '2024-01-03 10:00:00', priority='Low')])
+
+    restored = RollupTables.from_json(HEADERS, tables.to_json())
+
+    assert restored.counts == tables.counts
+    assert restored.issue_count == 2
+
+
+def test_from_json_rejects_old_format():
+    # 複数選択を分割する前の形式（選択肢の組み合わせがキー）は集計し直す
+    old = '{"issue_count": 1, "counts": {"function": {"機能A, 機能B": 1}}}'
+
+    assert RollupTables.from_json(HEADERS, old) is None
+
+
+def test_rows_and_csv_ordering():
+    tables = recount([
+        make_row(1, '2024-01-09 10:00:00', function='機能B'),
+        make_row(2, '2024-01-02 10:00:00', function='機能A'),
+        make_row(3, '2024-01-03 10:00:00', function='機能B'),
+        make_row(4, '', function='機能C'),
+    ])
+
+    # 週別は週順（未設定が先頭）、それ以外は件数の多い順・同数はキー順
+    assert tables.rows('week') == [[UNSET, '', 1], ['2024-01-01', '2024-W01', 2], ['2024-01-08', '2024-W02', 1]]
+    assert tables.rows('function') == [['機能B', 2], ['機能A', 1], ['機能C', 1]]
+
+    rows = list(csv.reader(StringIO(tables.to_csv('function'))))
+    assert rows == [['機能分類 (Function)', '件数'], ['機能B', '2'], ['機能A', '1'], ['機能C', '1']]
+
+    summary = tables.summary('2024-01-10T00:00:00')
+    assert summary['issue_count'] == 4
+    assert list(summary['rollups']) == [name for name, _ in ROLLUP_DIMENSIONS]
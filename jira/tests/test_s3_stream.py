@@ -0,0 +1,243 @@
+import gzip
+import hashlib
+import os
+
+import pytest
+from botocore.exceptions import ClientError
+
+from s3_stream import (
+    CONTENT_SHA256_METADATA, CompressedVariantWriter, S3MultipartWriter, compress_bytes, content_etag, content_sha256,
+    multipart_etag, stored_etag
+)
+
+BUCKET = 'test-bucket'
+KEY = 'exports/latest.csv'
+
+
+def write_rows(writer, rows: int, changed_row: int = None):
+    for i in range(rows):
+        writer.write(f"SUPPORT-{i},{'変更' if i == changed_row else '要約'},{i * 7}\n")
+    writer.close()
+    return writer
+
+
+def head(s3_client, key: str = KEY):
+    return s3_client.head_object(Bucket=BUCKET, Key=key)
+
+
+def open_uploads(s3_client):
+    directory = os.path.join(s3_client.root, '.multipart')
+    return os.listdir(directory) if os.path.isdir(directory) else []
+
+
+def stored_body(s3_client, key: str = KEY) -> bytes:
+    return s3_client.get_object(Bucket=BUCKET, Key=key)['Body'].read()
+
+
+@pytest.fixture
+def uploads(local_s3, monkeypatch):
+    """開始したマルチパートアップロードを記録する"""
+    started = []
+    create = local_s3.create_multipart_upload
+    monkeypatch.setattr(local_s3, 'create_multipart_upload', lambda **kwargs: started.append(kwargs) or create(**kwargs))
+    return started
+
+
+# ----------------------------------------------------------------------
+# ETag の計算
+# ----------------------------------------------------------------------
+
+def test_content_etag_is_md5_of_body():
+    assert content_etag(b'') == 'd41d8cd98f00b204e9800998ecf8427e'
+    assert content_etag(b'abc') == hashlib.md5(b'abc').hexdigest()
+
+
+def test_multipart_etag_is_md5_of_part_digests():
+    parts = [b'a' * 10, b'b' * 10, b'c' * 3]
+    digest = hashlib.md5(b''.join(hashlib.md5(part).digest() for part in parts)).hexdigest()
+
+    assert multipart_etag([hashlib.md5(part).digest() for part in parts]) == f'{digest}-3'
+    # 1パートでも put_object のETag（本文のMD5）とは異なる
+    body = b''.join(parts)
+    assert multipart_etag([hashlib.md5(body).digest()]) == f'{hashlib.md5(hashlib.md5(body).digest()).hexdigest()}-1'
+    assert multipart_etag([hashlib.md5(body).digest()]) != content_etag(body)
+
+
+def test_etags_match_stored_objects(local_s3):
+    local_s3.put_object(Bucket=BUCKET, Key='single', Body=b'hello')
+    assert stored_etag(local_s3, BUCKET, 'single') == content_etag(b'hello')
+
+    upload_id = local_s3.create_multipart_upload(Bucket=BUCKET, Key='multi')['UploadId']
+    parts = [b'x' * 7, b'y' * 3]
+    etags = [local_s3.upload_part(Bucket=BUCKET, Key='multi', UploadId=upload_id, PartNumber=n + 1, Body=body)['ETag']
+             for n, body in enumerate(parts)]
+    local_s3.complete_multipart_upload(Bucket=BUCKET, Key='multi', UploadId=upload_id, MultipartUpload={
+        'Parts': [{'PartNumber': n + 1, 'ETag': etag} for n, etag in enumerate(etags)]})
+    assert stored_etag(local_s3, BUCKET, 'multi') == multipart_etag([hashlib.md5(part).digest() for part in parts])
+
+    assert stored_etag(local_s3, BUCKET, 'missing') is None
+
+
+# ----------------------------------------------------------------------
+# skip_unchanged
+# ----------------------------------------------------------------------
+
+def test_single_put_is_skipped_when_unchanged(local_s3):
+    first = write_rows(S3MultipartWriter(local_s3, BUCKET, KEY, skip_unchanged=True), 20)
+    stored = head(local_s3)
+    assert not first.unchanged
+
+    second = write_rows(S3MultipartWriter(local_s3, BUCKET, KEY, skip_unchanged=True), 20)
+    assert second.unchanged
+    assert head(local_s3)['LastModified'] == stored['LastModified']
+
+    third = write_rows(S3MultipartWriter(local_s3, BUCKET, KEY, skip_unchanged=True), 20, changed_row=19)
+    assert not third.unchanged
+    assert head(local_s3)['ETag'] != stored['ETag']
+
+
+@pytest.mark.parametrize('rows', [40, 100, 101])
+def test_multipart_upload_is_not_started_when_unchanged(local_s3, uploads, rows):
+    # 1行は約20バイトのため、part_size=256 で複数パートになる
+    first = write_rows(S3MultipartWriter(local_s3, BUCKET, KEY, part_size=256, skip_unchanged=True), rows)
+    stored = head(local_s3)
+    assert stored['ETag'].strip('"') == multipart_etag(first.part_digests)
+    assert stored['Metadata'][CONTENT_SHA256_METADATA] == content_sha256(stored_body(local_s3))
+    assert len(uploads) == 1
+
+    second = write_rows(S3MultipartWriter(local_s3, BUCKET, KEY, part_size=256, skip_unchanged=True), rows)
+    assert second.unchanged
+    assert head(local_s3)['LastModified'] == stored['LastModified']
+    # SHA-256 が決まるまで送信しないため、マルチパートアップロードを始めない
+    assert len(uploads) == 1
+    assert open_uploads(local_s3) == []
+
+
+def test_multipart_upload_completes_when_last_part_changes(local_s3):
+    write_rows(S3MultipartWriter(local_s3, BUCKET, KEY, part_size=256, skip_unchanged=True), 100)
+    stored = head(local_s3)
+
+    writer = write_rows(S3MultipartWriter(local_s3, BUCKET, KEY, part_size=256, skip_unchanged=True), 100,
+                        changed_row=99)
+
+    assert not writer.unchanged
+    assert head(local_s3)['ETag'] != stored['ETag']
+    assert head(local_s3)['ETag'].strip('"') == multipart_etag(writer.part_digests)
+    assert head(local_s3)['Metadata'][CONTENT_SHA256_METADATA] == content_sha256(stored_body(local_s3))
+    assert b'SUPPORT-99,\xe5\xa4\x89\xe6\x9b\xb4' in stored_body(local_s3)
+
+
+def test_unchanged_is_detected_regardless_of_part_size(local_s3):
+    write_rows(S3MultipartWriter(local_s3, BUCKET, KEY, skip_unchanged=True), 100)
+
+    # パートの分け方が変わってETagが異なっても、SHA-256 が同じなら書き込まない
+    writer = write_rows(S3MultipartWriter(local_s3, BUCKET, KEY, part_size=256, skip_unchanged=True), 100)
+
+    assert writer.unchanged
+
+
+def test_sha256_is_compared_when_etag_is_not_md5(local_s3, monkeypatch):
+    write_rows(S3MultipartWriter(local_s3, BUCKET, KEY, skip_unchanged=True), 20)
+    head_object = local_s3.head_object
+
+    # SSE-KMS ではETagが本文のMD5にならない
+    monkeypatch.setattr(local_s3, 'head_object', lambda **kwargs: dict(head_object(**kwargs), ETag='"kms"'))
+
+    assert write_rows(S3MultipartWriter(local_s3, BUCKET, KEY, skip_unchanged=True), 20).unchanged
+    assert not write_rows(S3MultipartWriter(local_s3, BUCKET, KEY, skip_unchanged=True), 20, changed_row=3).unchanged
+
+
+def test_etag_is_compared_when_sha256_metadata_is_missing(local_s3):
+    # 以前の実行で保存した（メタデータのない）オブジェクト
+    write_rows(S3MultipartWriter(local_s3, BUCKET, KEY), 20)
+    stored = head(local_s3)
+    assert CONTENT_SHA256_METADATA not in stored['Metadata']
+
+    assert write_rows(S3MultipartWriter(local_s3, BUCKET, KEY, skip_unchanged=True), 20).unchanged
+    assert head(local_s3)['LastModified'] == stored['LastModified']
+
+
+def test_upload_streams_after_spool_limit(local_s3, uploads):
+    def export(**kwargs):
+        writer = S3MultipartWriter(local_s3, BUCKET, KEY, part_size=256, skip_unchanged=True, spool_limit=512,
+                                   **kwargs)
+        for i in range(100):
+            writer.write(f"SUPPORT-{i},要約,{i * 7}\n")
+            if writer.bytes_written > 1024:
+                # 上限を超えたら書き込みながら送信している
+                assert writer.upload_id is not None
+        writer.close()
+        return writer
+
+    first = export()
+    assert not first.unchanged
+    # SHA-256 は送信を始める前に決まらないためメタデータには入らない
+    assert CONTENT_SHA256_METADATA not in head(local_s3)['Metadata']
+    stored = head(local_s3)
+
+    # 同じ内容ならETagで比べ、送信済みのパートは破棄する
+    second = export()
+    assert second.unchanged
+    assert second.part_digests == first.part_digests
+    assert head(local_s3)['LastModified'] == stored['LastModified']
+    assert len(uploads) == 2
+    assert open_uploads(local_s3) == []
+
+
+def test_skip_unchanged_disabled_always_writes(local_s3):
+    write_rows(S3MultipartWriter(local_s3, BUCKET, KEY, part_size=256), 100)
+    stored = head(local_s3)
+
+    writer = write_rows(S3MultipartWriter(local_s3, BUCKET, KEY, part_size=256), 100)
+
+    assert not writer.unchanged
+    assert writer.part_digests == []
+    assert head(local_s3)['LastModified'] >= stored['LastModified']
+    assert open_uploads(local_s3) == []
+
+
+def test_compressed_variants_are_skipped_together(local_s3):
+    def export():
+        writer = CompressedVariantWriter(local_s3, BUCKET, KEY, ['gzip'], part_size=256, skip_unchanged=True)
+        return write_rows(writer, 300)
+
+    first = export()
+    body = local_s3.get_object(Bucket=BUCKET, Key=KEY)['Body'].read()
+    compressed = local_s3.get_object(Bucket=BUCKET, Key=KEY + '.gz')
+    assert compressed['ContentEncoding'] == 'gzip'
+    assert gzip.decompress(compressed['Body'].read()) == body
+    assert not first.unchanged
+
+    # gzip は決定的なので、同じ内容なら圧縮版も同じETagになる
+    assert export().unchanged
+    assert compress_bytes(body, 'gzip') == compress_bytes(body, 'gzip')
+
+
+@pytest.mark.parametrize('part_size', [256, 1024 * 1024])
+def test_compressed_variants_are_deleted_when_raw_close_fails(local_s3, monkeypatch, part_size):
+    def export(changed_row=None):
+        writer = CompressedVariantWriter(local_s3, BUCKET, KEY, ['gzip'], part_size=part_size, skip_unchanged=True)
+        return write_rows(writer, 300, changed_row)
+
+    export()
+    stored = stored_body(local_s3)
+    put_object = local_s3.put_object
+    complete = local_s3.complete_multipart_upload
+
+    def fail_raw(operation):
+        def call(**kwargs):
+            if kwargs['Key'] == KEY:
+                raise IOError('S3 error')
+            return operation(**kwargs)
+        return call
+
+    monkeypatch.setattr(local_s3, 'put_object', fail_raw(put_object))
+    monkeypatch.setattr(local_s3, 'complete_multipart_upload', fail_raw(complete))
+    with pytest.raises(IOError):
+        export(changed_row=5)
+
+    # 無圧縮版は前回のまま、新しい内容の圧縮版は残さない
+    assert stored_body(local_s3) == stored
+    with pytest.raises(ClientError):
+        local_s3.head_object(Bucket=BUCKET, Key=KEY + '.gz')
+    assert open_uploads(local_s3) == []
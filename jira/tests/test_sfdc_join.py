@@ -0,0 +1,86 @@
+import io
+
+import pytest
+
+import sfdc_join
+from sfdc_join import (
+    JOIN_HEADERS, SFDC_ACCOUNT_HEADER, SFDC_AMOUNT_HEADER, SFDC_TOKEN_HEADER, build_token_index, decode_sfdc_csv,
+    iter_csv_rows, join_issue_rows, load_token_index
+)
+
+BUCKET = 'test-bucket'
+SOURCE_KEY = 'sfdc/sfdc_export.csv'
+CACHE_KEY = 'state/sfdc_index.json'
+
+SFDC_CSV = (f'{SFDC_ACCOUNT_HEADER},{SFDC_TOKEN_HEADER},{SFDC_AMOUNT_HEADER}\n'
+            '株式会社A,TOKEN-1,10000\n'
+            '株式会社B, TOKEN-2 ,20000\n'
+            '空トークン,,5\n'
+            '株式会社C,TOKEN-1,30000\n')
+
+ISSUE_HEADERS = ['課題タイプ', '課題キー', '課題ID', '要約', '報告者', 'TS', '担当者', 'TOKEN']
+
+
+@pytest.fixture(autouse=True)
+def clear_index_cache():
+    sfdc_join._index_cache.clear()
+    yield
+    sfdc_join._index_cache.clear()
+
+
+def test_decode_sfdc_csv_accepts_bom_and_shift_jis():
+    assert decode_sfdc_csv('﻿取引先'.encode('utf-8')) == '取引先'
+    assert decode_sfdc_csv('取引先'.encode('cp932')) == '取引先'
+
+
+def test_build_token_index_uses_last_row_per_token():
+    assert build_token_index(SFDC_CSV) == {'TOKEN-1': ['株式会社C', '30000'], 'TOKEN-2': ['株式会社B', '20000']}
+
+
+def test_build_token_index_tolerates_missing_optional_columns():
+    assert build_token_index(f'{SFDC_TOKEN_HEADER}\nTOKEN-9\n') == {'TOKEN-9': ['', '']}
+    with pytest.raises(ValueError):
+        build_token_index('取引先名,合計月額\nA,1\n')
+
+
+def test_load_token_index_rebuilds_only_when_etag_changes(local_s3):
+    local_s3.put_object(Bucket=BUCKET, Key=SOURCE_KEY, Body=SFDC_CSV.encode('cp932'))
+
+    index, rebuilt = load_token_index(local_s3, BUCKET, SOURCE_KEY, CACHE_KEY)
+    assert rebuilt
+    assert index['TOKEN-2'] == ['株式会社B', '20000']
+
+    # プロセス内キャッシュ、次にS3のキャッシュ（コールドスタート）を使う
+    assert load_token_index(local_s3, BUCKET, SOURCE_KEY, CACHE_KEY) == (index, False)
+    sfdc_join._index_cache.clear()
+    assert load_token_index(local_s3, BUCKET, SOURCE_KEY, CACHE_KEY) == (index, False)
+
+    local_s3.put_object(Bucket=BUCKET, Key=SOURCE_KEY,
+                        Body=f'{SFDC_TOKEN_HEADER},{SFDC_ACCOUNT_HEADER}\nTOKEN-3,株式会社D\n'.encode('utf-8'))
+    index, rebuilt = load_token_index(local_s3, BUCKET, SOURCE_KEY, CACHE_KEY)
+    assert rebuilt
+    assert index == {'TOKEN-3': ['株式会社D', '']}
+
+
+def test_join_issue_rows():
+    index = build_token_index(SFDC_CSV)
+    body = io.BytesIO('\n'.join([
+        ','.join(ISSUE_HEADERS),
+        '質問,SUPPORT-1,10000,要約1,報告者,TS,担当者, TOKEN-1',
+        '質問,SUPPORT-2,10001,要約2,報告者,TS,担当者,TOKEN-404',
+    ]).encode('utf-8'))
+    rows = iter_csv_rows(body)
+    headers = next(rows)
+
+    joined = list(join_issue_rows(rows, headers, index))
+
+    assert len(JOIN_HEADERS) == len(joined[0][0])
+    assert joined == [
+        (['質問', 'SUPPORT-1', '要約1', '報告者', 'TS', '担当者', ' TOKEN-1', '株式会社C', '30000'], True),
+        (['質問', 'SUPPORT-2', '要約2', '報告者', 'TS', '担当者', 'TOKEN-404', '', ''], False),
+    ]
+
+
+def test_join_issue_rows_requires_join_columns():
+    with pytest.raises(ValueError):
+        list(join_issue_rows([['x']], ['課題キー'], {}))
@@ -0,0 +1,54 @@
+import pytest
+
+from jira_exporter import LambdaJiraS3Exporter
+from jira_stub import JiraStub
+from snapshot_export import run_snapshot_export
+from snapshot_store import SNAPSHOT_CSV_KEY, SNAPSHOT_DB_KEY
+
+BUCKET = 'test-bucket'
+PREFIX = 'exports/'
+KEYS = [PREFIX + SNAPSHOT_CSV_KEY, PREFIX + SNAPSHOT_CSV_KEY + '.gz', PREFIX + SNAPSHOT_DB_KEY,
+        PREFIX + 'rollups/rollups.json']
+
+
+@pytest.fixture
+def exporter(tmp_path, monkeypatch):
+    stub = JiraStub(40)
+    for name, value in {'JIRA_URL': stub.start(), 'JIRA_USERNAME': 'u', 'JIRA_API_TOKEN': 't', 'S3_BUCKET': BUCKET,
+                        'S3_PREFIX': PREFIX, 'LOCAL_S3_DIR': str(tmp_path / 's3')}.items():
+        monkeypatch.setenv(name, value)
+    yield LambdaJiraS3Exporter()
+    stub.stop()
+
+
+def last_modified(exporter):
+    return {key: exporter.s3_client.head_object(Bucket=BUCKET, Key=key)['LastModified'] for key in KEYS}
+
+
+def test_snapshot_without_changes_is_not_written_again(exporter):
+    first = run_snapshot_export(exporter, {})
+    assert first['changed_count'] == 40
+    written = last_modified(exporter)
+    exporter.artifacts.take_unchanged()
+
+    # スタブは更新日時で絞り込まないため、同じ40件を取得し直す
+    second = run_snapshot_export(exporter, {})
+
+    assert second['fetched_count'] == 40
+    assert second['changed_count'] == 0
+    assert second['snapshot_csv_url'] == first['snapshot_csv_url']
+    assert second['rollups_url'] == first['rollups_url']
+    # 全件CSV・データベース・集計テーブルは書き出さない
+    assert last_modified(exporter) == written
+    assert exporter.artifacts.take_unchanged() == [SNAPSHOT_CSV_KEY]
+
+
+def test_snapshot_rebuild_without_changes_is_not_written_again(exporter):
+    run_snapshot_export(exporter, {})
+    written = last_modified(exporter)
+
+    result = run_snapshot_export(exporter, {'rebuild': True})
+
+    assert result['changed_count'] == 0
+    assert result['issue_count'] == 40
+    assert last_modified(exporter) == written
@@ -0,0 +1,131 @@
+import sqlite3
+
+import pytest
+
+from snapshot_store import SnapshotStore, split_issue_key
+
+BUCKET = 'test-bucket'
+DB_KEY = 'state/snapshot.sqlite3'
+
+
+def row(issue_key: str, summary: str = '要約') -> list:
+    return ['質問', issue_key, summary]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SnapshotStore(str(tmp_path / 'snapshot.sqlite3'))
+    yield store
+    store.close()
+
+
+def test_split_issue_key():
+    assert split_issue_key('SUPPORT-123') == ('SUPPORT', 123)
+    assert split_issue_key('MY-PROJ-7') == ('MY-PROJ', 7)
+
+
+def test_upsert_returns_previous_rows_of_changed_issues(store):
+    assert store.upsert([(1, 'SUPPORT-1', 'u1', row('SUPPORT-1')), (2, 'SUPPORT-2', 'u1', row('SUPPORT-2'))]) == {
+        1: None, 2: None}
+
+    changed = store.upsert([
+        (1, 'SUPPORT-1', 'u2', row('SUPPORT-1')),            # 内容が同じ
+        (2, 'SUPPORT-2', 'u2', row('SUPPORT-2', '変更後')),  # 変更
+        (3, 'SUPPORT-3', 'u2', row('SUPPORT-3')),            # 新規
+    ])
+
+    assert changed == {2: row('SUPPORT-2'), 3: None}
+    assert store.count() == 3
+    assert store.get_rows([1, 2, 3, 4]) == {1: row('SUPPORT-1'), 2: row('SUPPORT-2', '変更後'), 3: row('SUPPORT-3')}
+
+
+def test_upsert_uses_last_record_for_duplicate_ids(store):
+    changed = store.upsert([(1, 'SUPPORT-1', 'u1', row('SUPPORT-1', '古い')),
+                            (1, 'SUPPORT-1', 'u2', row('SUPPORT-1', '新しい'))])
+
+    assert changed == {1: None}
+    assert store.get_rows([1]) == {1: row('SUPPORT-1', '新しい')}
+
+
+def test_upsert_keeps_one_row_when_issue_key_changes(store):
+    store.upsert([(1, 'SUPPORT-5', 'u1', row('SUPPORT-5'))])
+
+    # 課題の移動でキーが変わっても課題IDで同じ行を更新する
+    changed = store.upsert([(1, 'SUPPORT-20', 'u2', row('SUPPORT-20'))])
+
+    assert changed == {1: row('SUPPORT-5')}
+    assert store.count() == 1
+    assert list(store.iter_rows()) == [row('SUPPORT-20')]
+
+
+def test_iter_rows_orders_by_project_and_number(store):
+    store.upsert([(10, 'SUPPORT-10', None, row('SUPPORT-10')), (9, 'SUPPORT-9', None, row('SUPPORT-9')),
+                  (100, 'ADMIN-2', None, row('ADMIN-2')), (11, 'SUPPORT-100', None, row('SUPPORT-100'))])
+
+    assert [r[1] for r in store.iter_rows()] == ['ADMIN-2', 'SUPPORT-9', 'SUPPORT-10', 'SUPPORT-100']
+
+
+def test_get_rows_looks_up_more_ids_than_one_batch(store):
+    store.upsert([(i, f'SUPPORT-{i}', None, row(f'SUPPORT-{i}')) for i in range(1, 1201)])
+
+    rows = store.get_rows(list(range(0, 1300)))
+    assert len(rows) == 1200
+    assert rows[1200] == row('SUPPORT-1200')
+
+
+def test_remove_missing_returns_removed_rows(store):
+    store.upsert([(i, f'SUPPORT-{i}', None, row(f'SUPPORT-{i}')) for i in range(1, 6)])
+
+    removed = store.remove_missing([1, 3, 5, 99])
+
+    assert removed == {2: row('SUPPORT-2'), 4: row('SUPPORT-4')}
+    assert [r[1] for r in store.iter_rows()] == ['SUPPORT-1', 'SUPPORT-3', 'SUPPORT-5']
+    # 繰り返し呼び出せる
+    assert store.remove_missing([1, 3, 5]) == {}
+
+
+def test_save_and_load_round_trip(local_s3, store):
+    store.upsert([(1, 'SUPPORT-1', 'u1', row('SUPPORT-1'))])
+    store.set_meta('updated', 'u1')
+    store.save(local_s3, BUCKET, DB_KEY)
+
+    loaded = SnapshotStore.load(local_s3, BUCKET, DB_KEY)
+    try:
+        assert loaded.get_meta('updated') == 'u1'
+        assert list(loaded.iter_rows()) == [row('SUPPORT-1')]
+    finally:
+        loaded.close()
+
+
+def test_load_missing_database_starts_empty(local_s3):
+    loaded = SnapshotStore.load(local_s3, BUCKET, DB_KEY)
+    try:
+        assert loaded.count() == 0
+        assert loaded.get_meta('updated') is None
+    finally:
+        loaded.close()
+
+
+def test_old_key_based_schema_is_dropped(tmp_path):
+    path = str(tmp_path / 'old.sqlite3')
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE issues (issue_key TEXT PRIMARY KEY, updated TEXT, row TEXT NOT NULL);
+        CREATE INDEX issues_issue_key ON issues (issue_key);
+        CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT);
+        INSERT INTO issues VALUES ('SUPPORT-1', 'u1', '[]');
+        INSERT INTO meta VALUES ('updated', 'u1'), ('rollups', '{}'), ('other', 'x');
+    """)
+    conn.commit()
+    conn.close()
+
+    store = SnapshotStore(path)
+    try:
+        assert store.count() == 0
+        # ウォーターマークと集計を消して次の実行で作り直させる
+        assert store.get_meta('updated') is None
+        assert store.get_meta('rollups') is None
+        assert store.get_meta('other') == 'x'
+        assert store.upsert([(1, 'SUPPORT-1', 'u1', row('SUPPORT-1'))]) == {1: None}
+    finally:
+        store.close()